@@ -1,9 +1,11 @@
 import csv
+import io
 import os
 import sys
 import tkinter as tk
 from tkinter import ttk, messagebox
 import time
+from utils.file_lock import FileLock, LockTimeout, atomic_write, file_stamp
 
 # Get the directory where the script/exe is located
 if getattr(sys, 'frozen', False):
@@ -15,25 +17,104 @@ WORKERS_CSV = os.path.join(SCRIPT_DIR, "utils/workers.csv")
 PRODUCTS_CSV = os.path.join(SCRIPT_DIR, "utils/products.csv")
 TASKS_CSV = os.path.join(SCRIPT_DIR, "utils/tasks.csv")
 
+# Columns identifying a row, for merging edits saved by two stations
+KEY_COLUMNS = {
+    WORKERS_CSV: ('Group', 'Worker'),
+    TASKS_CSV: ('Type', 'Name'),
+    PRODUCTS_CSV: ('Product',)
+}
+
+
+def merge_csv_rows(key_columns, base, ours, theirs):
+    """
+    Three-way merge of CSV rows: our changes since `base` replayed onto `theirs`
+    
+    Args:
+        base, ours, theirs: (headers, rows) as read, as being saved and as now on disk
+    
+    Returns:
+        Tuple of (headers, rows); where both changed a cell, ours wins
+    """
+    (base_headers, base_rows), (our_headers, our_rows), (their_headers, their_rows) = base, ours, theirs
+    
+    def key(row):
+        return tuple((row.get(column) or '').strip() for column in key_columns)
+    
+    base_by_key = {key(row): row for row in base_rows}
+    our_keys = {key(row) for row in our_rows}
+    
+    # Columns we removed stay removed, columns they added are kept
+    headers = list(our_headers) + [
+        h for h in their_headers if h not in our_headers and h not in base_headers
+    ]
+    
+    merged = {}
+    for row in their_rows:
+        row_key = key(row)
+        if row_key in base_by_key and row_key not in our_keys:
+            continue  # deleted by us
+        merged[row_key] = dict(row)
+    
+    for row in our_rows:
+        row_key = key(row)
+        base_row = base_by_key.get(row_key)
+        if base_row is None or row_key not in merged:
+            merged[row_key] = dict(row)  # added by us, or changed by us and deleted by them
+            continue
+        for column, value in row.items():
+            if value != base_row.get(column):
+                merged[row_key][column] = value
+    
+    rows = [{h: row.get(h, '') for h in headers} for row in merged.values()]
+    return headers, rows
+
+
 class CSVManagerApp:
     def __init__(self, root):
         self.root = root
         self.root.title("CSV Manager")
         self.root.geometry("1000x700")
         self.current_tree = None
+        self.read_versions = {}  # filepath -> (file stamp, headers, rows) as last read or written
         self.create_menu()
     
     def safe_write_csv(self, filepath, headers, rows, max_retries=3):
-        """Safely write to CSV with retry logic and file lock detection."""
-        for attempt in range(max_retries):
+        """
+        Safely write to CSV with retry logic and file lock detection.
+        
+        The file is replaced under its lock, and only if no other station
+        saved it since it was read; otherwise the user merges or reloads.
+        Only failed attempts to open the file count against max_retries,
+        not merges with another station's save.
+        """
+        attempt = 0
+        while True:
             try:
-                with open(filepath, 'w', newline='', encoding='utf-8') as f:
-                    writer = csv.DictWriter(f, fieldnames=headers)
-                    writer.writeheader()
-                    writer.writerows(rows)
-                return True
+                with FileLock(filepath):
+                    if not self.is_stale(filepath):
+                        output = io.StringIO(newline='')
+                        writer = csv.DictWriter(output, fieldnames=headers)
+                        writer.writeheader()
+                        writer.writerows(rows)
+                        atomic_write(filepath, output.getvalue())
+                        self.remember_version(filepath, headers, rows)
+                        return True
+                
+                # Ask outside the lock so other stations are not kept waiting
+                merged = self.resolve_stale_csv(filepath, headers, rows)
+                if merged is None:
+                    return False
+                headers, rows = merged
+            except LockTimeout:
+                messagebox.showerror(
+                    "File Busy",
+                    f"{os.path.basename(filepath)} is being saved by another station.\n\n"
+                    f"Please try again in a moment."
+                )
+                return False
             except PermissionError:
-                if attempt < max_retries - 1:
+                attempt += 1
+                if attempt < max_retries:
                     time.sleep(0.5)  # Wait before retry
                 else:
                     filename = os.path.basename(filepath)
@@ -47,14 +128,68 @@ class CSVManagerApp:
             except Exception as e:
                 messagebox.showerror("Error", f"Failed to save file: {str(e)}")
                 return False
-        return False
+    
+    def remember_version(self, filepath, headers, rows, stamp=None):
+        """Record the version of a file this app last read or wrote"""
+        self.read_versions[filepath] = (
+            stamp or file_stamp(filepath),
+            list(headers),
+            [dict(row) for row in rows]  # callers edit the rows they loaded in place
+        )
+    
+    def is_stale(self, filepath):
+        """True if another station saved the file since this app read it"""
+        version = self.read_versions.get(filepath)
+        return version is not None and version[0] != file_stamp(filepath)
+    
+    def resolve_stale_csv(self, filepath, headers, rows):
+        """
+        Ask whether to merge this edit with the version another station saved
+        
+        Returns:
+            (headers, rows) to save, or None if the edit is dropped
+        """
+        filename = os.path.basename(filepath)
+        answer = messagebox.askyesnocancel(
+            "Changed on Another Station",
+            f"{filename} was saved on another station since you opened it.\n\n"
+            f"Yes: merge your changes into their version\n"
+            f"No: discard your changes (reopen the list to see theirs)\n"
+            f"Cancel: do not save"
+        )
+        if answer is None:
+            return None
+        
+        stamp = file_stamp(filepath)
+        with open(filepath, 'r', newline='', encoding='utf-8') as f:
+            reader = csv.DictReader(f)
+            their_rows = list(reader)
+            their_headers = reader.fieldnames or []
+        
+        # Either way their version is now the one this app has seen
+        _, base_headers, base_rows = self.read_versions[filepath]
+        self.remember_version(filepath, their_headers, their_rows, stamp)
+        if not answer:
+            return None
+        
+        key_columns = KEY_COLUMNS.get(filepath, tuple(headers[:1]))
+        return merge_csv_rows(
+            key_columns,
+            (base_headers, base_rows),
+            (headers, rows),
+            (their_headers, their_rows)
+        )
     
     def safe_read_csv(self, filepath):
         """Safely read CSV with error handling."""
         try:
             if os.path.exists(filepath):
+                stamp = file_stamp(filepath)
                 with open(filepath, 'r', newline='', encoding='utf-8') as f:
-                    return list(csv.DictReader(f))
+                    reader = csv.DictReader(f)
+                    rows = list(reader)
+                self.remember_version(filepath, reader.fieldnames or [], rows, stamp)
+                return rows
             return []
         except PermissionError:
             filename = os.path.basename(filepath)
@@ -5,7 +5,7 @@ a = Analysis(
     ['main.py'],
     pathex=[],
     binaries=[],
-    datas=[('utils', 'utils'), ('allocations_json', 'allocations_json'), ('exports', 'exports'), ('excel', 'excel'), ('allocation_history.json', '.'), ('audit_trail.json', '.')],
+    datas=[('utils', 'utils'), ('allocations_json', 'allocations_json'), ('exports', 'exports'), ('excel', 'excel'), ('allocation_history.json', '.'), ('audit_trail', 'audit_trail')],
     hiddenimports=['tkcalendar'],
     hookspath=[],
     hooksconfig={},
@@ -0,0 +1,255 @@
+"""
+Monthly pack archives of old allocation files
+
+allocations_json/ gains two files a day and every tool that walks it pays
+one open per shift. The archiver moves shifts older than ARCHIVE_AFTER_DAYS
+into one pack per month, allocations_json/archive/YYYY-MM.jsonl:
+    
+    {...v2 allocation...}\\n               one line per shift, sorted by file name
+    ...
+    {"Allocation_...json": [offset, length, catalog row], ...}\\n
+    {"index_offset": 12345}   \\n          fixed-size trailer (TRAILER_SIZE bytes)
+
+The index of a pack is read once (tail seek, then one read) and cached, so
+opening an archived shift is one seek and one read of plain JSON. Readers
+go through exists()/load(), which prefer the loose file and fall back to
+the pack, so a shift re-saved after archiving simply shadows its archived
+copy until the next archiver run folds it back in.
+    
+    python allocation_archive.py --days 90
+"""
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+
+from allocation_catalog import parse_filename, summarize_allocation
+from allocation_format import encode, load_file, loads
+from persistence_worker import persistence_worker, file_key
+from utils.file_lock import FileLock
+
+# Shifts older than this are packed by default
+ARCHIVE_AFTER_DAYS = 90
+
+# Size of the trailer line that points at the index
+TRAILER_SIZE = 40
+
+
+class AllocationArchive:
+    """Reads and writes the monthly packs of one allocations folder"""
+    
+    def __init__(self, directory=None):
+        if directory is None:
+            base_path = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
+            directory = os.path.join(base_path, "allocations_json")
+        self.directory = directory
+        self.archive_dir = os.path.join(directory, "archive")
+        
+        self.lock = threading.Lock()
+        self.indexes = {}  # month -> (mtime, size, index)
+    
+    def pack_path(self, month):
+        """Path of a month's pack (YYYY-MM)"""
+        return os.path.join(self.archive_dir, f"{month}.jsonl")
+    
+    def month_of(self, filename):
+        """Month (YYYY-MM) an allocation file belongs to, or None"""
+        parsed = parse_filename(filename)
+        return parsed[0][:7] if parsed else None
+    
+    def months(self):
+        """Months that have a pack, sorted"""
+        if not os.path.isdir(self.archive_dir):
+            return []
+        return sorted(name[:-len(".jsonl")] for name in os.listdir(self.archive_dir) if name.endswith(".jsonl"))
+    
+    # ------------------------------------------------------------------ #
+    # Reading
+    # ------------------------------------------------------------------ #
+    
+    def read_index(self, month):
+        """Index {filename: [offset, length, row]} of a pack (empty if there is none)"""
+        path = self.pack_path(month)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return {}
+        
+        with self.lock:
+            cached = self.indexes.get(month)
+            if cached is not None and cached[0] == stat.st_mtime and cached[1] == stat.st_size:
+                return cached[2]
+        
+        try:
+            with open(path, 'rb') as f:
+                f.seek(-TRAILER_SIZE, os.SEEK_END)
+                index_offset = json.loads(f.read(TRAILER_SIZE))['index_offset']
+                f.seek(index_offset)
+                index = json.loads(f.read(stat.st_size - TRAILER_SIZE - index_offset))
+        except Exception as e:
+            print(f"Error reading allocation archive {path}: {e}")
+            return {}
+        
+        with self.lock:
+            self.indexes[month] = (stat.st_mtime, stat.st_size, index)
+        return index
+    
+    def read_text(self, filename):
+        """Contents of an archived allocation file (None if it is not archived)"""
+        month = self.month_of(filename)
+        record = self.read_index(month).get(filename) if month else None
+        if record is None:
+            return None
+        
+        offset, length = record[0], record[1]
+        with open(self.pack_path(month), 'rb') as f:
+            f.seek(offset)
+            return f.read(length).decode('utf-8')
+    
+    def contains(self, filename):
+        """Whether an allocation file is in an archive pack"""
+        month = self.month_of(filename)
+        return month is not None and filename in self.read_index(month)
+    
+    def exists(self, filepath):
+        """Whether an allocation exists, loose or archived"""
+        return os.path.exists(filepath) or self.contains(os.path.basename(filepath))
+    
+    def version(self, filepath):
+        """
+        (mtime, size) identifying the current contents of an allocation, for caches
+        
+        Raises:
+            FileNotFoundError if the shift is neither loose nor archived
+        """
+        try:
+            stat = os.stat(filepath)
+            return stat.st_mtime, stat.st_size
+        except FileNotFoundError:
+            filename = os.path.basename(filepath)
+            if not self.contains(filename):
+                raise
+            stat = os.stat(self.pack_path(self.month_of(filename)))
+            return stat.st_mtime, stat.st_size
+    
+    def load(self, filepath):
+        """Parsed allocation (v1 layout), from the loose file or its archive pack"""
+        if os.path.exists(filepath):
+            return load_file(filepath)
+        
+        text = self.read_text(os.path.basename(filepath))
+        if text is None:
+            raise FileNotFoundError(filepath)
+        return loads(text)
+    
+    def list_archived(self):
+        """Catalog rows of every archived shift as {filename: row}"""
+        rows = {}
+        for month in self.months():
+            for filename, record in self.read_index(month).items():
+                rows[filename] = record[2]
+        return rows
+    
+    # ------------------------------------------------------------------ #
+    # Writing
+    # ------------------------------------------------------------------ #
+    
+    def write_pack(self, month, texts):
+        """Write a month's pack from {filename: v2 text}, replacing the old one"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = self.pack_path(month)
+        temp_file = path + ".tmp"
+        
+        index = {}
+        with open(temp_file, 'wb') as f:
+            for filename in sorted(texts):
+                data = texts[filename].encode('utf-8')
+                allocation_data = loads(texts[filename])
+                date, shift = parse_filename(filename)
+                row = {'date': date, 'shift': shift}
+                row.update(summarize_allocation(allocation_data))
+                
+                index[filename] = [f.tell(), len(data), row]
+                f.write(data + b"\n")
+            
+            index_offset = f.tell()
+            f.write(json.dumps(index, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b"\n")
+            f.write(json.dumps({'index_offset': index_offset}).ljust(TRAILER_SIZE - 1).encode('ascii') + b"\n")
+        
+        os.replace(temp_file, path)
+        with self.lock:
+            self.indexes.pop(month, None)
+    
+    def archive(self, days=ARCHIVE_AFTER_DAYS):
+        """
+        Pack loose shifts older than `days` into their month's pack and delete them
+        
+        Returns:
+            Number of shifts archived
+        """
+        cutoff = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        
+        by_month = {}
+        for filename in sorted(os.listdir(self.directory)) if os.path.isdir(self.directory) else []:
+            parsed = parse_filename(filename)
+            if parsed is not None and parsed[0] < cutoff:
+                by_month.setdefault(parsed[0][:7], []).append(filename)
+        
+        archived = 0
+        for month, filenames in sorted(by_month.items()):
+            texts = {}
+            month_index = self.read_index(month)
+            for filename in month_index:
+                texts[filename] = self.read_text(filename)
+            
+            # Each packed file stays locked until it is deleted, so a save
+            # cannot land between reading it and removing it
+            with contextlib.ExitStack() as locks:
+                packed = []
+                for filename in filenames:
+                    filepath = os.path.join(self.directory, filename)
+                    # Do not pack a version that is still being written
+                    persistence_worker.wait_for(file_key(filepath))
+                    try:
+                        locks.enter_context(FileLock(filepath))
+                        # Loose files are newer than their archived copies
+                        texts[filename] = encode(load_file(filepath))
+                        packed.append(filepath)
+                    except Exception as e:
+                        print(f"Skipping {filename}: {e}")
+                
+                if not packed:
+                    continue
+                self.write_pack(month, texts)
+                
+                for filepath in packed:
+                    os.remove(filepath)
+            archived += len(packed)
+            print(f"Archived {len(packed)} shifts into {self.pack_path(month)}")
+        
+        if archived:
+            from allocation_catalog import allocation_catalog
+            allocation_catalog.rescan()
+        return archived
+
+
+def main(argv=None):
+    """Command line: archive old shifts"""
+    parser = argparse.ArgumentParser(description="Pack old allocation files into monthly archives")
+    parser.add_argument('--days', type=int, default=ARCHIVE_AFTER_DAYS,
+                        help=f"archive shifts older than this many days (default {ARCHIVE_AFTER_DAYS})")
+    args = parser.parse_args(argv)
+    
+    archived = allocation_archive.archive(args.days)
+    print(f"Archived {archived} shifts")
+
+
+# Global instance
+allocation_archive = AllocationArchive()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,437 @@
+"""
+Catalog of saved shift allocations (one row per allocations_json file)
+
+Answering "is there an allocation for this shift?" used to mean one file
+existence check per guess, so stepping to the previous shift across a gap
+took several clicks and messages. The catalog keeps a small row per file:
+    
+    {'date': 'YYYY-MM-DD', 'shift': 'Morning', 'group': 'Group A',
+     'tasks': 12, 'workers': 48, 'unassigned': 3, 'mtime': ..., 'size': ...}
+
+It is built by a parallel scan on first use, persisted to
+allocation_catalog.json, refreshed from file mtimes on load and updated
+in place by save_allocation_json. Shift keys are kept sorted, so the
+previous/next existing shift and the rows of a date range are a bisect away.
+
+The scan runs without the lock, and screens start it on a background thread
+(load_in_background) instead of waiting for it on the Tk thread.
+"""
+import bisect
+import contextlib
+import json
+import os
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from allocation_format import load_file
+from persistence_worker import persistence_worker
+from utils.file_lock import FileLock, atomic_write
+
+CATALOG_VERSION = 1
+
+# Order of shifts within a day
+SHIFT_ORDER = {
+    'Morning': 0,
+    'Evening': 1
+}
+
+FILENAME_PATTERN = re.compile(r"^Allocation_(\d{4}-\d{2}-\d{2})_([A-Za-z]+)\.json$")
+
+# Threads used to read allocation files when (re)building rows
+SCAN_WORKERS = 8
+
+
+def parse_filename(filename):
+    """Get (date, shift) from an allocation file name, or None if it is not one"""
+    match = FILENAME_PATTERN.match(filename)
+    if not match or match.group(2) not in SHIFT_ORDER:
+        return None
+    return match.group(1), match.group(2)
+
+
+def catalog_filename(date, shift):
+    """Allocation file name of a shift"""
+    return f"Allocation_{date}_{shift}.json"
+
+
+def shift_key(date, shift):
+    """Sort key of a shift (dates sort as strings, Morning before Evening)"""
+    return (date, SHIFT_ORDER.get(shift, len(SHIFT_ORDER)), shift)
+
+
+def summarize_allocation(allocation_data):
+    """Catalog counts of allocation JSON data (as written by save_allocation_json)"""
+    tasks = allocation_data.get('processes', []) + allocation_data.get('machines', [])
+    return {
+        'group': allocation_data.get('metadata', {}).get('shift_group'),
+        'tasks': len(tasks),
+        'workers': sum(len(task.get('workers', [])) for task in tasks),
+        'unassigned': len(allocation_data.get('unassigned_workers', []))
+    }
+
+
+class AllocationCatalog:
+    """Sorted index of the shifts that have a saved allocation"""
+    
+    def __init__(self, base_path=None):
+        self.base_path = base_path or self.get_base_path()
+        self.directory = os.path.join(self.base_path, "allocations_json")
+        self.catalog_file = os.path.join(self.base_path, "allocation_catalog.json")
+        
+        # Held while rows change or are serialized (saves run on the persistence worker)
+        self.lock = threading.RLock()
+        
+        # Loaded on first use
+        self.rows = None  # filename -> row
+        self.keys = []  # sorted shift_key() of every row
+        self.dates_by_shift = {}  # shift -> sorted dates
+        self.generation = 0  # bumped whenever rows change, for indexes built on the catalog
+        self.loading = None  # Event set when a running scan finishes
+        self.scan_generation = 0  # bumped by rescan(), so a scan started before it is redone
+        self.loader = None  # background thread started by load_in_background
+    
+    def get_base_path(self):
+        """Get folder that holds allocations_json"""
+        if getattr(sys, 'frozen', False):
+            return os.path.dirname(sys.executable)
+        return os.path.dirname(os.path.abspath(__file__))
+    
+    # ------------------------------------------------------------------ #
+    # Loading and scanning
+    # ------------------------------------------------------------------ #
+    
+    @property
+    def loaded(self):
+        """Whether the rows are loaded (queries will not scan)"""
+        return self.rows is not None
+    
+    def load_in_background(self):
+        """Start loading the catalog on a background thread, unless it is loaded or loading"""
+        with self.lock:
+            if self.rows is not None or self.loading is not None:
+                return
+            if self.loader is not None and self.loader.is_alive():
+                return
+            self.loader = threading.Thread(target=self.ensure, name="catalog-scan", daemon=True)
+            self.loader.start()
+    
+    def ensure(self):
+        """
+        Load the catalog, rescanning files added or changed since it was saved
+        
+        Call without holding the lock: the scan runs unlocked, and other
+        threads that need the catalog meanwhile wait for it.
+        """
+        while True:
+            with self.lock:
+                if self.rows is not None:
+                    return
+                loading = self.loading
+                if loading is None:
+                    loading = self.loading = threading.Event()
+                    generation = self.scan_generation
+                    scanning = True
+                else:
+                    scanning = False
+            
+            if not scanning:
+                loading.wait()
+                continue
+            
+            changed = False
+            try:
+                rows, changed = self.scan()
+                with self.lock:
+                    # A rescan() during the scan means it may have missed changes: scan again
+                    if generation == self.scan_generation:
+                        self.rows = rows
+                        self.rebuild_keys()
+            finally:
+                with self.lock:
+                    self.loading = None
+                loading.set()
+            
+            if changed and self.rows is not None:
+                self.save_catalog()
+    
+    @contextlib.contextmanager
+    def loaded_rows(self):
+        """Hold the lock with the rows loaded"""
+        while True:
+            self.ensure()
+            with self.lock:
+                if self.rows is not None:
+                    yield self.rows
+                    return
+    
+    def scan(self):
+        """
+        Build the rows from the persisted catalog and the files changed since
+        
+        Returns:
+            Tuple of (rows by filename, True if they differ from the persisted catalog)
+        """
+        stored = self.load_catalog()
+        rows = {}
+        stale = []
+        
+        try:
+            entries = list(os.scandir(self.directory)) if os.path.isdir(self.directory) else []
+        except Exception as e:
+            print(f"Error listing allocations: {e}")
+            entries = []
+        
+        for entry in entries:
+            if parse_filename(entry.name) is None:
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            row = stored.get(entry.name)
+            if row is not None and row.get('mtime') == stat.st_mtime and row.get('size') == stat.st_size:
+                rows[entry.name] = row
+            else:
+                stale.append(entry.name)
+        
+        if stale:
+            # Reading many small files on a network drive is latency bound
+            with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+                for filename, row in zip(stale, executor.map(self.read_row, stale)):
+                    if row is not None:
+                        rows[filename] = row
+        
+        # Shifts packed into monthly archives (a loose file takes precedence)
+        from allocation_archive import allocation_archive
+        for filename, row in allocation_archive.list_archived().items():
+            if filename not in rows:
+                rows[filename] = dict(row, mtime=0, size=0, archived=True)
+        
+        return rows, bool(stale) or len(rows) != len(stored)
+    
+    def load_catalog(self):
+        """Read the persisted rows (empty if missing, unreadable or from another version)"""
+        if not os.path.exists(self.catalog_file):
+            return {}
+        try:
+            with open(self.catalog_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error loading allocation catalog: {e}")
+            return {}
+        
+        if data.get('version') != CATALOG_VERSION:
+            return {}
+        return data.get('rows', {})
+    
+    def read_row(self, filename):
+        """Build the row of one allocation file (None if it cannot be read)"""
+        date, shift = parse_filename(filename)
+        filepath = os.path.join(self.directory, filename)
+        try:
+            stat = os.stat(filepath)
+            allocation_data = load_file(filepath)
+        except Exception as e:
+            print(f"Error reading allocation {filename} for catalog: {e}")
+            return None
+        
+        # Date and shift come from the file name, like the history viewer
+        row = {'date': date, 'shift': shift}
+        row.update(summarize_allocation(allocation_data))
+        row['mtime'] = stat.st_mtime
+        row['size'] = stat.st_size
+        return row
+    
+    def rebuild_keys(self):
+        """Re-sort the shift keys after rows were added or removed"""
+        self.generation += 1
+        self.keys = sorted(shift_key(row['date'], row['shift']) for row in self.rows.values())
+        self.dates_by_shift = {}
+        for date, _, shift in self.keys:
+            self.dates_by_shift.setdefault(shift, []).append(date)
+    
+    def rescan(self):
+        """Forget the loaded rows and rebuild them from the folder on next use"""
+        with self.lock:
+            self.scan_generation += 1
+            self.rows = None
+            self.keys = []
+            self.dates_by_shift = {}
+    
+    # ------------------------------------------------------------------ #
+    # Updates
+    # ------------------------------------------------------------------ #
+    
+    def update(self, filepath, allocation_data):
+        """
+        Record an allocation that is being saved
+        
+        Args:
+            filepath: Allocation file path (its name gives date and shift)
+            allocation_data: Data written to the file
+        """
+        filename = os.path.basename(filepath)
+        parsed = parse_filename(filename)
+        if parsed is None:
+            return
+        
+        with self.loaded_rows():
+            row = {'date': parsed[0], 'shift': parsed[1]}
+            row.update(summarize_allocation(allocation_data))
+            # The file may still be queued; mtime and size are filled in when the catalog is written
+            row['mtime'] = None
+            row['size'] = None
+            
+            is_new = filename not in self.rows
+            self.rows[filename] = row
+            self.generation += 1
+            if is_new:
+                key = shift_key(*parsed)
+                bisect.insort(self.keys, key)
+                bisect.insort(self.dates_by_shift.setdefault(parsed[1], []), parsed[0])
+        
+        self.save_catalog()
+    
+    def remove(self, filepath):
+        """Drop the row of a deleted allocation file"""
+        filename = os.path.basename(filepath)
+        parsed = parse_filename(filename)
+        with self.loaded_rows():
+            if self.rows.pop(filename, None) is None:
+                return
+            self.generation += 1
+            if parsed is not None:
+                key = shift_key(*parsed)
+                i = bisect.bisect_left(self.keys, key)
+                if i < len(self.keys) and self.keys[i] == key:
+                    del self.keys[i]
+                dates = self.dates_by_shift.get(parsed[1], [])
+                i = bisect.bisect_left(dates, parsed[0])
+                if i < len(dates) and dates[i] == parsed[0]:
+                    del dates[i]
+        self.save_catalog()
+    
+    def save_catalog(self):
+        """Queue writing the catalog; queued behind any allocation file writes"""
+        persistence_worker.submit(self.write_catalog, key='allocation_catalog', coalesce=True)
+    
+    def write_catalog(self, items=None):
+        """Write the catalog to its JSON file (runs on the persistence worker)"""
+        with self.lock:
+            if self.rows is None:
+                return
+            for filename, row in self.rows.items():
+                if row['mtime'] is None:
+                    try:
+                        stat = os.stat(os.path.join(self.directory, filename))
+                    except OSError:
+                        continue
+                    row['mtime'] = stat.st_mtime
+                    row['size'] = stat.st_size
+            text = json.dumps({'version': CATALOG_VERSION, 'rows': self.rows}, ensure_ascii=False)
+        
+        # Stations sharing the data folder write it too
+        with FileLock(self.catalog_file):
+            atomic_write(self.catalog_file, text)
+    
+    # ------------------------------------------------------------------ #
+    # Queries
+    # ------------------------------------------------------------------ #
+    
+    def get_row(self, date, shift):
+        """Catalog row of a shift, or None if it has no saved allocation"""
+        with self.loaded_rows():
+            return self.rows.get(catalog_filename(date, shift))
+    
+    def exists(self, date, shift):
+        """Whether a shift has a saved allocation"""
+        return self.get_row(date, shift) is not None
+    
+    def previous_shift(self, date, shift):
+        """(date, shift) of the nearest saved shift before the given one, or None"""
+        with self.loaded_rows():
+            i = bisect.bisect_left(self.keys, shift_key(date, shift))
+            if i == 0:
+                return None
+            return self.keys[i - 1][0], self.keys[i - 1][2]
+    
+    def next_shift(self, date, shift):
+        """(date, shift) of the nearest saved shift after the given one, or None"""
+        with self.loaded_rows():
+            i = bisect.bisect_right(self.keys, shift_key(date, shift))
+            if i == len(self.keys):
+                return None
+            return self.keys[i][0], self.keys[i][2]
+    
+    def previous_date(self, date, shift):
+        """Nearest earlier date with a saved allocation for the same shift, or None"""
+        with self.loaded_rows():
+            dates = self.dates_by_shift.get(shift, [])
+            i = bisect.bisect_left(dates, date)
+            return dates[i - 1] if i > 0 else None
+    
+    def next_date(self, date, shift):
+        """Nearest later date with a saved allocation for the same shift, or None"""
+        with self.loaded_rows():
+            dates = self.dates_by_shift.get(shift, [])
+            i = bisect.bisect_right(dates, date)
+            return dates[i] if i < len(dates) else None
+    
+    def get_neighbours(self, date, shift, count=2):
+        """
+        Up to `count` saved shifts on each side of a shift, nearest first
+        
+        Returns:
+            List of (date, shift), alternating earlier and later
+        """
+        with self.loaded_rows():
+            lo = bisect.bisect_left(self.keys, shift_key(date, shift))
+            hi = bisect.bisect_right(self.keys, shift_key(date, shift))
+            earlier = self.keys[max(0, lo - count):lo][::-1]
+            later = self.keys[hi:hi + count]
+        
+        neighbours = []
+        for i in range(count):
+            for keys in (earlier, later):
+                if i < len(keys):
+                    neighbours.append((keys[i][0], keys[i][2]))
+        return neighbours
+    
+    def get_path(self, date, shift):
+        """Path of a shift's allocation file (whether or not it exists)"""
+        return os.path.join(self.directory, catalog_filename(date, shift))
+    
+    def get_shifts_in_range(self, start_date, end_date):
+        """
+        Saved shifts between two dates (inclusive), for date pickers
+        
+        Returns:
+            Dictionary {date: [shifts in day order]}
+        """
+        with self.loaded_rows():
+            lo = bisect.bisect_left(self.keys, (start_date,))
+            hi = bisect.bisect_right(self.keys, (end_date, len(SHIFT_ORDER) + 1))
+            
+            shifts = {}
+            for date, _, shift in self.keys[lo:hi]:
+                shifts.setdefault(date, []).append(shift)
+            return shifts
+    
+    def get_shifts_in_month(self, year, month):
+        """Saved shifts of one month as {date: [shifts]}"""
+        prefix = f"{year:04d}-{month:02d}"
+        return self.get_shifts_in_range(f"{prefix}-01", f"{prefix}-31")
+    
+    def get_rows(self, start_date=None, end_date=None):
+        """Catalog rows in shift order, optionally limited to a date range"""
+        with self.loaded_rows():
+            # The keys are kept sorted, so the range is two bisects
+            lo = 0 if start_date is None else bisect.bisect_left(self.keys, (start_date,))
+            hi = len(self.keys) if end_date is None else bisect.bisect_right(self.keys, (end_date, len(SHIFT_ORDER) + 1))
+            return [self.rows[catalog_filename(date, shift)] for date, _, shift in self.keys[lo:hi]]
+
+
+# Global instance
+allocation_catalog = AllocationCatalog()
@@ -0,0 +1,311 @@
+"""
+Structured before/after deltas between versions of a shift allocation
+
+Every save of an allocation JSON logs the delta against the previous version
+of the file to the audit trail, plus a full snapshot every SNAPSHOT_INTERVAL
+saves. Any historical version of a shift can then be rebuilt by replaying
+deltas from the nearest snapshot at or before the requested time.
+
+A snapshot is the comparable part of an allocation file:
+    
+    {
+        'shift_group': 'Group A',
+        'tasks': {name: {'kind': 'process'|'machine', 'product': ..., 'lot_number': ..., 'workers': [...]}},
+        'unassigned': [...]
+    }
+"""
+import copy
+from datetime import datetime
+
+from allocation_archive import allocation_archive
+
+# Full snapshot stored with every Nth logged version of a shift
+SNAPSHOT_INTERVAL = 20
+
+
+def empty_snapshot():
+    """Snapshot of a shift before its first save"""
+    return {'shift_group': None, 'tasks': {}, 'unassigned': []}
+
+
+def snapshot_from_allocation(allocation_data):
+    """Build a snapshot from allocation JSON data (as written by save_allocation_json)"""
+    snapshot = empty_snapshot()
+    snapshot['shift_group'] = allocation_data.get('metadata', {}).get('shift_group')
+    
+    for kind, key in (('process', 'processes'), ('machine', 'machines')):
+        for task in allocation_data.get(key, []):
+            snapshot['tasks'][task['name']] = {
+                'kind': kind,
+                'product': task.get('product', "N/A"),
+                'lot_number': task.get('lot_number', "N/A"),
+                'workers': [w['name'] for w in task.get('workers', [])]
+            }
+    
+    snapshot['unassigned'] = [w['name'] for w in allocation_data.get('unassigned_workers', [])]
+    return snapshot
+
+
+def load_snapshot(filepath):
+    """Snapshot of an allocation file on disk or archived (None if it does not exist or cannot be read)"""
+    if not allocation_archive.exists(filepath):
+        return None
+    try:
+        return snapshot_from_allocation(allocation_archive.load(filepath))
+    except Exception as e:
+        print(f"Error reading allocation for diff: {e}")
+        return None
+
+
+def diff_allocations(before, after):
+    """
+    Compute the delta turning snapshot `before` into snapshot `after`
+    
+    Returns:
+        Dictionary with only the parts that changed:
+            tasks_added: {name: task}
+            tasks_removed: [names]
+            tasks_changed: {name: {'workers_added', 'workers_removed', 'product': [old, new], 'lot_number': [old, new]}}
+            unassigned_added / unassigned_removed: [workers]
+            shift_group: [old, new]
+    """
+    delta = {}
+    before_tasks = before['tasks']
+    after_tasks = after['tasks']
+    
+    added = {name: task for name, task in after_tasks.items() if name not in before_tasks}
+    removed = [name for name in before_tasks if name not in after_tasks]
+    if added:
+        delta['tasks_added'] = copy.deepcopy(added)
+    if removed:
+        delta['tasks_removed'] = removed
+    
+    changed = {}
+    for name, new_task in after_tasks.items():
+        old_task = before_tasks.get(name)
+        if old_task is None:
+            continue
+        
+        change = {}
+        old_workers = set(old_task['workers'])
+        new_workers = set(new_task['workers'])
+        workers_added = [w for w in new_task['workers'] if w not in old_workers]
+        workers_removed = [w for w in old_task['workers'] if w not in new_workers]
+        if workers_added:
+            change['workers_added'] = workers_added
+        if workers_removed:
+            change['workers_removed'] = workers_removed
+        
+        for field in ('product', 'lot_number', 'kind'):
+            if old_task.get(field) != new_task.get(field):
+                change[field] = [old_task.get(field), new_task.get(field)]
+        
+        if change:
+            changed[name] = change
+    if changed:
+        delta['tasks_changed'] = changed
+    
+    old_unassigned = set(before['unassigned'])
+    new_unassigned = set(after['unassigned'])
+    unassigned_added = [w for w in after['unassigned'] if w not in old_unassigned]
+    unassigned_removed = [w for w in before['unassigned'] if w not in new_unassigned]
+    if unassigned_added:
+        delta['unassigned_added'] = unassigned_added
+    if unassigned_removed:
+        delta['unassigned_removed'] = unassigned_removed
+    
+    if before.get('shift_group') != after.get('shift_group'):
+        delta['shift_group'] = [before.get('shift_group'), after.get('shift_group')]
+    
+    return delta
+
+
+def apply_delta(snapshot, delta):
+    """Apply a delta to a snapshot, returning the new snapshot (the input is not modified)"""
+    result = copy.deepcopy(snapshot)
+    tasks = result['tasks']
+    
+    for name in delta.get('tasks_removed', []):
+        tasks.pop(name, None)
+    for name, task in delta.get('tasks_added', {}).items():
+        tasks[name] = copy.deepcopy(task)
+    
+    for name, change in delta.get('tasks_changed', {}).items():
+        task = tasks.setdefault(name, {'kind': None, 'product': "N/A", 'lot_number': "N/A", 'workers': []})
+        removed = set(change.get('workers_removed', []))
+        task['workers'] = [w for w in task['workers'] if w not in removed]
+        task['workers'].extend(change.get('workers_added', []))
+        for field in ('product', 'lot_number', 'kind'):
+            if field in change:
+                task[field] = change[field][1]
+    
+    removed = set(delta.get('unassigned_removed', []))
+    result['unassigned'] = [w for w in result['unassigned'] if w not in removed]
+    result['unassigned'].extend(delta.get('unassigned_added', []))
+    
+    if 'shift_group' in delta:
+        result['shift_group'] = delta['shift_group'][1]
+    
+    return result
+
+
+def merge_allocations(base, ours, theirs):
+    """
+    Three-way merge of allocation data saved concurrently by two stations
+    
+    Our changes since `base` (the version we started from, None for a new
+    shift) are replayed onto `theirs` (the version now on disk); where both
+    changed the same task, ours wins per field and worker lists are merged.
+    
+    Returns:
+        Allocation data in the v1 layout, with our metadata and their revision
+    """
+    from allocation_format import to_v1, worker_flags
+    
+    delta = diff_allocations(
+        snapshot_from_allocation(base) if base is not None else empty_snapshot(),
+        snapshot_from_allocation(ours)
+    )
+    merged = apply_delta(snapshot_from_allocation(theirs), delta)
+    
+    flags = {}
+    for data in (theirs, ours):
+        for task in data.get('processes', []) + data.get('machines', []):
+            for worker_data in task.get('workers', []):
+                flags[worker_data['name']] = worker_flags(worker_data)
+        for worker_data in data.get('unassigned_workers', []):
+            flags[worker_data['name']] = worker_flags(worker_data)
+    
+    metadata = dict(ours.get('metadata', {}))
+    metadata['revision'] = theirs.get('metadata', {}).get('revision', 0)
+    compact = {'metadata': metadata, 'processes': [], 'machines': [], 'unassigned': [], 'flags': {}}
+    
+    assigned = set()
+    for name, task in merged['tasks'].items():
+        item = {'name': name, 'workers': task['workers']}
+        if task.get('product') not in (None, "N/A"):
+            item['product'] = task['product']
+        if task.get('lot_number') not in (None, "N/A"):
+            item['lot'] = task['lot_number']
+        compact['machines' if task.get('kind') == 'machine' else 'processes'].append(item)
+        assigned.update(task['workers'])
+    
+    # A worker both stations placed stays placed
+    compact['unassigned'] = [w for w in merged['unassigned'] if w not in assigned]
+    compact['flags'] = {name: value for name, value in flags.items() if value}
+    return to_v1(compact)
+
+
+def summarize_delta(delta):
+    """One-line human readable summary of a delta"""
+    parts = []
+    
+    for name in delta.get('tasks_added', {}):
+        parts.append(f"+{name}")
+    for name in delta.get('tasks_removed', []):
+        parts.append(f"-{name}")
+    
+    for name, change in delta.get('tasks_changed', {}).items():
+        items = [f"+{w}" for w in change.get('workers_added', [])]
+        items += [f"-{w}" for w in change.get('workers_removed', [])]
+        for field in ('product', 'lot_number'):
+            if field in change:
+                items.append(f"{field.replace('_', ' ')} {change[field][0]} → {change[field][1]}")
+        parts.append(f"{name}: {', '.join(items)}")
+    
+    if 'shift_group' in delta:
+        parts.append(f"group {delta['shift_group'][0]} → {delta['shift_group'][1]}")
+    
+    return "; ".join(parts) if parts else "No changes"
+
+
+def build_audit_details(before, after, history):
+    """
+    Audit payload for a save: the delta, plus a snapshot when one is due
+    
+    Args:
+        before: Snapshot of the previous version (None for a new shift)
+        after: Snapshot of the version being saved
+        history: Earlier audit entries of the shift, oldest first
+    """
+    delta = diff_allocations(before or empty_snapshot(), after)
+    
+    details = {
+        'summary': summarize_delta(delta),
+        'tasks': len(after['tasks']),
+        'unassigned_workers': len(after['unassigned']),
+        'group': after.get('shift_group'),
+        'delta': delta
+    }
+    
+    versions = delta_entries(history)
+    since_snapshot = 0
+    for entry in reversed(versions):
+        if 'snapshot' in entry['details']:
+            break
+        since_snapshot += 1
+    
+    # Also snapshot when the file no longer matches the logged chain (e.g. edited by hand)
+    if before is None or since_snapshot + 1 >= SNAPSHOT_INTERVAL or not same_allocation(replay(versions), before):
+        details['snapshot'] = after
+    
+    return details
+
+
+def same_allocation(a, b):
+    """Compare two snapshots, ignoring worker order (deltas do not record it)"""
+    if a is None or b is None:
+        return a is b
+    return diff_allocations(a, b) == {}
+
+
+def delta_entries(entries):
+    """Audit entries that carry an allocation delta"""
+    return [entry for entry in entries if 'delta' in (entry.get('details') or {})]
+
+
+def replay(versions):
+    """
+    Replay delta entries (oldest first) from the newest snapshot among them
+    
+    Returns:
+        Snapshot after the last version, or None if there is no snapshot
+    """
+    for start in range(len(versions) - 1, -1, -1):
+        if 'snapshot' in versions[start]['details']:
+            snapshot = copy.deepcopy(versions[start]['details']['snapshot'])
+            for entry in versions[start + 1:]:
+                snapshot = apply_delta(snapshot, entry['details']['delta'])
+            return snapshot
+    return None
+
+
+def reconstruct_shift(audit_trail, allocation_date, shift_time, at=None):
+    """
+    Rebuild a shift as it was at a point in time
+    
+    Args:
+        audit_trail: AuditTrail to read versions from
+        allocation_date: Shift date (YYYY-MM-DD)
+        shift_time: Morning/Evening
+        at: 'YYYY-MM-DD HH:MM:SS' string or datetime (default: latest version)
+    
+    Returns:
+        Snapshot dictionary, or None if no version existed at that time
+    """
+    if isinstance(at, datetime):
+        at = at.strftime("%Y-%m-%d %H:%M:%S")
+    
+    versions = [
+        entry for entry in delta_entries(audit_trail.get_allocation_audit_log(allocation_date, shift_time))
+        if at is None or entry['timestamp'] <= at
+    ]
+    return replay(versions)
+
+
+def get_shift_versions(audit_trail, allocation_date, shift_time):
+    """List saved versions of a shift as [(timestamp, change_type, summary), ...] oldest first"""
+    return [
+        (entry['timestamp'], entry['change_type'], entry['details'].get('summary', ""))
+        for entry in delta_entries(audit_trail.get_allocation_audit_log(allocation_date, shift_time))
+    ]
@@ -0,0 +1,305 @@
+"""
+Allocation file format (v1 and the compact v2) with a reader for both
+
+v1 (written until now) is indented JSON in which every worker repeats its
+display name and flags, every task stores worker_count next to its list and
+"N/A" stands in for a missing product or lot number. v2 keeps only what
+cannot be derived:
+
+    {
+        "version": 2,
+        "metadata": {"date": ..., "shift_time": ..., "shift_group": ..., "exported_at": ...},
+        "processes": [{"name": ..., "product": ..., "lot": ..., "workers": [names]}],
+        "machines": [...],
+        "unassigned": [names],
+        "flags": {name: FLAG_OVERTIME | FLAG_TEMP}
+    }
+
+product and lot are left out when not set, and the file is written without
+indentation. Both versions carry metadata.revision, a save counter used to
+detect that another station saved the shift in the meantime (see
+check_revision; files without one are revision 0).
+
+Everything in the app works on the v1 layout in memory: readers call
+loads()/load_file(), which expand v2 files, so the format on disk only
+matters to encode().
+
+    python allocation_format.py compare            # size and load time of v1 vs v2
+    python allocation_format.py convert --to 2     # rewrite allocations_json in place
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+FORMAT_VERSION = 2
+
+# Worker flags in v2 "flags"
+FLAG_OVERTIME = 1
+FLAG_TEMP = 2
+
+# v1 placeholder for a missing product or lot number
+NOT_SET = "N/A"
+
+
+def display_name(worker, flags):
+    """Display name of a worker as shown in the app (see ApplicationState.get_worker_display_name)"""
+    if flags & FLAG_OVERTIME:
+        return f"{worker} (OT)"
+    if flags & FLAG_TEMP:
+        return f"{worker} (Temp)"
+    return worker
+
+
+def worker_flags(worker_data):
+    """v2 flag bits of a v1 worker dictionary"""
+    flags = 0
+    if worker_data.get('is_overtime'):
+        flags |= FLAG_OVERTIME
+    if worker_data.get('is_temp'):
+        flags |= FLAG_TEMP
+    return flags
+
+
+def to_v2(allocation_data):
+    """Convert allocation data in the v1 layout to v2"""
+    compact = {
+        'version': 2,
+        'metadata': dict(allocation_data.get('metadata', {})),
+        'processes': [],
+        'machines': [],
+        'unassigned': [],
+        'flags': {}
+    }
+
+    def add_workers(workers):
+        names = []
+        for worker_data in workers:
+            names.append(worker_data['name'])
+            flags = worker_flags(worker_data)
+            if flags:
+                compact['flags'][worker_data['name']] = flags
+        return names
+
+    for key in ('processes', 'machines'):
+        for task in allocation_data.get(key, []):
+            item = {'name': task['name']}
+            if task.get('product') not in (None, NOT_SET):
+                item['product'] = task['product']
+            if task.get('lot_number') not in (None, NOT_SET):
+                item['lot'] = task['lot_number']
+            item['workers'] = add_workers(task.get('workers', []))
+            compact[key].append(item)
+
+    compact['unassigned'] = add_workers(allocation_data.get('unassigned_workers', []))
+    return compact
+
+
+def to_v1(compact):
+    """Expand v2 allocation data to the v1 layout used in memory"""
+    flags = compact.get('flags', {})
+
+    def expand_workers(names):
+        return [
+            {
+                'name': name,
+                'display_name': display_name(name, flags.get(name, 0)),
+                'is_overtime': bool(flags.get(name, 0) & FLAG_OVERTIME),
+                'is_temp': bool(flags.get(name, 0) & FLAG_TEMP)
+            }
+            for name in names
+        ]
+
+    allocation_data = {
+        'metadata': dict(compact.get('metadata', {})),
+        'processes': [],
+        'machines': [],
+        'unassigned_workers': expand_workers(compact.get('unassigned', []))
+    }
+
+    for key in ('processes', 'machines'):
+        for item in compact.get(key, []):
+            workers = expand_workers(item.get('workers', []))
+            allocation_data[key].append({
+                'name': item['name'],
+                'product': item.get('product', NOT_SET),
+                'lot_number': item.get('lot', NOT_SET),
+                'workers': workers,
+                'worker_count': len(workers)
+            })
+
+    return allocation_data
+
+
+def get_version(data):
+    """Format version of parsed allocation data (files without a version are v1)"""
+    return data.get('version', 1)
+
+
+def normalize(data):
+    """Parsed allocation data of any version in the v1 layout"""
+    version = get_version(data)
+    if version == 1:
+        return data
+    if version == 2:
+        return to_v1(data)
+    raise ValueError(f"Unsupported allocation format version: {version}")
+
+
+def loads(text):
+    """Parse allocation file contents of any version (v1 layout)"""
+    return normalize(json.loads(text))
+
+
+def load_file(filepath):
+    """Read an allocation file of any version (v1 layout)"""
+    with open(filepath, 'r', encoding='utf-8') as f:
+        return normalize(json.load(f))
+
+
+def encode(allocation_data, version=FORMAT_VERSION):
+    """File contents for allocation data in the v1 layout"""
+    if version == 1:
+        return json.dumps(allocation_data, indent=4, ensure_ascii=False)
+    if version == 2:
+        return json.dumps(to_v2(allocation_data), ensure_ascii=False, separators=(',', ':'))
+    raise ValueError(f"Unsupported allocation format version: {version}")
+
+
+def get_revision(allocation_data):
+    """Save counter of allocation data (0 for files written before revisions)"""
+    if allocation_data is None:
+        return None
+    return allocation_data.get('metadata', {}).get('revision', 0)
+
+
+def check_revision(filepath, text):
+    """
+    Refuse to replace an allocation file with one that is not newer (called under the file's lock)
+    
+    Raises:
+        StaleWriteError if the file on disk has the same or a later revision
+    """
+    from allocation_archive import allocation_archive
+    from utils.file_lock import StaleWriteError
+    # An archived shift counts too: re-saving a stale copy must not shadow it
+    if not allocation_archive.exists(filepath):
+        return
+    current = get_revision(allocation_archive.load(filepath))
+    new = get_revision(loads(text))
+    if current >= new:
+        raise StaleWriteError(filepath, new - 1, current)
+
+
+def allocation_files(directory):
+    """Paths of the allocation files in a folder, sorted"""
+    return [
+        os.path.join(directory, filename)
+        for filename in sorted(os.listdir(directory))
+        if filename.startswith("Allocation_") and filename.endswith(".json")
+    ]
+
+
+def convert_directory(directory, version=FORMAT_VERSION):
+    """
+    Rewrite every allocation file in a folder in the given format
+
+    Returns:
+        Tuple of (files converted, total bytes before, total bytes after)
+    """
+    converted = 0
+    size_before = 0
+    size_after = 0
+
+    for filepath in allocation_files(directory):
+        with open(filepath, 'r', encoding='utf-8') as f:
+            text = f.read()
+        try:
+            data = json.loads(text)
+        except ValueError as e:
+            print(f"Skipping {os.path.basename(filepath)}: {e}")
+            continue
+
+        size_before += len(text.encode('utf-8'))
+        if get_version(data) == version:
+            size_after += len(text.encode('utf-8'))
+            continue
+
+        new_text = encode(normalize(data), version)
+        temp_file = filepath + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            f.write(new_text)
+        os.replace(temp_file, filepath)
+
+        converted += 1
+        size_after += len(new_text.encode('utf-8'))
+
+    return converted, size_before, size_after
+
+
+def compare_formats(directory, rounds=20):
+    """
+    Measure size and parse time of a folder's allocations in v1 and v2
+
+    Files are re-encoded in memory; nothing on disk changes.
+
+    Returns:
+        {version: {'files', 'bytes', 'load_ms'}} where load_ms is the time to
+        parse every file once (including expanding v2), averaged over rounds
+    """
+    allocations = []
+    for filepath in allocation_files(directory):
+        try:
+            allocations.append(load_file(filepath))
+        except Exception as e:
+            print(f"Skipping {os.path.basename(filepath)}: {e}")
+
+    results = {}
+    for version in (1, 2):
+        texts = [encode(data, version) for data in allocations]
+        start = time.perf_counter()
+        for _ in range(rounds):
+            for text in texts:
+                loads(text)
+        results[version] = {
+            'files': len(texts),
+            'bytes': sum(len(text.encode('utf-8')) for text in texts),
+            'load_ms': (time.perf_counter() - start) * 1000 / rounds
+        }
+    return results
+
+
+def main(argv=None):
+    """Command line: compare formats or convert a folder"""
+    default_dir = os.path.join(
+        os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__)),
+        "allocations_json"
+    )
+
+    parser = argparse.ArgumentParser(description="Allocation file format tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    compare = commands.add_parser('compare', help="compare size and load time of v1 and v2")
+    compare.add_argument('--dir', default=default_dir)
+
+    convert = commands.add_parser('convert', help="rewrite allocation files in another format version")
+    convert.add_argument('--dir', default=default_dir)
+    convert.add_argument('--to', type=int, choices=(1, 2), default=FORMAT_VERSION)
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        results = compare_formats(args.dir)
+        for version, result in results.items():
+            print(f"v{version}: {result['files']} files, {result['bytes'] / 1024:.1f} KB, "
+                  f"{result['load_ms']:.2f} ms to load all")
+        if results[1]['bytes']:
+            print(f"v2 is {100 * (1 - results[2]['bytes'] / results[1]['bytes']):.0f}% smaller")
+    else:
+        converted, size_before, size_after = convert_directory(args.dir, args.to)
+        print(f"Converted {converted} files to v{args.to}: {size_before / 1024:.1f} KB -> {size_after / 1024:.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,32 +1,193 @@
 """
 Manage allocation history for fair worker distribution
+
+History is kept in two tiers:
+  - raw:     {group: {worker: [YYYY-MM-DD, ...]}} for the last RAW_RETENTION_DAYS
+  - monthly: {group: {worker: {YYYY-MM: count}}} for everything older
+
+Older raw dates are rolled up into the monthly tier instead of being deleted,
+so long-range statistics survive while the file stays small. Which days of a
+month were rolled up is kept as a bit mask ({group: {worker: {YYYY-MM: mask}}},
+bit 0 = day 1), so a date is only counted once however often it is rolled up.
+Counts rolled up before the masks were kept have no days in the mask.
+
+Several stations can share the file: every write takes its lock and, when
+another station saved a newer revision in the meantime, merges it first.
+Raw dates and rolled-up days are unioned, and a raw date the other station
+already rolled up is dropped from the raw tier.
 """
 import os
 import json
+import threading
 from datetime import datetime, timedelta
 from data import get_process_group
+from persistence_worker import persistence_worker
+from utils.file_lock import FileLock, atomic_write
+
+# Number of days kept as individual dates before rolling up into months
+RAW_RETENTION_DAYS = 90
+
+HISTORY_FORMAT_VERSION = 3
+
+
+def day_bit(date_str):
+    """Bit of a date (YYYY-MM-DD) in its month's mask"""
+    return 1 << (int(date_str[8:10]) - 1)
+
+
+def bit_count(mask):
+    """Number of days set in a month's mask"""
+    return bin(mask).count("1")
+
 
 class AllocationHistory:
     """Track and manage worker allocation history"""
     
-    def __init__(self):
+    def __init__(self, raw_days=RAW_RETENTION_DAYS):
         self.history_file = os.path.join(os.path.dirname(__file__), "allocation_history.json")
-        self.history = self.load_history()
+        self.raw_days = raw_days
+        self.revision = 0  # revision of the file last read or written
+        self.rolled = {}  # {group: {worker: {month: mask}}} of the days counted in monthly
+        self.history, self.monthly = self.load_history()
+        self.listeners = []
+        self.merge_listeners = []  # listeners also told about allocations merged from disk
+        self.month_listeners = []  # told about rolled-up counts merged from disk
+        
+        # Held while the history is changed or serialized (saves run on the persistence worker)
+        self.lock = threading.RLock()
+        
+        # Roll up anything that aged out since the last run
+        if self.apply_retention():
+            self.save_history()
     
     def load_history(self):
-        """Load allocation history from JSON file"""
+        """
+        Load allocation history from JSON file
+        
+        Returns:
+            Tuple of (raw history, monthly rollups); the rolled-up days are
+            loaded into self.rolled. Files written before tiered retention
+            (plain {group: {worker: [dates]}}) load as raw.
+        """
         if os.path.exists(self.history_file):
             try:
                 with open(self.history_file, 'r') as f:
-                    return json.load(f)
+                    data = json.load(f)
             except:
-                return {}
-        return {}
+                return {}, {}
+            
+            if isinstance(data, dict) and 'raw' in data and 'version' in data:
+                self.revision = data.get('revision', 0)
+                self.rolled = data.get('rolled', {})
+                return data.get('raw', {}), data.get('monthly', {})
+            return data, {}
+        return {}, {}
     
     def save_history(self):
-        """Save allocation history to JSON file"""
-        with open(self.history_file, 'w') as f:
-            json.dump(self.history, f, indent=2)
+        """Queue saving allocation history; any number of queued saves write the file once"""
+        persistence_worker.submit(self.write_history, key='allocation_history', coalesce=True)
+    
+    def write_history(self, items=None):
+        """Write allocation history to JSON file (runs on the persistence worker)"""
+        with FileLock(self.history_file):
+            # Another station saved since we last read the file: keep its allocations too
+            disk_revision = self.revision
+            if os.path.exists(self.history_file):
+                try:
+                    with open(self.history_file, 'r') as f:
+                        disk = json.load(f)
+                    if isinstance(disk, dict) and disk.get('revision', 0) > self.revision:
+                        added, added_months = self.merge_history(disk.get('raw', {}), disk.get('monthly', {}), disk.get('rolled', {}))
+                        for group_name, worker_name, date in added:
+                            for listener in self.merge_listeners:
+                                listener(group_name, worker_name, date)
+                        for group_name, worker_name, month, count in added_months:
+                            for listener in self.month_listeners:
+                                listener(group_name, worker_name, month, count)
+                        disk_revision = disk['revision']
+                except Exception as e:
+                    print(f"Error reading allocation history for merge: {e}")
+            
+            with self.lock:
+                self.revision = max(self.revision, disk_revision) + 1
+                data = {
+                    'version': HISTORY_FORMAT_VERSION,
+                    'revision': self.revision,
+                    'raw_days': self.raw_days,
+                    'raw': self.history,
+                    'monthly': self.monthly,
+                    'rolled': self.rolled
+                }
+                text = json.dumps(data, indent=2)
+            
+            atomic_write(self.history_file, text)
+    
+    def merge_history(self, raw, monthly, rolled):
+        """
+        Fold history saved by another station into memory
+        
+        Rolled-up days are unioned, so months both stations rolled up are
+        not counted twice and days only one of them rolled up are kept.
+        Counts rolled up without days (older files) keep the larger value.
+        Raw dates either station has rolled up are then left out of the raw tier.
+        
+        Returns:
+            Tuple of (list of (group, worker, date) raw allocations that were
+            new here, list of (group, worker, month, count) rolled-up
+            allocations that were new here)
+        """
+        added = []
+        month_added = {}  # (group, worker, month) -> rolled-up allocations new here
+        with self.lock:
+            for group_name, workers in monthly.items():
+                for worker_name, months in workers.items():
+                    counts = self.monthly.setdefault(group_name, {}).setdefault(worker_name, {})
+                    masks = self.rolled.setdefault(group_name, {}).setdefault(worker_name, {})
+                    theirs = rolled.get(group_name, {}).get(worker_name, {})
+                    for month, count in months.items():
+                        mask, their_mask = masks.get(month, 0), theirs.get(month, 0)
+                        untracked = max(counts.get(month, 0) - bit_count(mask), count - bit_count(their_mask))
+                        masks[month] = mask | their_mask
+                        old_count = counts.get(month, 0)
+                        counts[month] = bit_count(masks[month]) + untracked
+                        month_added[(group_name, worker_name, month)] = counts[month] - old_count
+            
+            for group_name, workers in raw.items():
+                group = self.history.setdefault(group_name, {})
+                for worker_name, dates in workers.items():
+                    known = group.setdefault(worker_name, [])
+                    new_dates = sorted(
+                        date for date in set(dates) - set(known)
+                        if not self.is_rolled_up(group_name, worker_name, date)
+                    )
+                    known.extend(new_dates)
+                    added.extend((group_name, worker_name, date) for date in new_dates)
+            
+            # Dates the other station rolled up are now counted in the monthly tier
+            for group_name, workers in rolled.items():
+                for worker_name in workers:
+                    known = self.history.get(group_name, {}).get(worker_name)
+                    if not known:
+                        continue
+                    kept = []
+                    for date in known:
+                        if self.is_rolled_up(group_name, worker_name, date):
+                            # Already counted here as a raw date
+                            key = (group_name, worker_name, date[:7])
+                            month_added[key] = month_added.get(key, 0) - 1
+                        else:
+                            kept.append(date)
+                    known[:] = kept
+                    if not known:
+                        del self.history[group_name][worker_name]
+        
+        added_months = [key + (count,) for key, count in month_added.items() if count > 0]
+        return added, added_months
+    
+    def is_rolled_up(self, group_name, worker_name, date_str):
+        """True if a date is already counted in the monthly tier"""
+        mask = self.rolled.get(group_name, {}).get(worker_name, {}).get(date_str[:7], 0)
+        return bool(mask & day_bit(date_str))
     
     def add_allocation(self, process_name, worker_name, date=None):
         """Record a worker allocation - uses process GROUP not individual name"""
@@ -36,39 +197,104 @@ class AllocationHistory:
         # Use group name instead of individual process name
         group_name = get_process_group(process_name)
         
-        if group_name not in self.history:
-            self.history[group_name] = {}
-        
-        if worker_name not in self.history[group_name]:
-            self.history[group_name][worker_name] = []
+        with self.lock:
+            if group_name not in self.history:
+                self.history[group_name] = {}
+            
+            if worker_name not in self.history[group_name]:
+                self.history[group_name][worker_name] = []
+            
+            is_new = date not in self.history[group_name][worker_name] and not self.is_rolled_up(group_name, worker_name, date)
+            if is_new:
+                self.history[group_name][worker_name].append(date)
         
-        if date not in self.history[group_name][worker_name]:
-            self.history[group_name][worker_name].append(date)
+        if is_new:
+            for listener in self.listeners:
+                listener(group_name, worker_name, date)
         
         self.save_history()
     
+    def add_listener(self, callback, merged=True):
+        """
+        Register callback(group_name, worker_name, date) for new allocations
+        
+        Args:
+            merged: Also call it for allocations merged from another station's
+                save of the file (on the persistence worker). Change logs,
+                which must only record this station's edits, pass False.
+        """
+        self.listeners.append(callback)
+        if merged:
+            self.merge_listeners.append(callback)
+    
+    def add_month_listener(self, callback):
+        """
+        Register callback(group_name, worker_name, month, count) for rolled-up
+        allocations merged from another station's save (on the persistence worker)
+        """
+        self.month_listeners.append(callback)
+    
     def get_allocation_count(self, process_name, worker_name, days=30):
-        """Get allocation count using process GROUP"""
-        group_name = get_process_group(process_name)
+        """Get allocation count using process GROUP (rolled-up months included)"""
+        # A date counts when all of it lies within the last `days` days
+        start_date = (datetime.now() - timedelta(days=days - 1)).strftime("%Y-%m-%d")
+        # Only this worker's records: ranking asks once per worker
+        return self.count_worker(get_process_group(process_name), worker_name, start_date, "9999-12-31")
+    
+    def get_period_counts(self, process_name, start_date, end_date):
+        """
+        Get allocation counts per worker for a process GROUP over a date range
         
-        if group_name not in self.history:
-            return 0
+        Raw dates and rolled-up days are matched exactly. Counts rolled up
+        before the days were kept only have month resolution, so they are
+        counted in full for every month that overlaps the range.
         
-        if worker_name not in self.history[group_name]:
-            return 0
+        Args:
+            process_name: Process (or group) name
+            start_date: First date (YYYY-MM-DD), inclusive
+            end_date: Last date (YYYY-MM-DD), inclusive
         
-        cutoff_date = datetime.now() - timedelta(days=days)
+        Returns:
+            Dictionary of worker name -> allocation count
+        """
+        group_name = get_process_group(process_name)
+        workers = set(self.monthly.get(group_name, {})) | set(self.history.get(group_name, {}))
         
-        count = 0
-        for date_str in self.history[group_name][worker_name]:
-            try:
-                date = datetime.strptime(date_str, "%Y-%m-%d")
-                if date >= cutoff_date:
-                    count += 1
-            except:
+        counts = {}
+        for worker_name in workers:
+            count = self.count_worker(group_name, worker_name, start_date, end_date)
+            if count:
+                counts[worker_name] = count
+        return counts
+    
+    def count_worker(self, group_name, worker_name, start_date, end_date):
+        """Allocation count of one worker in a process GROUP over a date range (see get_period_counts)"""
+        start_month = start_date[:7]
+        end_month = end_date[:7]
+        total = 0
+        
+        months = self.monthly.get(group_name, {}).get(worker_name, {})
+        masks = self.rolled.get(group_name, {}).get(worker_name, {})
+        for month, count in months.items():
+            if not start_month <= month <= end_month:
                 continue
+            mask = masks.get(month, 0)
+            in_range = sum(
+                1 for day in range(31)
+                if mask >> day & 1 and start_date <= f"{month}-{day + 1:02d}" <= end_date
+            )
+            total += in_range + count - bit_count(mask)
+        
+        # ISO dates compare correctly as strings
+        for date_str in self.history.get(group_name, {}).get(worker_name, []):
+            if start_date <= date_str <= end_date:
+                total += 1
         
-        return count
+        return total
+    
+    def get_yearly_counts(self, process_name, year):
+        """Get allocation counts per worker for a process GROUP in a calendar year"""
+        return self.get_period_counts(process_name, f"{year}-01-01", f"{year}-12-31")
     
     def calculate_frequency_penalty(self, process_name, worker_name, days=30):
         """Calculate penalty using process GROUP - max penalty of 3"""
@@ -114,29 +340,49 @@ class AllocationHistory:
         
         return stats
     
-    def cleanup_old_records(self, days=90):
+    def apply_retention(self, days=None):
         """
-        Remove allocation records older than specified days
+        Roll raw dates older than the retention window up into monthly counts
+        
+        A date whose day is already in the month's mask (rolled up by another
+        station) is dropped without being counted again.
         
         Args:
-            days: Keep records from last X days
+            days: Keep raw dates from last X days (defaults to self.raw_days)
+        
+        Returns:
+            Number of raw dates that were rolled up
         """
-        cutoff_date = datetime.now() - timedelta(days=days)
+        if days is None:
+            days = self.raw_days
+        
+        cutoff_str = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        rolled_up = 0
         
         for process_name in list(self.history.keys()):
             for worker_name in list(self.history[process_name].keys()):
-                # Filter dates
-                valid_dates = []
+                recent_dates = []
                 for date_str in self.history[process_name][worker_name]:
                     try:
-                        date = datetime.strptime(date_str, "%Y-%m-%d")
-                        if date >= cutoff_date:
-                            valid_dates.append(date_str)
+                        datetime.strptime(date_str, "%Y-%m-%d")
                     except:
                         continue
+                    
+                    if date_str >= cutoff_str:
+                        recent_dates.append(date_str)
+                        continue
+                    
+                    months = self.monthly.setdefault(process_name, {}).setdefault(worker_name, {})
+                    masks = self.rolled.setdefault(process_name, {}).setdefault(worker_name, {})
+                    month = date_str[:7]
+                    mask = masks.get(month, 0)
+                    if not mask & day_bit(date_str):
+                        masks[month] = mask | day_bit(date_str)
+                        months[month] = months.get(month, 0) + 1
+                    rolled_up += 1
                 
-                if valid_dates:
-                    self.history[process_name][worker_name] = valid_dates
+                if recent_dates:
+                    self.history[process_name][worker_name] = recent_dates
                 else:
                     del self.history[process_name][worker_name]
             
@@ -144,18 +390,22 @@ class AllocationHistory:
             if not self.history[process_name]:
                 del self.history[process_name]
         
+        return rolled_up
+    
+    def cleanup_old_records(self, days=90):
+        """
+        Roll allocation records older than specified days into monthly counts
+        
+        Args:
+            days: Keep raw records from last X days
+        """
+        with self.lock:
+            self.apply_retention(days)
         self.save_history()
 
-    def show_worker_frequency_stats(worker_name, days=30):
+    def show_worker_frequency_stats(self, worker_name, days=30):
         """Show how many times worker did each process GROUP"""
-        from data import PROCESS_GROUPS
-        
-        stats = {}
-        for process_name in PROCESS_GROUPS.keys():
-            group_name = get_process_group(process_name)
-            count = allocation_history.get_allocation_count(process_name, worker_name, days)
-            if count > 0:
-                stats[group_name] = count
+        stats = self.get_worker_stats(worker_name, days)
         
         print(f"\n{worker_name}'s assignments (last {days} days):")
         for group, count in sorted(stats.items(), key=lambda x: x[1], reverse=True):
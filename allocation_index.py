@@ -0,0 +1,339 @@
+"""
+Inverted index over all saved allocations for cross-shift questions
+
+Four mappings, each kept sorted by shift so date ranges are bisect slices:
+  
+  worker  -> (date, shift, task, product, lot_number)
+  task    -> (date, shift, workers)
+  product -> (date, shift, task, lot_number)
+  lot     -> (date, shift, task, product, workers)     for batch traceability
+
+plus date -> worker -> {shift: [tasks]}, the occupancy used by conflict_check.
+
+The index is built from the allocation catalog with a parallel read of every
+shift (loose or archived), persisted to allocation_index.json, re-read only
+for shifts whose file changed since, and updated in place by
+save_allocation_json:
+    
+    allocation_index.worker_shifts("Nimal", "2025-01-01", "2025-12-31")
+    allocation_index.task_shifts("Coating")
+    allocation_index.product_shifts("Paracetamol 500mg")
+    allocation_index.lot_shifts("25-0412")
+
+Lot numbers are typed by hand, so they are matched ignoring case and
+surrounding spaces (see lot_key).
+"""
+import bisect
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from allocation_catalog import SHIFT_ORDER, SCAN_WORKERS
+from allocation_format import NOT_SET
+from persistence_worker import persistence_worker
+from utils.file_lock import FileLock, atomic_write
+
+INDEX_VERSION = 1
+
+# Sorts after any shift name, for the end of a date range
+LAST_SHIFT = (len(SHIFT_ORDER) + 1,)
+
+
+def lot_key(lot_number):
+    """Lot number as matched by the index (case and surrounding spaces ignored)"""
+    return lot_number.strip().upper()
+
+
+def shift_tasks(allocation_data):
+    """[[task, product, lot_number, [workers]], ...] of allocation data in the v1 layout"""
+    tasks = []
+    for task in allocation_data.get('processes', []) + allocation_data.get('machines', []):
+        product = task.get('product')
+        lot_number = task.get('lot_number')
+        tasks.append([
+            task['name'],
+            None if product == NOT_SET else product,
+            None if lot_number == NOT_SET else lot_number,
+            [w['name'] for w in task.get('workers', [])]
+        ])
+    return tasks
+
+
+class AllocationIndex:
+    """Worker, task and product postings over every saved shift"""
+    
+    def __init__(self, index_file=None):
+        if index_file is None:
+            from allocation_catalog import allocation_catalog
+            index_file = os.path.join(allocation_catalog.base_path, "allocation_index.json")
+        self.index_file = index_file
+        
+        # Held while postings change or are serialized (saves run on the persistence worker)
+        self.lock = threading.RLock()
+        
+        # Loaded on first query
+        self.shifts = None  # filename -> {'date', 'shift', 'stamp', 'tasks'}
+        self.by_worker = {}  # worker -> sorted [(date, order, shift, task, product, lot_number)]
+        self.by_task = {}  # task -> sorted [(date, order, shift, (workers))]
+        self.by_product = {}  # product -> sorted [(date, order, shift, task, lot_number)]
+        self.by_lot = {}  # lot_key -> sorted [(date, order, shift, task, product, (workers))]
+        self.by_date = {}  # date -> {worker: {shift: [tasks]}}, for conflict checks
+        self.catalog_generation = None  # catalog state the shifts were last checked against
+    
+    # ------------------------------------------------------------------ #
+    # Building
+    # ------------------------------------------------------------------ #
+    
+    def ensure(self):
+        """Load the index, re-reading shifts that changed since it was saved"""
+        from allocation_catalog import allocation_catalog
+        
+        with self.lock:
+            if self.shifts is None:
+                self.shifts = self.load_index()
+                self.by_worker, self.by_task, self.by_product, self.by_lot, self.by_date = {}, {}, {}, {}, {}
+                for record in self.shifts.values():
+                    self.add_postings(record, insert=list.append)
+                for postings in (self.by_worker, self.by_task, self.by_product, self.by_lot):
+                    for items in postings.values():
+                        items.sort()
+                
+                from audit_trail import audit_trail
+                audit_trail.add_listener(self.on_audit_entries)
+            elif self.catalog_generation == allocation_catalog.generation:
+                return
+            self.catalog_generation = allocation_catalog.generation
+            
+            rows = allocation_catalog.get_rows()
+            stale = []
+            names = set()
+            for row in rows:
+                filename = f"Allocation_{row['date']}_{row['shift']}.json"
+                names.add(filename)
+                record = self.shifts.get(filename)
+                # Shifts indexed from a save this session have no stamp yet
+                if record is None or (record['stamp'] is not None and record['stamp'] != [row['mtime'], row['size']]):
+                    stale.append((filename, row))
+            
+            removed = [filename for filename in self.shifts if filename not in names]
+            if not stale and not removed:
+                return
+            
+            for filename in removed:
+                self.remove_postings(self.shifts.pop(filename))
+            
+            def read(item):
+                filename, row = item
+                from allocation_archive import allocation_archive
+                try:
+                    return shift_tasks(allocation_archive.load(allocation_catalog.get_path(row['date'], row['shift'])))
+                except Exception as e:
+                    print(f"Error indexing {filename}: {e}")
+                    return None
+            
+            with ThreadPoolExecutor(max_workers=SCAN_WORKERS) as executor:
+                for (filename, row), tasks in zip(stale, executor.map(read, stale)):
+                    if tasks is not None:
+                        self.set_shift(filename, row['date'], row['shift'], tasks, [row['mtime'], row['size']])
+        
+        self.save_index()
+    
+    def load_index(self):
+        """Read the persisted shift records (empty if missing, unreadable or from another version)"""
+        if not os.path.exists(self.index_file):
+            return {}
+        try:
+            with open(self.index_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            print(f"Error loading allocation index: {e}")
+            return {}
+        
+        if data.get('version') != INDEX_VERSION:
+            return {}
+        return data.get('shifts', {})
+    
+    def set_shift(self, filename, date, shift, tasks, stamp=None):
+        """Replace the postings of one shift"""
+        with self.lock:
+            old = self.shifts.pop(filename, None)
+            if old is not None:
+                self.remove_postings(old)
+            record = {'date': date, 'shift': shift, 'stamp': stamp, 'tasks': tasks}
+            self.shifts[filename] = record
+            self.add_postings(record)
+    
+    def add_postings(self, record, insert=bisect.insort):
+        """Insert a shift's postings into the sorted lists (or append them, for a bulk load)"""
+        date, shift = record['date'], record['shift']
+        order = SHIFT_ORDER.get(shift, len(SHIFT_ORDER))
+        for task, product, lot_number, workers in record['tasks']:
+            # "" instead of None keeps the tuples comparable
+            product, lot_number = product or "", lot_number or ""
+            for worker in workers:
+                insert(self.by_worker.setdefault(worker, []), (date, order, shift, task, product, lot_number))
+            insert(self.by_task.setdefault(task, []), (date, order, shift, tuple(workers)))
+            occupancy = self.by_date.setdefault(date, {})
+            for worker in workers:
+                occupancy.setdefault(worker, {}).setdefault(shift, []).append(task)
+            if product:
+                insert(self.by_product.setdefault(product, []), (date, order, shift, task, lot_number))
+            if lot_key(lot_number):
+                insert(self.by_lot.setdefault(lot_key(lot_number), []), (date, order, shift, task, product, tuple(workers)))
+    
+    def remove_postings(self, record):
+        """Delete a shift's postings from the sorted lists"""
+        date, shift = record['date'], record['shift']
+        key = (date, SHIFT_ORDER.get(shift, len(SHIFT_ORDER)), shift)
+        for task, product, lot_number, workers in record['tasks']:
+            lookups = [(self.by_worker, w) for w in workers] + [(self.by_task, task), (self.by_product, product)]
+            if lot_number:
+                lookups.append((self.by_lot, lot_key(lot_number)))
+            for postings, name in lookups:
+                items = postings.get(name)
+                if not items:
+                    continue
+                lo = bisect.bisect_left(items, key)
+                hi = lo
+                while hi < len(items) and items[hi][:3] == key:
+                    hi += 1
+                del items[lo:hi]
+                if not items:
+                    del postings[name]
+            
+            occupancy = self.by_date.get(date, {})
+            for worker in workers:
+                shifts = occupancy.get(worker)
+                if shifts is not None and shifts.pop(shift, None) is not None and not shifts:
+                    del occupancy[worker]
+            if not occupancy:
+                self.by_date.pop(date, None)
+    
+    def update(self, filepath, allocation_data):
+        """Index an allocation that is being saved (called by save_allocation_json)"""
+        from allocation_catalog import parse_filename
+        filename = os.path.basename(filepath)
+        parsed = parse_filename(filename)
+        if parsed is None:
+            return
+        
+        with self.lock:
+            if self.shifts is None:
+                # Not loaded yet: the next ensure() picks the file up from the catalog
+                return
+            self.set_shift(filename, parsed[0], parsed[1], shift_tasks(allocation_data))
+        self.save_index()
+    
+    def on_audit_entries(self, entries):
+        """Audit listener: shifts touched by a logged edit are re-read on the next query"""
+        with self.lock:
+            for entry in entries:
+                record = self.shifts.get(f"Allocation_{entry.get('allocation_date')}_{entry.get('shift_time')}.json")
+                if record is not None:
+                    record['stamp'] = 'stale'
+                    self.catalog_generation = None
+    
+    def save_index(self):
+        """Queue writing the index"""
+        persistence_worker.submit(self.write_index, key='allocation_index', coalesce=True)
+    
+    def write_index(self, items=None):
+        """Write the index to its JSON file (runs on the persistence worker)"""
+        with self.lock:
+            if self.shifts is None:
+                return
+            text = json.dumps({'version': INDEX_VERSION, 'shifts': self.shifts}, ensure_ascii=False, separators=(',', ':'))
+        
+        with FileLock(self.index_file):
+            atomic_write(self.index_file, text)
+    
+    # ------------------------------------------------------------------ #
+    # Queries
+    # ------------------------------------------------------------------ #
+    
+    def range_of(self, items, start_date, end_date):
+        """Slice of sorted postings between two dates (inclusive, None for open ends)"""
+        lo = 0 if start_date is None else bisect.bisect_left(items, (start_date,))
+        hi = len(items) if end_date is None else bisect.bisect_right(items, (end_date,) + LAST_SHIFT)
+        return items[lo:hi]
+    
+    def worker_shifts(self, worker, start_date=None, end_date=None):
+        """Where a worker was: [{'date', 'shift', 'task', 'product', 'lot_number'}] in shift order"""
+        self.ensure()
+        with self.lock:
+            items = self.range_of(self.by_worker.get(worker, []), start_date, end_date)
+        return [
+            {'date': date, 'shift': shift, 'task': task, 'product': product or None, 'lot_number': lot_number or None}
+            for date, _, shift, task, product, lot_number in items
+        ]
+    
+    def task_shifts(self, task, start_date=None, end_date=None):
+        """Who worked a task: [{'date', 'shift', 'workers'}] in shift order"""
+        self.ensure()
+        with self.lock:
+            items = self.range_of(self.by_task.get(task, []), start_date, end_date)
+        return [
+            {'date': date, 'shift': shift, 'workers': list(workers)}
+            for date, _, shift, workers in items
+        ]
+    
+    def product_shifts(self, product, start_date=None, end_date=None):
+        """Where a product was made: [{'date', 'shift', 'task', 'lot_number'}] in shift order"""
+        self.ensure()
+        with self.lock:
+            items = self.range_of(self.by_product.get(product, []), start_date, end_date)
+        return [
+            {'date': date, 'shift': shift, 'task': task, 'lot_number': lot_number or None}
+            for date, _, shift, task, lot_number in items
+        ]
+    
+    def lot_shifts(self, lot_number, start_date=None, end_date=None):
+        """Everything that touched a lot: [{'date', 'shift', 'task', 'product', 'workers'}] in shift order"""
+        self.ensure()
+        with self.lock:
+            items = self.range_of(self.by_lot.get(lot_key(lot_number), []), start_date, end_date)
+        return [
+            {'date': date, 'shift': shift, 'task': task, 'product': product or None, 'workers': list(workers)}
+            for date, _, shift, task, product, workers in items
+        ]
+    
+    def occupancy(self, date):
+        """Shifts each worker was placed on at a date: {worker: {shift: [tasks]}} (do not modify)"""
+        self.ensure()
+        with self.lock:
+            return self.by_date.get(date, {})
+    
+    def occupied_dates(self):
+        """Every date with an indexed shift, sorted"""
+        self.ensure()
+        with self.lock:
+            return sorted(self.by_date)
+    
+    def get_workers(self):
+        """Every indexed worker, sorted"""
+        self.ensure()
+        with self.lock:
+            return sorted(self.by_worker)
+    
+    def get_tasks(self):
+        """Every indexed task, sorted"""
+        self.ensure()
+        with self.lock:
+            return sorted(self.by_task)
+    
+    def get_products(self):
+        """Every indexed product, sorted"""
+        self.ensure()
+        with self.lock:
+            return sorted(self.by_product)
+    
+    def get_lots(self):
+        """Every indexed lot number (as lot_key), sorted"""
+        self.ensure()
+        with self.lock:
+            return sorted(self.by_lot)
+
+
+# Global instance
+allocation_index = AllocationIndex()
@@ -0,0 +1,643 @@
+"""
+Allocation service: one local process holding the data layer for many stations
+
+Normally every station loads the CSVs, the allocation history and the
+repository into its own process and writes the shared files itself. In
+service mode one process does that and the stations call it over
+JSON-over-HTTP on keep-alive connections (stdlib only):
+    
+    POST /rpc      {"method": "rank_workers", "params": {...}}
+                   or a list of calls, answered with a list (one round trip)
+    GET  /metrics  request counts, latency percentiles and throughput
+    
+    python allocation_service.py serve --port 8765
+    set ALLOCATION_SERVICE=127.0.0.1:8765          (then start the stations)
+    python allocation_service.py bench --clients 8 --requests 500 --batch 4
+
+Stations reach the engine through get_engine(): a ServiceClient when
+ALLOCATION_SERVICE is set, otherwise a LocalEngine calling the same methods
+in process. With the variable set, open_repository() returns a
+ServiceRepository, so allocation reads and saves go to the service too.
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from repository import Repository
+
+DEFAULT_PORT = 8765
+
+# host:port of a running service; stations use it when set (also read by repository.open_repository)
+SERVICE_ENV = "ALLOCATION_SERVICE"
+
+REQUEST_TIMEOUT = 30
+
+# Seconds a station waits at start for the service to answer before using its own files
+PING_TIMEOUT = 3
+
+# Latencies kept per method for the percentiles in /metrics
+LATENCY_WINDOW = 2000
+
+
+class ServiceError(Exception):
+    """
+    Raised by a client when the service reports an error for a call, or
+    cannot be reached (error_type 'ConnectionError')
+    """
+    
+    def __init__(self, message, error_type=None, conflicts=None):
+        super().__init__(message)
+        self.error_type = error_type
+        self.conflicts = conflicts  # of an AllocationConflictError
+
+
+# ---------------------------------------------------------------------- #
+# Engine methods (run in the service process, or in process by LocalEngine)
+# ---------------------------------------------------------------------- #
+
+def rank_workers(task_name, task_type='process', product=None, workers=(), frequency_penalty=False):
+    """
+    Workers sorted by combined skill for a task, best first
+    
+    Args:
+        frequency_penalty: Subtract the allocation history penalty (tracked processes)
+    
+    Returns:
+        [[worker, score, penalty, task_skill, product_skill], ...]
+    """
+    from data import get_worker_skill, get_product_skill
+    from allocation_history import allocation_history
+    
+    ranked = []
+    for worker in workers:
+        task_skill = get_worker_skill(worker, task_name, task_type)
+        product_skill = get_product_skill(worker, product) if product else 0
+        penalty = allocation_history.calculate_frequency_penalty(task_name, worker) if frequency_penalty else 0
+        ranked.append([worker, task_skill + product_skill - penalty, penalty, task_skill, product_skill])
+    
+    ranked.sort(key=lambda item: item[1], reverse=True)
+    return ranked
+
+
+def record_allocations(process_name, workers, date=None):
+    """Add workers allocated to a process to the allocation history"""
+    from allocation_history import allocation_history
+    for worker in workers:
+        allocation_history.add_allocation(process_name, worker, date)
+    return len(workers)
+
+
+def save_allocation(allocation_data, base_revision=None, allow_conflicts=False):
+    """
+    Save an edited shift through the stations' save path (export_results.store_allocation):
+    revision and conflict checks, the write, catalog, index, change log and audit entry
+    
+    Args:
+        base_revision: Revision the edit started from (None for a new shift)
+    """
+    from allocation_catalog import allocation_catalog
+    from export_results import store_allocation
+    
+    metadata = allocation_data.get('metadata', {})
+    filepath = allocation_catalog.get_path(metadata['date'], metadata['shift_time'])
+    base = None if base_revision is None else {'metadata': {'revision': base_revision}}
+    store_allocation(filepath, allocation_data, base, allow_conflicts)
+    return os.path.basename(filepath)
+
+
+def write_allocation(allocation_data):
+    """
+    Store a shift version as it is (Repository.save_allocation, e.g. a shift
+    merged from another station's bundle) and update the catalog and index
+    """
+    from allocation_catalog import allocation_catalog
+    from allocation_index import allocation_index
+    from repository import repository
+    
+    metadata = allocation_data.get('metadata', {})
+    filepath = allocation_catalog.get_path(metadata['date'], metadata['shift_time'])
+    repository.save_allocation(filepath, allocation_data)
+    allocation_catalog.update(filepath, allocation_data)
+    allocation_index.update(filepath, allocation_data)
+    return os.path.basename(filepath)
+
+
+def load_allocation(date, shift):
+    """Allocation data of a shift (see Repository.load_allocation)"""
+    from repository import repository
+    return repository.load_allocation(date, shift)
+
+
+def list_shifts(start_date=None, end_date=None):
+    """Saved shifts as [(date, shift, group), ...]"""
+    from repository import repository
+    return repository.list_shifts(start_date, end_date)
+
+
+def get_worker_shifts(worker, start_date=None, end_date=None):
+    """Shifts a worker was assigned in as [(date, shift, task), ...]"""
+    from repository import repository
+    return repository.get_worker_shifts(worker, start_date, end_date)
+
+
+def get_history_dates(group_name, worker, start_date=None, end_date=None):
+    """Raw allocation dates of a worker in a process group"""
+    from repository import repository
+    return repository.get_history_dates(group_name, worker, start_date, end_date)
+
+
+def get_period_counts(group_name, start_date, end_date):
+    """Allocation counts per worker of a process group over a date range"""
+    from repository import repository
+    return repository.get_period_counts(group_name, start_date, end_date)
+
+
+def get_audit_entries(allocation_date=None, shift_time=None, start=None, end=None):
+    """Audit entries oldest first (see Repository.get_audit_entries)"""
+    from repository import repository
+    return repository.get_audit_entries(allocation_date, shift_time, start, end)
+
+
+def ping():
+    """Liveness check"""
+    return "pong"
+
+
+# Calls that change nothing, so a request that lost its connection can be sent again
+# (a retried record_allocations or save could be applied twice)
+IDEMPOTENT_METHODS = {
+    'rank_workers', 'load_allocation', 'list_shifts', 'get_worker_shifts',
+    'get_history_dates', 'get_period_counts', 'get_audit_entries', 'ping'
+}
+
+METHODS = {
+    'rank_workers': rank_workers,
+    'record_allocations': record_allocations,
+    'save_allocation': save_allocation,
+    'write_allocation': write_allocation,
+    'load_allocation': load_allocation,
+    'list_shifts': list_shifts,
+    'get_worker_shifts': get_worker_shifts,
+    'get_history_dates': get_history_dates,
+    'get_period_counts': get_period_counts,
+    'get_audit_entries': get_audit_entries,
+    'ping': ping
+}
+
+
+def run_call(call):
+    """Run one {'method', 'params'} call, as {'result'} or {'error', 'type'}"""
+    try:
+        function = METHODS[call['method']]
+    except (KeyError, TypeError):
+        return {'error': f"Unknown method: {call.get('method') if isinstance(call, dict) else call}", 'type': 'KeyError'}
+    try:
+        return {'result': function(**(call.get('params') or {}))}
+    except Exception as e:
+        response = {'error': str(e), 'type': type(e).__name__}
+        if getattr(e, 'conflicts', None) is not None:
+            response['conflicts'] = e.conflicts
+        return response
+
+
+# ---------------------------------------------------------------------- #
+# Server
+# ---------------------------------------------------------------------- #
+
+class ServiceMetrics:
+    """Call counts and latencies of the service, per method"""
+    
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.requests = 0  # HTTP requests (a batch is one request)
+        self.calls = {}  # method -> count
+        self.errors = {}  # method -> count
+        self.latencies = {}  # method -> recent latencies in seconds
+        self.connections = 0
+    
+    def record(self, method, seconds, failed=False):
+        with self.lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            if failed:
+                self.errors[method] = self.errors.get(method, 0) + 1
+            window = self.latencies.get(method)
+            if window is None:
+                window = self.latencies[method] = deque(maxlen=LATENCY_WINDOW)
+            window.append(seconds)
+    
+    def snapshot(self):
+        """Metrics as a JSON-ready dictionary"""
+        with self.lock:
+            uptime = time.time() - self.started
+            total_calls = sum(self.calls.values())
+            methods = {}
+            for method, window in self.latencies.items():
+                ordered = sorted(window)
+                methods[method] = {
+                    'calls': self.calls[method],
+                    'errors': self.errors.get(method, 0),
+                    'p50_ms': percentile(ordered, 50) * 1000,
+                    'p95_ms': percentile(ordered, 95) * 1000,
+                    'max_ms': ordered[-1] * 1000
+                }
+            return {
+                'uptime_s': uptime,
+                'connections': self.connections,
+                'requests': self.requests,
+                'calls': total_calls,
+                'calls_per_s': total_calls / uptime if uptime > 0 else 0.0,
+                'methods': methods
+            }
+
+
+def percentile(ordered, pct):
+    """Percentile of a sorted list (0 for an empty one)"""
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    """JSON-over-HTTP handler; HTTP/1.1 keeps each station's connection open"""
+    
+    protocol_version = "HTTP/1.1"
+    
+    # Headers and body go out as separate writes; without this each reply waits for a delayed ACK
+    disable_nagle_algorithm = True
+    
+    def setup(self):
+        super().setup()
+        with self.server.metrics.lock:
+            self.server.metrics.connections += 1
+    
+    def do_POST(self):
+        if self.path != "/rpc":
+            self.send_json({'error': f"Unknown path: {self.path}"}, status=404)
+            return
+        
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length))
+        except ValueError as e:
+            self.send_json({'error': f"Invalid request: {e}", 'type': 'ValueError'}, status=400)
+            return
+        
+        metrics = self.server.metrics
+        with metrics.lock:
+            metrics.requests += 1
+        
+        responses = []
+        for call in (request if isinstance(request, list) else [request]):
+            started = time.perf_counter()
+            response = run_call(call)
+            method = call.get('method') if isinstance(call, dict) else None
+            metrics.record(str(method), time.perf_counter() - started, failed='error' in response)
+            responses.append(response)
+        
+        self.send_json(responses if isinstance(request, list) else responses[0])
+    
+    def do_GET(self):
+        if self.path == "/metrics":
+            self.send_json(self.server.metrics.snapshot())
+        elif self.path == "/health":
+            self.send_json({'result': "ok"})
+        else:
+            self.send_json({'error': f"Unknown path: {self.path}"}, status=404)
+    
+    def send_json(self, value, status=200):
+        body = json.dumps(value, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        # One line per call would drown the console; /metrics has the numbers
+        pass
+
+
+class AllocationService(ThreadingHTTPServer):
+    """HTTP server running engine calls, one thread per station connection"""
+    
+    daemon_threads = True
+    
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT):
+        super().__init__((host, port), ServiceHandler)
+        self.metrics = ServiceMetrics()
+    
+    @property
+    def address(self):
+        host, port = self.server_address[:2]
+        return f"{host}:{port}"
+    
+    def start(self):
+        """Serve on a background thread (for the benchmark); returns self"""
+        threading.Thread(target=self.serve_forever, name="allocation-service", daemon=True).start()
+        return self
+
+
+def serve(host="127.0.0.1", port=DEFAULT_PORT):
+    """Load the data layer and serve until interrupted"""
+    import data  # loads the CSVs
+    from allocation_history import allocation_history
+    from persistence_worker import persistence_worker
+    from repository import repository
+    
+    repository.attach()
+    service = AllocationService(host, port)
+    print(f"Allocation service on {service.address} ({len(data.WORKER_SKILLS)} workers, "
+          f"{len(allocation_history.history)} history groups); "
+          f"set {SERVICE_ENV}={service.address} on the stations")
+    try:
+        service.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.server_close()
+        persistence_worker.stop()
+        from station_sync import change_log
+        change_log.stop(30)
+
+
+# ---------------------------------------------------------------------- #
+# Clients
+# ---------------------------------------------------------------------- #
+
+class LocalEngine:
+    """Engine methods called in this process (no service configured)"""
+    
+    def call(self, method, **params):
+        return METHODS[method](**params)
+    
+    def batch(self, calls):
+        """Run [(method, params), ...] and return their results in order"""
+        return [self.call(method, **params) for method, params in calls]
+
+
+class ServiceClient:
+    """Engine methods called on a running service over a keep-alive connection"""
+    
+    def __init__(self, address, timeout=REQUEST_TIMEOUT):
+        host, _, port = address.partition(":")
+        self.host = host or "127.0.0.1"
+        self.port = int(port or DEFAULT_PORT)
+        self.timeout = timeout
+        self.local = threading.local()  # one connection per thread
+    
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self.local.conn = conn
+        return conn
+    
+    def request(self, method, path, body=None, retry=True):
+        """
+        Send a request on the open connection
+        
+        Args:
+            retry: Reconnect and send again once if the connection dropped (only
+                for requests that are safe to run twice: the service may have
+                run the first one before the connection went)
+        """
+        payload = None if body is None else json.dumps(body, ensure_ascii=False).encode('utf-8')
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        for attempt in range(2 if retry else 1):
+            conn = self.connection()
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                return json.loads(response.read())
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                conn.close()
+                self.local.conn = None
+                if attempt or not retry:
+                    raise self.unreachable(e)
+            except OSError as e:
+                # Refused or timed out: the service is down or overloaded
+                conn.close()
+                self.local.conn = None
+                raise self.unreachable(e)
+    
+    def unreachable(self, error):
+        """ServiceError for a connection that failed"""
+        return ServiceError(f"Allocation service {self.host}:{self.port} unreachable: {error}", 'ConnectionError')
+    
+    def call(self, method, **params):
+        body = {'method': method, 'params': params}
+        return self.unwrap(self.request("POST", "/rpc", body, retry=method in IDEMPOTENT_METHODS))
+    
+    def batch(self, calls):
+        """Run [(method, params), ...] in one round trip and return their results in order"""
+        body = [{'method': method, 'params': params} for method, params in calls]
+        retry = all(method in IDEMPOTENT_METHODS for method, _ in calls)
+        return [self.unwrap(response) for response in self.request("POST", "/rpc", body, retry=retry)]
+    
+    def metrics(self):
+        return self.request("GET", "/metrics")
+    
+    def close(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+    
+    def unwrap(self, response):
+        if 'error' in response:
+            raise ServiceError(response['error'], response.get('type'), response.get('conflicts'))
+        return response['result']
+
+
+class ServiceRepository(Repository):
+    """Repository whose reads and saves go to the allocation service"""
+    
+    remote = True
+    
+    def __init__(self, client):
+        self.client = client
+    
+    def store_allocation(self, filepath, allocation_data, base_revision, allow_conflicts=False):
+        """Run the whole save of an edited shift in the service (see save_allocation)"""
+        try:
+            self.client.call(
+                'save_allocation', allocation_data=allocation_data,
+                base_revision=base_revision, allow_conflicts=allow_conflicts
+            )
+        except ServiceError as e:
+            self.raise_save_error(filepath, e)
+    
+    def save_allocation(self, filepath, allocation_data):
+        try:
+            self.client.call('write_allocation', allocation_data=allocation_data)
+        except ServiceError as e:
+            self.raise_save_error(filepath, e)
+    
+    def raise_save_error(self, filepath, error):
+        """Raise a service's save error as the exception a local save raises"""
+        if error.error_type == 'StaleWriteError':
+            from utils.file_lock import StaleWriteError
+            raise StaleWriteError(filepath, message=str(error))
+        if error.error_type == 'AllocationConflictError':
+            from conflict_check import AllocationConflictError
+            raise AllocationConflictError(error.conflicts)
+        raise error
+    
+    def load_allocation(self, date, shift):
+        return self.client.call('load_allocation', date=date, shift=shift)
+    
+    def list_shifts(self, start_date=None, end_date=None):
+        return [tuple(row) for row in self.client.call('list_shifts', start_date=start_date, end_date=end_date)]
+    
+    def get_worker_shifts(self, worker, start_date=None, end_date=None):
+        rows = self.client.call('get_worker_shifts', worker=worker, start_date=start_date, end_date=end_date)
+        return [tuple(row) for row in rows]
+    
+    def get_history_dates(self, group_name, worker, start_date=None, end_date=None):
+        return self.client.call(
+            'get_history_dates', group_name=group_name, worker=worker, start_date=start_date, end_date=end_date
+        )
+    
+    def get_period_counts(self, group_name, start_date, end_date):
+        return self.client.call('get_period_counts', group_name=group_name, start_date=start_date, end_date=end_date)
+    
+    def get_audit_entries(self, allocation_date=None, shift_time=None, start=None, end=None):
+        return self.client.call(
+            'get_audit_entries', allocation_date=allocation_date, shift_time=shift_time, start=start, end=end
+        )
+    
+    def attach(self):
+        # The service keeps its own store in step
+        pass
+
+
+_engine = None
+
+
+def service_address():
+    """host:port of the configured service, or None"""
+    return os.environ.get(SERVICE_ENV) or None
+
+
+def get_engine():
+    """The shared engine: the configured service, or this process (also when the service is down at start)"""
+    global _engine
+    if _engine is None:
+        address = service_address()
+        engine = LocalEngine()
+        if address:
+            try:
+                ServiceClient(address, timeout=PING_TIMEOUT).call('ping')
+                engine = ServiceClient(address)
+            except ServiceError as e:
+                print(f"{e}; using the local data files")
+        _engine = engine
+    return _engine
+
+
+# ---------------------------------------------------------------------- #
+# Benchmark: several client processes against one service
+# ---------------------------------------------------------------------- #
+
+def bench_client(address, requests, batch):
+    """Send `requests` rank_workers requests of `batch` calls each; returns latencies in seconds"""
+    import data
+    
+    workers = list(data.WORKER_SKILLS)
+    tasks = [(item[0], 'process') for item in data.PROCESSES] + [(item[0], 'machine') for item in data.COMPRESSION_MACHINES]
+    client = ServiceClient(address)
+    latencies = []
+    for i in range(requests):
+        calls = []
+        for j in range(batch):
+            task_name, task_type = tasks[(i * batch + j) % len(tasks)]
+            calls.append(('rank_workers', {
+                'task_name': task_name, 'task_type': task_type, 'workers': workers,
+                'frequency_penalty': task_type == 'process'
+            }))
+        started = time.perf_counter()
+        client.batch(calls)
+        latencies.append(time.perf_counter() - started)
+    client.close()
+    return latencies
+
+
+def bench(address=None, clients=4, requests=200, batch=1):
+    """
+    Measure the service with `clients` processes (starts one in this process if no address)
+    
+    Returns:
+        Dictionary of client-side latency and throughput, and the service's /metrics
+    """
+    service = None
+    if address is None:
+        service = AllocationService(port=0).start()
+        address = service.address
+    
+    started = time.perf_counter()
+    with multiprocessing.Pool(clients) as pool:
+        results = pool.starmap(bench_client, [(address, requests, batch)] * clients)
+    elapsed = time.perf_counter() - started
+    
+    latencies = sorted(latency for result in results for latency in result)
+    report = {
+        'clients': clients,
+        'requests': len(latencies),
+        'calls': len(latencies) * batch,
+        'elapsed_s': elapsed,
+        'requests_per_s': len(latencies) / elapsed,
+        'calls_per_s': len(latencies) * batch / elapsed,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'service': ServiceClient(address).metrics()
+    }
+    if service is not None:
+        service.shutdown()
+        service.server_close()
+    return report
+
+
+def main(argv=None):
+    """Command line: run the service or benchmark it"""
+    parser = argparse.ArgumentParser(description="Shared allocation service for several stations")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    serve_parser = commands.add_parser('serve', help="run the service")
+    serve_parser.add_argument('--host', default="127.0.0.1")
+    serve_parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    
+    bench_parser = commands.add_parser('bench', help="measure latency and throughput with client processes")
+    bench_parser.add_argument('--address', help="host:port of a running service (default: start one)")
+    bench_parser.add_argument('--clients', type=int, default=4)
+    bench_parser.add_argument('--requests', type=int, default=200, help="requests per client")
+    bench_parser.add_argument('--batch', type=int, default=1, help="calls per request")
+    
+    metrics_parser = commands.add_parser('metrics', help="print a running service's metrics")
+    metrics_parser.add_argument('--address', default=f"127.0.0.1:{DEFAULT_PORT}")
+    args = parser.parse_args(argv)
+    
+    if args.command == 'serve':
+        serve(args.host, args.port)
+    elif args.command == 'bench':
+        report = bench(args.address, args.clients, args.requests, args.batch)
+        service = report.pop('service')
+        print(f"{report['clients']} clients, {report['requests']} requests ({report['calls']} calls) "
+              f"in {report['elapsed_s']:.2f} s: {report['requests_per_s']:.0f} requests/s, "
+              f"{report['calls_per_s']:.0f} calls/s, p50 {report['p50_ms']:.1f} ms, p95 {report['p95_ms']:.1f} ms")
+        print(f"Service: {service['connections']} connections, {service['requests']} requests")
+        for method, stats in service['methods'].items():
+            print(f"  {method}: {stats['calls']} calls, p50 {stats['p50_ms']:.2f} ms, "
+                  f"p95 {stats['p95_ms']:.2f} ms, max {stats['max_ms']:.2f} ms")
+    else:
+        print(json.dumps(ServiceClient(args.address).metrics(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+"""
+Inverted token index over audit trail entries
+
+Every entry is split into lower-case tokens (worker names, task names,
+products, lot numbers, change types, ...). Each audit segment keeps:
+
+  YYYY-MM.tok   one [offset, length, [tokens]] line per entry, appended on log_edit
+  YYYY-MM.inv   {token: [offsets]} written once when the segment is closed
+
+Searches intersect the posting lists of the query tokens, so they only touch
+the entries that match.
+"""
+import bisect
+import json
+import os
+import re
+
+# Words, numbers and joined codes such as lot 25-0412, line 128-001 or 3.5;
+# underscores split, so ALLOCATION_DELETED is found by "deleted"
+TOKEN_PATTERN = re.compile(r"[^\W_]+(?:[-./][^\W_]+)*")
+
+
+def tokenize(text):
+    """Split text into lower-case search tokens"""
+    return [token.lower() for token in TOKEN_PATTERN.findall(str(text))]
+
+
+def entry_tokens(entry):
+    """Collect the distinct tokens of an entry, including every key and value in its details"""
+    tokens = set()
+    
+    def collect(value):
+        if isinstance(value, dict):
+            for key, item in value.items():
+                tokens.update(tokenize(key))
+                collect(item)
+        elif isinstance(value, (list, tuple)):
+            for item in value:
+                collect(item)
+        elif value is not None:
+            tokens.update(tokenize(value))
+    
+    for field in ('change_type', 'allocation_date', 'shift_time', 'user'):
+        collect(entry.get(field))
+    collect(entry.get('details'))
+    
+    return sorted(tokens)
+
+
+class TokenIndex:
+    """Token postings (token -> entry offsets) for one audit segment"""
+    
+    def __init__(self, segment):
+        self.segment = segment
+        base = os.path.join(segment.trail.audit_dir, segment.name)
+        self.token_file = base + ".tok"
+        self.inverted_file = base + ".inv"
+        
+        # Loaded lazily on first search
+        self.postings = None  # token -> [offsets]
+        self.vocabulary = None  # sorted tokens, for prefix lookups
+        self.indexed_size = 0
+    
+    def add_entry(self, entry, offset, length):
+        """Index an entry just appended to the segment"""
+        tokens = entry_tokens(entry)
+        try:
+            with open(self.token_file, 'ab') as f:
+                f.write((json.dumps([offset, length, tokens], ensure_ascii=False) + "\n").encode('utf-8'))
+        except Exception as e:
+            print(f"Error updating audit token index {self.token_file}: {e}")
+        
+        if self.postings is not None:
+            self.apply(offset, length, tokens)
+    
+    def apply(self, offset, length, tokens):
+        """Add one entry's tokens to the in-memory postings"""
+        if offset < self.indexed_size:
+            # Already indexed (e.g. another station caught up first)
+            return
+        for token in tokens:
+            postings = self.postings.get(token)
+            if postings is None:
+                self.postings[token] = [offset]
+                self.vocabulary = None
+            else:
+                postings.append(offset)
+        self.indexed_size = offset + length
+    
+    def ensure(self):
+        """Load the postings, indexing any entries appended since they were written"""
+        if self.postings is None:
+            self.postings = {}
+            self.vocabulary = None
+            self.indexed_size = 0
+            
+            try:
+                if self.segment.compressed and os.path.exists(self.inverted_file):
+                    with open(self.inverted_file, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    self.postings = data['postings']
+                    self.indexed_size = data['size']
+                elif os.path.exists(self.token_file):
+                    for offset, length, tokens in self.read_token_records():
+                        self.apply(offset, length, tokens)
+            except Exception as e:
+                print(f"Error loading audit token index for {self.segment.name}: {e}")
+                self.postings = {}
+                self.indexed_size = 0
+        
+        data_size = self.segment.data_size()
+        if self.indexed_size > data_size:
+            # Segment was replaced underneath the index
+            self.rebuild()
+        elif self.indexed_size < data_size:
+            for entry, offset, length in self.segment.scan(self.indexed_size):
+                self.add_entry(entry, offset, length)
+            if self.segment.compressed:
+                # e.g. a segment closed by an older version without token files
+                self.write_inverted()
+    
+    def read_token_records(self):
+        """Read all [offset, length, tokens] records of the token file"""
+        with open(self.token_file, 'rb') as f:
+            data = f.read()
+        
+        # Decoding the file as one JSON array is much faster than line by line
+        try:
+            return json.loads(b"[" + data.rstrip(b"\n").replace(b"\n", b",") + b"]")
+        except ValueError:
+            pass
+        
+        records = []
+        for line in data.split(b"\n"):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+    
+    def rebuild(self):
+        """Re-tokenize the whole segment"""
+        for path in (self.token_file, self.inverted_file):
+            if os.path.exists(path):
+                os.remove(path)
+        
+        self.postings = {}
+        self.vocabulary = None
+        self.indexed_size = 0
+        for entry, offset, length in self.segment.scan():
+            self.add_entry(entry, offset, length)
+        
+        if self.segment.compressed:
+            self.write_inverted()
+    
+    def write_inverted(self):
+        """Write the postings of a closed segment as one file that loads in a single read"""
+        self.ensure()
+        
+        temp_file = self.inverted_file + ".tmp"
+        with open(temp_file, 'w', encoding='utf-8') as f:
+            json.dump({'size': self.indexed_size, 'postings': self.postings}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_file, self.inverted_file)
+    
+    def lookup(self, token, prefix=False):
+        """Offsets of entries containing a token (or any token starting with it)"""
+        if not prefix:
+            return set(self.postings.get(token, ()))
+        
+        if self.vocabulary is None:
+            self.vocabulary = sorted(self.postings)
+        
+        offsets = set()
+        i = bisect.bisect_left(self.vocabulary, token)
+        while i < len(self.vocabulary) and self.vocabulary[i].startswith(token):
+            offsets.update(self.postings[self.vocabulary[i]])
+            i += 1
+        return offsets
+    
+    def search(self, tokens, prefix_last=False):
+        """
+        Offsets of entries containing all tokens
+        
+        Args:
+            tokens: Tokens from tokenize()
+            prefix_last: Let the last token match as a prefix (search-as-you-type)
+        """
+        self.ensure()
+        
+        result = None
+        # Rarest tokens first keeps the intersection small
+        exact = sorted(tokens[:-1] if prefix_last else tokens, key=lambda t: len(self.postings.get(t, ())))
+        for token in exact:
+            offsets = self.lookup(token)
+            result = offsets if result is None else result & offsets
+            if not result:
+                return set()
+        
+        if prefix_last and tokens:
+            offsets = self.lookup(tokens[-1], prefix=True)
+            result = offsets if result is None else result & offsets
+        
+        return result or set()
@@ -1,26 +1,667 @@
 """
 Audit trail for tracking all edits made to allocations
+
+Entries are stored append-only as JSON Lines (one entry per line), so logging
+an edit never rewrites existing entries. The trail is split into monthly
+segments by entry timestamp inside the audit_trail/ folder:
+
+  audit_trail/2025-11.jsonl      current (open) month
+  audit_trail/2025-10.jsonl.gz   closed months, gzip-compressed
+  audit_trail/2025-10.idx        per-segment index (entry id -> byte offset)
+  audit_trail/manifest.json      date range and entry count of every segment
+
+Queries use the manifest to open only the segments that can contain matching
+entries. Trails written by older versions (a single JSON array, or a single
+JSON Lines file) are migrated by open(), which the app calls once on startup.
+
+Stations sharing the folder append under the manifest's lock; a manifest
+revision written by another station is reloaded before appending. open()
+(manifest repair, migrations, compressing closed months) holds the same lock.
+Importing the module only sets up paths: tools that merely read or append
+load the manifest on first use and never rewrite the folder.
 """
+import csv
+import gzip
 import json
 import os
+import shutil
+import threading
+from collections import OrderedDict
 from datetime import datetime
 import sys
 
+from audit_search import TokenIndex, tokenize
+from persistence_worker import persistence_worker
+from utils.file_lock import FileLock, LockTimeout, atomic_write
+
+# Block size used when reading the log backwards from the end
+READ_BLOCK_SIZE = 64 * 1024
+
+MANIFEST_VERSION = 1
+
+MANIFEST_NAME = "manifest.json"
+
+# Files belonging to segments (log, index, token postings)
+SEGMENT_SUFFIXES = (".jsonl", ".jsonl.gz", ".idx", ".tok", ".inv")
+
+# Sub-folder a migration writes the rebuilt trail to before swapping it in
+STAGING_DIR = ".rebuild"
+
+# Closed segments kept decompressed in memory for random access
+DECOMPRESSED_CACHE_SIZE = 2
+
+# Change types written by log_edit
+CHANGE_TYPES = [
+    'ALLOCATION_CREATED',
+    'ALLOCATION_EDITED',
+    'WORKER_ADDED',
+    'WORKER_REMOVED',
+    'ALLOCATION_DELETED',
+    'PRODUCT_CHANGED',
+    'LOT_NUMBER_CHANGED'
+]
+
+# Report formats and their file extensions
+EXPORT_FORMATS = {
+    'text': 'txt',
+    'csv': 'csv',
+    'jsonl': 'jsonl'
+}
+
+CSV_COLUMNS = ['id', 'timestamp', 'change_type', 'allocation_date', 'shift_time', 'user', 'details']
+
+# Entries scanned between export progress callbacks
+PROGRESS_INTERVAL = 1000
+
+# Fields of a segment index record; filters are evaluated on these without reading entries
+INDEX_FIELDS = ['id', 'offset', 'length', 'allocation_date', 'shift_time', 'change_type', 'user']
+
+
+def decode_line(line):
+    """Decode one log line, returning None for blank or torn lines"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        return json.loads(line)
+    except ValueError:
+        print(f"Skipping unreadable audit trail line: {line[:80]!r}")
+        return None
+
+
+def encode_json_line(value):
+    """Encode a value as a single compact JSON line (bytes)"""
+    return (json.dumps(value, ensure_ascii=False, separators=(',', ':')) + "\n").encode('utf-8')
+
+
+class AuditSegment:
+    """One month of the audit trail plus its index"""
+    
+    def __init__(self, trail, name, info):
+        self.trail = trail
+        self.name = name
+        self.info = info
+        self.log_file = os.path.join(trail.audit_dir, f"{name}.jsonl")
+        self.gz_file = self.log_file + ".gz"
+        self.index_file = os.path.join(trail.audit_dir, f"{name}.idx")
+        
+        # Loaded lazily on first indexed query
+        self.entry_offsets = None  # entry id -> (offset, length)
+        self.shift_entries = None  # (allocation_date, shift_time) -> [entry ids]
+        self.rows = None  # index records in log order
+        self.indexed_size = 0  # bytes of the segment covered by the index
+        self.stale_index = False  # index written by an older version
+        # Guards the lookup tables, which the persistence worker extends while the UI reads them
+        self.lock = threading.RLock()
+        
+        self.tokens = TokenIndex(self)
+    
+    @property
+    def compressed(self):
+        return self.info.get('compressed', False)
+    
+    def data_size(self):
+        """Uncompressed size of the segment in bytes"""
+        if self.compressed:
+            return self.info.get('size', 0)
+        return os.path.getsize(self.log_file) if os.path.exists(self.log_file) else 0
+    
+    def read_all(self):
+        """Read the whole (decompressed) segment"""
+        if self.compressed:
+            return self.trail.decompressed(self)
+        if not os.path.exists(self.log_file):
+            return b""
+        with open(self.log_file, 'rb') as f:
+            return f.read()
+    
+    def scan(self, start=0):
+        """
+        Scan the segment from a byte offset
+        
+        Yields:
+            (entry, offset, length) for every readable entry
+        """
+        if self.compressed:
+            # Decompress as a stream so a full scan stays in constant memory
+            with gzip.open(self.gz_file, 'rb') as f:
+                offset = 0
+                for line in f:
+                    if offset >= start:
+                        entry = decode_line(line)
+                        if entry is not None:
+                            yield entry, offset, len(line)
+                    offset += len(line)
+            return
+        
+        if not os.path.exists(self.log_file):
+            return
+        
+        with open(self.log_file, 'rb') as f:
+            f.seek(start)
+            offset = start
+            for line in f:
+                entry = decode_line(line)
+                if entry is not None:
+                    yield entry, offset, len(line)
+                offset += len(line)
+    
+    def iter_entries(self):
+        """Stream entries oldest first"""
+        for entry, offset, length in self.scan():
+            yield entry
+    
+    def iter_entries_reversed(self):
+        """Stream entries newest first"""
+        if self.compressed:
+            for line in reversed(self.read_all().split(b"\n")):
+                entry = decode_line(line)
+                if entry is not None:
+                    yield entry
+            return
+        
+        if not os.path.exists(self.log_file):
+            return
+        
+        with open(self.log_file, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            position = f.tell()
+            remainder = b""
+            
+            while position > 0:
+                read_size = min(READ_BLOCK_SIZE, position)
+                position -= read_size
+                f.seek(position)
+                block = f.read(read_size) + remainder
+                
+                lines = block.split(b"\n")
+                # First piece may be the tail of a line that started in an earlier block
+                remainder = lines.pop(0)
+                
+                for line in reversed(lines):
+                    entry = decode_line(line)
+                    if entry is not None:
+                        yield entry
+            
+            entry = decode_line(remainder)
+            if entry is not None:
+                yield entry
+    
+    def read_entries_at(self, locations):
+        """Read entries at (offset, length) locations"""
+        entries = []
+        
+        if self.compressed:
+            data = self.read_all()
+            for offset, length in locations:
+                entry = decode_line(data[offset:offset + length])
+                if entry is not None:
+                    entries.append(entry)
+            return entries
+        
+        with open(self.log_file, 'rb') as f:
+            for offset, length in locations:
+                f.seek(offset)
+                entry = decode_line(f.read(length))
+                if entry is not None:
+                    entries.append(entry)
+        return entries
+    
+    def append(self, line):
+        """Append an encoded line to the open segment, returning its offset"""
+        with open(self.log_file, 'ab') as f:
+            f.seek(0, os.SEEK_END)
+            offset = f.tell()
+            f.write(line)
+            f.flush()
+            if self.trail.fsync:
+                os.fsync(f.fileno())
+        return offset
+    
+    def repair_tail(self):
+        """Terminate a line torn by a crash so the next append starts cleanly"""
+        if self.compressed:
+            return
+        try:
+            with open(self.log_file, 'rb+') as f:
+                f.seek(0, os.SEEK_END)
+                if f.tell() == 0:
+                    return
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    f.write(b"\n")
+        except FileNotFoundError:
+            pass
+    
+    def make_index_record(self, entry, offset, length):
+        """Build the index record for an entry stored at offset"""
+        return [
+            entry['id'], offset, length,
+            entry.get('allocation_date'), entry.get('shift_time'),
+            entry.get('change_type'), entry.get('user')
+        ]
+    
+    def apply_index_record(self, record):
+        """Add an index record to the in-memory lookup tables"""
+        if len(record) < len(INDEX_FIELDS):
+            self.stale_index = True
+            return
+        entry_id, offset, length, allocation_date, shift_time = record[:5]
+        with self.lock:
+            if self.entry_offsets.get(entry_id) == (offset, length):
+                # Same entry indexed twice (e.g. by two stations catching up)
+                return
+            self.entry_offsets[entry_id] = (offset, length)
+            self.shift_entries.setdefault((allocation_date, shift_time), []).append(entry_id)
+            self.rows.append(record)
+            self.indexed_size = max(self.indexed_size, offset + length)
+    
+    def append_index_record(self, record):
+        """Persist an index record and keep the loaded index in sync"""
+        try:
+            with open(self.index_file, 'ab') as f:
+                f.write(encode_json_line(record))
+        except Exception as e:
+            print(f"Error updating audit index {self.index_file}: {e}")
+        
+        if self.entry_offsets is not None:
+            self.apply_index_record(record)
+    
+    def ensure_index(self):
+        """Load the persisted index, indexing any segment tail it does not cover yet"""
+        with self.lock:
+            self.ensure_index_locked()
+    
+    def ensure_index_locked(self):
+        """ensure_index() body (called under the segment lock)"""
+        data_size = self.data_size()
+        
+        if self.entry_offsets is None:
+            self.entry_offsets = {}
+            self.shift_entries = {}
+            self.rows = []
+            self.indexed_size = 0
+            
+            if os.path.exists(self.index_file):
+                try:
+                    for record in self.read_index_records():
+                        self.apply_index_record(record)
+                except Exception as e:
+                    print(f"Error loading audit index {self.index_file}: {e}")
+        
+        if self.indexed_size > data_size or self.stale_index:
+            # Segment was replaced underneath the index, or the index lacks fields
+            self.rebuild_index()
+        elif self.indexed_size < data_size:
+            # Entries appended by another station or before a crash
+            for entry, offset, length in self.scan(self.indexed_size):
+                self.append_index_record(self.make_index_record(entry, offset, length))
+            self.indexed_size = data_size
+    
+    def read_index_records(self):
+        """Read all persisted index records"""
+        with open(self.index_file, 'rb') as f:
+            data = f.read()
+        
+        # Decoding the file as one JSON array is much faster than line by line
+        try:
+            return json.loads(b"[" + data.rstrip(b"\n").replace(b"\n", b",") + b"]")
+        except ValueError:
+            pass
+        
+        records = []
+        for line in data.split(b"\n"):
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+    
+    def rebuild_index(self):
+        """Rebuild the segment index from scratch"""
+        with self.lock:
+            return self.rebuild_index_locked()
+    
+    def rebuild_index_locked(self):
+        """rebuild_index() body (called under the segment lock)"""
+        self.entry_offsets = {}
+        self.shift_entries = {}
+        self.rows = []
+        self.indexed_size = 0
+        self.stale_index = False
+        
+        temp_file = self.index_file + ".tmp"
+        with open(temp_file, 'wb') as f:
+            for entry, offset, length in self.scan():
+                record = self.make_index_record(entry, offset, length)
+                f.write(encode_json_line(record))
+                self.apply_index_record(record)
+        os.replace(temp_file, self.index_file)
+        
+        return len(self.entry_offsets)
+    
+    def compress(self):
+        """Gzip a closed segment and drop the plain file"""
+        if self.compressed or not os.path.exists(self.log_file):
+            return
+        
+        self.repair_tail()
+        size = os.path.getsize(self.log_file)
+        temp_file = self.gz_file + ".tmp"
+        with open(self.log_file, 'rb') as src, gzip.open(temp_file, 'wb') as dst:
+            while True:
+                block = src.read(READ_BLOCK_SIZE)
+                if not block:
+                    break
+                dst.write(block)
+        os.replace(temp_file, self.gz_file)
+        
+        self.info['compressed'] = True
+        self.info['file'] = os.path.basename(self.gz_file)
+        self.info['size'] = size
+        self.trail.save_manifest()
+        os.remove(self.log_file)
+        
+        # Closed segments get their postings in one file for fast loading
+        self.tokens.write_inverted()
+    
+    def find_text(self, text):
+        """
+        Offsets of entries whose stored line contains text (case-insensitive)
+        
+        Matches the raw lines without decoding them, so the whole segment can
+        be searched quickly.
+        """
+        needle = text.lower().encode('utf-8')
+        offsets = set()
+        
+        opener = gzip.open(self.gz_file, 'rb') if self.compressed else open(self.log_file, 'rb')
+        with opener as f:
+            offset = 0
+            for line in f:
+                if needle in line.lower():
+                    offsets.add(offset)
+                offset += len(line)
+        return offsets
+    
+    def overlaps(self, start_date, end_date):
+        """Check whether the segment may hold entries for allocation dates in range"""
+        min_date = self.info.get('min_allocation_date')
+        max_date = self.info.get('max_allocation_date')
+        if min_date is None or max_date is None:
+            return self.info.get('entries', 0) > 0
+        return min_date <= end_date and start_date <= max_date
+
+
+class AuditQuery:
+    """Entries matching a query, numbered newest first and read a page at a time"""
+    
+    def __init__(self, parts):
+        # [(segment, matching index records)] oldest segment first, records in log order
+        self.parts = parts
+        self.total = sum(len(rows) for segment, rows in parts)
+    
+    def __len__(self):
+        return self.total
+    
+    def page(self, start, count):
+        """Read the entries at positions start..start+count (0 is the newest)"""
+        entries = []
+        skip = start
+        
+        for segment, rows in reversed(self.parts):
+            if count <= 0:
+                break
+            if skip >= len(rows):
+                skip -= len(rows)
+                continue
+            
+            take = min(len(rows) - skip, count)
+            last = len(rows) - 1 - skip
+            chosen = rows[last - take + 1:last + 1]
+            locations = [(r[1], r[2]) for r in reversed(chosen)]
+            entries.extend(segment.read_entries_at(locations))
+            
+            skip = 0
+            count -= take
+        
+        return entries
+
 
 class AuditTrail:
     """Track all changes made to allocations for traceability"""
     
-    def __init__(self):
-        self.history_file = self.get_history_file_path()
+    def __init__(self, fsync=False, background=True):
+        """
+        Args:
+            fsync: Force every entry to disk as it is written
+            background: Write logged entries on the persistence worker thread
+                instead of inside log_edit
+        """
+        self.base_path = self.get_base_path()
+        self.audit_dir = os.path.join(self.base_path, "audit_trail")
+        self.manifest_file = os.path.join(self.audit_dir, MANIFEST_NAME)
+        self.manifest_revision = 0  # revision of the manifest last read or written
+        self.fsync = fsync
+        self.background = background
+        
+        self.segments = OrderedDict()
+        self.decompressed_cache = OrderedDict()
+        self.listeners = []
+        self.loaded = False  # manifest read (see ensure_loaded)
+    
+    def open(self):
+        """Migrate older formats and tidy the segments (app start; not on import)"""
+        os.makedirs(self.audit_dir, exist_ok=True)
+        
+        # Other stations may be starting up or appending at the same time
+        try:
+            with FileLock(self.manifest_file):
+                self.open_trail()
+        except LockTimeout as e:
+            print(f"Audit trail busy on another station ({e}); opened without maintenance")
+            self.load_manifest()
     
-    def get_history_file_path(self):
-        """Get path for audit history file"""
+    def ensure_loaded(self):
+        """Read the manifest on first use"""
+        if not self.loaded:
+            self.load_manifest()
+    
+    def open_trail(self):
+        """Load the manifest, migrate older formats and tidy the segments (under the manifest's lock)"""
+        self.load_manifest()
+        
+        # Formats written by older versions (another station may have migrated them meanwhile)
+        legacy_jsonl = os.path.join(self.base_path, "audit_trail.jsonl")
+        legacy_json = os.path.join(self.base_path, "audit_trail.json")
+        if os.path.exists(legacy_jsonl):
+            self.migrate_from_jsonl(legacy_jsonl)
+        if os.path.exists(legacy_json):
+            self.migrate_from_json(legacy_json)
+        
+        self.refresh_open_segments()
+        self.close_old_segments()
+    
+    def get_base_path(self):
+        """Get folder that holds the audit trail"""
         if getattr(sys, 'frozen', False):
-            base_path = os.path.dirname(sys.executable)
-        else:
-            base_path = os.path.dirname(os.path.abspath(__file__))
+            return os.path.dirname(sys.executable)
+        return os.path.dirname(os.path.abspath(__file__))
+    
+    # ------------------------------------------------------------------ #
+    # Manifest and segments
+    # ------------------------------------------------------------------ #
+    
+    def load_manifest(self):
+        """Load the segment manifest, recovering it from the folder if missing"""
+        manifest = {}
+        if os.path.exists(self.manifest_file):
+            try:
+                with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                manifest = data.get('segments', {})
+                self.manifest_revision = data.get('revision', 0)
+            except Exception as e:
+                print(f"Error loading audit manifest: {e}")
+        
+        # Segments on disk that the manifest does not know about (e.g. lost manifest)
+        for filename in os.listdir(self.audit_dir) if os.path.isdir(self.audit_dir) else []:
+            for suffix, compressed in ((".jsonl.gz", True), (".jsonl", False)):
+                if filename.endswith(suffix):
+                    name = filename[:-len(suffix)]
+                    if name not in manifest:
+                        manifest[name] = {'file': filename, 'compressed': compressed, 'entries': 0}
+                    break
+        
+        self.segments = OrderedDict(
+            (name, AuditSegment(self, name, manifest[name]))
+            for name in sorted(manifest)
+        )
         
-        return os.path.join(base_path, "audit_trail.json")
+        for segment in self.segments.values():
+            if segment.compressed and 'size' not in segment.info:
+                # Recovered closed segment: size is needed for index checks
+                segment.info['size'] = len(segment.read_all())
+            if 'first_timestamp' not in segment.info and segment.data_size() > 0:
+                self.refresh_segment_stats(segment)
+        self.loaded = True
+    
+    def save_manifest(self):
+        """Write the manifest atomically"""
+        self.manifest_revision += 1
+        manifest = {
+            'version': MANIFEST_VERSION,
+            'revision': self.manifest_revision,
+            'segments': {name: segment.info for name, segment in self.segments.items()}
+        }
+        atomic_write(self.manifest_file, json.dumps(manifest, indent=2, ensure_ascii=False))
+    
+    def catch_up(self):
+        """Reload the manifest if another station saved it since we last did (called under its lock)"""
+        try:
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                revision = json.load(f).get('revision', 0)
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            print(f"Error reading audit manifest revision: {e}")
+            return
+        
+        if revision != self.manifest_revision:
+            self.load_manifest()
+            self.refresh_open_segments()
+    
+    def get_segment(self, name, create=False):
+        """Get a segment by month name (YYYY-MM)"""
+        segment = self.segments.get(name)
+        if segment is None and create:
+            info = {'file': f"{name}.jsonl", 'compressed': False, 'entries': 0}
+            segment = AuditSegment(self, name, info)
+            self.segments[name] = segment
+            self.segments = OrderedDict(sorted(self.segments.items()))
+        return segment
+    
+    def segment_name_for(self, entry):
+        """Month segment an entry belongs to (from its timestamp)"""
+        timestamp = entry.get('timestamp') or ""
+        if len(timestamp) >= 7:
+            return timestamp[:7]
+        return datetime.now().strftime("%Y-%m")
+    
+    def update_segment_stats(self, segment, entry):
+        """Fold one entry into a segment's manifest stats"""
+        info = segment.info
+        info['entries'] = info.get('entries', 0) + 1
+        
+        timestamp = entry.get('timestamp')
+        if timestamp:
+            if not info.get('first_timestamp') or timestamp < info['first_timestamp']:
+                info['first_timestamp'] = timestamp
+            if not info.get('last_timestamp') or timestamp > info['last_timestamp']:
+                info['last_timestamp'] = timestamp
+        
+        allocation_date = entry.get('allocation_date')
+        if allocation_date:
+            if not info.get('min_allocation_date') or allocation_date < info['min_allocation_date']:
+                info['min_allocation_date'] = allocation_date
+            if not info.get('max_allocation_date') or allocation_date > info['max_allocation_date']:
+                info['max_allocation_date'] = allocation_date
+    
+    def refresh_segment_stats(self, segment):
+        """Recompute a segment's manifest stats by scanning it"""
+        for key in ('first_timestamp', 'last_timestamp', 'min_allocation_date', 'max_allocation_date'):
+            segment.info.pop(key, None)
+        segment.info['entries'] = 0
+        
+        for entry in segment.iter_entries():
+            self.update_segment_stats(segment, entry)
+        segment.info['size'] = segment.data_size()
+        self.save_manifest()
+    
+    def refresh_open_segments(self):
+        """Repair torn tails and fix stats of open segments after a crash"""
+        for segment in self.segments.values():
+            if segment.compressed:
+                continue
+            segment.repair_tail()
+            if segment.info.get('size') != segment.data_size():
+                self.refresh_segment_stats(segment)
+    
+    def close_old_segments(self, current=None):
+        """Compress every open segment older than the current month"""
+        if current is None:
+            current = datetime.now().strftime("%Y-%m")
+        
+        for name, segment in list(self.segments.items()):
+            if name < current and not segment.compressed:
+                segment.compress()
+    
+    def decompressed(self, segment):
+        """Get a closed segment's data, keeping the most recent few in memory"""
+        data = self.decompressed_cache.get(segment.name)
+        if data is not None:
+            self.decompressed_cache.move_to_end(segment.name)
+            return data
+        
+        with gzip.open(segment.gz_file, 'rb') as f:
+            data = f.read()
+        
+        self.decompressed_cache[segment.name] = data
+        while len(self.decompressed_cache) > DECOMPRESSED_CACHE_SIZE:
+            self.decompressed_cache.popitem(last=False)
+        return data
+    
+    def segments_for_range(self, start_date, end_date):
+        """Segments that may contain entries for allocation dates in range"""
+        self.wait_for_writes()
+        return [
+            segment for segment in self.segments.values()
+            if segment.overlaps(start_date, end_date)
+        ]
+    
+    # ------------------------------------------------------------------ #
+    # Writing
+    # ------------------------------------------------------------------ #
     
     def log_edit(self, change_type, allocation_date, shift_time, details, user="Admin"):
         """
@@ -52,14 +693,10 @@ class AuditTrail:
             'details': details
         }
         
-        # Load existing audit trail
-        audit_log = self.load_audit_log()
-        
-        # Add new entry
-        audit_log.append(audit_entry)
-        
-        # Save back
-        self.save_audit_log(audit_log)
+        if self.background:
+            persistence_worker.submit(self.append_entries, audit_entry, key='audit')
+        else:
+            self.append_entries([audit_entry])
         
         print(f"[AUDIT] {timestamp} - {change_type}: {allocation_date} {shift_time}")
         return audit_entry['id']
@@ -68,84 +705,496 @@ class AuditTrail:
         """Generate unique ID for audit entry"""
         return datetime.now().strftime("%Y%m%d%H%M%S%f")
     
-    def load_audit_log(self):
-        """Load audit trail from file"""
-        if not os.path.exists(self.history_file):
-            return []
+    def encode_entry(self, entry):
+        """Encode an entry as a single JSON line (bytes)"""
+        return encode_json_line(entry)
+    
+    def append_entries(self, entries):
+        """Append a batch of logged entries, saving the manifest once"""
+        os.makedirs(self.audit_dir, exist_ok=True)
+        with FileLock(self.manifest_file):
+            self.ensure_loaded()
+            self.catch_up()
+            for entry in entries:
+                name = self.segment_name_for(entry)
+                if name not in self.segments:
+                    # First entry of a new month closes the previous ones
+                    self.close_old_segments(name)
+                self.append_entry(entry, save_manifest=False)
+            self.save_manifest()
         
+        for listener in self.listeners:
+            try:
+                listener(entries)
+            except Exception as e:
+                print(f"Error in audit listener: {e}")
+    
+    def add_listener(self, callback):
+        """Register callback(entries) for each batch of appended entries"""
+        self.listeners.append(callback)
+    
+    def wait_for_writes(self):
+        """Wait until entries queued by log_edit are on disk and the manifest is read (before reading)"""
+        persistence_worker.wait_for('audit')
+        self.ensure_loaded()
+    
+    def append_entry(self, entry, save_manifest=True):
+        """Append one entry to its month segment - O(1) regardless of trail size"""
+        name = self.segment_name_for(entry)
+        if name not in self.segments and save_manifest:
+            # First entry of a new month closes the previous ones
+            self.close_old_segments(name)
+        
+        segment = self.get_segment(name, create=True)
+        if segment.compressed:
+            # Late entry for a closed month goes to the newest segment instead
+            segment = self.get_segment(max(self.segments), create=True)
+            if segment.compressed:
+                segment = self.get_segment(datetime.now().strftime("%Y-%m"), create=True)
+        
+        line = self.encode_entry(entry)
+        offset = segment.append(line)
+        segment.append_index_record(segment.make_index_record(entry, offset, len(line)))
+        segment.tokens.add_entry(entry, offset, len(line))
+        
+        self.update_segment_stats(segment, entry)
+        segment.info['size'] = offset + len(line)
+        if save_manifest:
+            self.save_manifest()
+    
+    def segment_files(self):
+        """Names of the segment files in the audit folder"""
+        return {filename for filename in os.listdir(self.audit_dir) if filename.endswith(SEGMENT_SUFFIXES)}
+    
+    def save_audit_log(self, audit_log):
+        """
+        Replace the whole audit trail (used by the migrators, under the manifest's lock)
+        
+        The new segments are built in a staging folder and moved over the old
+        ones, the manifest last; files of old segments are deleted only after
+        that, so a crash part way leaves the old trail or a superset of it.
+        """
+        staging_dir = os.path.join(self.audit_dir, STAGING_DIR)
+        if os.path.exists(staging_dir):
+            shutil.rmtree(staging_dir)  # left by a crashed migration
+        os.makedirs(staging_dir)
+        
+        old_files = self.segment_files()
+        audit_dir, manifest_file = self.audit_dir, self.manifest_file
         try:
-            with open(self.history_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            # Segments created from here on live in the staging folder
+            self.audit_dir = staging_dir
+            self.manifest_file = os.path.join(staging_dir, MANIFEST_NAME)
+            self.segments = OrderedDict()
+            self.decompressed_cache.clear()
+            
+            for entry in audit_log:
+                self.append_entry(entry, save_manifest=False)
+            self.save_manifest()
+            self.close_old_segments()
+        finally:
+            self.audit_dir, self.manifest_file = audit_dir, manifest_file
+            self.decompressed_cache.clear()
+        
+        new_files = set(os.listdir(staging_dir)) - {MANIFEST_NAME}
+        for filename in new_files:
+            os.replace(os.path.join(staging_dir, filename), os.path.join(self.audit_dir, filename))
+        os.replace(os.path.join(staging_dir, MANIFEST_NAME), self.manifest_file)
+        for filename in old_files - new_files:
+            os.remove(os.path.join(self.audit_dir, filename))
+        shutil.rmtree(staging_dir)
+        
+        self.load_manifest()
+    
+    def merged_with_trail(self, audit_log):
+        """
+        Entries of the trail followed by those of audit_log it does not hold yet
+        
+        A migration interrupted after its segments were swapped in runs again
+        on the next start; entries already moved are recognised by id.
+        """
+        entries = list(self.iter_entries())
+        known = {entry.get('id') for entry in entries}
+        return entries + [entry for entry in audit_log if entry.get('id') is None or entry.get('id') not in known]
+    
+    def migrate_from_json(self, json_file):
+        """
+        One-shot migration from the old single-array JSON file
+        
+        The old file is kept as <name>.migrated so nothing is lost. It is
+        renamed only once the new trail is in place.
+        
+        Returns:
+            Number of entries migrated
+        """
+        try:
+            with open(json_file, 'r', encoding='utf-8') as f:
+                audit_log = json.load(f)
+        except FileNotFoundError:
+            return 0  # migrated by another station
         except Exception as e:
-            print(f"Error loading audit trail: {e}")
-            return []
+            print(f"Error reading legacy audit trail {json_file}: {e}")
+            return 0
+        
+        return self.finish_migration(json_file, audit_log)
     
-    def save_audit_log(self, audit_log):
-        """Save audit trail to file"""
+    def migrate_from_jsonl(self, jsonl_file):
+        """
+        One-shot migration from a single JSON Lines file into monthly segments
+        
+        The old file is kept as <name>.migrated so nothing is lost. It is
+        renamed only once the new trail is in place.
+        
+        Returns:
+            Number of entries migrated
+        """
+        audit_log = []
+        try:
+            with open(jsonl_file, 'rb') as f:
+                for line in f:
+                    entry = decode_line(line)
+                    if entry is not None:
+                        audit_log.append(entry)
+        except FileNotFoundError:
+            return 0  # migrated by another station
+        
+        migrated = self.finish_migration(jsonl_file, audit_log)
+        
+        # Its index is superseded by the per-segment indexes
+        index_file = jsonl_file[:-len(".jsonl")] + ".idx"
+        if migrated and os.path.exists(index_file):
+            os.remove(index_file)
+        return migrated
+    
+    def finish_migration(self, legacy_file, audit_log):
+        """Rebuild the trail with a legacy file's entries, then retire the file"""
         try:
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(audit_log, f, indent=4, ensure_ascii=False)
+            self.save_audit_log(self.merged_with_trail(audit_log))
         except Exception as e:
-            print(f"Error saving audit trail: {e}")
+            print(f"Error migrating audit trail {legacy_file} (kept for the next start): {e}")
+            self.load_manifest()
+            return 0
+        
+        try:
+            os.replace(legacy_file, legacy_file + ".migrated")
+        except FileNotFoundError:
+            pass  # renamed by another station
+        
+        print(f"[AUDIT] Migrated {len(audit_log)} entries from {legacy_file}")
+        return len(audit_log)
+    
+    # ------------------------------------------------------------------ #
+    # Reading
+    # ------------------------------------------------------------------ #
+    
+    def iter_entries(self, start_date=None, end_date=None):
+        """
+        Stream entries oldest first without loading the whole trail
+        
+        Args:
+            start_date, end_date: Optional allocation date range; only
+                overlapping segments are opened, entries are not filtered
+        """
+        for segment in self.select_segments(start_date, end_date):
+            yield from segment.iter_entries()
+    
+    def select_segments(self, start_date=None, end_date=None):
+        """Segments to open for an optional allocation date range"""
+        self.wait_for_writes()
+        if start_date is None and end_date is None:
+            return list(self.segments.values())
+        return self.segments_for_range(start_date or "", end_date or "9999-12-31")
+    
+    def matches(self, entry, start_date=None, end_date=None, change_types=None, user=None, shift_time=None):
+        """Check an entry against optional filters (None means no filter)"""
+        allocation_date = entry.get('allocation_date') or ""
+        if start_date and allocation_date < start_date:
+            return False
+        if end_date and allocation_date > end_date:
+            return False
+        if change_types and entry.get('change_type') not in change_types:
+            return False
+        if user and entry.get('user') != user:
+            return False
+        if shift_time and entry.get('shift_time') != shift_time:
+            return False
+        return True
+    
+    def iter_matching(self, start_date=None, end_date=None, change_types=None, user=None, shift_time=None):
+        """Stream entries matching the filters, oldest first"""
+        for entry in self.iter_entries(start_date, end_date):
+            if self.matches(entry, start_date, end_date, change_types, user, shift_time):
+                yield entry
+    
+    def iter_entries_reversed(self):
+        """Stream entries newest first, reading the newest segment first"""
+        self.wait_for_writes()
+        for segment in reversed(list(self.segments.values())):
+            yield from segment.iter_entries_reversed()
+    
+    def load_audit_log(self):
+        """Load the full audit trail into a list (prefer iter_entries for large trails)"""
+        try:
+            return list(self.iter_entries())
+        except Exception as e:
+            print(f"Error loading audit trail: {e}")
+            return []
+    
+    def rebuild_index(self):
+        """Rebuild every segment index (offsets and search tokens) from scratch"""
+        self.ensure_loaded()
+        for segment in self.segments.values():
+            segment.tokens.rebuild()
+        return sum(segment.rebuild_index() for segment in self.segments.values())
+    
+    def get_entry(self, entry_id):
+        """Get a single audit entry by id (None if not found)"""
+        self.wait_for_writes()
+        
+        # Ids start with the timestamp, so try that month's segment first
+        month = f"{entry_id[:4]}-{entry_id[4:6]}"
+        candidates = sorted(self.segments.values(), key=lambda s: s.name != month)
+        
+        for segment in candidates:
+            segment.ensure_index()
+            location = segment.entry_offsets.get(entry_id)
+            if location is not None:
+                entries = segment.read_entries_at([location])
+                return entries[0] if entries else None
+        return None
     
     def get_allocation_audit_log(self, allocation_date, shift_time):
         """Get all audit entries for a specific allocation"""
-        audit_log = self.load_audit_log()
-        return [
-            entry for entry in audit_log
-            if entry['allocation_date'] == allocation_date 
-            and entry['shift_time'] == shift_time
-        ]
+        entries = []
+        for segment in self.segments_for_range(allocation_date, allocation_date):
+            segment.ensure_index()
+            with segment.lock:
+                entry_ids = segment.shift_entries.get((allocation_date, shift_time), [])
+                locations = [segment.entry_offsets[i] for i in entry_ids]
+            entries.extend(segment.read_entries_at(locations))
+        return entries
     
     def get_recent_changes(self, limit=100):
-        """Get recent changes across all allocations"""
-        audit_log = self.load_audit_log()
-        return audit_log[-limit:] if len(audit_log) > limit else audit_log
+        """Get recent changes across all allocations (oldest first)"""
+        recent = []
+        for entry in self.iter_entries_reversed():
+            if len(recent) >= limit:
+                break
+            recent.append(entry)
+        
+        recent.reverse()
+        return recent
     
     def get_changes_by_date_range(self, start_date, end_date):
         """Get all changes within a date range"""
-        audit_log = self.load_audit_log()
+        entries = []
+        for segment in self.segments_for_range(start_date, end_date):
+            segment.ensure_index()
+            
+            # Snapshot the tables: the persistence worker may be indexing new entries
+            locations = []
+            with segment.lock:
+                for (entry_date, shift_time), entry_ids in segment.shift_entries.items():
+                    if entry_date and start_date <= entry_date <= end_date:
+                        locations.extend(segment.entry_offsets[i] for i in entry_ids)
+            
+            # Offsets follow log order, which keeps the result chronological
+            locations.sort()
+            entries.extend(segment.read_entries_at(locations))
+        return entries
+    
+    def query(self, start_date=None, end_date=None, change_types=None, user=None, shift_time=None, text=None):
+        """
+        Find entries matching the filters using the segment indexes
+        
+        Date, change type, user and shift filters are evaluated on index
+        records, and text through the token index (see search()).
+        
+        Returns:
+            AuditQuery with matches newest first
+        """
+        parts = []
+        for segment in self.select_segments(start_date, end_date):
+            segment.ensure_index()
+            rows = segment.rows
+            
+            if start_date:
+                rows = [r for r in rows if (r[3] or "") >= start_date]
+            if end_date:
+                rows = [r for r in rows if (r[3] or "") <= end_date]
+            if shift_time:
+                rows = [r for r in rows if r[4] == shift_time]
+            if change_types:
+                rows = [r for r in rows if r[5] in change_types]
+            if user:
+                rows = [r for r in rows if r[6] == user]
+            if text and rows:
+                offsets = self.search_segment(segment, text)
+                rows = [r for r in rows if r[1] in offsets]
+            
+            if rows:
+                parts.append((segment, rows))
+        
+        return AuditQuery(parts)
+    
+    def search(self, text, start_date=None, end_date=None, change_types=None, user=None, shift_time=None):
+        """
+        Find entries containing every word of text, e.g. a worker name or
+        "25-0412 128-001" for a lot on a line
         
-        filtered = []
-        for entry in audit_log:
-            entry_date = entry['allocation_date']
-            if start_date <= entry_date <= end_date:
-                filtered.append(entry)
+        The last word also matches as a prefix, so partial input finds results.
         
-        return filtered
+        Returns:
+            AuditQuery with matches newest first
+        """
+        return self.query(start_date, end_date, change_types, user, shift_time, text)
+    
+    def search_segment(self, segment, text):
+        """Offsets of the entries in a segment that match search text"""
+        tokens = tokenize(text)
+        if not tokens:
+            # Punctuation-only input has no tokens; fall back to matching raw lines
+            return segment.find_text(text)
+        return segment.tokens.search(tokens, prefix_last=True)
+    
+    def get_users(self):
+        """Users that appear in the trail"""
+        self.wait_for_writes()
+        users = set()
+        for segment in self.segments.values():
+            segment.ensure_index()
+            users.update(r[6] for r in segment.rows if r[6])
+        return sorted(users)
+    
+    def count_entries(self):
+        """Total number of entries, from the manifest"""
+        self.wait_for_writes()
+        return sum(segment.info.get('entries', 0) for segment in self.segments.values())
     
-    def export_audit_report(self, output_file=None):
-        """Export audit trail to a readable text file"""
+    def export_audit_report(self, output_file=None, fmt='text', start_date=None, end_date=None,
+                            change_types=None, user=None, shift_time=None, progress_callback=None):
+        """
+        Export the audit trail as a report, streaming entries one at a time
+        
+        Args:
+            output_file: Report path (default: timestamped file next to the trail)
+            fmt: 'text', 'csv' or 'jsonl'
+            start_date, end_date: Allocation date range (YYYY-MM-DD)
+            change_types: Collection of change types to include
+            user: Only entries made by this user
+            shift_time: Only entries for this shift
+            progress_callback: Called as (scanned, total) while exporting;
+                returning False cancels the export
+        
+        Returns:
+            Path of the written report, or None if cancelled
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Unknown report format: {fmt}")
+        
         if output_file is None:
             output_file = os.path.join(
-                os.path.dirname(self.history_file),
-                f"audit_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.txt"
+                self.base_path,
+                f"audit_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{EXPORT_FORMATS[fmt]}"
             )
         
-        audit_log = self.load_audit_log()
+        filters = (start_date, end_date, change_types, user, shift_time)
+        segments = self.select_segments(start_date, end_date)
+        total = sum(segment.info.get('entries', 0) for segment in segments)
+        scanned = 0
+        written = 0
+        cancelled = False
         
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write("=" * 80 + "\n")
-            f.write("ALLOCATION SYSTEM AUDIT TRAIL REPORT\n")
-            f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-            f.write(f"Total Entries: {len(audit_log)}\n")
-            f.write("=" * 80 + "\n\n")
-            
-            for entry in audit_log:
-                f.write(f"Entry ID: {entry['id']}\n")
-                f.write(f"Timestamp: {entry['timestamp']}\n")
-                f.write(f"Change Type: {entry['change_type']}\n")
-                f.write(f"Allocation: {entry['allocation_date']} - {entry['shift_time']}\n")
-                f.write(f"User: {entry['user']}\n")
-                f.write(f"Details:\n")
+        # Written under a temporary name so a cancelled or failed export leaves nothing behind
+        temp_file = output_file + ".tmp"
+        try:
+            with open(temp_file, 'w', encoding='utf-8', newline='') as f:
+                csv_writer = None
+                if fmt == 'csv':
+                    csv_writer = csv.writer(f)
+                    csv_writer.writerow(CSV_COLUMNS)
+                elif fmt == 'text':
+                    self.write_report_header(f, filters)
                 
-                for key, value in entry['details'].items():
-                    f.write(f"  {key}: {value}\n")
+                for segment in segments:
+                    for entry in segment.iter_entries():
+                        scanned += 1
+                        if self.matches(entry, *filters):
+                            self.write_report_entry(f, fmt, entry, csv_writer)
+                            written += 1
+                        
+                        if progress_callback and scanned % PROGRESS_INTERVAL == 0:
+                            if progress_callback(scanned, total) is False:
+                                cancelled = True
+                                break
+                    if cancelled:
+                        break
                 
-                f.write("-" * 80 + "\n\n")
+                if fmt == 'text' and not cancelled:
+                    # Matching entries are only known once the stream is done
+                    f.write("=" * 80 + "\n")
+                    f.write(f"Total Entries: {written}\n")
+            
+            if cancelled:
+                os.remove(temp_file)
+                return None
+            
+            os.replace(temp_file, output_file)
+        except Exception:
+            if os.path.exists(temp_file):
+                os.remove(temp_file)
+            raise
+        
+        if progress_callback:
+            progress_callback(total, total)
         
         return output_file
+    
+    def write_report_header(self, f, filters):
+        """Write the text report header"""
+        start_date, end_date, change_types, user, shift_time = filters
+        
+        f.write("=" * 80 + "\n")
+        f.write("ALLOCATION SYSTEM AUDIT TRAIL REPORT\n")
+        f.write(f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        if start_date or end_date:
+            f.write(f"Allocation Dates: {start_date or 'start'} to {end_date or 'today'}\n")
+        if change_types:
+            f.write(f"Change Types: {', '.join(sorted(change_types))}\n")
+        if user:
+            f.write(f"User: {user}\n")
+        if shift_time:
+            f.write(f"Shift: {shift_time}\n")
+        f.write("=" * 80 + "\n\n")
+    
+    def write_report_entry(self, f, fmt, entry, csv_writer=None):
+        """Write one entry in the given report format"""
+        details = entry.get('details', {})
+        
+        if fmt == 'jsonl':
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            return
+        
+        if fmt == 'csv':
+            row = [entry.get(column, '') for column in CSV_COLUMNS[:-1]]
+            csv_writer.writerow(row + [json.dumps(details, ensure_ascii=False)])
+            return
+        
+        f.write(f"Entry ID: {entry['id']}\n")
+        f.write(f"Timestamp: {entry['timestamp']}\n")
+        f.write(f"Change Type: {entry['change_type']}\n")
+        f.write(f"Allocation: {entry['allocation_date']} - {entry['shift_time']}\n")
+        f.write(f"User: {entry['user']}\n")
+        f.write(f"Details:\n")
+        
+        if isinstance(details, dict):
+            for key, value in details.items():
+                f.write(f"  {key}: {value}\n")
+        else:
+            f.write(f"  {details}\n")
+        
+        f.write("-" * 80 + "\n\n")
 
 
 # Global instance
-audit_trail = AuditTrail()
\ No newline at end of file
+audit_trail = AuditTrail()
@@ -0,0 +1,250 @@
+"""
+Double-booking and rest-period checks for worker allocations
+
+A worker must not be placed in both shifts of a date (e.g. a General Shift
+worker added again as overtime) or on two tasks of one shift, and needs
+MIN_REST_HOURS between the end of one shift and the start of the next
+(an Evening followed by the next Morning leaves only 8 hours).
+
+Saved shifts are looked up in the per-date occupancy of the allocation
+index, so checking a shift costs a few dictionary lookups per worker:
+    
+    conflicts = allocation_conflicts(allocation_data)     # before a save
+    conflicts = audit_conflicts("2025-01-01")             # every saved shift
+    
+    python conflict_check.py --from 2025-01-01 --csv conflicts.csv
+"""
+import argparse
+import csv
+from datetime import datetime, timedelta
+
+# Shift start and end, in hours from midnight (see DateShiftScreen)
+SHIFT_HOURS = {
+    'Morning': (6, 14),
+    'Evening': (14, 22)
+}
+
+# Minimum hours off between two shifts on different dates
+MIN_REST_HOURS = 10
+
+DOUBLE_BOOKING = 'double_booking'
+REST_PERIOD = 'rest_period'
+
+
+class AllocationConflictError(Exception):
+    """Raised by save_allocation_json when the allocation books a worker twice or breaks the rest period"""
+    
+    def __init__(self, conflicts):
+        super().__init__(format_conflicts(conflicts))
+        self.conflicts = conflicts
+
+
+def shift_start(date, shift):
+    """Start of a shift as a datetime"""
+    return datetime.strptime(date, "%Y-%m-%d") + timedelta(hours=SHIFT_HOURS[shift][0])
+
+
+def shift_end(date, shift):
+    """End of a shift as a datetime"""
+    return datetime.strptime(date, "%Y-%m-%d") + timedelta(hours=SHIFT_HOURS[shift][1])
+
+
+def neighbour_dates(date):
+    """The day before and the day after a date (YYYY-MM-DD)"""
+    day = datetime.strptime(date, "%Y-%m-%d")
+    return [(day + timedelta(days=offset)).strftime("%Y-%m-%d") for offset in (-1, 1)]
+
+
+def classify(worker, first, second):
+    """
+    Conflict between two placements of a worker, or None
+    
+    Args:
+        first, second: (date, shift, tasks) with `first` the earlier shift
+    """
+    (date_a, shift_a, tasks_a), (date_b, shift_b, tasks_b) = first, second
+    conflict = {
+        'worker': worker,
+        'date': date_a, 'shift': shift_a, 'tasks': list(tasks_a),
+        'other_date': date_b, 'other_shift': shift_b, 'other_tasks': list(tasks_b)
+    }
+    
+    if date_a == date_b:
+        conflict['type'] = DOUBLE_BOOKING
+        return conflict
+    
+    if shift_a not in SHIFT_HOURS or shift_b not in SHIFT_HOURS:
+        return None
+    rest = (shift_start(date_b, shift_b) - shift_end(date_a, shift_a)).total_seconds() / 3600
+    if rest < MIN_REST_HOURS:
+        conflict['type'] = REST_PERIOD
+        conflict['rest_hours'] = rest
+        return conflict
+    return None
+
+
+def shift_conflicts(date, shift, assignments, workers=None):
+    """
+    Conflicts of one shift against itself and the saved shifts around it
+    
+    Args:
+        date, shift: Shift being saved (its own saved version is ignored)
+        assignments: {worker: [tasks]} of the shift
+        workers: Only check these workers (default: everyone in assignments)
+    
+    Returns:
+        List of conflict dictionaries (see classify), earlier shift first
+    """
+    from allocation_index import allocation_index
+    
+    occupancy = {day: allocation_index.occupancy(day) for day in [date] + neighbour_dates(date)}
+    key = shift_start(date, shift) if shift in SHIFT_HOURS else None
+    
+    conflicts = []
+    for worker in (assignments if workers is None else workers):
+        tasks = assignments.get(worker, [])
+        if len(tasks) > 1:
+            conflicts.append(classify(worker, (date, shift, tasks[:1]), (date, shift, tasks[1:])))
+        
+        for day, day_occupancy in occupancy.items():
+            for other_shift, other_tasks in day_occupancy.get(worker, {}).items():
+                if day == date and other_shift == shift:
+                    continue
+                this = (date, shift, tasks)
+                other = (day, other_shift, other_tasks)
+                other_key = shift_start(day, other_shift) if other_shift in SHIFT_HOURS else None
+                earlier_first = key is not None and other_key is not None and other_key < key
+                conflict = classify(worker, other, this) if earlier_first else classify(worker, this, other)
+                if conflict is not None:
+                    conflicts.append(conflict)
+    
+    return conflicts
+
+
+def saved_shift_conflicts(date, shift, workers):
+    """Conflicts of workers about to join a shift with the saved shifts around it (for the swap/overtime dialogs)"""
+    if not date or not shift:
+        return []
+    return shift_conflicts(date, shift, {}, workers=workers)
+
+
+def assignments_from_allocations(allocations):
+    """{worker: [tasks]} from a {task: [workers]} mapping (ApplicationState.allocations)"""
+    assignments = {}
+    for task, workers in allocations.items():
+        for worker in workers:
+            assignments.setdefault(worker, []).append(task)
+    return assignments
+
+
+def allocation_conflicts(allocation_data):
+    """Conflicts of allocation data about to be saved (layout as built by save_allocation_json)"""
+    metadata = allocation_data.get('metadata', {})
+    date, shift = metadata.get('date'), metadata.get('shift_time')
+    if not date or not shift:
+        return []
+    
+    allocations = {
+        task['name']: [w['name'] for w in task.get('workers', [])]
+        for task in allocation_data.get('processes', []) + allocation_data.get('machines', [])
+    }
+    return shift_conflicts(date, shift, assignments_from_allocations(allocations))
+
+
+def audit_conflicts(start_date=None, end_date=None):
+    """
+    Every conflict between saved shifts, optionally between two dates
+    
+    Returns:
+        List of conflict dictionaries sorted by date and worker
+    """
+    from allocation_index import allocation_index
+    
+    conflicts = []
+    for date in allocation_index.occupied_dates():
+        if (start_date and date < start_date) or (end_date and date > end_date):
+            continue
+        next_day = neighbour_dates(date)[1]
+        next_occupancy = allocation_index.occupancy(next_day)
+        
+        for worker, shifts in allocation_index.occupancy(date).items():
+            placements = sorted(
+                ((date, shift, tasks) for shift, tasks in shifts.items()),
+                key=lambda item: SHIFT_HOURS.get(item[1], (24,))
+            )
+            for i, (_, shift, tasks) in enumerate(placements):
+                if len(tasks) > 1:
+                    conflicts.append(classify(worker, (date, shift, tasks[:1]), (date, shift, tasks[1:])))
+                for later in placements[i + 1:]:
+                    conflicts.append(classify(worker, placements[i], later))
+            
+            # Rest period into the next day (only the last shift of the day can be too close)
+            for shift, tasks in next_occupancy.get(worker, {}).items():
+                conflict = classify(worker, placements[-1], (next_day, shift, tasks))
+                if conflict is not None:
+                    conflicts.append(conflict)
+    
+    conflicts.sort(key=lambda c: (c['date'], c['worker'], c['other_date']))
+    return conflicts
+
+
+def describe_conflict(conflict):
+    """One-line description of a conflict"""
+    def placement(shift, tasks):
+        return f"{shift} ({', '.join(tasks)})" if tasks else shift
+    
+    first = placement(conflict['shift'], conflict['tasks'])
+    second = placement(conflict['other_shift'], conflict['other_tasks'])
+    
+    if conflict['type'] == DOUBLE_BOOKING:
+        if conflict['shift'] == conflict['other_shift']:
+            return f"{conflict['worker']}: two tasks in the {conflict['date']} {conflict['shift']} shift " \
+                   f"({', '.join(conflict['tasks'] + conflict['other_tasks'])})"
+        return f"{conflict['worker']}: {first} and {second} on {conflict['date']}"
+    
+    return f"{conflict['worker']}: only {conflict['rest_hours']:.0f}h rest between " \
+           f"{conflict['date']} {first} and {conflict['other_date']} {second}"
+
+
+def format_conflicts(conflicts, limit=10):
+    """Conflict descriptions for a message box (at most `limit` lines)"""
+    lines = [describe_conflict(conflict) for conflict in conflicts[:limit]]
+    if len(conflicts) > limit:
+        lines.append(f"... and {len(conflicts) - limit} more")
+    return "\n".join(lines)
+
+
+def write_csv(conflicts, output_file):
+    """Write conflicts as CSV, one row per conflict"""
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['type', 'worker', 'date', 'shift', 'tasks', 'other_date', 'other_shift', 'other_tasks', 'rest_hours'])
+        for c in conflicts:
+            writer.writerow([
+                c['type'], c['worker'],
+                c['date'], c['shift'], "; ".join(c['tasks']),
+                c['other_date'], c['other_shift'], "; ".join(c['other_tasks']),
+                f"{c['rest_hours']:.1f}" if 'rest_hours' in c else ""
+            ])
+
+
+def main(argv=None):
+    """Command line: audit every saved shift for conflicts"""
+    parser = argparse.ArgumentParser(description="Find double bookings and rest-period breaches in saved allocations")
+    parser.add_argument('--from', dest='start_date', help="first date to check (YYYY-MM-DD)")
+    parser.add_argument('--to', dest='end_date', help="last date to check (YYYY-MM-DD)")
+    parser.add_argument('--csv', help="also write the conflicts to this CSV file")
+    args = parser.parse_args(argv)
+    
+    conflicts = audit_conflicts(args.start_date, args.end_date)
+    for conflict in conflicts:
+        print(describe_conflict(conflict))
+    print(f"{len(conflicts)} conflicts found")
+    
+    if args.csv:
+        write_csv(conflicts, args.csv)
+        print(f"Written to {args.csv}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+"""
+Background export jobs for allocation PDFs
+
+Laying out the A3 report with reportlab used to run on the Tk main thread
+and froze the window until the PDF was written. The UI now takes a snapshot
+of the state (ResultsExporter.pdf_snapshot) and hands it to a runner:
+    
+    job = export_runner.submit(exporter.pdf_snapshot(shift_time))
+    ...                                   # Tk thread polls job with after()
+    if job.finished: ...                  # job.status, job.filename, job.error
+
+The snapshot is plain data, so the allocation can be edited while the report
+is built. Jobs run one at a time, in submission order. A job submitted for a
+file whose previous job has not started yet is coalesced into it: the queued
+job builds the newer snapshot, and every requester gets the one result.
+
+The layout runs on the runner thread. reportlab reports its progress per
+flowable, which is shown in the progress window and is also where a cancelled
+job stops. The PDF is written only once it is complete, so cancelling leaves
+the file on disk as it was.
+"""
+import collections
+import threading
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+
+class ExportCancelled(Exception):
+    """Raised on the runner thread to abandon a cancelled job"""
+
+
+class ExportJob:
+    """One PDF export; its fields are written by the runner and read by the UI"""
+    
+    def __init__(self, snapshot):
+        self.snapshot = snapshot
+        self.filename = snapshot['filename']
+        self.status = QUEUED
+        self.progress = 0  # percent
+        self.message = "Waiting for the previous export"
+        self.error = None
+        self.requests = 1  # exports coalesced into this job
+        self.cancel_event = threading.Event()
+    
+    @property
+    def finished(self):
+        """True once the job is done, failed or cancelled"""
+        return self.status in (DONE, FAILED, CANCELLED)
+    
+    def cancel(self):
+        """Ask the runner to drop this job (the UI polls status for the outcome)"""
+        self.cancel_event.set()
+    
+    def update(self, progress, message):
+        """Report progress (runner thread)"""
+        self.progress = progress
+        self.message = message
+
+
+class ExportRunner:
+    """Runs export jobs in order on one background thread"""
+    
+    def __init__(self):
+        self.lock = threading.Condition()
+        self.jobs = collections.deque()
+        self.queued = {}  # filename -> job not started yet (for coalescing)
+        self.stopping = False
+        self.thread = None
+    
+    def submit(self, snapshot):
+        """
+        Queue a PDF export of a snapshot
+        
+        Returns:
+            The ExportJob that will write snapshot['filename'] (an earlier,
+            not yet started job for the same file, if there is one)
+        """
+        with self.lock:
+            job = self.queued.get(snapshot['filename'])
+            if job is not None and not job.cancel_event.is_set():
+                job.snapshot = snapshot
+                job.requests += 1
+                return job
+            
+            job = ExportJob(snapshot)
+            self.queued[job.filename] = job
+            self.jobs.append(job)
+            self.stopping = False
+            self.lock.notify_all()
+            
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run, name="export-runner", daemon=True)
+                self.thread.start()
+        return job
+    
+    def run(self):
+        """Runner loop: take the next job and build it"""
+        while True:
+            with self.lock:
+                self.lock.wait_for(lambda: self.jobs or self.stopping)
+                if not self.jobs:
+                    return
+                job = self.jobs.popleft()
+                if self.queued.get(job.filename) is job:
+                    del self.queued[job.filename]
+            
+            self.run_job(job)
+    
+    def run_job(self, job):
+        """Build and write one PDF, reporting progress on the job"""
+        from export_results import build_pdf
+        from utils.file_lock import atomic_write
+        
+        def report_progress(fraction):
+            if job.cancel_event.is_set():
+                raise ExportCancelled()
+            job.update(10 + int(fraction * 80), "Laying out the report")
+        
+        try:
+            if job.cancel_event.is_set():
+                raise ExportCancelled()
+            job.status = RUNNING
+            job.update(10, "Laying out the report")
+            data = build_pdf(job.snapshot, progress=report_progress)
+            if job.cancel_event.is_set():
+                raise ExportCancelled()
+            
+            job.update(90, "Writing the PDF")
+            atomic_write(job.filename, data)
+        except ExportCancelled:
+            job.status = CANCELLED
+            job.update(0, "Export cancelled")
+            return
+        except Exception as e:
+            print(f"PDF export failed ({job.filename}): {e}")
+            job.error = e
+            job.status = FAILED
+            job.update(100, "Export failed")
+            return
+        
+        job.update(100, "Export complete")
+        job.status = DONE
+    
+    def stop(self, timeout=None):
+        """Cancel queued jobs, let a running one finish and stop the runner"""
+        with self.lock:
+            for job in self.jobs:
+                job.cancel()
+            self.stopping = True
+            self.lock.notify_all()
+            thread = self.thread
+        
+        if thread is not None and thread.is_alive():
+            thread.join(timeout)
+
+
+# Global instance
+export_runner = ExportRunner()
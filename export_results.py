@@ -4,15 +4,8 @@ Export allocation results to Excel
 import os
 from datetime import datetime
 
-import json
-
-from reportlab.lib.pagesizes import letter, A4 , A3
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib.enums import TA_CENTER, TA_LEFT
-from reportlab.platypus import Paragraph
+# reportlab is imported inside build_pdf and its helpers: it adds a noticeable delay to
+# startup and is only needed when a PDF is exported
 
 
 class ResultsExporter:
@@ -61,8 +54,15 @@ class ResultsExporter:
     
     
 
-    def save_allocation_json(self, shift_time):
-        """Save allocation data as JSON"""
+    def save_allocation_json(self, shift_time, allow_conflicts=False):
+        """
+        Save allocation data as JSON
+        
+        Raises:
+            StaleWriteError if another station saved the shift since it was loaded
+            AllocationConflictError if a worker is double-booked or short of rest
+            (unless allow_conflicts, after the user confirmed)
+        """
         
         filename = self.generate_json_filename(shift_time)
         
@@ -144,29 +144,17 @@ class ResultsExporter:
         
         print(f"DEBUG: Saving {len(allocation_data['processes'])} processes and {len(allocation_data['machines'])} machines")
         
-        # Save to file
-        with open(filename, 'w', encoding='utf-8') as f:
-            json.dump(allocation_data, f, indent=4, ensure_ascii=False)
-
-        # Log to audit trail
-        from audit_trail import audit_trail
-        audit_trail.log_edit(
-            change_type='ALLOCATION_CREATED',
-            allocation_date=self.state.selected_date or datetime.now().strftime("%Y-%m-%d"),
-            shift_time=shift_time,
-            details={
-                'processes_allocated': len(allocation_data['processes']),
-                'machines_allocated': len(allocation_data['machines']),
-                'total_workers_assigned': allocation_data['metadata'].get('total_workers', 0),
-                'unassigned_workers': len(allocation_data['unassigned_workers']),
-                'group': self.state.shift_group
-            }
-        )
+        # Conflict and revision checks, the write and the audit entry (the service runs the same path)
+        filename = store_allocation(filename, allocation_data, self.state.get_loaded_version(filename), allow_conflicts)
+        
+        # The next save of this shift starts from this version
+        self.state.loaded_filepath = filename
+        self.state.loaded_allocation = allocation_data
         
         print(f"Allocation saved to: {filename}")
         print("="*60 + "\n")
         return filename
-
+    
     def generate_json_filename(self, shift_time):
         """Generate JSON filename with date and shift time"""
         import sys
@@ -194,218 +182,338 @@ class ResultsExporter:
         # Use data_path to get the correct path
         return data_path(os.path.join("allocations_json", filename))
     
+    def pdf_snapshot(self, shift_time):
+        """
+        Everything the PDF report shows, copied from the state (see build_pdf)
+        
+        Taken on the Tk thread when the export is requested, so the report can be
+        built in the background while the allocation is still being edited.
+        """
+        def task_rows(tasks):
+            rows = []
+            for task_data in tasks:
+                task_name = task_data[0]
+                if task_name in self.state.allocations:
+                    workers = self.state.allocations[task_name]
+                    rows.append([
+                        task_name,
+                        self.state.get_product_for_allocation(task_name) or "N/A",
+                        self.state.get_lot_number_for_allocation(task_name) or "N/A",
+                        [self.state.get_worker_display_name(w) for w in workers]
+                    ])
+            return rows
+        
+        return {
+            'filename': self.generate_filename(shift_time, "pdf"),
+            'date': self.state.selected_date,
+            'shift_time': self.state.shift_time,
+            'shift_group': self.state.shift_group,
+            'processes': task_rows(self.state.PROCESSES),
+            'machines': task_rows(self.state.compression_machines),
+            'unassigned': [self.state.get_worker_display_name(w) for w in sorted(self.state.available_workers)]
+        }
+    
     def export_to_pdf(self, shift_time):
-        """Export results to PDF"""
-        filename = self.generate_filename(shift_time, "pdf")
-        
-        # Create PDF document
-        doc = SimpleDocTemplate(
-            filename,
-            pagesize=A3,
-            rightMargin=0.5*inch,
-            leftMargin=0.5*inch,
-            topMargin=0.5*inch,
-            bottomMargin=0.5*inch
-        )
-        
-        # Container for PDF elements
-        story = []
+        """Export results to PDF (on the calling thread; the UI uses export_jobs)"""
+        from utils.file_lock import atomic_write
         
-        # Get styles
-        styles = getSampleStyleSheet()
-        
-        # Create custom styles
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading2'],
-            fontSize=18,
-            textColor=colors.HexColor('#2c3e50'),
-            spaceAfter=2,
-            alignment=TA_CENTER
-        )
-        
-        heading_style = ParagraphStyle(
-            'CustomHeading',
-            parent=styles['Heading3'],
-            fontSize=12,
-            textColor=colors.HexColor('#2c3e50'),
-            spaceAfter=3,
-            spaceBefore=3
-        )
-            
-        # Add report info - use selected date
-        if self.state.selected_date:
-            date_str = datetime.strptime(self.state.selected_date, "%Y-%m-%d").strftime("%B %d, %Y")
-        else:
-            date_str = datetime.now().strftime("%B %d, %Y")
+        snapshot = self.pdf_snapshot(shift_time)
+        atomic_write(snapshot['filename'], build_pdf(snapshot))
+        return snapshot['filename']
 
-        # Combine title and info on same line
-        combined_text = f"<b>Worker Allocation Report | Date: {date_str} | Shift: {self.state.shift_time} | Group: {self.state.shift_group}</b>"
 
-        story.append(Paragraph(combined_text, title_style))
-        story.append(Spacer(1, 0.15*inch))
-        
-        # Add Production Processes section
-        self._add_processes_to_pdf(story, heading_style, styles)
-        
-        # Add Compression Machines section
-        self._add_machines_to_pdf(story, heading_style, styles)
-        
-        # Add Unassigned Workers section
-        self._add_unassigned_to_pdf(story, heading_style, styles)
-        
-        # Build PDF
-        doc.build(story)
+def store_allocation(filename, allocation_data, base, allow_conflicts=False):
+    """
+    Save allocation data over the version it was edited from
+    
+    The one save path: revision and conflict checks, the compare-and-write,
+    catalog, index, change log and the audit entry. With the allocation
+    service configured it runs in the service (see allocation_service.save_allocation).
+    
+    Args:
+        base: Allocation data the edit started from (None for a new shift)
+        allow_conflicts: Save even if a worker is double-booked or short of rest
+    
+    Returns:
+        Path of the saved file
+    
+    Raises:
+        StaleWriteError (with .base, .current and .ours) if the shift was saved since base
+        AllocationConflictError unless allow_conflicts
+    """
+    from allocation_catalog import allocation_catalog
+    from allocation_diff import snapshot_from_allocation, build_audit_details
+    from allocation_format import get_revision
+    from allocation_index import allocation_index
+    from repository import repository
+    from utils.file_lock import StaleWriteError
+    
+    metadata = allocation_data['metadata']
+    allocation_date, shift_time = metadata['date'], metadata['shift_time']
+    
+    if repository.remote:
+        try:
+            repository.store_allocation(filename, allocation_data, get_revision(base), allow_conflicts)
+        except StaleWriteError:
+            raise stale_write_error(filename, base, repository.load_allocation(allocation_date, shift_time), allocation_data)
+        metadata['revision'] = (get_revision(base) or 0) + 1
+        allocation_catalog.update(filename, allocation_data)
+        allocation_index.update(filename, allocation_data)
         return filename
     
-    def _add_processes_to_pdf(self, story, heading_style, styles):
-        """Add production processes section to PDF"""
-        # Check if any processes are allocated
-        if not any(process_data[0] in self.state.allocations for process_data in self.state.PROCESSES):
-            return
-        
-        # Section heading
-        story.append(Paragraph("Production Processes", heading_style))
-        story.append(Spacer(1, 0.05*inch))
-        
-        # Table data
-        data = [['Process', 'Product', 'Lot Number', 'Workers', 'Count']]
-        
-        # Add rows
-        for process_data in self.state.PROCESSES:
-            process_name = process_data[0]
-            if process_name in self.state.allocations:
-                workers = self.state.allocations[process_name]
-                product = self.state.get_product_for_allocation(process_name) or "N/A"
-                lot_number = self.state.get_lot_number_for_allocation(process_name) or "N/A"
-                worker_names = ", ".join([self.state.get_worker_display_name(w) for w in workers])
-                
-                # Create wrapped Paragraphs for long text
-                data.append([
-                    Paragraph(process_name, styles['Normal']),
-                    Paragraph(product, styles['Normal']),
-                    Paragraph(lot_number, styles['Normal']),
-                    Paragraph(worker_names, styles['Normal']),
-                    Paragraph(str(len(workers)), styles['Normal'])
-                ])
-        
-        # Create table
-        table = Table(data, colWidths=[2.5*inch, 3.5*inch, 1*inch, 3.5*inch, 0.6*inch])
-        
-        # Style the table
-        table.setStyle(TableStyle([
-            # Header row styling
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#9b59b6')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            
-            # Data rows styling
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
-            ('ALIGN', (3, 1), (3, -1), 'CENTER'),  # Count column centered
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-            
-            # Grid
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
-        
-        story.append(table)
-        story.append(Spacer(1, 0.05*inch))
+    # Version on disk; it must be the one this edit started from
+    current = load_current_version(filename)
+    if current is not None and get_revision(current) != get_revision(base):
+        raise stale_write_error(filename, base, current, allocation_data)
+    metadata['revision'] = (get_revision(current) or 0) + 1
+    
+    if not allow_conflicts:
+        from conflict_check import allocation_conflicts, AllocationConflictError
+        conflicts = allocation_conflicts(allocation_data)
+        if conflicts:
+            raise AllocationConflictError(conflicts)
+    
+    # Previous version, to log what this save changes
+    before = snapshot_from_allocation(current) if current is not None else None
+    
+    # Compare-and-write under the file's lock before anything records the save:
+    # another station may have saved the shift since the check above
+    try:
+        repository.save_allocation(filename, allocation_data)
+    except StaleWriteError:
+        raise stale_write_error(filename, base, load_current_version(filename), allocation_data)
+    
+    allocation_catalog.update(filename, allocation_data)
+    allocation_index.update(filename, allocation_data)
+    
+    # Offline stations pick the save up from the change log (see station_sync)
+    from station_sync import change_log
+    change_log.record_allocation(allocation_data)
+    
+    # Log the structured change to audit trail
+    from audit_trail import audit_trail
+    details = build_audit_details(
+        before,
+        snapshot_from_allocation(allocation_data),
+        audit_trail.get_allocation_audit_log(allocation_date, shift_time)
+    )
+    
+    if details['delta'] or 'snapshot' in details:
+        audit_trail.log_edit(
+            change_type='ALLOCATION_CREATED' if before is None else 'ALLOCATION_EDITED',
+            allocation_date=allocation_date,
+            shift_time=shift_time,
+            details=details
+        )
+    else:
+        print("Allocation saved without changes - nothing to log")
+    return filename
 
-    def _add_machines_to_pdf(self, story, heading_style, styles):
-        """Add compression machines section to PDF"""
-        # Check if any machines are allocated
-        if not any(machine_data[0] in self.state.allocations for machine_data in self.state.compression_machines):
-            return
-        
-        # Section heading
-        story.append(Paragraph("Compression Machines", heading_style))
-        story.append(Spacer(1, 0.05*inch))
-        
-        # Table data
-        data = [['Machine', 'Product', 'Lot Number', 'Workers', 'Count']]  # Changed 'Process' to 'Machine'
-        
-        # Add rows
-        for machine_data in self.state.compression_machines:
-            machine_name = machine_data[0]
-            if machine_name in self.state.allocations:
-                workers = self.state.allocations[machine_name]
-                product = self.state.get_product_for_allocation(machine_name) or "N/A"
-                lot_number = self.state.get_lot_number_for_allocation(machine_name) or "N/A"
-                worker_names = ", ".join([self.state.get_worker_display_name(w) for w in workers])
 
-                # Create wrapped Paragraphs for long text
-                data.append([
-                    Paragraph(machine_name, styles['Normal']),
-                    Paragraph(product, styles['Normal']),
-                    Paragraph(lot_number, styles['Normal']),
-                    Paragraph(worker_names, styles['Normal']),
-                    Paragraph(str(len(workers)), styles['Normal'])
-                ])
+def stale_write_error(filename, base, current, allocation_data):
+    """StaleWriteError carrying the versions SaveAllocationPrompt offers to merge or reload"""
+    from utils.file_lock import StaleWriteError
+    error = StaleWriteError(filename, base=base, current=current)
+    error.ours = allocation_data
+    return error
 
+
+def load_current_version(filename):
+    """Allocation data of a shift as on disk or archived (None if it was never saved)"""
+    from allocation_archive import allocation_archive
+    if not allocation_archive.exists(filename):
+        return None
+    try:
+        return allocation_archive.load(filename)
+    except Exception as e:
+        print(f"Error reading allocation for diff: {e}")
+        return None
+
+
+def build_pdf(snapshot, progress=None):
+    """
+    Lay out the allocation report of a snapshot (see ResultsExporter.pdf_snapshot)
+    
+    Uses neither the state nor Tk, so it can run on a worker thread.
+    
+    Args:
+        progress: Called as progress(fraction done) while the document is laid out;
+            an exception it raises stops the build
+    
+    Returns:
+        The PDF document as bytes
+    """
+    import io
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.lib.pagesizes import A3
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+    
+    output = io.BytesIO()
+    
+    # Create PDF document
+    doc = SimpleDocTemplate(
+        output,
+        pagesize=A3,
+        rightMargin=0.5*inch,
+        leftMargin=0.5*inch,
+        topMargin=0.5*inch,
+        bottomMargin=0.5*inch
+    )
+    
+    # Container for PDF elements
+    story = []
+    
+    # Get styles
+    styles = getSampleStyleSheet()
+    
+    # Create custom styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading2'],
+        fontSize=18,
+        textColor=colors.HexColor('#2c3e50'),
+        spaceAfter=2,
+        alignment=TA_CENTER
+    )
+    
+    heading_style = ParagraphStyle(
+        'CustomHeading',
+        parent=styles['Heading3'],
+        fontSize=12,
+        textColor=colors.HexColor('#2c3e50'),
+        spaceAfter=3,
+        spaceBefore=3
+    )
+    
+    # Add report info - use selected date
+    if snapshot['date']:
+        date_str = datetime.strptime(snapshot['date'], "%Y-%m-%d").strftime("%B %d, %Y")
+    else:
+        date_str = datetime.now().strftime("%B %d, %Y")
+    
+    # Combine title and info on same line
+    combined_text = f"<b>Worker Allocation Report | Date: {date_str} | Shift: {snapshot['shift_time']} | Group: {snapshot['shift_group']}</b>"
+    
+    story.append(Paragraph(combined_text, title_style))
+    story.append(Spacer(1, 0.15*inch))
+    
+    # Add Production Processes section
+    add_task_table_to_pdf(
+        story, heading_style, styles, "Production Processes", 'Process', snapshot['processes'],
+        header_font_size=9, centered_column=3, space_after=0.05
+    )
+    
+    # Add Compression Machines section (purple header, count column centered)
+    add_task_table_to_pdf(
+        story, heading_style, styles, "Compression Machines", 'Machine', snapshot['machines'],
+        header_font_size=11, centered_column=4, space_after=0.1
+    )
+    
+    # Add Unassigned Workers section
+    add_unassigned_to_pdf(story, heading_style, styles, snapshot['unassigned'])
+    
+    if progress is not None:
+        estimate = {}
         
-        # Create table
-        table = Table(data, colWidths=[2.5*inch, 3.5*inch, 1*inch, 3.5*inch, 0.6*inch])
-        
-        # Style the table (purple header for machines)
-        table.setStyle(TableStyle([
-            # Header row styling
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#9b59b6')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            
-            # Data rows styling
-            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-            ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-            ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
-            ('ALIGN', (4, 1), (4, -1), 'CENTER'),  # Count column centered (changed from 3 to 4)
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('TOPPADDING', (0, 1), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-            
-            # Grid
-            ('GRID', (0, 0), (-1, -1), 1, colors.grey),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+        def on_progress(kind, value):
+            if kind == 'SIZE_EST':
+                estimate['total'] = value
+            elif kind == 'PROGRESS' and estimate.get('total'):
+                progress(min(1.0, value / estimate['total']))
         
-        story.append(table)
-        story.append(Spacer(1, 0.1*inch))
+        doc.setProgressCallBack(on_progress)
+    
+    # Build PDF
+    doc.build(story)
+    return output.getvalue()
 
-    def _add_unassigned_to_pdf(self, story, heading_style, styles):
-            """Add unassigned workers section to PDF"""
-            if not self.state.available_workers:
-                return
-            
-            # Section heading
-            story.append(Paragraph("Unassigned Workers", heading_style))
-            story.append(Spacer(1, 0.05*inch))
-            
-            # Get unassigned workers
-            unassigned = ", ".join([
-                self.state.get_worker_display_name(w) 
-                for w in sorted(self.state.available_workers)
-            ])
-            
-            # Create a styled paragraph
-            unassigned_style = ParagraphStyle(
-                'Unassigned',
-                parent=styles['Normal'],
-                fontSize=10,
-                textColor=colors.HexColor("#c0c059"),
-                leftIndent=20,
-                rightIndent=20
-            )
-            
-            story.append(Paragraph(unassigned, unassigned_style))
\ No newline at end of file
+
+def add_task_table_to_pdf(story, heading_style, styles, title, task_header, rows,
+                          header_font_size, centered_column, space_after):
+    """Add a section with one table row per allocated process or machine"""
+    from reportlab.lib import colors
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Table, TableStyle, Paragraph, Spacer
+    
+    # Check if any tasks are allocated
+    if not rows:
+        return
+    
+    # Section heading
+    story.append(Paragraph(title, heading_style))
+    story.append(Spacer(1, 0.05*inch))
+    
+    # Table data
+    data = [[task_header, 'Product', 'Lot Number', 'Workers', 'Count']]
+    
+    # Add rows
+    for task_name, product, lot_number, worker_names in rows:
+        # Create wrapped Paragraphs for long text
+        data.append([
+            Paragraph(task_name, styles['Normal']),
+            Paragraph(product, styles['Normal']),
+            Paragraph(lot_number, styles['Normal']),
+            Paragraph(", ".join(worker_names), styles['Normal']),
+            Paragraph(str(len(worker_names)), styles['Normal'])
+        ])
+    
+    # Create table
+    table = Table(data, colWidths=[2.5*inch, 3.5*inch, 1*inch, 3.5*inch, 0.6*inch])
+    
+    # Style the table
+    table.setStyle(TableStyle([
+        # Header row styling
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#9b59b6')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), header_font_size),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        
+        # Data rows styling
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
+        ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
+        ('ALIGN', (centered_column, 1), (centered_column, -1), 'CENTER'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 9),
+        ('TOPPADDING', (0, 1), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+        
+        # Grid
+        ('GRID', (0, 0), (-1, -1), 1, colors.grey),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]))
+    
+    story.append(table)
+    story.append(Spacer(1, space_after*inch))
+
+
+def add_unassigned_to_pdf(story, heading_style, styles, unassigned_names):
+    """Add unassigned workers section to PDF"""
+    from reportlab.lib import colors
+    from reportlab.lib.styles import ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Paragraph, Spacer
+    
+    if not unassigned_names:
+        return
+    
+    # Section heading
+    story.append(Paragraph("Unassigned Workers", heading_style))
+    story.append(Spacer(1, 0.05*inch))
+    
+    # Create a styled paragraph
+    unassigned_style = ParagraphStyle(
+        'Unassigned',
+        parent=styles['Normal'],
+        fontSize=10,
+        textColor=colors.HexColor("#c0c059"),
+        leftIndent=20,
+        rightIndent=20
+    )
+    
+    story.append(Paragraph(", ".join(unassigned_names), unassigned_style))
@@ -1,15 +1,59 @@
 """
 Main entry point for the Worker Allocation System
+
+With STARTUP_PROFILE set the app prints the time to its first drawn window
+and exits (used by startup_budget.py).
 """
+import time
+STARTED = time.perf_counter()  # before the app's own imports
+
+import os
 import tkinter as tk
 from ui.main_window import WorkerAllocationSystem
+from persistence_worker import persistence_worker
+
+
+def report_first_window(root):
+    """Print the milliseconds from start to the first drawn window and close it"""
+    root.update()
+    print(f"first_window_ms {(time.perf_counter() - STARTED) * 1000:.1f}", flush=True)
+    root.destroy()
+
+
+def attach_stores():
+    """Start following history and audit changes (once the window is up; nothing changes before)"""
+    # Keep the SQLite store (if migrated) in step with history and audit changes
+    from repository import repository
+    repository.attach()
+    
+    # Log history and audit changes for offline sync between stations
+    from station_sync import change_log
+    change_log.attach()
 
 
 def main():
     """Initialize and run the application"""
+    # Migrate a legacy audit log and compress closed months before anything reads the trail
+    from audit_trail import audit_trail
+    audit_trail.open()
+    
     root = tk.Tk()
+    
     app = WorkerAllocationSystem(root)
+    if os.environ.get("STARTUP_PROFILE"):
+        root.after_idle(report_first_window, root)
+    root.after_idle(attach_stores)
     root.mainloop()
+    
+    # Exit buttons destroy the window directly; finish a PDF being written
+    # (queued ones are dropped) and write anything still queued
+    from export_jobs import export_runner
+    export_runner.stop(30)
+    persistence_worker.stop()
+    
+    # Log the changes just written for the next sync
+    from station_sync import change_log
+    change_log.stop(30)
 
 
 if __name__ == "__main__":
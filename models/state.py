@@ -1,6 +1,7 @@
 """
 Application state management
 """
+import os
 from data import GROUPS, PROCESSES, COMPRESSION_MACHINES, PRODUCTS
 from audit_trail import audit_trail
 
@@ -28,6 +29,7 @@ class ApplicationState:
         # Product selection per allocation
         self.allocation_products = {}  # Maps task_name -> product_name
         self.lot_numbers = {}  # Store lot numbers for each allocation
+        self.allocation_lot_numbers = self.lot_numbers  # Same dict; used by history editing
         
         # Process allocation state
         self.current_process = None
@@ -40,6 +42,10 @@ class ApplicationState:
         self.compression_widgets = {}
 
         self.audit_trail = audit_trail
+        
+        # Allocation file last loaded or saved, for stale-write checks
+        self.loaded_filepath = None
+        self.loaded_allocation = None
     
     def select_group(self, group):
         """Select shift group"""
@@ -126,6 +132,13 @@ class ApplicationState:
         self.allocation_products = {}
         self.lot_numbers = {}
     
+    def get_loaded_version(self, filepath):
+        """Allocation data a save of filepath started from (None for a new shift)"""
+        if self.loaded_filepath is None or self.loaded_allocation is None:
+            return None
+        same = os.path.normcase(os.path.abspath(self.loaded_filepath)) == os.path.normcase(os.path.abspath(filepath))
+        return self.loaded_allocation if same else None
+    
     def get_worker_display_name(self, worker):
         """Get display name with markers for overtime/temp workers"""
         if worker in self.overtime_workers:
@@ -145,22 +158,42 @@ class ApplicationState:
         self.temp_workers = []
         self.allocations = {}
         self.allocation_products = {}
+        self.lot_numbers = {}
+        self.allocation_lot_numbers = self.lot_numbers
         self.current_process = None
         self.process_listboxes = []
         self.current_machine = None
         self.compression_vars = {}
         self.confirmed_workers = []
         self.compression_widgets = {}
+        self.loaded_filepath = None
+        self.loaded_allocation = None
 
 
-    def load_allocation_from_json(self, filepath):
-        """Load allocation data from JSON file"""
+    def load_allocation_from_json(self, filepath, data=None):
+        """
+        Load allocation data from JSON file (any allocation_format version)
+        
+        Args:
+            data: Already parsed allocation data for the file (e.g. a merge)
+        """
         print(f"\nDEBUG: load_allocation_from_json called with: {filepath}")
-        import json
+        from allocation_catalog import parse_filename
+        from repository import repository
+        from shift_cache import shift_cache
         
         try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # Through the storage backend (the JSON files go through shift_cache,
+            # which waits for a queued save of the file)
+            if data is None:
+                parsed = parse_filename(os.path.basename(filepath))
+                data = repository.load_allocation(*parsed) if parsed else shift_cache.get(filepath)
+                if data is None:
+                    raise FileNotFoundError(filepath)
+            
+            # Version the next save of this shift must still find on disk
+            self.loaded_filepath = filepath
+            self.loaded_allocation = data
             
             # Load metadata
             metadata = data.get('metadata', {})
@@ -171,7 +204,8 @@ class ApplicationState:
             # Clear current state
             self.allocations = {}
             self.allocation_products = {}
-            self.allocation_lot_numbers = {}
+            self.lot_numbers = {}
+            self.allocation_lot_numbers = self.lot_numbers
             self.overtime_workers = []
             self.temp_workers = []
             self.available_workers = []
@@ -241,7 +275,7 @@ class ApplicationState:
             # Mark as loaded allocation
             self._is_loaded_allocation = True
             
-            print(f"DEBUG: Finished loading. Allocations: {self.allocations}")
+            print(f"DEBUG: Finished loading. Allocations: {len(self.allocations)}")
             print(f"DEBUG: Available workers: {len(self.available_workers)}")
             
             return True
@@ -272,5 +306,10 @@ class ApplicationState:
         filename = f"Allocation_{date}_{shift_time}.json"
         filepath = data_path(os.path.join("allocations_json", filename))
         
-        return os.path.exists(filepath), filepath
+        from persistence_worker import persistence_worker, file_key
+        persistence_worker.wait_for(file_key(filepath))
+        
+        # Old shifts may only exist in their monthly archive pack
+        from allocation_archive import allocation_archive
+        return allocation_archive.exists(filepath), filepath
     
@@ -0,0 +1,213 @@
+"""
+Background writer for audit, history and allocation file persistence
+
+File I/O on a slow (network) drive used to run on the Tk main thread and
+freeze the window. Callers now hand writes to a single worker thread and
+return immediately:
+    
+    persistence_worker.submit(audit_trail.append_entries, entry, key='audit')
+
+Jobs run in submission order. Consecutive queued jobs with the same key are
+handed to their handler together as one batch, and coalesced keys are queued
+at most once (e.g. "save the history file" only needs to run once for any
+number of changes). Readers that need a write to have landed call
+wait_for(key) first. Errors are collected for the UI to poll with after().
+"""
+import atexit
+import functools
+import os
+import queue
+import threading
+
+
+class PersistenceWorker:
+    """Single background thread that performs queued writes in order"""
+    
+    def __init__(self, max_queue=1000, batch_size=200):
+        """
+        Args:
+            max_queue: Queue bound; submit blocks when it is full
+            batch_size: Most jobs taken from the queue per batch
+        """
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        
+        self.lock = threading.Condition()
+        self.pending = {}  # key -> jobs queued or running
+        self.queued = {}  # key -> jobs not started yet (for coalescing)
+        self.latest = {}  # key -> most recent pending item (see pending_item)
+        self.coalesced = set()  # keys whose handler only needs the latest item
+        self.errors = []
+        
+        self.thread = None
+    
+    def start(self):
+        """Start the worker thread (done automatically on first submit)"""
+        with self.lock:
+            if self.thread is not None and self.thread.is_alive():
+                return
+            self.thread = threading.Thread(target=self.run, name="persistence-worker", daemon=True)
+            self.thread.start()
+    
+    def submit(self, handler, item=None, key=None, coalesce=False):
+        """
+        Queue a write
+        
+        Args:
+            handler: Called on the worker thread as handler([items]) with the
+                items of a batch of consecutive jobs sharing this key
+            item: Data for this write
+            key: Groups jobs for batching and for wait_for (default: the handler)
+            coalesce: Skip queuing if a job with this key has not started yet;
+                that job then runs with this (latest) item instead
+        """
+        if key is None:
+            key = handler
+        
+        with self.lock:
+            self.latest[key] = item
+            if coalesce:
+                self.coalesced.add(key)
+                if self.queued.get(key, 0) > 0:
+                    return
+            self.pending[key] = self.pending.get(key, 0) + 1
+            self.queued[key] = self.queued.get(key, 0) + 1
+        
+        self.start()
+        self.jobs.put((key, handler, item))
+    
+    def write_file(self, path, text, check=None):
+        """
+        Queue writing text to a file; only the latest pending text is written
+        
+        Args:
+            check: Called as check(path, text) under the file's lock before
+                writing (see utils.file_lock.locked_write)
+        """
+        self.submit(functools.partial(write_text_file, path, check=check), text, key=file_key(path), coalesce=True)
+    
+    def run(self):
+        """Worker loop: take a batch, group it by key and run the handlers"""
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                return
+            
+            batch = [job]
+            while len(batch) < self.batch_size:
+                try:
+                    job = self.jobs.get_nowait()
+                except queue.Empty:
+                    break
+                if job is None:
+                    # Stop after this batch
+                    self.jobs.put(None)
+                    self.jobs.task_done()
+                    break
+                batch.append(job)
+            
+            # Runs of consecutive jobs with the same key keep their relative order
+            runs = []
+            for key, handler, item in batch:
+                if runs and runs[-1][0] == key:
+                    runs[-1][2].append(item)
+                else:
+                    runs.append((key, handler, [item]))
+            
+            for key, handler, items in runs:
+                with self.lock:
+                    # Jobs submitted from now on are not covered by this run
+                    self.queued[key] -= len(items)
+                    if self.queued[key] <= 0:
+                        del self.queued[key]
+                    if key in self.coalesced:
+                        items = items[:-1] + [self.latest.get(key)]
+                try:
+                    handler(items)
+                except Exception as e:
+                    print(f"Background save failed ({self.describe(key)}): {e}")
+                    with self.lock:
+                        self.errors.append((self.describe(key), e))
+                finally:
+                    with self.lock:
+                        self.pending[key] -= len(items)
+                        if self.pending[key] <= 0:
+                            del self.pending[key]
+                            self.latest.pop(key, None)
+                        self.lock.notify_all()
+            
+            for _ in batch:
+                self.jobs.task_done()
+    
+    def describe(self, key):
+        """Readable name of a job key for error messages"""
+        if callable(key):
+            return getattr(key, '__qualname__', repr(key))
+        return str(key)
+    
+    def pending_item(self, key, default=None):
+        """Most recent item submitted for a key that has not been written yet"""
+        with self.lock:
+            return self.latest.get(key, default)
+    
+    def wait_for(self, key, timeout=None):
+        """
+        Block until every queued job with this key has run
+        
+        Returns immediately on the worker thread itself, where waiting would deadlock.
+        
+        Returns:
+            True if nothing with the key is pending any more
+        """
+        if threading.current_thread() is self.thread:
+            return True
+        with self.lock:
+            return self.lock.wait_for(lambda: key not in self.pending, timeout)
+    
+    def flush(self, timeout=None):
+        """Block until every queued job has run"""
+        if threading.current_thread() is self.thread:
+            return True
+        with self.lock:
+            return self.lock.wait_for(lambda: not self.pending, timeout)
+    
+    def stop(self, timeout=None):
+        """Flush and stop the worker thread"""
+        self.flush(timeout)
+        with self.lock:
+            thread = self.thread
+        if thread is not None and thread.is_alive():
+            self.jobs.put(None)
+            thread.join(timeout)
+    
+    def take_errors(self):
+        """Get and clear the errors collected since the last call"""
+        with self.lock:
+            errors = self.errors
+            self.errors = []
+        return errors
+
+
+def file_key(path):
+    """Job key for writes to a file (the same for every spelling of the path)"""
+    return ('file', os.path.normcase(os.path.abspath(path)))
+
+
+def write_text_file(path, items, check=None):
+    """
+    Handler writing the latest of several queued contents to a file, atomically
+    and under the file's lock (other stations may write it too)
+    
+    Bound to its path by PersistenceWorker.write_file.
+    """
+    from utils.file_lock import locked_write
+    text = items[-1]
+    locked_write(path, text, None if check is None else lambda p: check(p, text))
+
+
+# Global instance
+persistence_worker = PersistenceWorker()
+
+# Scripts without a Tk window still get their writes flushed on exit
+atexit.register(persistence_worker.stop, 30)
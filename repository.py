@@ -0,0 +1,655 @@
+"""
+Storage backends for allocations, allocation history and the audit trail
+
+The app talks to the `repository` global through the Repository interface:
+  
+  JsonRepository    the original files (allocations_json/, allocation_history.json,
+                    audit_trail/); every query parses the files it needs
+  SqliteRepository  allocations.db (stdlib sqlite3, WAL mode) with indexed
+                    tables for shifts, assignments, history events and audit entries
+  
+  ServiceRepository (allocation_service.py) forwards to a shared service process
+                    when ALLOCATION_SERVICE is set
+
+Once allocations.db exists (created by the migrator) it is used automatically:
+    
+    python repository.py migrate          # import the JSON files into allocations.db
+    python repository.py export OUT_DIR   # write every shift back out as JSON
+
+Allocation JSON files are still written on every save as an export format,
+so the history viewer and older stations keep working.
+"""
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+
+from allocation_format import encode, check_revision, get_revision
+from persistence_worker import persistence_worker, file_key
+from utils.file_lock import locked_write
+
+SCHEMA_VERSION = 2
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+
+CREATE TABLE IF NOT EXISTS shifts (
+    id INTEGER PRIMARY KEY,
+    date TEXT NOT NULL,
+    shift TEXT NOT NULL,
+    shift_group TEXT,
+    exported_at TEXT,
+    saved_at TEXT,
+    revision INTEGER,
+    UNIQUE (date, shift)
+);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    shift_id INTEGER NOT NULL REFERENCES shifts(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    product TEXT,
+    lot_number TEXT,
+    PRIMARY KEY (shift_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS assignments (
+    shift_id INTEGER NOT NULL REFERENCES shifts(id) ON DELETE CASCADE,
+    task TEXT,
+    position INTEGER NOT NULL,
+    worker TEXT NOT NULL,
+    display_name TEXT,
+    is_overtime INTEGER NOT NULL DEFAULT 0,
+    is_temp INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS assignments_shift ON assignments (shift_id);
+CREATE INDEX IF NOT EXISTS assignments_worker ON assignments (worker, shift_id);
+
+CREATE TABLE IF NOT EXISTS history_events (
+    group_name TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    date TEXT NOT NULL,
+    PRIMARY KEY (group_name, worker, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS history_events_date ON history_events (group_name, date);
+
+CREATE TABLE IF NOT EXISTS history_monthly (
+    group_name TEXT NOT NULL,
+    worker TEXT NOT NULL,
+    month TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (group_name, worker, month)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS audit_entries (
+    id TEXT PRIMARY KEY,
+    timestamp TEXT NOT NULL,
+    change_type TEXT,
+    allocation_date TEXT,
+    shift_time TEXT,
+    user TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS audit_entries_shift ON audit_entries (allocation_date, shift_time, timestamp);
+CREATE INDEX IF NOT EXISTS audit_entries_timestamp ON audit_entries (timestamp);
+CREATE INDEX IF NOT EXISTS audit_entries_change_type ON audit_entries (change_type, timestamp);
+"""
+
+
+def get_base_path():
+    """Get folder that holds the data files"""
+    if getattr(sys, 'frozen', False):
+        return os.path.dirname(sys.executable)
+    return os.path.dirname(os.path.abspath(__file__))
+
+
+def allocation_filename(date, shift):
+    """File name of a shift's allocation JSON"""
+    return f"Allocation_{date}_{shift}.json"
+
+
+class Repository:
+    """Interface shared by the storage backends"""
+    
+    # Saves run in another process, through store_allocation (see ServiceRepository)
+    remote = False
+    
+    def save_allocation(self, filepath, allocation_data):
+        """
+        Store a shift allocation (allocation_data as built by save_allocation_json)
+        
+        The allocation file is replaced before this returns, so callers update
+        the catalog, index and audit trail only for saves that landed.
+        
+        Raises:
+            StaleWriteError if the file on disk has the same or a later revision
+        """
+        raise NotImplementedError
+    
+    def load_allocation(self, date, shift):
+        """
+        Allocation data of a shift in the JSON layout (with metadata.revision), or None
+        
+        The data may be shared with a cache and must be treated as read-only.
+        """
+        raise NotImplementedError
+    
+    def list_shifts(self, start_date=None, end_date=None):
+        """Saved shifts as [(date, shift, group), ...] in date order"""
+        raise NotImplementedError
+    
+    def get_worker_shifts(self, worker, start_date=None, end_date=None):
+        """Shifts a worker was assigned in as [(date, shift, task), ...]"""
+        raise NotImplementedError
+    
+    def get_history_dates(self, group_name, worker, start_date=None, end_date=None):
+        """Raw allocation dates of a worker in a process group, sorted"""
+        raise NotImplementedError
+    
+    def get_period_counts(self, group_name, start_date, end_date):
+        """
+        Allocation counts per worker of a process group over a date range
+        (rolled-up months included, see AllocationHistory.get_period_counts)
+        """
+        raise NotImplementedError
+    
+    def get_audit_entries(self, allocation_date=None, shift_time=None, start=None, end=None):
+        """Audit entries oldest first, optionally for one shift and/or a timestamp range"""
+        raise NotImplementedError
+    
+    def attach(self):
+        """Start following history and audit changes made by the app"""
+
+
+class JsonRepository(Repository):
+    """The original JSON files; queries parse them"""
+    
+    def __init__(self, base_path=None):
+        self.base_path = base_path or get_base_path()
+        self.directory = os.path.join(self.base_path, "allocations_json")
+    
+    def save_allocation(self, filepath, allocation_data):
+        # Compare-and-write under the file's lock now (a queued write would be checked
+        # only after the audit trail and index had recorded the save)
+        text = encode(allocation_data)
+        persistence_worker.wait_for(file_key(filepath))
+        locked_write(filepath, text, check=lambda path: check_revision(path, text))
+    
+    def load_allocation(self, date, shift):
+        filepath = os.path.join(self.directory, allocation_filename(date, shift))
+        from shift_cache import shift_cache
+        try:
+            # Waits for a queued save of the file
+            return shift_cache.get(filepath)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error loading allocation {filepath}: {e}")
+            return None
+    
+    def list_shifts(self, start_date=None, end_date=None):
+        from allocation_catalog import allocation_catalog
+        return [(row['date'], row['shift'], row['group']) for row in allocation_catalog.get_rows(start_date, end_date)]
+    
+    def get_worker_shifts(self, worker, start_date=None, end_date=None):
+        shifts = []
+        for date, shift, group in self.list_shifts(start_date, end_date):
+            allocation_data = self.load_allocation(date, shift) or {}
+            for task in allocation_data.get('processes', []) + allocation_data.get('machines', []):
+                if any(w['name'] == worker for w in task.get('workers', [])):
+                    shifts.append((date, shift, task['name']))
+        return shifts
+    
+    def get_history_dates(self, group_name, worker, start_date=None, end_date=None):
+        from allocation_history import allocation_history
+        with allocation_history.lock:
+            dates = list(allocation_history.history.get(group_name, {}).get(worker, []))
+        return sorted(
+            d for d in dates
+            if (start_date is None or d >= start_date) and (end_date is None or d <= end_date)
+        )
+    
+    def get_period_counts(self, group_name, start_date, end_date):
+        from allocation_history import allocation_history
+        with allocation_history.lock:
+            return allocation_history.get_period_counts(group_name, start_date, end_date)
+    
+    def get_audit_entries(self, allocation_date=None, shift_time=None, start=None, end=None):
+        from audit_trail import audit_trail
+        if allocation_date is not None and shift_time is not None:
+            entries = audit_trail.get_allocation_audit_log(allocation_date, shift_time)
+        else:
+            entries = audit_trail.iter_entries(allocation_date, allocation_date)
+        return [
+            e for e in entries
+            if (allocation_date is None or e['allocation_date'] == allocation_date)
+            and (shift_time is None or e['shift_time'] == shift_time)
+            and (start is None or e['timestamp'] >= start) and (end is None or e['timestamp'] <= end)
+        ]
+
+
+class SqliteRepository(Repository):
+    """allocations.db in WAL mode; every query is an indexed lookup"""
+    
+    def __init__(self, db_path=None, export_json=True):
+        """
+        Args:
+            db_path: Database file (default: allocations.db next to the app)
+            export_json: Also write allocation JSON files on save
+        """
+        self.db_path = db_path or os.path.join(get_base_path(), "allocations.db")
+        self.export_json = export_json
+        self.json = JsonRepository(os.path.dirname(os.path.abspath(self.db_path)))
+        
+        # One connection per thread (reads on the Tk thread, writes on the persistence worker)
+        self.local = threading.local()
+        self.attached = False
+        
+        with self.connect() as conn:
+            conn.executescript(SCHEMA)
+            # Version 1 databases kept no revision, so loads lost metadata.revision
+            columns = [row['name'] for row in conn.execute("PRAGMA table_info(shifts)")]
+            if 'revision' not in columns:
+                conn.execute("ALTER TABLE shifts ADD COLUMN revision INTEGER")
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('schema_version', ?)",
+                (str(SCHEMA_VERSION),)
+            )
+    
+    def connect(self):
+        """Connection for the calling thread"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.row_factory = sqlite3.Row
+            # Readers do not block the writer and vice versa
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self.local.conn = conn
+        return conn
+    
+    def close(self):
+        """Close the calling thread's connection"""
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+    
+    # ------------------------------------------------------------------ #
+    # Writes
+    # ------------------------------------------------------------------ #
+    
+    def save_allocation(self, filepath, allocation_data):
+        # The JSON file is written (and its revision checked) first, so a rejected
+        # save never reaches the database
+        if self.export_json:
+            self.json.save_allocation(filepath, allocation_data)
+        persistence_worker.submit(self.write_allocations, allocation_data, key='repository')
+    
+    def write_allocations(self, items):
+        """Store a batch of allocations in one transaction (runs on the persistence worker)"""
+        with self.connect() as conn:
+            for allocation_data in items:
+                self.insert_allocation(conn, allocation_data)
+    
+    def insert_allocation(self, conn, allocation_data, date=None, shift=None):
+        """Replace one shift's rows (inside the caller's transaction)"""
+        metadata = allocation_data.get('metadata', {})
+        date = date or metadata.get('date')
+        shift = shift or metadata.get('shift_time')
+        
+        conn.execute("DELETE FROM shifts WHERE date = ? AND shift = ?", (date, shift))
+        shift_id = conn.execute(
+            "INSERT INTO shifts (date, shift, shift_group, exported_at, saved_at, revision) VALUES (?, ?, ?, ?, ?, ?)",
+            (date, shift, metadata.get('shift_group'), metadata.get('exported_at'),
+             datetime.now().strftime("%Y-%m-%d %H:%M:%S"), get_revision(allocation_data))
+        ).lastrowid
+        
+        tasks = []
+        assignments = []
+        for kind, key in (('process', 'processes'), ('machine', 'machines')):
+            for task in allocation_data.get(key, []):
+                tasks.append((shift_id, len(tasks), kind, task['name'], task.get('product'), task.get('lot_number')))
+                for position, w in enumerate(task.get('workers', [])):
+                    assignments.append(self.assignment_row(shift_id, task['name'], position, w))
+        for position, w in enumerate(allocation_data.get('unassigned_workers', [])):
+            assignments.append(self.assignment_row(shift_id, None, position, w))
+        
+        conn.executemany("INSERT INTO tasks VALUES (?, ?, ?, ?, ?, ?)", tasks)
+        conn.executemany(
+            "INSERT INTO assignments (shift_id, task, position, worker, display_name, is_overtime, is_temp) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+            assignments
+        )
+    
+    def assignment_row(self, shift_id, task, position, worker):
+        """assignments row for a worker dictionary of the JSON layout"""
+        return (
+            shift_id, task, position, worker['name'], worker.get('display_name', worker['name']),
+            int(bool(worker.get('is_overtime'))), int(bool(worker.get('is_temp')))
+        )
+    
+    def record_history_event(self, group_name, worker, date):
+        """allocation_history listener: queue storing a new allocation date"""
+        persistence_worker.submit(self.write_history_events, (group_name, worker, date), key='repository_history')
+    
+    def write_history_events(self, items):
+        """Store a batch of history events (runs on the persistence worker)"""
+        with self.connect() as conn:
+            conn.executemany("INSERT OR IGNORE INTO history_events VALUES (?, ?, ?)", items)
+    
+    def record_history_month(self, group_name, worker, month, count):
+        """allocation_history month listener: queue adding rolled-up allocations merged from another station"""
+        persistence_worker.submit(self.write_history_months, (group_name, worker, month, count), key='repository_history_months')
+    
+    def write_history_months(self, items):
+        """Add a batch of rolled-up counts (runs on the persistence worker)"""
+        with self.connect() as conn:
+            conn.executemany(
+                "INSERT INTO history_monthly VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (group_name, worker, month) DO UPDATE SET count = count + excluded.count",
+                items
+            )
+    
+    def write_audit_entries(self, entries):
+        """audit_trail listener: store appended entries (already on the persistence worker)"""
+        with self.connect() as conn:
+            self.insert_audit_entries(conn, entries)
+    
+    def insert_audit_entries(self, conn, entries):
+        """Insert audit entries (inside the caller's transaction)"""
+        conn.executemany(
+            "INSERT OR REPLACE INTO audit_entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (str(e.get('id')), e.get('timestamp', ""), e.get('change_type'), e.get('allocation_date'),
+                 e.get('shift_time'), e.get('user'), json.dumps(e.get('details'), ensure_ascii=False))
+                for e in entries
+            ]
+        )
+    
+    def attach(self):
+        if self.attached:
+            return
+        self.attached = True
+        
+        from allocation_history import allocation_history
+        from audit_trail import audit_trail
+        allocation_history.add_listener(self.record_history_event)
+        allocation_history.add_month_listener(self.record_history_month)
+        audit_trail.add_listener(self.write_audit_entries)
+    
+    # ------------------------------------------------------------------ #
+    # Queries
+    # ------------------------------------------------------------------ #
+    
+    def wait_for_writes(self):
+        """Wait until queued repository writes are in the database (before reading)"""
+        persistence_worker.wait_for('repository')
+        persistence_worker.wait_for('repository_history')
+        persistence_worker.wait_for('repository_history_months')
+        persistence_worker.wait_for('audit')
+    
+    def load_allocation(self, date, shift):
+        self.wait_for_writes()
+        conn = self.connect()
+        shift_row = conn.execute(
+            "SELECT * FROM shifts WHERE date = ? AND shift = ?", (date, shift)
+        ).fetchone()
+        if shift_row is None:
+            return None
+        
+        allocation_data = {
+            'metadata': {
+                'date': shift_row['date'],
+                'shift_time': shift_row['shift'],
+                'shift_group': shift_row['shift_group'],
+                'exported_at': shift_row['exported_at'],
+                'revision': shift_row['revision'] or 0
+            },
+            'processes': [],
+            'machines': [],
+            'unassigned_workers': []
+        }
+        
+        workers = {}
+        for row in conn.execute(
+            "SELECT * FROM assignments WHERE shift_id = ? ORDER BY task, position", (shift_row['id'],)
+        ):
+            workers.setdefault(row['task'], []).append({
+                'name': row['worker'],
+                'display_name': row['display_name'],
+                'is_overtime': bool(row['is_overtime']),
+                'is_temp': bool(row['is_temp'])
+            })
+        
+        for row in conn.execute("SELECT * FROM tasks WHERE shift_id = ? ORDER BY position", (shift_row['id'],)):
+            task_workers = workers.get(row['name'], [])
+            allocation_data['processes' if row['kind'] == 'process' else 'machines'].append({
+                'name': row['name'],
+                'product': row['product'],
+                'lot_number': row['lot_number'],
+                'workers': task_workers,
+                'worker_count': len(task_workers)
+            })
+        allocation_data['unassigned_workers'] = workers.get(None, [])
+        
+        return allocation_data
+    
+    def list_shifts(self, start_date=None, end_date=None):
+        self.wait_for_writes()
+        # Morning sorts after Evening, so DESC keeps the day order
+        rows = self.connect().execute(
+            "SELECT date, shift, shift_group FROM shifts WHERE date >= ? AND date <= ? ORDER BY date, shift DESC",
+            (start_date or "", end_date or "9999")
+        )
+        return [tuple(row) for row in rows]
+    
+    def get_worker_shifts(self, worker, start_date=None, end_date=None):
+        self.wait_for_writes()
+        rows = self.connect().execute(
+            "SELECT s.date, s.shift, a.task FROM assignments a JOIN shifts s ON s.id = a.shift_id "
+            "WHERE a.worker = ? AND a.task IS NOT NULL AND s.date >= ? AND s.date <= ? "
+            "ORDER BY s.date, s.shift DESC",
+            (worker, start_date or "", end_date or "9999")
+        )
+        return [tuple(row) for row in rows]
+    
+    def get_history_dates(self, group_name, worker, start_date=None, end_date=None):
+        self.wait_for_writes()
+        rows = self.connect().execute(
+            "SELECT date FROM history_events WHERE group_name = ? AND worker = ? AND date >= ? AND date <= ? "
+            "ORDER BY date",
+            (group_name, worker, start_date or "", end_date or "9999")
+        )
+        return [row['date'] for row in rows]
+    
+    def get_period_counts(self, group_name, start_date, end_date):
+        # Rolled-up months only have month resolution: every month overlapping the range counts in full
+        self.wait_for_writes()
+        rows = self.connect().execute(
+            "SELECT worker, SUM(n) AS n FROM ("
+            "SELECT worker, COUNT(*) AS n FROM history_events WHERE group_name = ? AND date >= ? AND date <= ? "
+            "GROUP BY worker "
+            "UNION ALL "
+            "SELECT worker, SUM(count) AS n FROM history_monthly WHERE group_name = ? AND month >= ? AND month <= ? "
+            "GROUP BY worker"
+            ") GROUP BY worker",
+            (group_name, start_date, end_date, group_name, start_date[:7], end_date[:7])
+        )
+        return {row['worker']: row['n'] for row in rows if row['n']}
+    
+    def get_audit_entries(self, allocation_date=None, shift_time=None, start=None, end=None):
+        self.wait_for_writes()
+        sql = "SELECT * FROM audit_entries WHERE timestamp >= ? AND timestamp <= ?"
+        params = [start or "", end or "9999"]
+        if allocation_date is not None:
+            sql += " AND allocation_date = ?"
+            params.append(allocation_date)
+        if shift_time is not None:
+            sql += " AND shift_time = ?"
+            params.append(shift_time)
+        sql += " ORDER BY timestamp, id"
+        
+        entries = []
+        for row in self.connect().execute(sql, params):
+            entry = dict(row)
+            entry['details'] = json.loads(entry['details']) if entry['details'] else None
+            entries.append(entry)
+        return entries
+    
+    # ------------------------------------------------------------------ #
+    # Migration and export
+    # ------------------------------------------------------------------ #
+    
+    def import_json(self, base_path=None, progress=print):
+        """
+        Import allocations_json/, allocation_history.json and the audit trail
+        
+        Safe to run again: shifts and audit entries are replaced, history
+        events are merged.
+        
+        Returns:
+            Dictionary of imported row counts
+        """
+        base_path = base_path or get_base_path()
+        counts = {'shifts': 0, 'history_events': 0, 'history_months': 0, 'audit_entries': 0}
+        
+        with self.connect() as conn:
+            directory = os.path.join(base_path, "allocations_json")
+            from allocation_catalog import parse_filename
+            from allocation_archive import AllocationArchive
+            archive = AllocationArchive(directory)
+            filenames = set(os.listdir(directory)) if os.path.isdir(directory) else set()
+            filenames.update(archive.list_archived())
+            for filename in sorted(filenames):
+                parsed = parse_filename(filename)
+                if parsed is None:
+                    continue
+                try:
+                    allocation_data = archive.load(os.path.join(directory, filename))
+                except Exception as e:
+                    progress(f"Skipping {filename}: {e}")
+                    continue
+                # Date and shift come from the file name (metadata can be stale)
+                self.insert_allocation(conn, allocation_data, *parsed)
+                counts['shifts'] += 1
+            
+            history_file = os.path.join(base_path, "allocation_history.json")
+            if os.path.exists(history_file):
+                try:
+                    with open(history_file, 'r') as f:
+                        data = json.load(f)
+                except Exception as e:
+                    progress(f"Skipping allocation history: {e}")
+                    data = {}
+                
+                if 'raw' in data and 'version' in data:
+                    raw, monthly = data.get('raw', {}), data.get('monthly', {})
+                else:
+                    raw, monthly = data, {}
+                
+                events = [
+                    (group, worker, date)
+                    for group, workers in raw.items()
+                    for worker, dates in workers.items()
+                    for date in dates
+                ]
+                conn.executemany("INSERT OR IGNORE INTO history_events VALUES (?, ?, ?)", events)
+                months = [
+                    (group, worker, month, count)
+                    for group, workers in monthly.items()
+                    for worker, counts_by_month in workers.items()
+                    for month, count in counts_by_month.items()
+                ]
+                conn.executemany("INSERT OR REPLACE INTO history_monthly VALUES (?, ?, ?, ?)", months)
+                counts['history_events'] = len(events)
+                counts['history_months'] = len(months)
+            
+            # open() folds a legacy audit_trail.json into the segments first
+            from audit_trail import audit_trail
+            audit_trail.open()
+            batch = []
+            for entry in audit_trail.iter_entries():
+                batch.append(entry)
+                if len(batch) >= 1000:
+                    self.insert_audit_entries(conn, batch)
+                    counts['audit_entries'] += len(batch)
+                    batch = []
+            self.insert_audit_entries(conn, batch)
+            counts['audit_entries'] += len(batch)
+        
+        return counts
+    
+    def export_allocations(self, output_dir):
+        """Write every stored shift as an allocation JSON file; returns the number written"""
+        os.makedirs(output_dir, exist_ok=True)
+        written = 0
+        for date, shift, group in self.list_shifts():
+            allocation_data = self.load_allocation(date, shift)
+            with open(os.path.join(output_dir, allocation_filename(date, shift)), 'w', encoding='utf-8') as f:
+                f.write(encode(allocation_data))
+            written += 1
+        return written
+
+
+def open_repository(base_path=None):
+    """
+    The allocation service if ALLOCATION_SERVICE is set and the service answers
+    (see allocation_service), otherwise SQLite if allocations.db exists, otherwise the JSON files
+    """
+    # Checked before importing allocation_service (its HTTP modules cost startup time)
+    if os.environ.get("ALLOCATION_SERVICE"):
+        from allocation_service import get_engine, ServiceClient, ServiceRepository
+        engine = get_engine()
+        if isinstance(engine, ServiceClient):
+            return ServiceRepository(engine)
+        # Service down: this station reads and writes the files itself
+    
+    base_path = base_path or get_base_path()
+    db_path = os.path.join(base_path, "allocations.db")
+    if os.path.exists(db_path):
+        try:
+            return SqliteRepository(db_path)
+        except Exception as e:
+            print(f"Error opening {db_path}, using JSON files: {e}")
+    return JsonRepository(base_path)
+
+
+def main(argv=None):
+    """Command line: migrate the JSON files into SQLite or export SQLite back to JSON"""
+    parser = argparse.ArgumentParser(description="Allocation storage tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    migrate = commands.add_parser('migrate', help="import JSON files into allocations.db")
+    migrate.add_argument('--db', default=os.path.join(get_base_path(), "allocations.db"))
+    
+    export = commands.add_parser('export', help="write stored shifts as allocation JSON files")
+    export.add_argument('output_dir')
+    export.add_argument('--db', default=os.path.join(get_base_path(), "allocations.db"))
+    
+    args = parser.parse_args(argv)
+    
+    if args.command == 'migrate':
+        counts = SqliteRepository(args.db, export_json=False).import_json(os.path.dirname(os.path.abspath(args.db)))
+        print(f"Imported into {args.db}: " + ", ".join(f"{n} {name.replace('_', ' ')}" for name, n in counts.items()))
+    else:
+        if not os.path.exists(args.db):
+            parser.error(f"{args.db} does not exist")
+        written = SqliteRepository(args.db, export_json=False).export_allocations(args.output_dir)
+        print(f"Exported {written} shifts to {args.output_dir}")
+
+
+# Global instance
+repository = open_repository()
+
+
+if __name__ == "__main__":
+    main()
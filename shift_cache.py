@@ -0,0 +1,126 @@
+"""
+Cache of parsed allocation files with background prefetch
+
+Flipping through history re-read and re-parsed one allocation file per
+click, which is slow when allocations_json sits on a network share. Parsed
+files are kept in a bounded LRU keyed by path and validated against the
+file's mtime and size, and the history viewer asks for the neighbouring
+shifts to be read on a background thread while the current one is shown:
+    
+    data = shift_cache.get(filepath)
+    shift_cache.prefetch([previous_path, next_path, ...])
+
+Cached data is in the v1 layout (see allocation_format), shared between
+callers and must be treated as read-only.
+"""
+import os
+import queue
+import threading
+from collections import OrderedDict
+
+from allocation_archive import allocation_archive
+from persistence_worker import persistence_worker, file_key
+
+# Parsed allocations kept in memory (about two months of shifts)
+SHIFT_CACHE_SIZE = 128
+
+
+class ShiftCache:
+    """LRU of parsed allocation JSON files"""
+    
+    def __init__(self, max_entries=SHIFT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # path -> (mtime, size, data)
+        self.loading = {}  # path -> Event set when its read finishes
+        self.lock = threading.Lock()
+        
+        self.prefetch_queue = queue.Queue()
+        self.prefetch_generation = 0
+        self.thread = None
+        
+        self.hits = 0
+        self.misses = 0
+    
+    def get(self, filepath):
+        """
+        Parsed contents of an allocation file
+        
+        Raises:
+            OSError / ValueError if the file cannot be read or parsed
+        """
+        path = os.path.normcase(os.path.abspath(filepath))
+        
+        # A save of this file may still be queued
+        persistence_worker.wait_for(file_key(path))
+        
+        while True:
+            # The loose file, or its monthly archive pack
+            mtime, size = allocation_archive.version(path)
+            with self.lock:
+                cached = self.entries.get(path)
+                if cached is not None and cached[0] == mtime and cached[1] == size:
+                    self.entries.move_to_end(path)
+                    self.hits += 1
+                    return cached[2]
+                
+                event = self.loading.get(path)
+                if event is None:
+                    # This thread reads the file
+                    event = self.loading[path] = threading.Event()
+                    self.misses += 1
+                    break
+            
+            # Another thread (usually the prefetcher) is reading it; use its result
+            event.wait()
+        
+        try:
+            data = allocation_archive.load(path)
+            
+            with self.lock:
+                self.entries[path] = (mtime, size, data)
+                self.entries.move_to_end(path)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+            return data
+        finally:
+            with self.lock:
+                del self.loading[path]
+            event.set()
+    
+    def invalidate(self, filepath=None):
+        """Drop one file (or everything) from the cache"""
+        with self.lock:
+            if filepath is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(os.path.normcase(os.path.abspath(filepath)), None)
+    
+    def prefetch(self, filepaths):
+        """Read files in the background, in order; replaces any earlier prefetch still running"""
+        with self.lock:
+            self.prefetch_generation += 1
+            generation = self.prefetch_generation
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self.run_prefetch, name="shift-prefetch", daemon=True)
+                self.thread.start()
+        
+        self.prefetch_queue.put((generation, list(filepaths)))
+    
+    def run_prefetch(self):
+        """Prefetch loop (runs on its own thread)"""
+        while True:
+            generation, filepaths = self.prefetch_queue.get()
+            for filepath in filepaths:
+                if generation != self.prefetch_generation:
+                    # The user moved on; a newer request is queued
+                    break
+                if not allocation_archive.exists(filepath):
+                    continue
+                try:
+                    self.get(filepath)
+                except Exception as e:
+                    print(f"Error prefetching {filepath}: {e}")
+
+
+# Global instance
+shift_cache = ShiftCache()
@@ -0,0 +1,300 @@
+"""
+Differences between two shifts and reassignment churn over a date range
+
+allocation_diff compares versions of the same shift for the audit trail;
+this module compares different shifts ("what changed between yesterday's
+and today's Morning?", "how many reassignments happened this week?").
+
+Shifts are reduced to interned ids, task id -> (frozenset of worker ids,
+product id, lot id), so a diff is a handful of set operations per task:
+    
+    diff = compare_shifts("2025-10-23", "Morning", "2025-10-24", "Morning")
+    churn = range_churn("2025-10-01", "2025-10-31", shift="Morning")
+
+Range mode walks the catalog in shift order and keeps only the previous
+shift in memory; files are read through shift_cache.
+"""
+import csv
+import threading
+import time
+
+from allocation_format import NOT_SET
+
+# Shift type filter for range mode (None compares every consecutive pair)
+ALL_SHIFTS = None
+
+
+class Interner:
+    """Maps names (workers, tasks, products, lots) to small integer ids and back"""
+    
+    def __init__(self):
+        self.ids = {}
+        self.names = []
+        self.lock = threading.Lock()
+    
+    def intern(self, name):
+        """Id of a name (None stays None)"""
+        if name is None:
+            return None
+        name_id = self.ids.get(name)
+        if name_id is None:
+            with self.lock:
+                name_id = self.ids.get(name)
+                if name_id is None:
+                    name_id = self.ids[name] = len(self.names)
+                    self.names.append(name)
+        return name_id
+    
+    def name(self, name_id):
+        """Name of an id (None stays None)"""
+        return None if name_id is None else self.names[name_id]
+    
+    def sorted_names(self, name_ids):
+        """Names of a set of ids, sorted"""
+        return sorted(self.names[name_id] for name_id in name_ids)
+
+
+# Shared by every comparison so ids of different shifts match
+names = Interner()
+
+
+def compact_shift(allocation_data):
+    """
+    Interned form of allocation data in the v1 layout
+    
+    Returns:
+        {'group', 'tasks': {task: (workers, product, lot)}, 'placed': {worker: tasks}, 'unassigned': workers}
+        with every name replaced by its id and every collection a frozenset
+    """
+    tasks = {}
+    placed = {}
+    for task in allocation_data.get('processes', []) + allocation_data.get('machines', []):
+        task_id = names.intern(task['name'])
+        workers = frozenset(names.intern(w['name']) for w in task.get('workers', []))
+        product = task.get('product')
+        lot_number = task.get('lot_number')
+        tasks[task_id] = (
+            workers,
+            names.intern(None if product == NOT_SET else product),
+            names.intern(None if lot_number == NOT_SET else lot_number)
+        )
+        for worker_id in workers:
+            placed.setdefault(worker_id, set()).add(task_id)
+    
+    return {
+        'group': allocation_data.get('metadata', {}).get('shift_group'),
+        'tasks': tasks,
+        'placed': {worker_id: frozenset(task_ids) for worker_id, task_ids in placed.items()},
+        'unassigned': frozenset(names.intern(w['name']) for w in allocation_data.get('unassigned_workers', []))
+    }
+
+
+def load_compact(date, shift):
+    """Interned form of a saved shift (None if it has no allocation or cannot be read)"""
+    from repository import repository
+    
+    try:
+        allocation_data = repository.load_allocation(date, shift)
+        return compact_shift(allocation_data) if allocation_data is not None else None
+    except Exception as e:
+        print(f"Error reading allocation for diff: {e}")
+        return None
+
+
+def diff_compact(before, after):
+    """
+    Structured diff turning shift `before` into shift `after` (both from compact_shift)
+    
+    Returns:
+        {
+            'tasks_added': [tasks], 'tasks_removed': [tasks],
+            'tasks_changed': {task: {'workers_added', 'workers_removed', 'product': [old, new], 'lot_number': [old, new]}},
+            'reassigned': [{'worker', 'from', 'to'}],      worked a different task in both shifts
+            'joined': [workers], 'left': [workers],         placed on a task in only one of the shifts
+            'unchanged_tasks': count,
+            'groups': [before, after]
+        }
+    """
+    before_tasks, after_tasks = before['tasks'], after['tasks']
+    
+    tasks_changed = {}
+    unchanged = 0
+    for task_id in before_tasks.keys() & after_tasks.keys():
+        old_workers, old_product, old_lot = before_tasks[task_id]
+        new_workers, new_product, new_lot = after_tasks[task_id]
+        
+        change = {}
+        if old_workers != new_workers:
+            if new_workers - old_workers:
+                change['workers_added'] = names.sorted_names(new_workers - old_workers)
+            if old_workers - new_workers:
+                change['workers_removed'] = names.sorted_names(old_workers - new_workers)
+        if old_product != new_product:
+            change['product'] = [names.name(old_product), names.name(new_product)]
+        if old_lot != new_lot:
+            change['lot_number'] = [names.name(old_lot), names.name(new_lot)]
+        
+        if change:
+            tasks_changed[names.name(task_id)] = change
+        else:
+            unchanged += 1
+    
+    before_placed, after_placed = before['placed'], after['placed']
+    reassigned = [
+        {
+            'worker': names.name(worker_id),
+            'from': ", ".join(names.sorted_names(before_placed[worker_id])),
+            'to': ", ".join(names.sorted_names(after_placed[worker_id]))
+        }
+        for worker_id in before_placed.keys() & after_placed.keys()
+        if before_placed[worker_id] != after_placed[worker_id]
+    ]
+    reassigned.sort(key=lambda item: item['worker'])
+    
+    return {
+        'tasks_added': names.sorted_names(after_tasks.keys() - before_tasks.keys()),
+        'tasks_removed': names.sorted_names(before_tasks.keys() - after_tasks.keys()),
+        'tasks_changed': dict(sorted(tasks_changed.items())),
+        'reassigned': reassigned,
+        'joined': names.sorted_names(after_placed.keys() - before_placed.keys()),
+        'left': names.sorted_names(before_placed.keys() - after_placed.keys()),
+        'unchanged_tasks': unchanged,
+        'groups': [before['group'], after['group']]
+    }
+
+
+def compare_shifts(date_a, shift_a, date_b, shift_b):
+    """
+    Diff between two saved shifts (see diff_compact)
+    
+    Raises:
+        FileNotFoundError if either shift has no readable allocation
+    """
+    before = load_compact(date_a, shift_a)
+    after = load_compact(date_b, shift_b)
+    for compact, date, shift in ((before, date_a, shift_a), (after, date_b, shift_b)):
+        if compact is None:
+            raise FileNotFoundError(f"No allocation found for {date} - {shift} Shift")
+    return diff_compact(before, after)
+
+
+def iter_range_diffs(start_date, end_date, shift=ALL_SHIFTS):
+    """
+    Diffs of consecutive saved shifts between two dates, in shift order
+    
+    Args:
+        shift: Only compare shifts of this type (Morning to Morning), or None for every pair
+    
+    Yields:
+        (before row, after row, diff) with catalog rows ({'date', 'shift', ...})
+    """
+    from allocation_catalog import allocation_catalog
+    
+    previous = None
+    for row in allocation_catalog.get_rows(start_date, end_date):
+        if shift is not None and row['shift'] != shift:
+            continue
+        compact = load_compact(row['date'], row['shift'])
+        if compact is None:
+            continue
+        if previous is not None:
+            yield previous[0], row, diff_compact(previous[1], compact)
+        previous = (row, compact)
+
+
+def range_churn(start_date, end_date, shift=ALL_SHIFTS):
+    """
+    Reassignment statistics over consecutive shifts between two dates
+    
+    Returns:
+        {
+            'pairs': [{'from', 'to', 'tasks_changed', 'reassigned', 'joined', 'left'}],
+            'workers': {worker: reassignments}, sorted most reassigned first
+            'tasks': {task: workers added + removed}, sorted most changed first
+            'elapsed_ms': time taken
+        }
+    """
+    started = time.perf_counter()
+    pairs = []
+    workers = {}
+    tasks = {}
+    
+    for before, after, diff in iter_range_diffs(start_date, end_date, shift):
+        for item in diff['reassigned']:
+            workers[item['worker']] = workers.get(item['worker'], 0) + 1
+        for task, change in diff['tasks_changed'].items():
+            moves = len(change.get('workers_added', [])) + len(change.get('workers_removed', []))
+            if moves:
+                tasks[task] = tasks.get(task, 0) + moves
+        
+        pairs.append({
+            'from': f"{before['date']} {before['shift']}",
+            'to': f"{after['date']} {after['shift']}",
+            'tasks_changed': len(diff['tasks_changed']) + len(diff['tasks_added']) + len(diff['tasks_removed']),
+            'reassigned': len(diff['reassigned']),
+            'joined': len(diff['joined']),
+            'left': len(diff['left'])
+        })
+    
+    def by_count(counts):
+        return dict(sorted(counts.items(), key=lambda item: (-item[1], item[0])))
+    
+    return {
+        'pairs': pairs,
+        'workers': by_count(workers),
+        'tasks': by_count(tasks),
+        'elapsed_ms': (time.perf_counter() - started) * 1000
+    }
+
+
+def diff_rows(diff):
+    """Flat [(section, name, details)] rows of a diff, for tables and CSV"""
+    rows = []
+    for task in diff['tasks_added']:
+        rows.append(("Task added", task, ""))
+    for task in diff['tasks_removed']:
+        rows.append(("Task removed", task, ""))
+    
+    for task, change in diff['tasks_changed'].items():
+        items = [f"+{w}" for w in change.get('workers_added', [])]
+        items += [f"-{w}" for w in change.get('workers_removed', [])]
+        for field in ('product', 'lot_number'):
+            if field in change:
+                old, new = change[field]
+                items.append(f"{field.replace('_', ' ')} {old or NOT_SET} → {new or NOT_SET}")
+        rows.append(("Task changed", task, ", ".join(items)))
+    
+    for item in diff['reassigned']:
+        rows.append(("Reassigned", item['worker'], f"{item['from']} → {item['to']}"))
+    for worker in diff['joined']:
+        rows.append(("Joined", worker, ""))
+    for worker in diff['left']:
+        rows.append(("Left", worker, ""))
+    
+    if diff['groups'][0] != diff['groups'][1]:
+        rows.append(("Group", "", f"{diff['groups'][0]} → {diff['groups'][1]}"))
+    return rows
+
+
+def export_diff_csv(diff, output_file):
+    """Write a shift diff as CSV (section, name, details)"""
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['section', 'name', 'details'])
+        writer.writerows(diff_rows(diff))
+
+
+def export_churn_csv(churn, output_file):
+    """Write range churn as CSV: worker and task totals, then one row per shift pair"""
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['section', 'name', 'count'])
+        for worker, count in churn['workers'].items():
+            writer.writerow(['worker_reassignments', worker, count])
+        for task, count in churn['tasks'].items():
+            writer.writerow(['task_worker_changes', task, count])
+        
+        writer.writerow([])
+        writer.writerow(['from', 'to', 'tasks_changed', 'reassigned', 'joined', 'left'])
+        for pair in churn['pairs']:
+            writer.writerow([pair['from'], pair['to'], pair['tasks_changed'], pair['reassigned'], pair['joined'], pair['left']])
@@ -0,0 +1,154 @@
+"""
+Startup time audit and budget check
+
+Starts the app in fresh interpreters and measures:
+    
+    import    importing main (python -X importtime), i.e. every module loaded
+              before the window is created, with the slowest imports listed
+    window    start to the first drawn window (main.py with STARTUP_PROFILE),
+              skipped when there is no display
+
+Each measurement is the median of several runs after a warm-up run (which
+also writes the bytecode caches). The command exits with status 1 when a
+median is over its budget, so it can run before a release:
+    
+    python startup_budget.py
+    python startup_budget.py --runs 10 --top 25
+    python startup_budget.py --import-budget 150 --window-budget 1500
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Budgets in milliseconds on the reference data (measured about 60 ms to import
+# main and well under a second to the first window; the budgets leave headroom
+# for slower station PCs)
+IMPORT_BUDGET_MS = 250
+WINDOW_BUDGET_MS = 2000
+
+
+def app_env(**extra):
+    """Environment for a measured run (bytecode caching on, as in the installed app)"""
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env.update(extra)
+    return env
+
+
+def parse_importtime(output):
+    """
+    Entries of `python -X importtime` output
+    
+    Returns:
+        List of (module, self_ms, cumulative_ms, depth) in output order;
+        depth 0 is a module imported by the script itself
+    """
+    entries = []
+    for line in output.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+            self_ms, cumulative_ms = int(self_us) / 1000, int(cumulative_us) / 1000
+        except ValueError:
+            continue  # the header line
+        depth = (len(name) - len(name.lstrip())) // 2 - 1
+        entries.append((name.strip(), self_ms, cumulative_ms, depth))
+    return entries
+
+
+def measure_import(runs=5, app_dir=APP_DIR):
+    """
+    Time to import main (from the app in app_dir)
+    
+    Returns:
+        (median ms, entries of the last run as from parse_importtime)
+    """
+    times = []
+    entries = []
+    for i in range(runs + 1):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import main"],
+            cwd=app_dir, env=app_env(), capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"importing main failed:\n{result.stderr[-2000:]}")
+        entries = parse_importtime(result.stderr)
+        if i > 0:  # the first run is the warm-up
+            times.append(sum(cumulative for _, _, cumulative, depth in entries if depth == 0))
+    return statistics.median(times), entries
+
+
+def measure_window(runs=5, timeout=60, app_dir=APP_DIR):
+    """
+    Time from start to the first drawn window (of the app in app_dir)
+    
+    Returns:
+        Median ms, or None when the app cannot open a window here (no display)
+    """
+    times = []
+    for i in range(runs + 1):
+        try:
+            result = subprocess.run(
+                [sys.executable, "main.py"],
+                cwd=app_dir, env=app_env(STARTUP_PROFILE="1"),
+                capture_output=True, text=True, timeout=timeout
+            )
+        except subprocess.TimeoutExpired:
+            raise RuntimeError(f"main.py did not report its first window within {timeout} s")
+        
+        reported = [line.split()[1] for line in result.stdout.splitlines() if line.startswith("first_window_ms ")]
+        if not reported:
+            if "TclError" in result.stderr:
+                return None
+            raise RuntimeError(f"main.py did not report its first window:\n{result.stderr[-2000:]}")
+        if i > 0:
+            times.append(float(reported[0]))
+    return statistics.median(times)
+
+
+def slowest_imports(entries, top=15):
+    """Modules imported by main (directly or not) with the highest cumulative time"""
+    shown = [entry for entry in entries if entry[3] >= 1]
+    return sorted(shown, key=lambda entry: entry[2], reverse=True)[:top]
+
+
+def check(label, value, budget):
+    """Print a measurement against its budget; True if within it"""
+    ok = value <= budget
+    print(f"{label:<16}{value:8.1f} ms   budget {budget:.0f} ms   {'ok' if ok else 'OVER BUDGET'}")
+    return ok
+
+
+def main(argv=None):
+    """Command line: measure startup and compare it with the budgets"""
+    parser = argparse.ArgumentParser(description="Measure app startup time against its budget")
+    parser.add_argument('--runs', type=int, default=5, help="measured runs per check (after one warm-up)")
+    parser.add_argument('--top', type=int, default=15, help="number of slowest imports to list")
+    parser.add_argument('--import-budget', type=float, default=IMPORT_BUDGET_MS, help="ms allowed to import main")
+    parser.add_argument('--window-budget', type=float, default=WINDOW_BUDGET_MS, help="ms allowed to the first window")
+    args = parser.parse_args(argv)
+    
+    import_ms, entries = measure_import(args.runs)
+    print("Slowest imports (cumulative ms, self ms):")
+    for name, self_ms, cumulative_ms, depth in slowest_imports(entries, args.top):
+        print(f"  {cumulative_ms:8.1f} {self_ms:8.1f}  {name}")
+    print()
+    
+    ok = check("Import main", import_ms, args.import_budget)
+    window_ms = measure_window(args.runs)
+    if window_ms is None:
+        print("First window    skipped (no display)")
+    else:
+        ok = check("First window", window_ms, args.window_budget) and ok
+    
+    if not ok:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
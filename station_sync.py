@@ -0,0 +1,555 @@
+"""
+Offline sync between stations through change-log bundles
+
+Every station keeps an ordered log of its own changes in sync/changes.jsonl:
+allocation saves, allocation history events and audit entries. Each change
+has an id (station:seq) and the vector clock of the station when it was
+made, {station: last seq seen}. Changes received from other stations are
+appended to the same log, so they are passed on to the next station too.
+
+Stations that were offline exchange bundles (gzip JSON Lines) holding only
+the changes the other side has not seen, judged by the clock it reported
+in its last bundle:
+    
+    python station_sync.py export bundle.jsonl.gz --peer LINE2-PC   # changes LINE2-PC lacks
+    python station_sync.py import bundle.jsonl.gz                   # merge another station's bundle
+    python station_sync.py status
+
+Merging is deterministic, with one rule per kind of change:
+  allocation   last writer wins per shift: a change whose clock dominates
+               the current one replaces it; for concurrent changes the higher
+               revision, then the later time, then the larger station id wins
+  history      allocation dates are a set, every event is kept
+  audit        entries are appended once, by id
+
+The sync folder belongs to the station, so it lives in the user's local
+application data (%LOCALAPPDATA% on Windows, ~/.local/share elsewhere), not
+next to the program on the shared drive; ALLOCATION_SYNC_DIR overrides it.
+The app and the command line share it, so every change to the state holds
+the lock on sync/station.json and first reloads what the other process wrote.
+"""
+import argparse
+import contextlib
+import gzip
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+from persistence_worker import persistence_worker
+from utils.file_lock import FileLock, atomic_write, file_stamp
+
+BUNDLE_FORMAT_VERSION = 1
+
+ALLOCATION = 'allocation'
+HISTORY = 'history'
+AUDIT = 'audit'
+
+# Seconds to wait for the state lock (an import holds it while it applies a bundle)
+STATE_LOCK_TIMEOUT = 120
+
+# Seconds the log writer waits before retrying after a failed write
+WRITER_RETRY_SECONDS = 5
+
+
+def get_sync_dir():
+    """Folder on this machine that holds this station's change log (created if missing)"""
+    sync_dir = os.environ.get("ALLOCATION_SYNC_DIR")
+    if not sync_dir:
+        if sys.platform == 'win32':
+            base_path = os.environ.get("LOCALAPPDATA") or os.path.expanduser(r"~\AppData\Local")
+            sync_dir = os.path.join(base_path, "Worker Allocation System", "sync")
+        else:
+            base_path = os.environ.get("XDG_DATA_HOME") or os.path.expanduser("~/.local/share")
+            sync_dir = os.path.join(base_path, "worker-allocation-system", "sync")
+    os.makedirs(sync_dir, exist_ok=True)
+    return sync_dir
+
+
+def dominates(a, b):
+    """True if clock a has seen everything clock b has, and more"""
+    return a != b and all(a.get(station, 0) >= seq for station, seq in b.items())
+
+
+def merge_clocks(a, b):
+    """Element-wise maximum of two clocks"""
+    merged = dict(a)
+    for station, seq in b.items():
+        if seq > merged.get(station, 0):
+            merged[station] = seq
+    return merged
+
+
+def wins(change, head):
+    """True if an allocation change replaces the current head of its shift"""
+    if head is None or dominates(change['clock'], head['clock']):
+        return True
+    if dominates(head['clock'], change['clock']) or change['id'] == head['id']:
+        return False
+    # Concurrent edits: the same answer on every station
+    def rank(item):
+        return (item.get('revision') or 0, item['time'], item['station'])
+    return rank(change) > rank(head)
+
+
+class ChangeLog:
+    """This station's ordered change log, its vector clock and what its peers have seen"""
+    
+    def __init__(self, sync_dir=None):
+        self.sync_dir = sync_dir or get_sync_dir()
+        self.log_file = os.path.join(self.sync_dir, "changes.jsonl")
+        self.state_file = os.path.join(self.sync_dir, "station.json")
+        self.lock = threading.RLock()
+        self.lock_depth = 0  # nesting of locked() in the thread holding self.lock
+        self.applying = None  # thread applying remote changes, whose data file events are not logged again
+        self.attached = False
+        
+        # Local changes waiting for the log writer thread, which takes the state lock
+        # (the history and audit listeners run on the persistence worker and must not wait for it)
+        self.pending = []
+        self.pending_lock = threading.Condition()
+        self.stopping = False
+        self.writer = None
+        
+        self.station = None
+        self.clock = {}
+        self.peers = {}  # peer station -> clock it reported in its last bundle
+        self.heads = {}  # shift key -> {'id', 'clock', 'revision', 'time', 'station'} of the current version
+        self.log_size = 0  # bytes of the log reflected in the state
+        self.state_stamp = None  # file_stamp of the state file when last read or written
+        self.load_state()
+    
+    # ------------------------------------------------------------------ #
+    # State
+    # ------------------------------------------------------------------ #
+    
+    @contextlib.contextmanager
+    def locked(self):
+        """
+        Hold the state against other threads and processes (the command line)
+        
+        The state is reloaded first if another process changed it, so
+        whatever is done inside starts from the latest clock, heads and log.
+        """
+        with self.lock:
+            if self.lock_depth:
+                self.lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self.lock_depth -= 1
+                return
+            
+            with FileLock(self.state_file, timeout=STATE_LOCK_TIMEOUT):
+                self.lock_depth = 1
+                try:
+                    self.refresh()
+                    yield
+                finally:
+                    self.lock_depth = 0
+    
+    def load_state(self):
+        """Load the station state, catching up with log lines written after it was saved"""
+        with self.locked():
+            if not self.station:
+                # Host name for people, a random suffix so cloned installs stay distinct
+                import socket
+                import uuid
+                self.station = f"{socket.gethostname()}-{uuid.uuid4().hex[:6]}"
+                self.write_state_locked()
+    
+    def refresh(self):
+        """Reread the state if another process wrote it, and fold in log lines appended since (under locked())"""
+        stamp = file_stamp(self.state_file)
+        if stamp is not None and stamp != self.state_stamp:
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    state = json.load(f)
+                self.station = state.get('station')
+                self.clock = state.get('clock', {})
+                self.peers = state.get('peers', {})
+                self.heads = state.get('heads', {})
+                self.log_size = state.get('log_size', 0)
+                self.state_stamp = stamp
+            except Exception as e:
+                print(f"Error loading sync state: {e}")
+        
+        if os.path.exists(self.log_file) and os.path.getsize(self.log_file) != self.log_size:
+            self.repair_tail()
+            for change in self.iter_log(self.log_size):
+                self.track(change)
+            self.log_size = os.path.getsize(self.log_file)
+    
+    def write_state(self):
+        """Write the station state"""
+        with self.locked():
+            self.write_state_locked()
+    
+    def write_state_locked(self):
+        """Write the station state now (under locked())"""
+        text = json.dumps({
+            'station': self.station,
+            'clock': self.clock,
+            'peers': self.peers,
+            'heads': self.heads,
+            'log_size': self.log_size
+        }, indent=2, ensure_ascii=False)
+        atomic_write(self.state_file, text)
+        self.state_stamp = file_stamp(self.state_file)
+    
+    def track(self, change):
+        """Fold a logged change into the clock and shift heads"""
+        station, seq = change['station'], change['seq']
+        if seq > self.clock.get(station, 0):
+            self.clock[station] = seq
+        if change['type'] == ALLOCATION and wins(change, self.heads.get(change['key'])):
+            self.heads[change['key']] = self.head_of(change)
+    
+    def head_of(self, change):
+        """Part of an allocation change kept as the head of its shift"""
+        return {key: change.get(key) for key in ('id', 'clock', 'revision', 'time', 'station')}
+    
+    def iter_log(self, offset=0):
+        """Logged changes in order, from a byte offset"""
+        if not os.path.exists(self.log_file):
+            return
+        with open(self.log_file, 'rb') as f:
+            f.seek(offset)
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue  # torn last line
+    
+    def repair_tail(self):
+        """Terminate a line torn by a crash so the next append starts cleanly"""
+        with open(self.log_file, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            if f.tell() == 0:
+                return
+            f.seek(-1, os.SEEK_END)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+    
+    def append(self, changes):
+        """Append changes to the log (under locked())"""
+        with open(self.log_file, 'ab') as f:
+            for change in changes:
+                f.write(json.dumps(change, ensure_ascii=False, separators=(',', ':')).encode('utf-8') + b"\n")
+            self.log_size = f.tell()
+    
+    # ------------------------------------------------------------------ #
+    # Recording local changes
+    # ------------------------------------------------------------------ #
+    
+    def record(self, change_type, key, data, revision=None):
+        """Queue a change made on this station for the log writer (never waits for the state lock)"""
+        if self.applying == threading.get_ident():
+            return
+        change = {
+            'time': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            'type': change_type,
+            'key': key,
+            'data': data
+        }
+        if revision is not None:
+            change['revision'] = revision
+        
+        with self.pending_lock:
+            self.pending.append(change)
+            self.stopping = False
+            self.pending_lock.notify_all()
+            if self.writer is None or not self.writer.is_alive():
+                self.writer = threading.Thread(target=self.run_writer, name="change-log-writer", daemon=True)
+                self.writer.start()
+    
+    def run_writer(self):
+        """Writer loop: log queued changes whenever there are some"""
+        while True:
+            with self.pending_lock:
+                self.pending_lock.wait_for(lambda: self.pending or self.stopping)
+                if not self.pending:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                # e.g. an import held the state lock past its timeout; the changes stay queued
+                print(f"Error writing the change log (retrying): {e}")
+                time.sleep(WRITER_RETRY_SECONDS)
+    
+    def flush(self):
+        """Log the queued changes and write the state"""
+        with self.locked():
+            if self.flush_locked():
+                self.write_state_locked()
+    
+    def flush_locked(self):
+        """
+        Number the queued changes and append them to the log (under locked())
+        
+        Returns:
+            Number of changes logged
+        """
+        with self.pending_lock:
+            queued, self.pending = self.pending, []
+        
+        changes = []
+        for change in queued:
+            seq = self.clock.get(self.station, 0) + 1
+            self.clock[self.station] = seq
+            changes.append({
+                'id': f"{self.station}:{seq}",
+                'station': self.station,
+                'seq': seq,
+                'clock': dict(self.clock),
+                **change
+            })
+        
+        if changes:
+            self.append(changes)
+            for change in changes:
+                self.track(change)
+        return len(changes)
+    
+    def stop(self, timeout=None):
+        """Log whatever is still queued and stop the writer (app exit)"""
+        with self.pending_lock:
+            self.stopping = True
+            self.pending_lock.notify_all()
+            writer = self.writer
+        
+        if writer is not None and writer.is_alive():
+            writer.join(timeout)
+    
+    def record_allocation(self, allocation_data):
+        """Log a saved shift (allocation data in the v1 layout)"""
+        from allocation_format import to_v2, get_revision
+        metadata = allocation_data.get('metadata', {})
+        key = f"{metadata.get('date')}|{metadata.get('shift_time')}"
+        self.record(ALLOCATION, key, to_v2(allocation_data), get_revision(allocation_data))
+    
+    def record_history_event(self, group_name, worker, date):
+        """allocation_history listener for allocations made on this station"""
+        self.record(HISTORY, f"{group_name}|{worker}|{date}", None)
+    
+    def record_audit_entries(self, entries):
+        """audit_trail listener"""
+        for entry in entries:
+            self.record(AUDIT, str(entry.get('id')), entry)
+    
+    def attach(self):
+        """Start logging history and audit changes made by the app"""
+        if self.attached:
+            return
+        self.attached = True
+        
+        from allocation_history import allocation_history
+        from audit_trail import audit_trail
+        allocation_history.add_listener(self.record_history_event, merged=False)
+        audit_trail.add_listener(self.record_audit_entries)
+    
+    # ------------------------------------------------------------------ #
+    # Bundles
+    # ------------------------------------------------------------------ #
+    
+    def export_bundle(self, bundle_file, peer=None, full=False):
+        """
+        Write the changes a peer has not seen to a bundle
+        
+        Args:
+            peer: Station the bundle is for (default: every change)
+            full: Ignore what the peer reported having seen
+        
+        Returns:
+            Number of changes written
+        """
+        with self.locked():
+            if self.flush_locked():
+                self.write_state_locked()
+            seen = {} if full or peer is None else self.peers.get(peer, {})
+            header = {
+                'format': BUNDLE_FORMAT_VERSION,
+                'station': self.station,
+                'clock': dict(self.clock),
+                'exported_at': datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            }
+            count = 0
+            with gzip.open(bundle_file, 'wt', encoding='utf-8') as f:
+                f.write(json.dumps(header, ensure_ascii=False) + "\n")
+                for change in self.iter_log():
+                    if change['seq'] > seen.get(change['station'], 0):
+                        f.write(json.dumps(change, ensure_ascii=False, separators=(',', ':')) + "\n")
+                        count += 1
+        return count
+    
+    def import_bundle(self, bundle_file):
+        """
+        Merge another station's bundle
+        
+        Changes already seen are skipped; a station's changes are applied
+        in sequence, and stop at a gap (export a full bundle to fill it).
+        
+        Returns:
+            Dictionary of counts: applied per type, skipped, conflicts (concurrent
+            shift edits, one of which was kept), gaps, seconds
+        """
+        started = time.perf_counter()
+        report = {ALLOCATION: 0, HISTORY: 0, AUDIT: 0, 'skipped': 0, 'conflicts': 0, 'gaps': 0}
+        
+        with gzip.open(bundle_file, 'rt', encoding='utf-8') as f:
+            header = json.loads(f.readline())
+            if header.get('format') != BUNDLE_FORMAT_VERSION:
+                raise ValueError(f"Unsupported bundle format: {header.get('format')}")
+            
+            with self.locked():
+                if header.get('station') == self.station:
+                    raise ValueError("This bundle was exported by this station")
+                
+                # Changes made before the import get clocks that do not include it
+                self.flush_locked()
+                
+                accepted = []
+                expected = {}
+                for line in f:
+                    change = json.loads(line)
+                    station = change['station']
+                    next_seq = expected.get(station, self.clock.get(station, 0) + 1)
+                    if change['seq'] < next_seq:
+                        report['skipped'] += 1
+                        continue
+                    if change['seq'] > next_seq:
+                        report['gaps'] += 1
+                        continue
+                    expected[station] = next_seq + 1
+                    accepted.append(change)
+                
+                self.apply(accepted, report)
+                self.append(accepted)
+                for change in accepted:
+                    self.track(change)
+                self.peers[header['station']] = merge_clocks(self.peers.get(header['station'], {}), header['clock'])
+                self.write_state_locked()
+        
+        report['seconds'] = time.perf_counter() - started
+        return report
+    
+    def apply(self, changes, report):
+        """Apply accepted remote changes to the data files"""
+        from allocation_history import allocation_history
+        from audit_trail import audit_trail
+        from repository import repository
+        
+        # History and audit entries reach SQLite through its listeners (not attached on the command line)
+        repository.attach()
+        
+        self.applying = threading.get_ident()
+        try:
+            # Only the last winning version of each shift is written
+            winners = {}
+            for change in changes:
+                if change['type'] != ALLOCATION:
+                    continue
+                key = change['key']
+                head = winners.get(key, self.heads.get(key))
+                if head is not None and change['id'] != head['id'] and not (
+                    dominates(change['clock'], head['clock']) or dominates(head['clock'], change['clock'])
+                ):
+                    report['conflicts'] += 1
+                if wins(change, head):
+                    winners[key] = change
+            for change in winners.values():
+                self.write_allocation(change)
+                report[ALLOCATION] += 1
+            
+            for change in changes:
+                if change['type'] == HISTORY:
+                    group_name, worker, date = change['key'].split("|")
+                    allocation_history.add_allocation(group_name, worker, date)
+                    report[HISTORY] += 1
+            
+            entries = [change['data'] for change in changes if change['type'] == AUDIT]
+            if entries:
+                audit_trail.append_entries(entries)
+                report[AUDIT] += len(entries)
+        finally:
+            self.applying = None
+    
+    def write_allocation(self, change):
+        """Store a remote version of a shift through the repository (JSON files and SQLite alike)"""
+        from allocation_catalog import allocation_catalog
+        from allocation_format import normalize, get_revision
+        from allocation_index import allocation_index
+        from repository import repository
+        from shift_cache import shift_cache
+        from utils.file_lock import StaleWriteError
+        
+        date, shift = change['key'].split("|")
+        filepath = allocation_catalog.get_path(date, shift)
+        allocation_data = normalize(change['data'])
+        remote_revision = get_revision(allocation_data)
+        
+        while True:
+            current = repository.load_allocation(date, shift)
+            # Newer than any local version, so an open edit of the shift sees the change
+            allocation_data['metadata']['revision'] = max(get_revision(current) or 0, remote_revision) + 1
+            try:
+                repository.save_allocation(filepath, allocation_data)
+                break
+            except StaleWriteError:
+                continue  # saved here meanwhile; go past that revision too
+        
+        shift_cache.invalidate(filepath)
+        allocation_catalog.update(filepath, allocation_data)
+        allocation_index.update(filepath, allocation_data)
+    
+    def status(self):
+        """Station, clock and peers as a dictionary"""
+        with self.locked():
+            return {
+                'station': self.station,
+                'clock': dict(self.clock),
+                'peers': {peer: dict(clock) for peer, clock in self.peers.items()},
+                'shifts': len(self.heads),
+                'log_bytes': self.log_size
+            }
+
+
+def main(argv=None):
+    """Command line: export, import and inspect change-log bundles"""
+    parser = argparse.ArgumentParser(description="Sync allocations, history and audit entries between stations")
+    commands = parser.add_subparsers(dest='command', required=True)
+    
+    export = commands.add_parser('export', help="write changes another station has not seen")
+    export.add_argument('bundle')
+    export.add_argument('--peer', help="station the bundle is for (default: every change)")
+    export.add_argument('--full', action='store_true', help="include changes the peer reported having seen")
+    
+    merge = commands.add_parser('import', help="merge another station's bundle")
+    merge.add_argument('bundle')
+    
+    commands.add_parser('status', help="show this station's clock and peers")
+    args = parser.parse_args(argv)
+    
+    log = change_log
+    if args.command == 'export':
+        count = log.export_bundle(args.bundle, args.peer, args.full)
+        print(f"{count} changes from {log.station} written to {args.bundle}")
+    elif args.command == 'import':
+        report = log.import_bundle(args.bundle)
+        print(f"Applied {report[ALLOCATION]} shifts, {report[HISTORY]} history events and "
+              f"{report[AUDIT]} audit entries in {report['seconds']:.2f} s "
+              f"({report['skipped']} already seen, {report['conflicts']} concurrent shift edits resolved, "
+              f"{report['gaps']} out of sequence)")
+        persistence_worker.stop()
+    else:
+        print(json.dumps(log.status(), indent=2, ensure_ascii=False))
+
+
+# Global instance
+change_log = ChangeLog()
+
+
+if __name__ == "__main__":
+    main()
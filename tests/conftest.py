@@ -0,0 +1,31 @@
+"""
+Test setup: the app's modules live in the repository root
+
+Tests that run the app, or write its data files, work in a copy made with
+copy_app(), so the checkout is never touched.
+
+Importing station_sync creates the station's sync folder, so the tests get a
+scratch one instead of the user's (see station_sync.get_sync_dir).
+"""
+import atexit
+import os
+import shutil
+import sys
+import tempfile
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+if not os.environ.get("ALLOCATION_SYNC_DIR"):
+    os.environ["ALLOCATION_SYNC_DIR"] = tempfile.mkdtemp(prefix="allocation-sync-")
+    atexit.register(shutil.rmtree, os.environ["ALLOCATION_SYNC_DIR"], True)
+
+
+def copy_app(destination):
+    """Copy of the app and its data files, without per-station state or rebuildable indexes"""
+    shutil.copytree(APP_DIR, destination, ignore=shutil.ignore_patterns(
+        '.git', 'venv', 'tests', '__pycache__', 'exports', 'sync', 'allocations.db',
+        '*.idx', '*.tok', '*.inv', '*.migrated', '*.lock', '*.lck'
+    ))
+    return str(destination)
@@ -0,0 +1,89 @@
+"""
+Tests for allocation_archive.py: pack layout and reading shifts back through
+the pack index
+
+Archiving runs in a copy of the app, since it deletes the packed files and
+rescans the catalog next to the modules.
+"""
+import json
+import os
+import subprocess
+import sys
+
+from allocation_archive import TRAILER_SIZE, AllocationArchive
+from allocation_format import encode, load_file
+
+from conftest import copy_app
+
+
+def make_allocation(date, shift, workers):
+    """v1 allocation data of a shift with one process"""
+    return {
+        'metadata': {'date': date, 'shift_time': shift, 'shift_group': "Group A", 'revision': 1},
+        'processes': [{
+            'name': "Weighing", 'product': "N/A", 'lot_number': "N/A",
+            'workers': [{'name': w, 'display_name': w, 'is_overtime': False, 'is_temp': False} for w in workers],
+            'worker_count': len(workers)
+        }],
+        'machines': [],
+        'unassigned_workers': []
+    }
+
+
+def test_pack_ends_with_a_trailer_pointing_at_its_index(tmp_path):
+    archive = AllocationArchive(str(tmp_path))
+    shifts = {
+        f"Allocation_2025-10-0{day}_{shift}.json": make_allocation(f"2025-10-0{day}", shift, [f"Worker {day}"])
+        for day in (1, 2) for shift in ("Morning", "Evening")
+    }
+    archive.write_pack("2025-10", {filename: encode(data, 2) for filename, data in shifts.items()})
+    
+    with open(archive.pack_path("2025-10"), 'rb') as f:
+        pack = f.read()
+    trailer = json.loads(pack[-TRAILER_SIZE:])
+    index = json.loads(pack[trailer['index_offset']:-TRAILER_SIZE])
+    assert sorted(index) == sorted(shifts)
+    for filename, (offset, length, row) in index.items():
+        assert json.loads(pack[offset:offset + length])['version'] == 2
+        assert [row['date'], row['shift']] == filename[len("Allocation_"):-len(".json")].split("_")
+    
+    for filename, data in shifts.items():
+        assert archive.exists(os.path.join(str(tmp_path), filename))
+        assert archive.load(os.path.join(str(tmp_path), filename)) == data
+    assert not archive.exists(os.path.join(str(tmp_path), "Allocation_2025-10-03_Morning.json"))
+    assert sorted(archive.list_archived()) == sorted(shifts)
+    
+    # A rewritten pack is read again, not served from the cached index
+    later = make_allocation("2025-10-03", "Morning", ["Worker 3"])
+    texts = {filename: encode(data, 2) for filename, data in shifts.items()}
+    texts["Allocation_2025-10-03_Morning.json"] = encode(later, 2)
+    archive.write_pack("2025-10", texts)
+    assert archive.load(os.path.join(str(tmp_path), "Allocation_2025-10-03_Morning.json")) == later
+
+
+def test_archived_shifts_read_back_unchanged(tmp_path):
+    app_dir = copy_app(tmp_path / "app")
+    directory = os.path.join(app_dir, "allocations_json")
+    originals = {
+        filename: load_file(os.path.join(directory, filename))
+        for filename in os.listdir(directory) if filename.endswith(".json")
+    }
+    
+    env = dict(os.environ, ALLOCATION_SYNC_DIR=os.path.join(app_dir, "sync"))
+    subprocess.run(
+        [sys.executable, "allocation_archive.py", "--days", "0"],
+        cwd=app_dir, env=env, capture_output=True, text=True, check=True
+    )
+    
+    archive = AllocationArchive(directory)
+    assert not [filename for filename in os.listdir(directory) if filename.endswith(".json")]
+    assert sorted(archive.list_archived()) == sorted(originals)
+    for filename, data in originals.items():
+        assert archive.load(os.path.join(directory, filename)) == data
+    
+    # A shift saved again after archiving shadows its packed copy
+    filename = sorted(originals)[0]
+    edited = dict(originals[filename], unassigned_workers=[])
+    with open(os.path.join(directory, filename), 'w', encoding='utf-8') as f:
+        f.write(encode(edited))
+    assert archive.load(os.path.join(directory, filename)) == edited
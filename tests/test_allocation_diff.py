@@ -0,0 +1,113 @@
+"""
+Tests for allocation_diff.py: deltas between shift versions and rebuilding
+a shift from the audit trail
+"""
+import pytest
+
+import allocation_diff
+from allocation_diff import (
+    apply_delta, build_audit_details, diff_allocations, get_shift_versions,
+    reconstruct_shift, same_allocation, snapshot_from_allocation
+)
+from audit_trail import AuditTrail
+
+
+def make_allocation(processes, machines=(), unassigned=(), group="Group A"):
+    """Allocation data in the layout save_allocation_json writes; tasks as (name, product, workers)"""
+    def tasks(items):
+        return [
+            {'name': name, 'product': product, 'lot_number': "N/A", 'workers': [{'name': w} for w in workers]}
+            for name, product, workers in items
+        ]
+    return {
+        'metadata': {'date': "2025-11-03", 'shift_time': "Morning", 'shift_group': group},
+        'processes': tasks(processes),
+        'machines': tasks(machines),
+        'unassigned_workers': [{'name': w} for w in unassigned]
+    }
+
+
+VERSIONS = [
+    make_allocation([("Weighing", "N/A", ["Ana", "Ben"])], unassigned=["Cara", "Dan"]),
+    make_allocation([("Weighing", "N/A", ["Ana", "Cara"])], unassigned=["Ben", "Dan"]),
+    make_allocation([("Weighing", "N/A", ["Ana", "Cara"]), ("Mixing", "Syrup", ["Dan"])], unassigned=["Ben"]),
+    make_allocation([("Mixing", "Tablets", ["Dan", "Ben"])], [("Press 1", "N/A", ["Ana"])], ["Cara"], "Group B"),
+    make_allocation([], unassigned=["Ana", "Ben", "Cara", "Dan"], group="Group B"),
+]
+
+
+@pytest.fixture
+def trail(tmp_path, monkeypatch):
+    """Empty audit trail in a temporary data folder, written in the calling thread"""
+    monkeypatch.setattr(AuditTrail, 'get_base_path', lambda self: str(tmp_path))
+    trail = AuditTrail(background=False)
+    trail.open()
+    return trail
+
+
+def log_versions(trail, versions):
+    """Log each version as save_allocation_json does, a minute apart; returns their timestamps"""
+    timestamps = []
+    before = None
+    for i, allocation_data in enumerate(versions):
+        after = snapshot_from_allocation(allocation_data)
+        history = trail.get_allocation_audit_log("2025-11-03", "Morning")
+        timestamp = f"2025-11-03 09:{i:02d}:00"
+        trail.append_entries([{
+            'id': f"202511030900{i:02d}000000",
+            'timestamp': timestamp,
+            'change_type': 'ALLOCATION_CREATED' if before is None else 'ALLOCATION_EDITED',
+            'allocation_date': "2025-11-03",
+            'shift_time': "Morning",
+            'user': "Admin",
+            'details': build_audit_details(before, after, history)
+        }])
+        timestamps.append(timestamp)
+        before = after
+    return timestamps
+
+
+def test_delta_turns_one_version_into_the_next():
+    for before, after in zip(VERSIONS, VERSIONS[1:]):
+        before, after = snapshot_from_allocation(before), snapshot_from_allocation(after)
+        assert same_allocation(apply_delta(before, diff_allocations(before, after)), after)
+
+
+def test_delta_holds_only_what_changed():
+    before, after = snapshot_from_allocation(VERSIONS[2]), snapshot_from_allocation(VERSIONS[3])
+    
+    assert diff_allocations(before, after) == {
+        'tasks_added': {'Press 1': {'kind': 'machine', 'product': "N/A", 'lot_number': "N/A", 'workers': ["Ana"]}},
+        'tasks_removed': ["Weighing"],
+        'tasks_changed': {'Mixing': {'workers_added': ["Ben"], 'product': ["Syrup", "Tablets"]}},
+        'unassigned_added': ["Cara"],
+        'unassigned_removed': ["Ben"],
+        'shift_group': ["Group A", "Group B"]
+    }
+    assert diff_allocations(after, after) == {}
+
+
+@pytest.mark.parametrize('interval', [20, 2], ids=['one-snapshot', 'snapshot-every-2'])
+def test_shift_is_rebuilt_at_every_saved_version(trail, monkeypatch, interval):
+    monkeypatch.setattr(allocation_diff, 'SNAPSHOT_INTERVAL', interval)
+    timestamps = log_versions(trail, VERSIONS)
+    
+    for timestamp, allocation_data in zip(timestamps, VERSIONS):
+        assert same_allocation(reconstruct_shift(trail, "2025-11-03", "Morning", timestamp), snapshot_from_allocation(allocation_data))
+    assert same_allocation(reconstruct_shift(trail, "2025-11-03", "Morning"), snapshot_from_allocation(VERSIONS[-1]))
+    assert reconstruct_shift(trail, "2025-11-03", "Morning", "2025-11-03 08:59:59") is None
+    
+    snapshots = ['snapshot' in entry['details'] for entry in trail.get_allocation_audit_log("2025-11-03", "Morning")]
+    assert snapshots == ([True, False, False, False, False] if interval == 20 else [True, False, True, False, True])
+    assert [version[1] for version in get_shift_versions(trail, "2025-11-03", "Morning")] == ['ALLOCATION_CREATED'] + ['ALLOCATION_EDITED'] * 4
+
+
+def test_file_edited_outside_the_app_gets_a_snapshot(trail):
+    log_versions(trail, VERSIONS[:2])
+    history = trail.get_allocation_audit_log("2025-11-03", "Morning")
+    
+    # The file on disk is not the version the logged chain ends with
+    before = snapshot_from_allocation(VERSIONS[3])
+    details = build_audit_details(before, snapshot_from_allocation(VERSIONS[4]), history)
+    
+    assert details['snapshot'] == snapshot_from_allocation(VERSIONS[4])
@@ -0,0 +1,80 @@
+"""
+Tests for allocation_format.py: v1 and v2 files hold the same allocation
+
+The shipped allocation files are converted in a copy of the app.
+"""
+import json
+import os
+
+import pytest
+
+from allocation_format import (
+    FORMAT_VERSION, allocation_files, convert_directory, encode, get_version, load_file, loads, to_v2
+)
+
+from conftest import copy_app
+
+
+def worker(name, overtime=False, temp=False):
+    """v1 worker dictionary as the app writes it"""
+    suffix = " (OT)" if overtime else " (Temp)" if temp else ""
+    return {'name': name, 'display_name': name + suffix, 'is_overtime': overtime, 'is_temp': temp}
+
+
+ALLOCATION = {
+    'metadata': {
+        'date': "2025-11-03", 'shift_time': "Evening", 'shift_group': "Group B",
+        'exported_at': "2025-11-03 14:00:00", 'revision': 7
+    },
+    'processes': [
+        {'name': "Weighing", 'product': "Bisoprolol Tablets BP 5 mg", 'lot_number': "L-104",
+         'workers': [worker("Ana"), worker("Ben", overtime=True)], 'worker_count': 2},
+        {'name': "Sieving", 'product': "N/A", 'lot_number': "N/A", 'workers': [], 'worker_count': 0},
+    ],
+    'machines': [
+        {'name': "Press 1", 'product': "N/A", 'lot_number': "N/A", 'workers': [worker("Cara", temp=True)], 'worker_count': 1},
+    ],
+    'unassigned_workers': [worker("Dan"), worker("Eli", temp=True)]
+}
+
+
+def test_v2_round_trip_keeps_the_allocation():
+    text = encode(ALLOCATION, 2)
+    data = json.loads(text)
+    
+    assert get_version(data) == 2
+    assert data['flags'] == {'Ben': 1, 'Cara': 2, 'Eli': 2}
+    assert 'product' not in data['processes'][1] and 'lot' not in data['processes'][1]
+    assert "\n" not in text
+    assert loads(text) == ALLOCATION
+    assert loads(encode(ALLOCATION, 1)) == ALLOCATION
+
+
+def test_unknown_version_is_refused():
+    with pytest.raises(ValueError):
+        loads(json.dumps(dict(to_v2(ALLOCATION), version=FORMAT_VERSION + 1)))
+    with pytest.raises(ValueError):
+        encode(ALLOCATION, FORMAT_VERSION + 1)
+
+
+def test_shipped_files_convert_to_v2_and_back(tmp_path):
+    directory = os.path.join(copy_app(tmp_path / "app"), "allocations_json")
+    files = allocation_files(directory)
+    originals = {filepath: load_file(filepath) for filepath in files}
+    assert originals
+    
+    converted, size_before, size_after = convert_directory(directory, 2)
+    
+    assert converted == len(files)
+    assert size_after < size_before
+    for filepath in files:
+        with open(filepath, 'r', encoding='utf-8') as f:
+            assert get_version(json.load(f)) == 2
+        assert load_file(filepath) == originals[filepath]
+    
+    # Already in the requested format: nothing to do
+    assert convert_directory(directory, 2)[0] == 0
+    
+    assert convert_directory(directory, 1)[0] == len(files)
+    for filepath in files:
+        assert load_file(filepath) == originals[filepath]
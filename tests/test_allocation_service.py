@@ -0,0 +1,178 @@
+"""
+Tests for allocation_service.py: the service gives the same answers as the local engine
+
+Each side runs in its own copy of the app, since ranking, saving and
+recording history read and write the data files next to the modules.
+"""
+import csv
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from allocation_service import AllocationService, ServiceClient, ServiceError, ServiceHandler
+
+from conftest import APP_DIR, copy_app
+
+# Runs calls read from stdin with the in-process engine and prints their results
+LOCAL_DRIVER = """
+import json, sys
+from allocation_service import LocalEngine
+from persistence_worker import persistence_worker
+results = LocalEngine().batch(json.load(sys.stdin))
+persistence_worker.stop()
+print(json.dumps(results, ensure_ascii=False))
+"""
+
+
+def app_env(app_dir):
+    """Environment for a process of an app copy: no service, sync state inside the copy"""
+    env = dict(os.environ)
+    env.pop("ALLOCATION_SERVICE", None)
+    env["ALLOCATION_SYNC_DIR"] = os.path.join(app_dir, "sync")
+    return env
+
+
+def run_local(app_dir, calls):
+    """Results of calls made with LocalEngine in an app copy"""
+    result = subprocess.run(
+        [sys.executable, "-c", LOCAL_DRIVER], cwd=app_dir, input=json.dumps(calls),
+        env=app_env(app_dir), capture_output=True, text=True, check=True
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+@pytest.fixture
+def service(tmp_path):
+    """ServiceClient of a service started on an ephemeral port in its own app copy"""
+    app_dir = copy_app(tmp_path / "service")
+    process = subprocess.Popen(
+        [sys.executable, "-u", "allocation_service.py", "serve", "--port", "0"],
+        cwd=app_dir, env=app_env(app_dir), stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True
+    )
+    try:
+        for line in process.stdout:
+            if line.startswith("Allocation service on "):
+                address = line.split()[3]
+                break
+        else:
+            pytest.fail("the service did not start")
+        
+        client = ServiceClient(address)
+        yield client
+        client.close()
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+@pytest.fixture
+def local_dir(tmp_path):
+    return copy_app(tmp_path / "local")
+
+
+def test_service_matches_local_engine(service, local_dir):
+    with open(os.path.join(APP_DIR, "utils", "workers.csv"), newline='', encoding='utf-8') as f:
+        rows = list(csv.reader(f))
+    process = "WEIGHING I"
+    workers = [row[1] for row in rows[1:9]]
+    date = "2026-01-15"
+    
+    shift = sorted(name for name in os.listdir(os.path.join(local_dir, "allocations_json")) if name.endswith(".json"))[0]
+    shift_date, shift_time = shift[len("Allocation_"):-len(".json")].split("_")
+    
+    calls = [
+        ('rank_workers', {'task_name': process, 'workers': workers, 'frequency_penalty': True}),
+        ('record_allocations', {'process_name': process, 'workers': workers[:3], 'date': date}),
+        ('get_history_dates', {'group_name': "Weighing", 'worker': workers[0]}),
+        ('get_period_counts', {'group_name': "Weighing", 'start_date': date, 'end_date': date}),
+        ('rank_workers', {'task_name': process, 'workers': workers, 'frequency_penalty': True}),
+        ('load_allocation', {'date': shift_date, 'shift': shift_time}),
+    ]
+    remote = service.batch(calls)
+    local = run_local(local_dir, calls)
+    assert remote == local
+    
+    assert date in remote[2]
+    assert remote[3] == {worker: 1 for worker in workers[:3]}
+    
+    # Edit the shift on both sides, read it back and find the save in the audit trail
+    allocation_data = remote[5]
+    base_revision = allocation_data['metadata'].get('revision', 0)
+    allocation_data['machines'] = []
+    save = ('save_allocation', {'allocation_data': allocation_data, 'base_revision': base_revision, 'allow_conflicts': True})
+    calls = [
+        save,
+        ('load_allocation', {'date': shift_date, 'shift': shift_time}),
+        ('get_audit_entries', {'allocation_date': shift_date, 'shift_time': shift_time}),
+    ]
+    remote = service.batch(calls)
+    local = run_local(local_dir, calls)
+    assert remote[:2] == local[:2]
+    assert remote[0] == shift
+    assert remote[1]['metadata']['revision'] == base_revision + 1
+    assert remote[1]['machines'] == []
+    
+    def logged(entries):
+        return [(entry['change_type'], entry['details']) for entry in entries]
+    assert logged(remote[2]) == logged(local[2])
+    assert remote[2][-1]['change_type'] == 'ALLOCATION_EDITED'
+    
+    # Saving over the same base again is refused as a stale write
+    with pytest.raises(ServiceError) as error:
+        service.call(save[0], **save[1])
+    assert error.value.error_type == 'StaleWriteError'
+
+
+class DroppingHandler(ServiceHandler):
+    """Closes the connection without answering the first request it gets"""
+    
+    def do_POST(self):
+        if not self.server.dropped:
+            self.server.dropped = True
+            self.close_connection = True
+            return
+        super().do_POST()
+
+
+@pytest.fixture
+def dropping_service():
+    """In-process service that drops the next request (set dropped=False to arm it again)"""
+    service = AllocationService(port=0)
+    service.RequestHandlerClass = DroppingHandler
+    service.dropped = False
+    service.start()
+    yield service
+    service.shutdown()
+    service.server_close()
+
+
+def test_only_idempotent_calls_are_retried(dropping_service):
+    client = ServiceClient(dropping_service.address)
+    assert client.call('ping') == "pong"
+    
+    # The dropped request may have run on the service; sending it again could record it twice
+    dropping_service.dropped = False
+    with pytest.raises(ServiceError) as error:
+        client.batch([('ping', {}), ('record_allocations', {'process_name': "WEIGHING I", 'workers': []})])
+    assert error.value.error_type == 'ConnectionError'
+    client.close()
+
+
+def test_engine_falls_back_to_local_when_service_is_down(monkeypatch):
+    import allocation_service
+    
+    # A port nothing listens on
+    server = AllocationService(port=0)
+    address = server.address
+    server.server_close()
+    
+    monkeypatch.setenv("ALLOCATION_SERVICE", address)
+    monkeypatch.setattr(allocation_service, '_engine', None)
+    assert isinstance(allocation_service.get_engine(), allocation_service.LocalEngine)
+    
+    with pytest.raises(ServiceError) as error:
+        ServiceClient(address).call('rank_workers', task_name="WEIGHING I", workers=[])
+    assert error.value.error_type == 'ConnectionError'
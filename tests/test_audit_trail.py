@@ -0,0 +1,142 @@
+"""
+Tests for audit_trail.py: migrating older trails, recovering from torn lines,
+and monthly segments with their manifest
+
+Each test keeps its trail in a temporary data folder.
+"""
+import json
+import os
+
+import pytest
+
+from audit_trail import AuditTrail
+
+
+def make_entry(number, timestamp, allocation_date="2025-11-03", shift_time="Morning"):
+    """Audit entry as log_edit writes it"""
+    return {
+        'id': f"2025110309000{number:04d}",
+        'timestamp': timestamp,
+        'change_type': 'ALLOCATION_EDITED',
+        'allocation_date': allocation_date,
+        'shift_time': shift_time,
+        'user': "Admin",
+        'details': {'summary': f"edit {number}"}
+    }
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    """Folder the trails of a test live in"""
+    monkeypatch.setattr(AuditTrail, 'get_base_path', lambda self: str(tmp_path))
+    return tmp_path
+
+
+def open_trail():
+    """Trail opened as on app start, writing entries in the calling thread"""
+    trail = AuditTrail(background=False)
+    trail.open()
+    return trail
+
+
+def test_json_array_trail_is_migrated_into_segments(data_dir):
+    entries = [make_entry(i, f"2025-11-03 09:00:{i:02d}") for i in range(5)]
+    with open(data_dir / "audit_trail.json", 'w', encoding='utf-8') as f:
+        json.dump(entries, f)
+    
+    trail = open_trail()
+    
+    assert trail.load_audit_log() == entries
+    assert not (data_dir / "audit_trail.json").exists()
+    assert (data_dir / "audit_trail.json.migrated").exists()
+    assert trail.get_allocation_audit_log("2025-11-03", "Morning") == entries
+    
+    # Opening again does not migrate twice
+    assert open_trail().load_audit_log() == entries
+
+
+def test_jsonl_trail_with_torn_last_line_is_migrated(data_dir):
+    entries = [make_entry(i, f"2025-11-03 09:00:{i:02d}") for i in range(3)]
+    with open(data_dir / "audit_trail.jsonl", 'wb') as f:
+        for entry in entries:
+            f.write(json.dumps(entry).encode('utf-8') + b"\n")
+        f.write(json.dumps(make_entry(3, "2025-11-03 09:00:03")).encode('utf-8')[:40])
+    
+    trail = open_trail()
+    
+    assert trail.load_audit_log() == entries
+    assert (data_dir / "audit_trail.jsonl.migrated").exists()
+
+
+def test_torn_segment_tail_is_repaired_on_open(data_dir):
+    trail = open_trail()
+    month = trail.segment_name_for({})
+    entries = [make_entry(i, f"{month}-01 09:00:{i:02d}") for i in range(3)]
+    trail.append_entries(entries)
+    
+    # A crash part way through writing the next entry
+    segment_file = os.path.join(trail.audit_dir, f"{month}.jsonl")
+    with open(segment_file, 'ab') as f:
+        f.write(b'{"id": "torn", "timestamp": "')
+    
+    trail = open_trail()
+    later = make_entry(9, f"{month}-01 10:00:00")
+    trail.append_entries([later])
+    
+    assert trail.load_audit_log() == entries + [later]
+    assert trail.segments[month].info['entries'] == 4
+    assert trail.get_entry(later['id']) == later
+
+
+def read_manifest(trail):
+    with open(trail.manifest_file, 'r', encoding='utf-8') as f:
+        return json.load(f)['segments']
+
+
+def test_first_entry_of_a_month_closes_the_previous_segment(data_dir):
+    october = [make_entry(i, f"2025-10-0{i + 1} 09:00:00", allocation_date=f"2025-10-0{i + 1}") for i in range(3)]
+    november = [make_entry(i + 3, f"2025-11-0{i + 1} 09:00:00", allocation_date=f"2025-11-0{i + 1}") for i in range(2)]
+    trail = open_trail()
+    trail.append_entries(october)
+    
+    assert read_manifest(trail)['2025-10']['compressed'] is False
+    
+    trail.append_entries(november)
+    
+    files = os.listdir(trail.audit_dir)
+    assert "2025-10.jsonl.gz" in files and "2025-10.jsonl" not in files
+    assert "2025-11.jsonl" in files
+    manifest = read_manifest(trail)
+    assert manifest['2025-10']['compressed'] is True
+    assert manifest['2025-10']['entries'] == 3
+    assert (manifest['2025-10']['min_allocation_date'], manifest['2025-10']['max_allocation_date']) == ("2025-10-01", "2025-10-03")
+    assert manifest['2025-11']['compressed'] is False
+    assert manifest['2025-11']['entries'] == 2
+    
+    # Queries read across the segments, opening only those in range
+    assert trail.load_audit_log() == october + november
+    assert trail.get_changes_by_date_range("2025-10-02", "2025-11-01") == october[1:] + november[:1]
+    assert [segment.name for segment in trail.segments_for_range("2025-11-01", "2025-11-30")] == ["2025-11"]
+    assert trail.get_entry(october[0]['id']) == october[0]
+
+
+def test_lost_manifest_is_recovered_from_the_segments(data_dir):
+    entries = [
+        make_entry(0, "2025-10-01 09:00:00", allocation_date="2025-10-01"),
+        make_entry(1, "2025-11-01 09:00:00", allocation_date="2025-11-01"),
+    ]
+    trail = open_trail()
+    trail.append_entries(entries[:1])
+    trail.append_entries(entries[1:])
+    manifest = read_manifest(trail)
+    os.remove(trail.manifest_file)
+    
+    trail = open_trail()
+    
+    # Both months are over by now, so opening closes November too
+    recovered = read_manifest(trail)
+    for name in ("2025-10", "2025-11"):
+        assert recovered[name]['compressed'] is True
+        for key in ('entries', 'min_allocation_date', 'max_allocation_date', 'size'):
+            assert recovered[name][key] == manifest[name][key]
+    assert trail.load_audit_log() == entries
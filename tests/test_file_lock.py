@@ -0,0 +1,98 @@
+"""
+Tests for utils/file_lock.py: read-modify-write from several processes and
+breaking fallback lock files
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+from utils import file_lock
+from utils.file_lock import FileLock, LockTimeout, hammer
+
+from conftest import APP_DIR
+
+
+@pytest.mark.parametrize('fallback', [False, True], ids=['os-lock', 'lock-file'])
+def test_processes_lose_no_updates(tmp_path, fallback):
+    expected, final, retries, elapsed = hammer(processes=4, rounds=50, directory=str(tmp_path), fallback=fallback)
+    assert final == expected
+
+
+@pytest.fixture
+def fallback_lock(tmp_path, monkeypatch):
+    """FileLock factory for a document in tmp_path that uses the fallback lock file"""
+    path = str(tmp_path / "doc.json")
+    monkeypatch.setattr(file_lock, 'unsupported_paths', {path + ".lock"})
+    monkeypatch.setattr(file_lock, 'STALE_LOCK_SECONDS', 1)
+    return lambda timeout=2: FileLock(path, timeout=timeout)
+
+
+def write_owner(lock, host, pid, age=0):
+    """Leave a fallback lock file as another process would"""
+    with open(lock.fallback_file, 'w') as f:
+        f.write(json.dumps({'host': host, 'pid': pid, 'time': time.time()}))
+    stamp = time.time() - age
+    os.utime(lock.fallback_file, (stamp, stamp))
+
+
+def test_lock_file_of_dead_process_is_broken_at_once(fallback_lock):
+    finished = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    lock = fallback_lock(timeout=0.5)
+    write_owner(lock, socket.gethostname(), int(finished.stdout))
+    
+    with lock:
+        assert lock.owns_fallback
+
+
+def test_lock_file_of_crashed_station_is_broken_when_not_refreshed(fallback_lock):
+    lock = fallback_lock()
+    write_owner(lock, "another-station", 1234, age=5)
+    
+    with lock:
+        assert lock.owns_fallback
+
+
+def test_lock_taken_by_another_waiter_is_not_broken(fallback_lock, tmp_path):
+    lock = fallback_lock()
+    write_owner(lock, "another-station", 1234, age=5)
+    stale = lock.fallback_owner()
+    
+    # Another waiter broke the stale lock and took it before this one got to it
+    write_owner(lock, "third-station", 5678)
+    fresh = lock.fallback_owner()
+    lock.break_fallback(stale)
+    
+    assert lock.fallback_owner() == fresh
+    assert sorted(os.listdir(tmp_path)) == ["doc.json.lck"]
+
+
+def test_lock_file_held_by_live_process_is_not_broken(fallback_lock, tmp_path):
+    lock = fallback_lock(timeout=2.5)
+    
+    # Holds the lock for 4 s, longer than STALE_LOCK_SECONDS, refreshing it every 0.2 s
+    holder = subprocess.Popen(
+        [sys.executable, "-c", (
+            "import sys, time\n"
+            "from utils import file_lock\n"
+            "file_lock.HEARTBEAT_SECONDS = 0.2\n"
+            f"file_lock.unsupported_paths.add({lock.lock_file!r})\n"
+            f"with file_lock.FileLock({lock.path!r}):\n"
+            "    print('locked', flush=True)\n"
+            "    time.sleep(4)\n"
+        )],
+        cwd=APP_DIR, stdout=subprocess.PIPE, text=True
+    )
+    try:
+        assert holder.stdout.readline().strip() == "locked"
+        with pytest.raises(LockTimeout):
+            lock.acquire()
+    finally:
+        holder.wait()
+    
+    with lock:
+        assert lock.owns_fallback
@@ -0,0 +1,43 @@
+"""
+Startup time budget (startup_budget.py) as a test
+
+Runs against a copy of the app: starting it migrates and tidies the audit
+trail and creates the station's sync state.
+"""
+import subprocess
+import sys
+
+import pytest
+
+from startup_budget import IMPORT_BUDGET_MS, WINDOW_BUDGET_MS, app_env, measure_import, measure_window
+
+from conftest import copy_app
+
+
+@pytest.fixture
+def app_dir(tmp_path, monkeypatch):
+    """App copy whose sync state is kept under tmp_path too"""
+    monkeypatch.setenv("ALLOCATION_SYNC_DIR", str(tmp_path / "sync"))
+    return copy_app(tmp_path / "app")
+
+
+def test_import_main_within_budget(app_dir):
+    import_ms, entries = measure_import(runs=3, app_dir=app_dir)
+    assert import_ms <= IMPORT_BUDGET_MS
+
+
+def test_import_main_defers_stores_and_export_runner(app_dir):
+    # Imported where first used (after the window is up, or on export)
+    result = subprocess.run(
+        [sys.executable, "-c", "import sys, main; print(' '.join(sorted(sys.modules)))"],
+        cwd=app_dir, env=app_env(), capture_output=True, text=True, check=True
+    )
+    loaded = set(result.stdout.split())
+    assert not loaded & {'repository', 'station_sync', 'export_jobs', 'sqlite3'}
+
+
+def test_first_window_within_budget(app_dir):
+    window_ms = measure_window(runs=3, app_dir=app_dir)
+    if window_ms is None:
+        pytest.skip("no display")
+    assert window_ms <= WINDOW_BUDGET_MS
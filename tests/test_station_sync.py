@@ -0,0 +1,140 @@
+"""
+Tests for station_sync.py: vector clocks, last-writer-wins on shifts and
+exchanging bundles between two stations
+
+Each station is a copy of the app with its own sync folder; edits, exports
+and imports run in those copies.
+"""
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from station_sync import dominates, merge_clocks, wins
+
+from conftest import copy_app
+
+# Saves a shift through the stations' save path, keeping the first `keep` unassigned workers
+SAVE_DRIVER = """
+import copy, json, sys
+from allocation_catalog import allocation_catalog
+from export_results import store_allocation
+from persistence_worker import persistence_worker
+from repository import repository
+from station_sync import change_log
+edit = json.load(sys.stdin)
+base = repository.load_allocation(edit['date'], edit['shift'])
+data = copy.deepcopy(base)
+data['unassigned_workers'] = data['unassigned_workers'][:edit['keep']]
+store_allocation(allocation_catalog.get_path(edit['date'], edit['shift']), data, base, allow_conflicts=True)
+persistence_worker.stop()
+change_log.stop(30)
+"""
+
+# Prints the unassigned workers of a shift
+LOAD_DRIVER = """
+import json, sys
+from repository import repository
+date, shift = sys.argv[1:]
+print(json.dumps([w['name'] for w in repository.load_allocation(date, shift)['unassigned_workers']]))
+"""
+
+
+def change(station, seq, clock, revision=1, time="2025-11-03 09:00:00"):
+    """Allocation change as logged by a station"""
+    return {'id': f"{station}:{seq}", 'station': station, 'seq': seq, 'clock': clock, 'revision': revision, 'time': time}
+
+
+def test_clock_order():
+    assert dominates({'A': 2, 'B': 1}, {'A': 1, 'B': 1})
+    assert dominates({'A': 1, 'B': 1}, {'A': 1})
+    assert not dominates({'A': 1}, {'A': 1})
+    assert not dominates({'A': 2}, {'B': 1})
+    assert not dominates({'B': 1}, {'A': 2})
+    assert merge_clocks({'A': 2, 'B': 1}, {'B': 3, 'C': 1}) == {'A': 2, 'B': 3, 'C': 1}
+
+
+def test_last_writer_wins():
+    first = change('A', 1, {'A': 1})
+    assert wins(first, None)
+    
+    # A later edit made after seeing the first wins, whatever its revision or time
+    later = change('B', 1, {'A': 1, 'B': 1}, revision=1, time="2025-11-03 08:00:00")
+    assert wins(later, first)
+    assert not wins(first, later)
+    assert not wins(first, first)
+    
+    # Concurrent edits: higher revision, then later time, then larger station id
+    ours, theirs = change('A', 2, {'A': 2}, revision=3), change('B', 1, {'B': 1}, revision=2)
+    assert wins(ours, theirs) and not wins(theirs, ours)
+    ours, theirs = change('A', 2, {'A': 2}), change('B', 1, {'B': 1}, time="2025-11-03 09:00:01")
+    assert wins(theirs, ours) and not wins(ours, theirs)
+    ours, theirs = change('A', 2, {'A': 2}), change('B', 1, {'B': 1})
+    assert wins(theirs, ours) and not wins(ours, theirs)
+
+
+class Station:
+    """A copy of the app with its own sync folder"""
+    
+    def __init__(self, app_dir):
+        self.app_dir = app_dir
+        self.env = dict(os.environ, ALLOCATION_SYNC_DIR=os.path.join(app_dir, "sync"))
+        self.env.pop("ALLOCATION_SERVICE", None)
+        self.name = self.sync('status')['station']
+    
+    def run(self, args, stdin=None):
+        result = subprocess.run(
+            [sys.executable] + args, cwd=self.app_dir, env=self.env, input=stdin,
+            capture_output=True, text=True, check=True
+        )
+        return result.stdout
+    
+    def sync(self, *args):
+        output = self.run(["station_sync.py"] + list(args))
+        return json.loads(output) if args[0] == 'status' else output
+    
+    def edit(self, date, shift, keep):
+        self.run(["-c", SAVE_DRIVER], json.dumps({'date': date, 'shift': shift, 'keep': keep}))
+    
+    def unassigned(self, date, shift):
+        return json.loads(self.run(["-c", LOAD_DRIVER, date, shift]))
+    
+    def send(self, other, tmp_path):
+        """Export the changes other has not seen and import them there; the import's output"""
+        bundle = str(tmp_path / f"{self.name}-to-{other.name}.jsonl.gz")
+        self.sync('export', bundle, '--peer', other.name)
+        return other.sync('import', bundle)
+
+
+@pytest.fixture
+def stations(tmp_path):
+    """Two stations starting from the same data"""
+    return Station(copy_app(tmp_path / "a")), Station(copy_app(tmp_path / "b"))
+
+
+def test_stations_converge_after_concurrent_edits(stations, tmp_path):
+    a, b = stations
+    shift_file = sorted(name for name in os.listdir(os.path.join(a.app_dir, "allocations_json")) if name.endswith(".json"))[0]
+    date, shift = shift_file[len("Allocation_"):-len(".json")].split("_")
+    
+    # Both stations edit the same shift while offline
+    a.edit(date, shift, keep=1)
+    b.edit(date, shift, keep=2)
+    edits = [a.unassigned(date, shift), b.unassigned(date, shift)]
+    assert edits[0] != edits[1]
+    
+    assert "1 concurrent shift edits resolved" in a.send(b, tmp_path)
+    assert "1 concurrent shift edits resolved" in b.send(a, tmp_path)
+    assert a.unassigned(date, shift) == b.unassigned(date, shift)
+    assert a.unassigned(date, shift) in edits
+    assert a.sync('status')['clock'] == b.sync('status')['clock']
+    
+    # An edit made after seeing the other station's wins without a conflict
+    b.edit(date, shift, keep=0)
+    assert "0 concurrent shift edits resolved" in b.send(a, tmp_path)
+    assert a.unassigned(date, shift) == []
+    
+    # Nothing is applied twice
+    assert "Applied 0 shifts, 0 history events and 0 audit entries" in b.send(a, tmp_path)
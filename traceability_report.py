@@ -0,0 +1,151 @@
+"""
+Lot traceability report for GMP deviations and batch recalls
+
+Lists every shift, task and worker that touched a lot, straight from the
+allocation index (no allocation files are opened), as CSV or PDF.
+"""
+import csv
+import os
+import sys
+from datetime import datetime
+from xml.sax.saxutils import escape
+
+REPORT_FORMATS = {
+    'csv': 'csv',
+    'pdf': 'pdf'
+}
+
+CSV_COLUMNS = ['lot_number', 'date', 'shift', 'task', 'product', 'worker_count', 'workers']
+
+
+def get_exports_dir():
+    """Folder reports are written to (created if missing)"""
+    base_path = os.path.dirname(sys.executable) if getattr(sys, 'frozen', False) else os.path.dirname(os.path.abspath(__file__))
+    exports_dir = os.path.join(base_path, "exports")
+    os.makedirs(exports_dir, exist_ok=True)
+    return exports_dir
+
+
+def build_lot_trace(lot_number, start_date=None, end_date=None):
+    """Shifts that touched a lot, from the allocation index (see AllocationIndex.lot_shifts)"""
+    from allocation_index import allocation_index
+    return allocation_index.lot_shifts(lot_number, start_date, end_date)
+
+
+def export_lot_trace(lot_number, fmt='csv', output_file=None, start_date=None, end_date=None):
+    """
+    Write the traceability report of a lot
+    
+    Args:
+        lot_number: Lot to trace
+        fmt: 'csv' or 'pdf'
+        output_file: Target path (default: exports/Lot_Trace_<lot>_<timestamp>.<ext>)
+        start_date, end_date: Optional shift date range (YYYY-MM-DD)
+    
+    Returns:
+        Tuple of (output file, number of shifts in the report)
+    """
+    if fmt not in REPORT_FORMATS:
+        raise ValueError(f"Unknown report format: {fmt}")
+    
+    trace = build_lot_trace(lot_number, start_date, end_date)
+    
+    if output_file is None:
+        safe_lot = "".join(c if c.isalnum() or c in "-_" else "_" for c in lot_number.strip())
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        output_file = os.path.join(get_exports_dir(), f"Lot_Trace_{safe_lot}_{timestamp}.{REPORT_FORMATS[fmt]}")
+    
+    if fmt == 'csv':
+        write_csv(lot_number, trace, output_file)
+    else:
+        write_pdf(lot_number, trace, output_file, start_date, end_date)
+    
+    return output_file, len(trace)
+
+
+def write_csv(lot_number, trace, output_file):
+    """Write the trace as CSV, one row per shift and task"""
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for item in trace:
+            writer.writerow([
+                lot_number.strip(),
+                item['date'],
+                item['shift'],
+                item['task'],
+                item['product'] or "N/A",
+                len(item['workers']),
+                "; ".join(item['workers'])
+            ])
+
+
+def write_pdf(lot_number, trace, output_file, start_date=None, end_date=None):
+    """Write the trace as a PDF table with a summary of workers and tasks"""
+    from reportlab.lib import colors
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch
+    from reportlab.lib.enums import TA_CENTER
+    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+    
+    doc = SimpleDocTemplate(
+        output_file,
+        pagesize=landscape(A4),
+        rightMargin=0.5*inch,
+        leftMargin=0.5*inch,
+        topMargin=0.5*inch,
+        bottomMargin=0.5*inch
+    )
+    styles = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'TraceTitle',
+        parent=styles['Heading2'],
+        fontSize=18,
+        textColor=colors.HexColor('#2c3e50'),
+        spaceAfter=2,
+        alignment=TA_CENTER
+    )
+    
+    workers = sorted({worker for item in trace for worker in item['workers']})
+    tasks = sorted({item['task'] for item in trace})
+    period = f"{start_date or 'start'} to {end_date or 'today'}"
+    
+    story = [
+        Paragraph(f"<b>Lot Traceability Report | Lot: {escape(lot_number.strip())}</b>", title_style),
+        Paragraph(
+            f"Period: {period} | Shifts: {len({(i['date'], i['shift']) for i in trace})} | "
+            f"Tasks: {len(tasks)} | Workers: {len(workers)} | "
+            f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+            styles['Normal']
+        ),
+        Spacer(1, 0.15*inch)
+    ]
+    
+    data = [['Date', 'Shift', 'Task', 'Product', 'Workers']]
+    for item in trace:
+        data.append([
+            item['date'],
+            item['shift'],
+            Paragraph(escape(item['task']), styles['Normal']),
+            Paragraph(escape(item['product'] or "N/A"), styles['Normal']),
+            Paragraph(escape(", ".join(item['workers']) or "-"), styles['Normal'])
+        ])
+    
+    table = Table(data, colWidths=[1*inch, 0.9*inch, 2.4*inch, 2.4*inch, 3.9*inch], repeatRows=1)
+    table.setStyle(TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#34495e')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), 9),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey)
+    ]))
+    story.append(table)
+    
+    if workers:
+        story.append(Spacer(1, 0.2*inch))
+        story.append(Paragraph(f"<b>All workers who handled the lot:</b> {escape(', '.join(workers))}", styles['Normal']))
+    
+    doc.build(story)
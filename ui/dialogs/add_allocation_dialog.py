@@ -239,6 +239,10 @@ class AddAllocationDialog:
         product = self.product_entry.get().strip()
         lot_number = self.lot_entry.get().strip()
         
+        # Selected workers must not be double-booked or short of rest
+        if not self.confirm_conflicts(allocation_name, selected_workers):
+            return
+        
         # Create the allocation
         self.state.allocations[allocation_name] = selected_workers
         
@@ -257,17 +261,40 @@ class AddAllocationDialog:
         if lot_number:
             self.state.allocation_lot_numbers[allocation_name] = lot_number
         
-        # Auto-save
+        self.result = True
+        self.dialog.destroy()
+        
+        # Auto-save (conflicts were confirmed above; a version saved meanwhile on
+        # another station is offered for merging or reloading)
+        from ui.dialogs.save_allocation_prompt import SaveAllocationPrompt
         try:
-            from export_results import ResultsExporter
-            exporter = ResultsExporter(self.state)
-            exporter.save_allocation_json(self.state.shift_time)
-            print(f"DEBUG: Created new allocation: {allocation_name}")
+            if SaveAllocationPrompt(self.parent, self.state).save(self.state.shift_time, allow_conflicts=True):
+                print(f"DEBUG: Created new allocation: {allocation_name}")
         except Exception as e:
-            print(f"ERROR: Auto-save failed: {e}")
+            messagebox.showerror("Save Error", f"Failed to save the new allocation:\n{str(e)}", parent=self.parent)
+    
+    def confirm_conflicts(self, allocation_name, selected_workers):
+        """Check the selected workers against the other tasks and saved shifts; False if the user backs out"""
+        if not self.state.selected_date or not self.state.shift_time:
+            return True
+        
+        from conflict_check import shift_conflicts, assignments_from_allocations, format_conflicts
+        allocations = dict(self.state.allocations)
+        allocations[allocation_name] = selected_workers
+        conflicts = shift_conflicts(
+            self.state.selected_date,
+            self.state.shift_time,
+            assignments_from_allocations(allocations),
+            workers=selected_workers
+        )
+        if not conflicts:
+            return True
         
-        self.result = True
-        self.dialog.destroy()
+        return messagebox.askyesno(
+            "Scheduling Conflict",
+            f"These workers are double-booked or short of rest:\n\n{format_conflicts(conflicts)}\n\nSave anyway?",
+            parent=self.dialog
+        )
     
     def cancel(self):
         """Cancel creating allocation"""
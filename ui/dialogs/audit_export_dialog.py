@@ -0,0 +1,240 @@
+"""
+Dialog for exporting the audit trail with filters
+"""
+import tkinter as tk
+from tkinter import ttk, messagebox
+import os
+import platform
+import queue
+import subprocess
+import threading
+
+from audit_trail import CHANGE_TYPES, EXPORT_FORMATS
+
+
+class AuditExportDialog:
+    """Dialog for choosing report format and filters, exporting in the background"""
+    
+    ALL = "All"
+    
+    FORMAT_LABELS = {
+        "Text Report (.txt)": 'text',
+        "Spreadsheet (.csv)": 'csv',
+        "JSON Lines (.jsonl)": 'jsonl'
+    }
+    
+    def __init__(self, root, state, allocation_date=None, shift_time=None):
+        self.root = root
+        self.state = state
+        self.allocation_date = allocation_date
+        self.shift_time = shift_time
+        self.window = None
+        
+        # Export runs on a worker thread; the UI polls this queue with after()
+        self.messages = queue.Queue()
+        self.cancel_event = threading.Event()
+        self.worker = None
+    
+    def show(self):
+        """Display the export dialog"""
+        self.window = tk.Toplevel(self.root)
+        self.window.title("Export Audit Report")
+        self.window.geometry("480x460")
+        self.window.configure(bg="#f0f0f0")
+        self.window.transient(self.root)
+        self.window.protocol("WM_DELETE_WINDOW", self.close)
+        
+        title = tk.Label(
+            self.window,
+            text="Export Audit Report",
+            font=("Arial", 16, "bold"),
+            bg="#f0f0f0",
+            fg="#2c3e50"
+        )
+        title.pack(pady=15)
+        
+        form = tk.Frame(self.window, bg="#f0f0f0")
+        form.pack(fill=tk.X, padx=30)
+        
+        self.format_combo = self.add_combo(form, 0, "Format:", list(self.FORMAT_LABELS.keys()))
+        
+        self.start_entry = self.add_entry(form, 1, "From Date (YYYY-MM-DD):", self.allocation_date or "")
+        self.end_entry = self.add_entry(form, 2, "To Date (YYYY-MM-DD):", self.allocation_date or "")
+        
+        self.type_combo = self.add_combo(form, 3, "Change Type:", [self.ALL] + CHANGE_TYPES)
+        self.shift_combo = self.add_combo(form, 4, "Shift:", [self.ALL, "Morning", "Evening"])
+        if self.shift_time:
+            self.shift_combo.set(self.shift_time)
+        
+        self.user_entry = self.add_entry(form, 5, "User:", "")
+        
+        # Progress
+        self.progress = ttk.Progressbar(self.window, mode='determinate', maximum=100)
+        self.progress.pack(fill=tk.X, padx=30, pady=(20, 5))
+        
+        self.status_label = tk.Label(
+            self.window,
+            text="",
+            font=("Arial", 10),
+            bg="#f0f0f0",
+            fg="#7f8c8d"
+        )
+        self.status_label.pack()
+        
+        # Buttons
+        button_frame = tk.Frame(self.window, bg="#f0f0f0")
+        button_frame.pack(side=tk.BOTTOM, pady=15)
+        
+        self.export_btn = tk.Button(
+            button_frame,
+            text="Export",
+            font=("Arial", 11, "bold"),
+            bg="#16a085",
+            fg="white",
+            width=15,
+            command=self.start_export
+        )
+        self.export_btn.pack(side=tk.LEFT, padx=5)
+        
+        close_btn = tk.Button(
+            button_frame,
+            text="Close",
+            font=("Arial", 11, "bold"),
+            bg="#95a5a6",
+            fg="white",
+            width=15,
+            command=self.close
+        )
+        close_btn.pack(side=tk.LEFT, padx=5)
+    
+    def add_combo(self, form, row, label, values):
+        """Add a labelled read-only combobox set to its first value"""
+        tk.Label(form, text=label, font=("Arial", 11), bg="#f0f0f0").grid(row=row, column=0, sticky="w", pady=5)
+        combo = ttk.Combobox(form, values=values, font=("Arial", 11), width=24, state="readonly")
+        combo.set(values[0])
+        combo.grid(row=row, column=1, sticky="w", padx=10, pady=5)
+        return combo
+    
+    def add_entry(self, form, row, label, value):
+        """Add a labelled entry"""
+        tk.Label(form, text=label, font=("Arial", 11), bg="#f0f0f0").grid(row=row, column=0, sticky="w", pady=5)
+        entry = tk.Entry(form, font=("Arial", 11), width=26)
+        entry.insert(0, value)
+        entry.grid(row=row, column=1, sticky="w", padx=10, pady=5)
+        return entry
+    
+    def get_options(self):
+        """Collect export options from the form"""
+        change_type = self.type_combo.get()
+        shift_time = self.shift_combo.get()
+        
+        return {
+            'fmt': self.FORMAT_LABELS[self.format_combo.get()],
+            'start_date': self.start_entry.get().strip() or None,
+            'end_date': self.end_entry.get().strip() or None,
+            'change_types': None if change_type == self.ALL else [change_type],
+            'shift_time': None if shift_time == self.ALL else shift_time,
+            'user': self.user_entry.get().strip() or None
+        }
+    
+    def start_export(self):
+        """Start the export on a worker thread"""
+        if self.worker and self.worker.is_alive():
+            return
+        
+        options = self.get_options()
+        if options['fmt'] not in EXPORT_FORMATS:
+            return
+        
+        self.cancel_event.clear()
+        self.export_btn.config(state=tk.DISABLED)
+        self.progress['value'] = 0
+        self.status_label.config(text="Exporting...")
+        
+        self.worker = threading.Thread(target=self.run_export, args=(options,), daemon=True)
+        self.worker.start()
+        self.poll()
+    
+    def run_export(self, options):
+        """Worker thread: stream the report and post progress to the queue"""
+        def report_progress(scanned, total):
+            self.messages.put(('progress', scanned, total))
+            return not self.cancel_event.is_set()
+        
+        try:
+            report_file = self.state.audit_trail.export_audit_report(
+                progress_callback=report_progress,
+                **options
+            )
+            self.messages.put(('done', report_file))
+        except Exception as e:
+            self.messages.put(('error', str(e)))
+    
+    def poll(self):
+        """Apply messages from the worker thread (runs on the Tk thread)"""
+        if self.window is None:
+            return
+        
+        try:
+            while True:
+                message = self.messages.get_nowait()
+                
+                if message[0] == 'progress':
+                    scanned, total = message[1], message[2]
+                    if total:
+                        self.progress['value'] = min(100, scanned * 100 / total)
+                    self.status_label.config(text=f"Scanned {scanned:,} of {total:,} entries")
+                elif message[0] == 'done':
+                    self.finish(message[1])
+                    return
+                elif message[0] == 'error':
+                    self.export_btn.config(state=tk.NORMAL)
+                    self.status_label.config(text="Export failed")
+                    messagebox.showerror("Export Error", f"Failed to export report:\n{message[1]}", parent=self.window)
+                    return
+        except queue.Empty:
+            pass
+        
+        if self.window is not None:
+            self.window.after(100, self.poll)
+    
+    def finish(self, report_file):
+        """Handle a completed (or cancelled) export"""
+        if self.window is None:
+            return
+        
+        self.export_btn.config(state=tk.NORMAL)
+        
+        if report_file is None:
+            self.status_label.config(text="Export cancelled")
+            return
+        
+        self.progress['value'] = 100
+        self.status_label.config(text=os.path.basename(report_file))
+        
+        result = messagebox.askyesno(
+            "Report Exported",
+            f"Audit report exported successfully!\n\n"
+            f"{os.path.basename(report_file)}\n\n"
+            f"Do you want to open the folder?",
+            parent=self.window
+        )
+        
+        if result:
+            self.open_folder(os.path.dirname(report_file))
+    
+    def close(self):
+        """Close the dialog, cancelling a running export"""
+        self.cancel_event.set()
+        if self.window is not None:
+            self.window.destroy()
+            self.window = None
+    
+    def open_folder(self, path):
+        """Open folder in file explorer"""
+        if platform.system() == "Windows":
+            os.startfile(path)
+        elif platform.system() == "Darwin":  # macOS
+            subprocess.Popen(["open", path])
+        else:  # Linux
+            subprocess.Popen(["xdg-open", path])
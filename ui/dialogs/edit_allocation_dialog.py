@@ -200,6 +200,10 @@ class EditAllocationDialog:
         # Workers being added to this allocation
         added_workers = new_workers_set - old_workers
         
+        # Added workers must not be double-booked or short of rest
+        if not self.confirm_conflicts(new_workers, added_workers):
+            return
+        
         # Update allocations
         self.state.allocations[self.allocation_name] = new_workers
         
@@ -237,13 +241,37 @@ class EditAllocationDialog:
         self.result = True
         self.dialog.destroy()
 
+        # Auto-save (conflicts were confirmed above; a version saved meanwhile on
+        # another station is offered for merging or reloading)
+        from ui.dialogs.save_allocation_prompt import SaveAllocationPrompt
         try:
-            from export_results import ResultsExporter
-            exporter = ResultsExporter(self.state)
-            exporter.save_allocation_json(self.state.shift_time)
-            print("DEBUG: Auto-saved changes to JSON")
+            if SaveAllocationPrompt(self.parent, self.state).save(self.state.shift_time, allow_conflicts=True):
+                print("DEBUG: Auto-saved changes to JSON")
         except Exception as e:
-            print(f"ERROR: Auto-save failed: {e}")
+            messagebox.showerror("Save Error", f"Failed to save changes:\n{str(e)}", parent=self.parent)
+    
+    def confirm_conflicts(self, new_workers, added_workers):
+        """Check added workers against the other tasks and saved shifts; False if the user backs out"""
+        if not added_workers or not self.state.selected_date or not self.state.shift_time:
+            return True
+        
+        from conflict_check import shift_conflicts, assignments_from_allocations, format_conflicts
+        allocations = dict(self.state.allocations)
+        allocations[self.allocation_name] = new_workers
+        conflicts = shift_conflicts(
+            self.state.selected_date,
+            self.state.shift_time,
+            assignments_from_allocations(allocations),
+            workers=added_workers
+        )
+        if not conflicts:
+            return True
+        
+        return messagebox.askyesno(
+            "Scheduling Conflict",
+            f"These workers are double-booked or short of rest:\n\n{format_conflicts(conflicts)}\n\nSave anyway?",
+            parent=self.dialog
+        )
     
     def cancel(self):
         """Cancel editing"""
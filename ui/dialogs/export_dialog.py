@@ -15,6 +15,7 @@ class ExportDialog:
         self.parent = parent
         self.state = state
         self.shift_time = None
+        self.reloaded = False  # another station's version replaced the allocation
     
     def show(self):
         """Export results using already selected shift time"""
@@ -25,31 +26,44 @@ class ExportDialog:
             messagebox.showwarning("No Shift Time", "Shift time not set!")
             return
         
-        # Import here to avoid circular imports
-        from export_results import ResultsExporter
-        
         try:
-            exporter = ResultsExporter(self.state)
-            
-            # Export to JSON and PDF
-            json_file = exporter.save_allocation_json(shift_time)
-            pdf_file = exporter.export_to_pdf(shift_time)
+            # Save the JSON (the file itself is written by the persistence worker)
+            from ui.dialogs.save_allocation_prompt import SaveAllocationPrompt
+            prompt = SaveAllocationPrompt(self.parent, self.state)
+            json_file = prompt.save(shift_time)
+            self.reloaded = prompt.reloaded
+            if json_file is None:
+                return
             
-            # Show success message
-            result = messagebox.askyesno(
-                "Export Successful",
-                f"Files created successfully!\n\n"
-                f"JSON: {os.path.basename(json_file)}\n"
-                f"PDF: {os.path.basename(pdf_file)}\n\n"
-                f"Do you want to open the folder?"
-            )
-            
-            if result:
-                self.open_folder(os.path.dirname(pdf_file))
+            # Build the PDF in the background from a snapshot of the allocation
+            from export_results import ResultsExporter
+            from export_jobs import export_runner
+            from ui.dialogs.export_progress_dialog import ExportProgressDialog
+            exporter = ResultsExporter(self.state)
+            job = export_runner.submit(exporter.pdf_snapshot(shift_time))
+            ExportProgressDialog.watch(self.parent, job, lambda job: self.finish(json_file, job))
         
         except Exception as e:
             messagebox.showerror("Export Error", f"Failed to export:\n{str(e)}")
     
+    def finish(self, json_file, job):
+        """Report a finished export (called on the Tk thread)"""
+        from ui.dialogs.export_progress_dialog import export_succeeded
+        if not export_succeeded(self.parent, job, json_file):
+            return
+        
+        # Show success message
+        result = messagebox.askyesno(
+            "Export Successful",
+            f"Files created successfully!\n\n"
+            f"JSON: {os.path.basename(json_file)}\n"
+            f"PDF: {os.path.basename(job.filename)}\n\n"
+            f"Do you want to open the folder?"
+        )
+        
+        if result:
+            self.open_folder(os.path.dirname(job.filename))
+    
     def open_folder(self, path):
         """Open folder in file explorer"""
         if platform.system() == "Windows":
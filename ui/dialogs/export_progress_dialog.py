@@ -0,0 +1,134 @@
+"""
+Progress window for a background PDF export (see export_jobs)
+"""
+import tkinter as tk
+from tkinter import ttk, messagebox
+import os
+
+from export_jobs import DONE, FAILED
+
+
+class ExportProgressDialog:
+    """Non-modal window following an export job, with a Cancel button"""
+    
+    POLL_MS = 100
+    
+    # filename -> dialog following its job (a coalesced export reuses the window)
+    open_dialogs = {}
+    
+    def __init__(self, root, job, on_finished):
+        self.root = root
+        self.job = job
+        self.on_finished = on_finished
+        self.window = None
+    
+    @classmethod
+    def watch(cls, root, job, on_finished):
+        """
+        Show the progress of a job and call on_finished(job) on the Tk thread when it ends
+        
+        If the job is already shown (an export coalesced into a queued one),
+        its window is raised and on_finished replaces the earlier callback.
+        """
+        dialog = cls.open_dialogs.get(job.filename)
+        if dialog is not None and dialog.job is job and dialog.window is not None:
+            dialog.on_finished = on_finished
+            dialog.window.lift()
+            return dialog
+        
+        dialog = cls(root, job, on_finished)
+        cls.open_dialogs[job.filename] = dialog
+        dialog.show()
+        return dialog
+    
+    def show(self):
+        """Display the window and start polling the job"""
+        self.window = tk.Toplevel(self.root)
+        self.window.title("Exporting PDF")
+        self.window.geometry("420x170")
+        self.window.configure(bg="#f0f0f0")
+        self.window.transient(self.root)
+        self.window.protocol("WM_DELETE_WINDOW", self.cancel)
+        
+        tk.Label(
+            self.window,
+            text=os.path.basename(self.job.filename),
+            font=("Arial", 11, "bold"),
+            bg="#f0f0f0",
+            fg="#2c3e50"
+        ).pack(pady=(15, 5))
+        
+        self.progress = ttk.Progressbar(self.window, mode='determinate', maximum=100)
+        self.progress.pack(fill=tk.X, padx=30, pady=5)
+        
+        self.status_label = tk.Label(
+            self.window,
+            text=self.job.message,
+            font=("Arial", 10),
+            bg="#f0f0f0",
+            fg="#7f8c8d"
+        )
+        self.status_label.pack()
+        
+        self.cancel_btn = tk.Button(
+            self.window,
+            text="Cancel",
+            font=("Arial", 11, "bold"),
+            bg="#95a5a6",
+            fg="white",
+            width=15,
+            command=self.cancel
+        )
+        self.cancel_btn.pack(pady=10)
+        
+        self.poll()
+    
+    def poll(self):
+        """Show the job's progress (runs on the Tk thread every POLL_MS)"""
+        if self.window is None:
+            return
+        
+        self.progress['value'] = self.job.progress
+        cancelling = self.job.cancel_event.is_set()
+        self.status_label.config(text="Cancelling..." if cancelling else self.job.message)
+        
+        if self.job.finished:
+            self.close()
+            self.on_finished(self.job)
+            return
+        
+        self.window.after(self.POLL_MS, self.poll)
+    
+    def cancel(self):
+        """Cancel the export; the window closes once the runner has dropped it"""
+        self.job.cancel()
+        self.cancel_btn.config(state=tk.DISABLED)
+    
+    def close(self):
+        """Close the window"""
+        if self.open_dialogs.get(self.job.filename) is self:
+            del self.open_dialogs[self.job.filename]
+        if self.window is not None:
+            self.window.destroy()
+            self.window = None
+
+
+def export_succeeded(parent, job, saved_file=None):
+    """
+    Tell the user why a finished export produced no PDF
+    
+    Args:
+        saved_file: Allocation JSON saved along with the PDF, mentioned in the message
+    
+    Returns:
+        True if the PDF was written
+    """
+    if job.status == DONE:
+        return True
+    
+    saved = f"The allocation was saved to {os.path.basename(saved_file)}.\n\n" if saved_file else ""
+    if job.status == FAILED:
+        messagebox.showerror("Export Error", f"{saved}Failed to export the PDF:\n{job.error}", parent=parent)
+    else:
+        messagebox.showinfo("Export Cancelled", f"{saved}The PDF was not created.", parent=parent)
+    return False
@@ -2,6 +2,7 @@
 Overtime workers dialog
 """
 import tkinter as tk
+from tkinter import messagebox
 from utils.helpers import bind_mousewheel
 
 
@@ -109,6 +110,17 @@ class OvertimeDialog:
     def confirm_overtime(self):
         """Confirm overtime worker selection"""
         selected = [w for w, var in self.overtime_vars.items() if var.get()]
+        
+        # Overtime workers often already worked the other shift of the day
+        from conflict_check import saved_shift_conflicts, format_conflicts
+        conflicts = saved_shift_conflicts(self.state.selected_date, self.state.shift_time, selected)
+        if conflicts and not messagebox.askyesno(
+            "Scheduling Conflict",
+            f"These workers are double-booked or short of rest:\n\n{format_conflicts(conflicts)}\n\nAdd them anyway?",
+            parent=self.window
+        ):
+            return
+        
         if selected:
             self.state.add_overtime(selected)
         self.window.destroy()
\ No newline at end of file
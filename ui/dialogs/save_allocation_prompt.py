@@ -0,0 +1,79 @@
+"""
+Saving an allocation with the questions a save can raise: double bookings
+(conflict_check) and a newer version saved by another station
+"""
+from tkinter import messagebox
+
+
+class SaveAllocationPrompt:
+    """Save the current allocation, asking the user how to resolve conflicts"""
+    
+    def __init__(self, parent, state):
+        self.parent = parent
+        self.state = state
+        self.reloaded = False  # the user discarded their changes for the other station's version
+    
+    def save(self, shift_time, allow_conflicts=False):
+        """
+        Save the allocation JSON
+        
+        Args:
+            allow_conflicts: Conflicts were already confirmed (e.g. by the edit dialogs)
+        
+        Returns:
+            Path of the saved file, or None if the user cancelled or reloaded
+        """
+        from export_results import ResultsExporter
+        from conflict_check import AllocationConflictError
+        from utils.file_lock import StaleWriteError
+        
+        exporter = ResultsExporter(self.state)
+        while True:
+            try:
+                return exporter.save_allocation_json(shift_time, allow_conflicts=allow_conflicts)
+            except AllocationConflictError as e:
+                if not messagebox.askyesno(
+                    "Scheduling Conflict",
+                    f"These workers are double-booked or short of rest:\n\n{e}\n\nSave anyway?",
+                    parent=self.parent
+                ):
+                    return None
+                allow_conflicts = True
+            except StaleWriteError as e:
+                if not self.resolve_stale_write(e):
+                    return None
+    
+    def resolve_stale_write(self, error):
+        """
+        Ask whether to merge our changes into the other station's version or reload it
+        
+        Returns:
+            True if the save should be retried (merged), False otherwise
+        """
+        answer = messagebox.askyesnocancel(
+            "Changed on Another Station",
+            f"{self.state.selected_date} {self.state.shift_time} was saved on another station "
+            f"while you were editing it.\n\n"
+            f"Yes: merge your changes into their version\n"
+            f"No: reload their version (your changes are discarded)\n"
+            f"Cancel: keep editing",
+            parent=self.parent
+        )
+        if answer is None:
+            return False
+        
+        from allocation_diff import merge_allocations
+        selected_date, shift_time = self.state.selected_date, self.state.shift_time
+        
+        if answer:
+            merged = merge_allocations(error.base, error.ours, error.current)
+            self.state.load_allocation_from_json(error.path, merged)
+            # Their version is now the one the merge is saved over
+            self.state.loaded_allocation = error.current
+        else:
+            self.state.load_allocation_from_json(error.path, error.current)
+            self.reloaded = True
+        
+        # Keep the shift being edited (the file name, not the JSON metadata, is authoritative)
+        self.state.selected_date, self.state.shift_time = selected_date, shift_time
+        return answer
@@ -200,5 +200,14 @@ class ShiftSwapDialog:
             messagebox.showinfo("No Changes", "No valid swaps selected")
             return
         
+        from conflict_check import saved_shift_conflicts, format_conflicts
+        conflicts = saved_shift_conflicts(self.state.selected_date, self.state.shift_time, added)
+        if conflicts and not messagebox.askyesno(
+            "Scheduling Conflict",
+            f"These workers are double-booked or short of rest:\n\n{format_conflicts(conflicts)}\n\nSwap them in anyway?",
+            parent=self.window
+        ):
+            return
+        
         self.state.add_shift_swap(removed, added)
         self.window.destroy()
\ No newline at end of file
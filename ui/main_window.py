@@ -2,7 +2,9 @@
 Main window and navigation controller
 """
 import tkinter as tk
+from tkinter import messagebox
 from models.state import ApplicationState
+from persistence_worker import persistence_worker
 from ui.screens.start_screen import StartScreen
 from ui.screens.absentee_screen import AbsenteeScreen
 from ui.screens.actions_screen import ActionsScreen
@@ -13,6 +15,9 @@ from ui.screens.results_screen import ResultsScreen
 from ui.screens.date_shift_screen import DateShiftScreen
 from ui.screens.history_viewer_screen import HistoryViewerScreen
 from ui.screens.audit_log_screen import AuditLogScreen
+from ui.screens.workload_dashboard_screen import WorkloadDashboardScreen
+from ui.screens.allocation_search_screen import AllocationSearchScreen
+from ui.screens.shift_diff_screen import ShiftDiffScreen
 
 class WorkerAllocationSystem:
     """Main application controller"""
@@ -48,14 +53,42 @@ class WorkerAllocationSystem:
             'compression_allocation': CompressionAllocationScreen(self),
             'results': ResultsScreen(self),
             'history_viewer': HistoryViewerScreen(self),
-            'audit_log' : AuditLogScreen(self)
+            'audit_log' : AuditLogScreen(self),
+            'workload_dashboard': WorkloadDashboardScreen(self),
+            'allocation_search': AllocationSearchScreen(self),
+            'shift_diff': ShiftDiffScreen(self)
         }
 
         
         
+        # Saves run on the persistence worker: flush them on close, report failures
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
+        self.poll_persistence_errors()
+        
         # Start screen
         self.show_screen('date_shift')
     
+    def on_close(self):
+        """Flush queued saves before closing the window"""
+        if not persistence_worker.flush(timeout=30):
+            if not messagebox.askyesno(
+                "Saving",
+                "Some changes are still being saved.\n\nClose anyway and lose them?"
+            ):
+                return
+        self.root.destroy()
+    
+    def poll_persistence_errors(self):
+        """Show errors from background saves (runs every 500 ms on the Tk thread)"""
+        errors = persistence_worker.take_errors()
+        if errors:
+            messagebox.showerror(
+                "Save Error",
+                "Some changes could not be saved:\n\n" +
+                "\n".join(f"• {name}: {error}" for name, error in errors)
+            )
+        self.root.after(500, self.poll_persistence_errors)
+    
     def clear_frame(self):
         """Destroy all widgets in main frame"""
         for widget in self.main_frame.winfo_children():
@@ -0,0 +1,225 @@
+"""
+Cross-shift search screen: where was a worker, who worked a task, where was a
+product made and everything that touched a lot (with a traceability report)
+"""
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox
+from ui.screens.base_screen import BaseScreen
+
+
+class AllocationSearchScreen(BaseScreen):
+    """Screen answering questions across all saved shifts through the allocation index"""
+    
+    # Search kind -> (index query, table columns, column titles)
+    KINDS = {
+        "Worker": ('worker_shifts', ('date', 'shift', 'task', 'product', 'lot_number'),
+                   ('Date', 'Shift', 'Task', 'Product', 'Lot Number')),
+        "Task": ('task_shifts', ('date', 'shift', 'workers'),
+                 ('Date', 'Shift', 'Workers')),
+        "Product": ('product_shifts', ('date', 'shift', 'task', 'lot_number'),
+                    ('Date', 'Shift', 'Task', 'Lot Number')),
+        "Lot": ('lot_shifts', ('date', 'shift', 'task', 'product', 'workers'),
+                ('Date', 'Shift', 'Task', 'Product', 'Workers'))
+    }
+    
+    def show(self, **kwargs):
+        from allocation_index import allocation_index
+        self.index = allocation_index
+        
+        title = self.create_title("🔎 Search Allocations", 24)
+        title.pack(pady=20)
+        
+        # Filter bar
+        filter_frame = tk.Frame(self.main_frame, bg="#e8f4f8", relief=tk.RAISED, bd=2)
+        filter_frame.pack(fill=tk.X, padx=30, pady=10)
+        
+        def add_label(text):
+            tk.Label(filter_frame, text=text, font=("Arial", 11, "bold"), bg="#e8f4f8").pack(side=tk.LEFT, padx=(15, 5), pady=10)
+        
+        add_label("Search by:")
+        self.kind_combo = ttk.Combobox(
+            filter_frame,
+            values=list(self.KINDS.keys()),
+            font=("Arial", 11),
+            width=10,
+            state="readonly"
+        )
+        self.kind_combo.set("Worker")
+        self.kind_combo.pack(side=tk.LEFT, pady=10)
+        self.kind_combo.bind("<<ComboboxSelected>>", lambda e: self.on_kind_changed())
+        
+        add_label("Name:")
+        self.name_combo = ttk.Combobox(filter_frame, font=("Arial", 11), width=35)
+        self.name_combo.pack(side=tk.LEFT, pady=10)
+        self.name_combo.bind("<<ComboboxSelected>>", lambda e: self.run_search())
+        self.name_combo.bind("<Return>", lambda e: self.run_search())
+        
+        add_label("From:")
+        self.start_entry = tk.Entry(filter_frame, font=("Arial", 11), width=11)
+        self.start_entry.pack(side=tk.LEFT, pady=10)
+        self.start_entry.bind("<Return>", lambda e: self.run_search())
+        
+        add_label("To:")
+        self.end_entry = tk.Entry(filter_frame, font=("Arial", 11), width=11)
+        self.end_entry.pack(side=tk.LEFT, pady=10)
+        self.end_entry.bind("<Return>", lambda e: self.run_search())
+        
+        search_btn = tk.Button(
+            filter_frame,
+            text="Search",
+            font=("Arial", 11, "bold"),
+            bg="#3498db",
+            fg="white",
+            command=self.run_search,
+            cursor="hand2"
+        )
+        search_btn.pack(side=tk.LEFT, padx=15, pady=10)
+        
+        self.summary_label = tk.Label(
+            filter_frame,
+            text="",
+            font=("Arial", 10),
+            bg="#e8f4f8",
+            fg="#2c3e50"
+        )
+        self.summary_label.pack(side=tk.RIGHT, padx=15, pady=10)
+        
+        # Bottom buttons
+        button_frame = tk.Frame(self.main_frame, bg="#f0f0f0")
+        button_frame.pack(side=tk.BOTTOM, pady=20, fill=tk.X, padx=20)
+        
+        back_btn = self.create_button(
+            button_frame,
+            "← Back",
+            lambda: self.app.show_screen('date_shift'),
+            bg="#95a5a6"
+        )
+        back_btn.pack(side=tk.LEFT, padx=5)
+        
+        self.trace_buttons = []
+        for text, fmt in (("📄 Lot Report (CSV)", 'csv'), ("📄 Lot Report (PDF)", 'pdf')):
+            trace_btn = self.create_button(
+                button_frame,
+                text,
+                lambda fmt=fmt: self.export_lot_report(fmt),
+                bg="#16a085"
+            )
+            trace_btn.pack(side=tk.LEFT, padx=5)
+            self.trace_buttons.append(trace_btn)
+        
+        hint = tk.Label(
+            button_frame,
+            text="Double-click a row to open that shift",
+            font=("Arial", 10, "italic"),
+            bg="#f0f0f0",
+            fg="#7f8c8d"
+        )
+        hint.pack(side=tk.RIGHT, padx=5)
+        
+        # Results table
+        table_frame = tk.Frame(self.main_frame, bg="#f0f0f0")
+        table_frame.pack(fill=tk.BOTH, expand=True, padx=30, pady=10)
+        
+        self.tree = ttk.Treeview(table_frame, show='headings')
+        scrollbar = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=scrollbar.set)
+        self.tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree.bind("<Double-1>", self.open_selected_shift)
+        
+        self.on_kind_changed()
+    
+    def on_kind_changed(self):
+        """Refill the name list and table columns for the selected search kind"""
+        kind = self.kind_combo.get()
+        names = {
+            "Worker": self.index.get_workers,
+            "Task": self.index.get_tasks,
+            "Product": self.index.get_products,
+            "Lot": self.index.get_lots
+        }[kind]()
+        
+        self.name_combo['values'] = names
+        self.name_combo.set("")
+        
+        _, columns, titles = self.KINDS[kind]
+        self.tree.delete(*self.tree.get_children())
+        self.tree['columns'] = columns
+        for column, heading in zip(columns, titles):
+            self.tree.heading(column, text=heading)
+            width = 500 if column == 'workers' else (100 if column in ('date', 'shift') else 220)
+            self.tree.column(column, width=width, anchor=tk.W)
+        
+        self.summary_label.config(text=f"{len(names)} {kind.lower()}s indexed")
+        
+        for button in self.trace_buttons:
+            button.config(state=tk.NORMAL if kind == "Lot" else tk.DISABLED)
+    
+    def run_search(self):
+        """Query the index and fill the table"""
+        kind = self.kind_combo.get()
+        name = self.name_combo.get().strip()
+        if not name:
+            return
+        
+        start_date = self.start_entry.get().strip() or None
+        end_date = self.end_entry.get().strip() or None
+        for value in (start_date, end_date):
+            if value and len(value) != 10:
+                messagebox.showwarning("Invalid Date", "Dates must be in YYYY-MM-DD format")
+                return
+        
+        query, columns, _ = self.KINDS[kind]
+        started = time.perf_counter()
+        results = getattr(self.index, query)(name, start_date, end_date)
+        elapsed = (time.perf_counter() - started) * 1000
+        
+        self.tree.delete(*self.tree.get_children())
+        for result in results:
+            values = []
+            for column in columns:
+                value = result[column]
+                if column == 'workers':
+                    value = ", ".join(value)
+                values.append(value if value is not None else "N/A")
+            self.tree.insert('', tk.END, values=values)
+        
+        self.summary_label.config(text=f"{len(results)} shifts found in {elapsed:.1f} ms")
+    
+    def export_lot_report(self, fmt):
+        """Write the traceability report of the searched lot"""
+        lot_number = self.name_combo.get().strip()
+        if not lot_number:
+            messagebox.showwarning("No Lot", "Enter a lot number to report on")
+            return
+        
+        from traceability_report import export_lot_trace
+        try:
+            output_file, count = export_lot_trace(
+                lot_number,
+                fmt,
+                start_date=self.start_entry.get().strip() or None,
+                end_date=self.end_entry.get().strip() or None
+            )
+        except ImportError:
+            messagebox.showerror("Report Unavailable", "PDF reports require reportlab.\n\nInstall it with: pip install reportlab")
+            return
+        except Exception as e:
+            messagebox.showerror("Report Failed", f"Could not write the report:\n{e}")
+            return
+        
+        messagebox.showinfo("Report Saved", f"Traceability report for lot {lot_number} ({count} entries) saved to:\n{output_file}")
+    
+    def open_selected_shift(self, event=None):
+        """Open the double-clicked shift in the history viewer"""
+        selection = self.tree.selection()
+        if not selection:
+            return
+        
+        values = self.tree.item(selection[0], 'values')
+        exists, filepath = self.state.check_allocation_exists(values[0], values[1])
+        if exists:
+            self.app.show_screen('history_viewer', filepath=filepath)
+        else:
+            messagebox.showinfo("No Allocation Found", f"No allocation found for:\n{values[0]} - {values[1]} Shift")
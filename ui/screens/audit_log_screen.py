@@ -4,57 +4,51 @@ Audit log viewer screen
 import tkinter as tk
 from tkinter import ttk, messagebox
 from ui.screens.base_screen import BaseScreen
-import os
 
 
 class AuditLogScreen(BaseScreen):
     """Screen for viewing allocation edit history/audit trail"""
     
+    # Only this many rows exist in the table; scrolling re-fills them from the query
+    VISIBLE_ROWS = 20
+    
+    ALL = "All"
+    
     def show(self, **kwargs):
         allocation_date = kwargs.get('allocation_date')
         shift_time = kwargs.get('shift_time')
+        self.allocation_date = allocation_date
+        self.shift_time = shift_time
         self.return_filepath = kwargs.get('filepath')
         
+        self.query = None
+        self.top = 0
+        self.row_entries = {}  # tree item id -> entry shown in that row
+        self.search_after_id = None
+        
         # Title
         if allocation_date and shift_time:
             title_text = f"📋 Audit Trail - {allocation_date} {shift_time}"
-            history = self.state.audit_trail.get_allocation_audit_log(allocation_date, shift_time)
         else:
-            title_text = "📋 Recent Audit Trail"
-            history = self.state.audit_trail.get_recent_changes(100)
+            title_text = "📋 Audit Trail"
         
         title = self.create_title(title_text, 22)
         title.pack(pady=20)
         
+        self.create_filter_bar()
+        
         # Info bar
         info_frame = tk.Frame(self.main_frame, bg="#e8f4f8", relief=tk.RAISED, bd=2)
         info_frame.pack(fill=tk.X, padx=30, pady=10)
         
-        info_text = f"Total Entries: {len(history)}"
-        if history:
-            info_text += f" | Oldest: {history[0]['timestamp']} | Newest: {history[-1]['timestamp']}"
-        
-        info_label = tk.Label(
+        self.info_label = tk.Label(
             info_frame,
-            text=info_text,
+            text="",
             font=("Arial", 10),
             bg="#e8f4f8",
             fg="#2c3e50"
         )
-        info_label.pack(pady=8)
-        
-        if not history:
-            no_history = tk.Label(
-                self.main_frame,
-                text="No audit trail entries found",
-                font=("Arial", 14),
-                bg="#f0f0f0",
-                fg="#7f8c8d"
-            )
-            no_history.pack(pady=50)
-        else:
-            # Create table
-            self.create_audit_table(history)
+        self.info_label.pack(pady=8)
         
         # Bottom buttons
         button_frame = tk.Frame(self.main_frame, bg="#f0f0f0")
@@ -68,14 +62,116 @@ class AuditLogScreen(BaseScreen):
         )
         back_btn.pack(side=tk.LEFT, padx=5)
         
-        if history:
-            export_btn = self.create_button(
-                button_frame,
-                "📄 Export Report",
-                self.export_audit_report,
-                bg="#16a085"
-            )
-            export_btn.pack(side=tk.LEFT, padx=5)
+        export_btn = self.create_button(
+            button_frame,
+            "📄 Export Report",
+            self.export_audit_report,
+            bg="#16a085"
+        )
+        export_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Create table
+        self.create_audit_table()
+        
+        if allocation_date and shift_time:
+            self.start_entry.insert(0, allocation_date)
+            self.end_entry.insert(0, allocation_date)
+            self.shift_combo.set(shift_time)
+        
+        self.apply_filters()
+    
+    def create_filter_bar(self):
+        """Create filter controls; every change re-runs the query"""
+        filter_frame = tk.Frame(self.main_frame, bg="#f0f0f0")
+        filter_frame.pack(fill=tk.X, padx=30)
+        
+        def add_label(text):
+            tk.Label(filter_frame, text=text, font=("Arial", 10, "bold"), bg="#f0f0f0").pack(side=tk.LEFT, padx=(10, 3))
+        
+        def add_combo(values, width):
+            combo = ttk.Combobox(filter_frame, values=values, font=("Arial", 10), width=width, state="readonly")
+            combo.set(values[0])
+            combo.pack(side=tk.LEFT)
+            combo.bind("<<ComboboxSelected>>", lambda e: self.apply_filters())
+            return combo
+        
+        def add_entry(width):
+            entry = tk.Entry(filter_frame, font=("Arial", 10), width=width)
+            entry.pack(side=tk.LEFT)
+            entry.bind("<Return>", lambda e: self.apply_filters())
+            return entry
+        
+        from audit_trail import CHANGE_TYPES
+        
+        add_label("Type:")
+        self.type_combo = add_combo([self.ALL] + CHANGE_TYPES, 22)
+        
+        add_label("From:")
+        self.start_entry = add_entry(11)
+        add_label("To:")
+        self.end_entry = add_entry(11)
+        
+        add_label("Shift:")
+        self.shift_combo = add_combo([self.ALL, "Morning", "Evening"], 9)
+        
+        add_label("User:")
+        self.user_combo = add_combo([self.ALL] + self.state.audit_trail.get_users(), 12)
+        
+        add_label("Search:")
+        self.search_entry = add_entry(18)
+        # Search as the user types, once typing pauses
+        self.search_entry.bind("<KeyRelease>", lambda e: self.schedule_search())
+        
+        tk.Button(
+            filter_frame,
+            text="Clear",
+            font=("Arial", 10),
+            command=self.clear_filters
+        ).pack(side=tk.LEFT, padx=10)
+    
+    def schedule_search(self):
+        """Debounce free-text search"""
+        if self.search_after_id:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(300, self.apply_filters)
+    
+    def clear_filters(self):
+        """Reset all filters"""
+        self.type_combo.set(self.ALL)
+        self.shift_combo.set(self.ALL)
+        self.user_combo.set(self.ALL)
+        for entry in (self.start_entry, self.end_entry, self.search_entry):
+            entry.delete(0, tk.END)
+        self.apply_filters()
+    
+    def get_filters(self):
+        """Collect query filters from the filter bar"""
+        change_type = self.type_combo.get()
+        shift_time = self.shift_combo.get()
+        user = self.user_combo.get()
+        
+        return {
+            'change_types': None if change_type == self.ALL else [change_type],
+            'start_date': self.start_entry.get().strip() or None,
+            'end_date': self.end_entry.get().strip() or None,
+            'shift_time': None if shift_time == self.ALL else shift_time,
+            'user': None if user == self.ALL else user,
+            'text': self.search_entry.get().strip() or None
+        }
+    
+    def apply_filters(self):
+        """Re-run the query and show its first page"""
+        self.search_after_id = None
+        self.query = self.state.audit_trail.query(**self.get_filters())
+        self.top = 0
+        
+        total = len(self.query)
+        if total:
+            self.info_label.config(text=f"Matching Entries: {total:,} (newest first)")
+        else:
+            self.info_label.config(text="No audit trail entries found")
+        
+        self.render()
     
     def go_back(self):
         """Go back to previous screen"""
@@ -84,21 +180,21 @@ class AuditLogScreen(BaseScreen):
         else:
             self.app.show_screen('date_shift')
     
-    def create_audit_table(self, history):
-        """Create table showing audit entries"""
-        # Frame for table with scrolling
+    def create_audit_table(self):
+        """Create the virtual table showing a window of the query results"""
         canvas_frame = tk.Frame(self.main_frame, bg="#ffffff")
         canvas_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
         
         # Create Treeview
-        columns = ('timestamp', 'type', 'date', 'shift', 'details')
-        tree = ttk.Treeview(canvas_frame, columns=columns, show='headings', height=15)
+        columns = ('timestamp', 'type', 'date', 'shift', 'user', 'details')
+        tree = ttk.Treeview(canvas_frame, columns=columns, show='headings', height=self.VISIBLE_ROWS)
         
         # Define headings
         tree.heading('timestamp', text='Timestamp')
         tree.heading('type', text='Change Type')
         tree.heading('date', text='Allocation Date')
         tree.heading('shift', text='Shift')
+        tree.heading('user', text='User')
         tree.heading('details', text='Details')
         
         # Define column widths
@@ -106,6 +202,7 @@ class AuditLogScreen(BaseScreen):
         tree.column('type', width=180, anchor='w')
         tree.column('date', width=120, anchor='center')
         tree.column('shift', width=80, anchor='center')
+        tree.column('user', width=90, anchor='center')
         tree.column('details', width=350, anchor='w')
         
         # Color tags for different change types
@@ -114,8 +211,64 @@ class AuditLogScreen(BaseScreen):
         tree.tag_configure('deleted', background='#f8d7da')
         tree.tag_configure('normal', background='#ffffff')
         
-        # Add data (newest first)
-        for entry in reversed(history):
+        # The scrollbar maps to positions in the query, not to tree items
+        vsb = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=self.on_scroll)
+        hsb = ttk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL, command=tree.xview)
+        tree.configure(xscrollcommand=hsb.set)
+        
+        # Grid layout
+        tree.grid(row=0, column=0, sticky='nsew')
+        vsb.grid(row=0, column=1, sticky='ns')
+        hsb.grid(row=1, column=0, sticky='ew')
+        
+        canvas_frame.grid_rowconfigure(0, weight=1)
+        canvas_frame.grid_columnconfigure(0, weight=1)
+        
+        # Scrolling moves the window instead of the tree's own view
+        tree.bind('<MouseWheel>', lambda e: self.scroll_rows(-3 if e.delta > 0 else 3))
+        tree.bind('<Button-4>', lambda e: self.scroll_rows(-3))
+        tree.bind('<Button-5>', lambda e: self.scroll_rows(3))
+        tree.bind('<Prior>', lambda e: self.scroll_rows(-self.VISIBLE_ROWS))
+        tree.bind('<Next>', lambda e: self.scroll_rows(self.VISIBLE_ROWS))
+        tree.bind('<Home>', lambda e: self.scroll_to(0))
+        tree.bind('<End>', lambda e: self.scroll_to(len(self.query)))
+        
+        # Bind double-click to show details
+        tree.bind('<Double-1>', lambda e: self.show_entry_details(tree))
+        
+        self.tree = tree
+        self.vsb = vsb
+    
+    def on_scroll(self, action, amount, unit=None):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units'|'pages')"""
+        if action == 'moveto':
+            self.scroll_to(int(float(amount) * len(self.query)))
+        elif unit == 'pages':
+            self.scroll_rows(int(amount) * self.VISIBLE_ROWS)
+        else:
+            self.scroll_rows(int(amount))
+    
+    def scroll_rows(self, rows):
+        """Move the visible window by a number of rows"""
+        self.scroll_to(self.top + rows)
+        return "break"
+    
+    def scroll_to(self, position):
+        """Show the window starting at a query position"""
+        last_top = max(len(self.query) - self.VISIBLE_ROWS, 0)
+        position = min(max(position, 0), last_top)
+        if position != self.top:
+            self.top = position
+            self.render()
+        return "break"
+    
+    def render(self):
+        """Fill the table with the entries in the visible window"""
+        tree = self.tree
+        tree.delete(*tree.get_children())
+        self.row_entries = {}
+        
+        for entry in self.query.page(self.top, self.VISIBLE_ROWS):
             details_str = self.format_details(entry['details'])
             
             # Determine tag based on change type
@@ -128,29 +281,23 @@ class AuditLogScreen(BaseScreen):
             else:
                 tag = 'normal'
             
-            tree.insert('', tk.END, values=(
+            # Tk generates a unique item id; the entry is looked up by it, so
+            # rows with duplicate entry ids (e.g. migrated twice) keep their details
+            item = tree.insert('', tk.END, values=(
                 entry['timestamp'],
                 self.format_change_type(entry['change_type']),
                 entry['allocation_date'],
                 entry['shift_time'],
+                entry.get('user', ''),
                 details_str
             ), tags=(tag,))
+            self.row_entries[item] = entry
         
-        # Add scrollbars
-        vsb = ttk.Scrollbar(canvas_frame, orient=tk.VERTICAL, command=tree.yview)
-        hsb = ttk.Scrollbar(canvas_frame, orient=tk.HORIZONTAL, command=tree.xview)
-        tree.configure(yscrollcommand=vsb.set, xscrollcommand=hsb.set)
-        
-        # Grid layout
-        tree.grid(row=0, column=0, sticky='nsew')
-        vsb.grid(row=0, column=1, sticky='ns')
-        hsb.grid(row=1, column=0, sticky='ew')
-        
-        canvas_frame.grid_rowconfigure(0, weight=1)
-        canvas_frame.grid_columnconfigure(0, weight=1)
-        
-        # Bind double-click to show details
-        tree.bind('<Double-1>', lambda e: self.show_entry_details(tree))
+        total = len(self.query)
+        if total:
+            self.vsb.set(self.top / total, min(self.top + self.VISIBLE_ROWS, total) / total)
+        else:
+            self.vsb.set(0, 1)
     
     def format_change_type(self, change_type):
         """Format change type for display"""
@@ -179,18 +326,7 @@ class AuditLogScreen(BaseScreen):
         if not selection:
             return
         
-        item = tree.item(selection[0])
-        values = item['values']
-        
-        # Find the full entry
-        timestamp = values[0]
-        history = self.state.audit_trail.load_audit_log()
-        
-        entry = None
-        for e in history:
-            if e['timestamp'] == timestamp:
-                entry = e
-                break
+        entry = self.row_entries.get(selection[0])
         
         if not entry:
             return
@@ -250,27 +386,7 @@ class AuditLogScreen(BaseScreen):
         close_btn.pack(pady=10)
     
     def export_audit_report(self):
-        """Export audit trail to text file"""
-        try:
-            report_file = self.state.audit_trail.export_audit_report()
-            
-            result = messagebox.askyesno(
-                "Report Exported",
-                f"Audit report exported successfully!\n\n"
-                f"{os.path.basename(report_file)}\n\n"
-                f"Do you want to open the folder?"
-            )
-            
-            if result:
-                import platform
-                import subprocess
-                folder = os.path.dirname(report_file)
-                if platform.system() == "Windows":
-                    os.startfile(folder)
-                elif platform.system() == "Darwin":
-                    subprocess.Popen(["open", folder])
-                else:
-                    subprocess.Popen(["xdg-open", folder])
-        
-        except Exception as e:
-            messagebox.showerror("Export Error", f"Failed to export report:\n{str(e)}")
\ No newline at end of file
+        """Open the export dialog, pre-filtered to the shown shift"""
+        from ui.dialogs.audit_export_dialog import AuditExportDialog
+        dialog = AuditExportDialog(self.root, self.state, self.allocation_date, self.shift_time)
+        dialog.show()
@@ -4,7 +4,6 @@ Compression allocation screen with combined skill sorting
 import tkinter as tk
 from tkinter import messagebox
 from ui.screens.base_screen import BaseScreen
-from data import get_combined_skill, get_worker_skill, get_product_skill
 
 
 class CompressionAllocationScreen(BaseScreen):
@@ -101,14 +100,15 @@ class CompressionAllocationScreen(BaseScreen):
         available = [w for w in self.state.available_workers 
                     if w not in self.state.confirmed_workers]
         
-        # Sort by combined skill
-        worker_skills = []
-        for worker in available:
-            combined = get_combined_skill(worker, machine_name, 'machine', product)
-            worker_skills.append((worker, combined))
-        
-        # Sort by combined skill descending
-        worker_skills.sort(key=lambda x: x[1], reverse=True)
+        # Sorted by combined skill, best first
+        from allocation_service import get_engine, ServiceError
+        try:
+            worker_skills = get_engine().call(
+                'rank_workers', task_name=machine_name, task_type='machine', product=product, workers=available
+            )
+        except ServiceError as e:
+            messagebox.showerror("Allocation Service", f"Could not rank the workers:\n{e}")
+            return
         
         for i, widgets in self.state.compression_widgets.items():
             if i not in self.state.confirmed_workers:
@@ -119,13 +119,11 @@ class CompressionAllocationScreen(BaseScreen):
                 menu.delete(0, 'end')
                 
                 if worker_skills:
-                    for worker, skill in worker_skills:
+                    for worker, skill, _, task_skill, prod_skill in worker_skills:
                         display_name = self.state.get_worker_display_name(worker)
                         
                         # Show skill breakdown if product is selected
                         if product:
-                            task_skill = get_worker_skill(worker, machine_name, 'machine')
-                            prod_skill = get_product_skill(worker, product)
                             display_text = f"{display_name} | Total: {skill} (M:{task_skill} + Pr:{prod_skill})"
                         else:
                             display_text = f"{display_name} | Skill: {skill}"
@@ -10,6 +10,21 @@ from ui.screens.base_screen import BaseScreen
 class DateShiftScreen(BaseScreen):
     """Screen for selecting date and shift time"""
     
+    # Calendar day colours: background by staffing fill level, text by saved shifts
+    FILL_COLORS = {
+        'low': "#f5b7b1",
+        'medium': "#f9e79f",
+        'high': "#abebc6"
+    }
+    COVERAGE_COLORS = {
+        'morning': "#1f618d",
+        'evening': "#6c3483",
+        'both': "#000000"
+    }
+    
+    # How often to check whether the allocation catalog has finished loading
+    CATALOG_POLL_MS = 100
+    
     def show(self, **kwargs):
         # Main container
         main_container = tk.Frame(self.main_frame, bg="#f0f0f0")
@@ -84,6 +99,14 @@ class DateShiftScreen(BaseScreen):
 
         self.calendar.pack(pady=15, padx=30, ipadx=20, ipady=20)  # Reduced from pady=30, ipadx=35, ipady=35
         
+        # Mark dates that already have saved shifts (one catalog query per month),
+        # once the first screen is drawn so loading the catalog does not delay it
+        self.create_calendar_legend(left_frame)
+        self.configure_calendar_tags()
+        self.tagged_months = set()
+        self.root.after_idle(self.tag_displayed_months)
+        self.calendar.bind("<<CalendarMonthChanged>>", lambda e: self.tag_displayed_months())
+        
         # RIGHT COLUMN - Shift Selection
         right_frame = tk.Frame(columns_frame, bg="#f0f0f0")
         right_frame.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=(15, 0))
@@ -162,6 +185,104 @@ class DateShiftScreen(BaseScreen):
         )
         continue_btn.pack()
 
+        dashboard_btn = tk.Button(
+            button_container,
+            text="📊 Workload Dashboard",
+            font=("Arial", 11, "bold"),
+            bg="#34495e",
+            fg="white",
+            width=30,
+            command=lambda: self.app.show_screen('workload_dashboard'),
+            cursor="hand2"
+        )
+        dashboard_btn.pack(pady=(10, 0))
+        
+        search_btn = tk.Button(
+            button_container,
+            text="🔎 Search Allocations",
+            font=("Arial", 11, "bold"),
+            bg="#34495e",
+            fg="white",
+            width=30,
+            command=lambda: self.app.show_screen('allocation_search'),
+            cursor="hand2"
+        )
+        search_btn.pack(pady=(5, 0))
+
+    def configure_calendar_tags(self):
+        """One calendar tag per shift coverage and staffing fill level"""
+        for coverage, foreground in self.COVERAGE_COLORS.items():
+            for level, background in self.FILL_COLORS.items():
+                self.calendar.tag_config(f"{coverage}_{level}", background=background, foreground=foreground)
+    
+    def create_calendar_legend(self, parent):
+        """Legend explaining the calendar colours"""
+        legend = tk.Frame(parent, bg="#f0f0f0")
+        legend.pack()
+        
+        for level, text in (('low', "< 60% staffed"), ('medium', "60-85%"), ('high', "> 85%")):
+            tk.Label(legend, text="  ", bg=self.FILL_COLORS[level]).pack(side=tk.LEFT, padx=(8, 2))
+            tk.Label(legend, text=text, font=("Arial", 10), bg="#f0f0f0").pack(side=tk.LEFT)
+        
+        for coverage, text in (('morning', "Morning"), ('evening', "Evening"), ('both', "Both shifts")):
+            tk.Label(
+                legend,
+                text=f"■ {text}",
+                font=("Arial", 10, "bold"),
+                bg="#f0f0f0",
+                fg=self.COVERAGE_COLORS[coverage]
+            ).pack(side=tk.LEFT, padx=(8, 0))
+    
+    def tag_displayed_months(self):
+        """Tag saved shifts of the displayed month and the days shown from its neighbours"""
+        if not self.calendar.winfo_exists():
+            return  # left the screen before the deferred tagging ran
+        
+        # The first scan of the allocations folder runs in the background; check back until it is done
+        from allocation_catalog import allocation_catalog
+        if not allocation_catalog.loaded:
+            allocation_catalog.load_in_background()
+            self.root.after(self.CATALOG_POLL_MS, self.tag_displayed_months)
+            return
+        
+        month, year = self.calendar.get_displayed_month()
+        for offset in (-1, 0, 1):
+            y, m = divmod(year * 12 + (month - 1) + offset, 12)
+            self.tag_month(y, m + 1)
+    
+    def tag_month(self, year, month):
+        """Add calendar events for one month from the allocation catalog (once per month)"""
+        if (year, month) in self.tagged_months:
+            return
+        self.tagged_months.add((year, month))
+        
+        from allocation_catalog import allocation_catalog
+        prefix = f"{year:04d}-{month:02d}"
+        rows = allocation_catalog.get_rows(f"{prefix}-01", f"{prefix}-31")
+        
+        by_date = {}
+        for row in rows:
+            by_date.setdefault(row['date'], []).append(row)
+        
+        for date_str, day_rows in by_date.items():
+            shifts = {row['shift'] for row in day_rows}
+            coverage = 'both' if len(shifts) > 1 else ('morning' if "Morning" in shifts else 'evening')
+            
+            assigned = sum(row['workers'] for row in day_rows)
+            total = assigned + sum(row['unassigned'] for row in day_rows)
+            fill = assigned / total if total else 0
+            level = 'high' if fill > 0.85 else ('medium' if fill >= 0.6 else 'low')
+            
+            text = "\n".join(
+                f"{row['shift']}: {row['workers']} assigned, {row['unassigned']} unassigned ({row['group']})"
+                for row in day_rows
+            )
+            self.calendar.calevent_create(
+                datetime.strptime(date_str, "%Y-%m-%d").date(),
+                text,
+                f"{coverage}_{level}"
+            )
+    
     def validate_and_continue(self):
         """Validate selections and proceed"""
         from tkinter import messagebox
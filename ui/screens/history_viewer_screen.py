@@ -5,7 +5,6 @@ import tkinter as tk
 from tkinter import messagebox
 import os
 import json
-from datetime import datetime, timedelta
 from ui.screens.base_screen import BaseScreen
 
 
@@ -16,7 +15,13 @@ class HistoryViewerScreen(BaseScreen):
         self.current_filepath = kwargs.get('filepath')
         self.edit_mode = False
         
-        if not self.current_filepath or not os.path.exists(self.current_filepath):
+        # The file may have just been saved in the background
+        if self.current_filepath:
+            from persistence_worker import persistence_worker, file_key
+            persistence_worker.wait_for(file_key(self.current_filepath))
+        
+        from allocation_archive import allocation_archive
+        if not self.current_filepath or not allocation_archive.exists(self.current_filepath):
             messagebox.showerror("Error", "Allocation file not found")
             self.app.show_screen('date_shift')
             return
@@ -72,6 +77,9 @@ class HistoryViewerScreen(BaseScreen):
         # Unassigned workers
         self.create_unassigned_section()
         
+        # Read the shifts the navigation buttons lead to while this one is shown
+        self.prefetch_neighbours()
+    
     
     def create_navigation_bar(self):
         """Create navigation bar for switching between dates/shifts"""
@@ -140,49 +148,76 @@ class HistoryViewerScreen(BaseScreen):
         )
         next_date_btn.pack(side=tk.LEFT, padx=10, pady=10)
     
+    def prefetch_neighbours(self):
+        """Queue background reads of the nearest saved shifts in both directions"""
+        from allocation_catalog import allocation_catalog
+        from shift_cache import shift_cache
+        
+        date, shift = self.state.selected_date, self.state.shift_time
+        targets = allocation_catalog.get_neighbours(date, shift)
+        for other_date in (allocation_catalog.previous_date(date, shift), allocation_catalog.next_date(date, shift)):
+            if other_date and (other_date, shift) not in targets:
+                targets.append((other_date, shift))
+        
+        shift_cache.prefetch([allocation_catalog.get_path(d, s) for d, s in targets])
+    
     def navigate_previous_date(self):
-        """Navigate to previous date (same shift)"""
-        current_date = datetime.strptime(self.state.selected_date, "%Y-%m-%d")
-        previous_date = current_date - timedelta(days=1)
-        new_date_str = previous_date.strftime("%Y-%m-%d")
+        """Navigate to the nearest earlier date with a saved allocation (same shift)"""
+        from allocation_catalog import allocation_catalog
         
-        self.navigate_to_date_shift(new_date_str, self.state.shift_time)
+        def find(date, shift):
+            previous = allocation_catalog.previous_date(date, shift)
+            return (previous, shift) if previous else None
+        self.navigate_to_catalog_shift(find, "before")
     
     def navigate_next_date(self):
-        """Navigate to next date (same shift)"""
-        current_date = datetime.strptime(self.state.selected_date, "%Y-%m-%d")
-        next_date = current_date + timedelta(days=1)
-        new_date_str = next_date.strftime("%Y-%m-%d")
+        """Navigate to the nearest later date with a saved allocation (same shift)"""
+        from allocation_catalog import allocation_catalog
         
-        self.navigate_to_date_shift(new_date_str, self.state.shift_time)
+        def find(date, shift):
+            following = allocation_catalog.next_date(date, shift)
+            return (following, shift) if following else None
+        self.navigate_to_catalog_shift(find, "after")
     
     def navigate_previous_shift(self):
-        """Navigate to previous shift (same date)"""
-        # Toggle between Morning and Evening
-        new_shift = "Evening" if self.state.shift_time == "Morning" else "Morning"
-        
-        # If going from Morning to Evening, go to previous date
-        if new_shift == "Evening":
-            current_date = datetime.strptime(self.state.selected_date, "%Y-%m-%d")
-            previous_date = current_date - timedelta(days=1)
-            new_date_str = previous_date.strftime("%Y-%m-%d")
-            self.navigate_to_date_shift(new_date_str, new_shift)
-        else:
-            self.navigate_to_date_shift(self.state.selected_date, new_shift)
+        """Navigate to the nearest earlier shift with a saved allocation"""
+        from allocation_catalog import allocation_catalog
+        self.navigate_to_catalog_shift(allocation_catalog.previous_shift, "before")
     
     def navigate_next_shift(self):
-        """Navigate to next shift (same date)"""
-        # Toggle between Morning and Evening
-        new_shift = "Evening" if self.state.shift_time == "Morning" else "Morning"
-        
-        # If going from Evening to Morning, go to next date
-        if new_shift == "Morning":
-            current_date = datetime.strptime(self.state.selected_date, "%Y-%m-%d")
-            next_date = current_date + timedelta(days=1)
-            new_date_str = next_date.strftime("%Y-%m-%d")
-            self.navigate_to_date_shift(new_date_str, new_shift)
-        else:
-            self.navigate_to_date_shift(self.state.selected_date, new_shift)
+        """Navigate to the nearest later shift with a saved allocation"""
+        from allocation_catalog import allocation_catalog
+        self.navigate_to_catalog_shift(allocation_catalog.next_shift, "after")
+    
+    def navigate_to_catalog_shift(self, find, direction):
+        """
+        Open the nearest shift in the allocation catalog whose file still exists
+        
+        Args:
+            find: Called as find(date, shift) for the next catalog entry to try,
+                (date, shift) or None
+            direction: "before" or "after", for the message when there is none
+        """
+        from allocation_catalog import allocation_catalog
+        
+        date, shift = self.state.selected_date, self.state.shift_time
+        while True:
+            target = find(date, shift)
+            if target is None:
+                messagebox.showinfo(
+                    "No Allocation Found",
+                    f"No allocation found {direction}:\n{self.state.selected_date} - {self.state.shift_time} Shift"
+                )
+                return
+            
+            date, shift = target
+            exists, filepath = self.state.check_allocation_exists(date, shift)
+            if exists:
+                self.app.show_screen('history_viewer', filepath=filepath)
+                return
+            
+            # Deleted or moved since the catalog was built: drop it and try the next one
+            allocation_catalog.remove(filepath)
     
     def navigate_to_date_shift(self, date, shift):
         """Navigate to a specific date and shift"""
@@ -401,6 +436,15 @@ class HistoryViewerScreen(BaseScreen):
             )
             audit_btn.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
             
+            compare_btn = self.create_button(
+                button_frame,
+                "🔀 Compare",
+                self.compare_with_previous,
+                bg="#2980b9",
+                height=2
+            )
+            compare_btn.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
+            
             exit_btn = self.create_button(
                 button_frame,
                 "Exit",
@@ -410,6 +454,19 @@ class HistoryViewerScreen(BaseScreen):
             )
             exit_btn.pack(side=tk.LEFT, padx=5, fill=tk.X, expand=True)
     
+    def compare_with_previous(self):
+        """Open the shift comparison against the previous saved shift of the same type"""
+        from allocation_catalog import allocation_catalog
+        previous_date = allocation_catalog.previous_date(self.state.selected_date, self.state.shift_time)
+        self.app.show_screen(
+            'shift_diff',
+            from_date=previous_date or "",
+            from_shift=self.state.shift_time,
+            to_date=self.state.selected_date,
+            to_shift=self.state.shift_time,
+            filepath=self.current_filepath
+        )
+    
     def edit_allocation(self):
         """Edit current allocation with password protection"""
         from ui.dialogs.password_dialog import PasswordDialog
@@ -430,31 +487,43 @@ class HistoryViewerScreen(BaseScreen):
             pass
     
     def export_current(self):
-        """Export current history view to PDF"""
+        """Export current history view to PDF (built in the background)"""
         from export_results import ResultsExporter
+        from export_jobs import export_runner
+        from ui.dialogs.export_progress_dialog import ExportProgressDialog
         from tkinter import messagebox
-        import platform
-        import subprocess
         
         try:
             exporter = ResultsExporter(self.state)
-            pdf_file = exporter.export_to_pdf(self.state.shift_time)
-            
-            result = messagebox.askyesno(
-                "Export Successful",
-                f"PDF created successfully!\n\n"
-                f"{os.path.basename(pdf_file)}\n\n"
-                f"Do you want to open the folder?"
-            )
-            
-            if result:
-                folder = os.path.dirname(pdf_file)
-                if platform.system() == "Windows":
-                    os.startfile(folder)
-                elif platform.system() == "Darwin":
-                    subprocess.Popen(["open", folder])
-                else:
-                    subprocess.Popen(["xdg-open", folder])
+            job = export_runner.submit(exporter.pdf_snapshot(self.state.shift_time))
+            ExportProgressDialog.watch(self.root, job, self.report_export)
         
         except Exception as e:
-            messagebox.showerror("Export Error", f"Failed to export:\n{str(e)}")
\ No newline at end of file
+            messagebox.showerror("Export Error", f"Failed to export:\n{str(e)}")
+    
+    def report_export(self, job):
+        """Offer to open the folder of a finished PDF export (called on the Tk thread)"""
+        from ui.dialogs.export_progress_dialog import export_succeeded
+        from tkinter import messagebox
+        import platform
+        import subprocess
+        
+        if not export_succeeded(self.root, job):
+            return
+        
+        pdf_file = job.filename
+        result = messagebox.askyesno(
+            "Export Successful",
+            f"PDF created successfully!\n\n"
+            f"{os.path.basename(pdf_file)}\n\n"
+            f"Do you want to open the folder?"
+        )
+        
+        if result:
+            folder = os.path.dirname(pdf_file)
+            if platform.system() == "Windows":
+                os.startfile(folder)
+            elif platform.system() == "Darwin":
+                subprocess.Popen(["open", folder])
+            else:
+                subprocess.Popen(["xdg-open", folder])
\ No newline at end of file
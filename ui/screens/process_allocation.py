@@ -5,7 +5,6 @@ import tkinter as tk
 from tkinter import messagebox
 from ui.screens.base_screen import BaseScreen
 from utils.helpers import sort_workers
-from data import get_combined_skill
 
 
 class ProcessAllocationScreen(BaseScreen):
@@ -83,8 +82,8 @@ class ProcessAllocationScreen(BaseScreen):
     
     def update_listboxes(self, changed_idx):
         """Update all listboxes with workers sorted by combined skills"""
-        from data import get_worker_skill, get_product_skill, should_track_frequency
-        from allocation_history import allocation_history
+        from data import should_track_frequency
+        from allocation_service import get_engine, ServiceError
         
         process_name = self.state.current_process[0]
         product = self.state.get_product_for_allocation(process_name)
@@ -101,71 +100,57 @@ class ProcessAllocationScreen(BaseScreen):
                 worker_name = worker_text.split(" |")[0].split(" (")[0]
                 selected_workers.append(worker_name)
         
+        # Rank the workers of every slot in one engine batch (one round trip in service mode)
+        calls = []
+        for i in range(len(self.state.process_listboxes)):
+            exclude = [w for j, w in enumerate(selected_workers) if j != i]
+            calls.append(('rank_workers', {
+                'task_name': process_name,
+                'task_type': 'process',
+                'product': product,
+                'workers': [w for w in self.state.available_workers if w not in exclude],
+                'frequency_penalty': track_frequency
+            }))
+        try:
+            rankings = get_engine().batch(calls)
+        except ServiceError as e:
+            messagebox.showerror("Allocation Service", f"Could not rank the workers:\n{e}")
+            return
+        
         for i, lb in enumerate(self.state.process_listboxes):
             current_selection = None
             if lb.curselection():
                 worker_text = lb.get(lb.curselection()[0])
                 current_selection = worker_text.split(" |")[0].split(" (")[0]
             
-            exclude = [w for j, w in enumerate(selected_workers) if j != i]
-            available = [w for w in self.state.available_workers if w not in exclude]
-            
-            # Sort by combined skill with frequency penalty
-            worker_skills = []
-            for worker in available:
-                combined = get_combined_skill(worker, process_name, 'process', product)
-                
-                # Apply frequency penalty if tracking is enabled
-                if track_frequency:
-                    penalty = allocation_history.calculate_frequency_penalty(process_name, worker)
-                    combined -= penalty
-
-                    # DEBUG
-                    if penalty > 0:
-                        print(f"  {worker}: count={allocation_history.get_allocation_count(process_name, worker)}, penalty={penalty}")
-
-
-                else:
-                    penalty = 0
-                
-                worker_skills.append((worker, combined, penalty))
+            # Sorted by combined skill with frequency penalty
+            worker_skills = rankings[i]
 
             print(f"\nDEBUG: Process '{process_name}' - Track frequency: {track_frequency}")
             if track_frequency:
                 print(f"DEBUG: Applied frequency penalties for {len([w for w in worker_skills if w[2] > 0])} workers")
             
-            # Sort by combined skill descending
-            worker_skills.sort(key=lambda x: x[1], reverse=True)
-            
             lb.delete(0, tk.END)
-            for worker, skill, penalty in worker_skills:
+            for worker, skill, penalty, task_skill, prod_skill in worker_skills:
                 display_name = self.state.get_worker_display_name(worker)
                 
                 # Show skill breakdown
-                lb.delete(0, tk.END)
-                for worker, skill, penalty in worker_skills:
-                    display_name = self.state.get_worker_display_name(worker)
-                    
-                    # Show skill breakdown
-                    if product:
-                        task_skill = get_worker_skill(worker, process_name, 'process')
-                        prod_skill = get_product_skill(worker, product)
-                        
-                        if track_frequency and penalty > 0:
-                            display_text = f"{display_name} | ⬇️ {skill:.1f} ({task_skill}+{prod_skill}-{penalty:.1f})"
-                        else:
-                            display_text = f"{display_name} | {skill} ({task_skill}+{prod_skill})"
+                if product:
+                    if track_frequency and penalty > 0:
+                        display_text = f"{display_name} | ⬇️ {skill:.1f} ({task_skill}+{prod_skill}-{penalty:.1f})"
+                    else:
+                        display_text = f"{display_name} | {skill} ({task_skill}+{prod_skill})"
+                else:
+                    if track_frequency and penalty > 0:
+                        display_text = f"{display_name} | ⬇️ {skill:.1f} (was {skill + penalty:.1f},-{penalty:.1f})"
                     else:
-                        if track_frequency and penalty > 0:
-                            display_text = f"{display_name} | ⬇️ {skill:.1f} (was {skill + penalty:.1f},-{penalty:.1f})"
-                        else:
-                            display_text = f"{display_name} | Skill: {skill}"
-                    
-                    lb.insert(tk.END, display_text)
+                        display_text = f"{display_name} | Skill: {skill}"
+                
+                lb.insert(tk.END, display_text)
             
             # Restore selection if it was there
             if current_selection:
-                for idx, (worker, _, _) in enumerate(worker_skills):
+                for idx, (worker, *_) in enumerate(worker_skills):
                     if worker == current_selection:
                         lb.selection_set(idx)
                         lb.see(idx)
@@ -173,7 +158,7 @@ class ProcessAllocationScreen(BaseScreen):
 
     def confirm_allocation(self):
         """Confirm worker allocation"""
-        from allocation_history import allocation_history
+        from allocation_service import get_engine, ServiceError
         from data import should_track_frequency
         
         selected = []
@@ -193,8 +178,13 @@ class ProcessAllocationScreen(BaseScreen):
         
         # Record allocation history if tracking is enabled
         if should_track_frequency(process_name, 'process'):
-            for worker in selected:
-                allocation_history.add_allocation(process_name, worker)
+            try:
+                get_engine().call('record_allocations', process_name=process_name, workers=selected)
+            except ServiceError as e:
+                messagebox.showerror(
+                    "Allocation Service",
+                    f"The workers were allocated, but their allocation history was not recorded:\n{e}"
+                )
         
         self.app.show_screen('main_menu')
 
@@ -377,39 +377,22 @@ class ResultsScreen(BaseScreen):
         
         if result:
             try:
-                # Log the edit to audit trail
-                try:
-                    self.state.audit_trail.log_edit(
-                        change_type='ALLOCATION_EDITED',
-                        allocation_date=self.state.selected_date,
-                        shift_time=self.state.shift_time,
-                        details={
-                            'allocations_count': len(self.state.allocations),
-                            'allocations': {k: len(v) for k, v in self.state.allocations.items()},
-                            'total_assigned_workers': sum(len(v) for v in self.state.allocations.values()),
-                            'unassigned_workers_count': len(self.state.available_workers),
-                            'overtime_workers': len(self.state.overtime_workers),
-                            'temp_workers': len(self.state.temp_workers)
-                        }
-                    )
-                except Exception as e:
-                    print(f"Warning: Could not log to audit trail: {e}")
-                
-                # Save the allocation to JSON
+                # Save the allocation to JSON (logs the changes to the audit trail)
                 from export_results import ResultsExporter
+                from ui.dialogs.save_allocation_prompt import SaveAllocationPrompt
                 exporter = ResultsExporter(self.state)
-                json_file = exporter.save_allocation_json(self.state.shift_time)
-                
-                # Also regenerate PDF
-                pdf_file = exporter.export_to_pdf(self.state.shift_time)
+                prompt = SaveAllocationPrompt(self.root, self.state)
+                json_file = prompt.save(self.state.shift_time)
+                if json_file is None:
+                    if prompt.reloaded:
+                        self.app.show_screen('results', edit_mode=self.edit_mode)
+                    return
                 
-                messagebox.showinfo(
-                    "Changes Saved",
-                    "Allocation has been successfully updated!\n\n"
-                    f"Updated files:\n"
-                    f"• {os.path.basename(json_file)}\n"
-                    f"• {os.path.basename(pdf_file)}"
-                )
+                # Also regenerate PDF, in the background (reported when it is written)
+                from export_jobs import export_runner
+                from ui.dialogs.export_progress_dialog import ExportProgressDialog
+                job = export_runner.submit(exporter.pdf_snapshot(self.state.shift_time))
+                ExportProgressDialog.watch(self.root, job, lambda job: self.report_saved(json_file, job))
                 
                 # Clear edit mode flags
                 self.state.is_editing_history = False
@@ -423,11 +406,27 @@ class ResultsScreen(BaseScreen):
                     f"Failed to save changes:\n{str(e)}"
                 )
 
+    def report_saved(self, json_file, job):
+        """Confirm a save once its PDF is regenerated (called on the Tk thread)"""
+        from ui.dialogs.export_progress_dialog import export_succeeded
+        if not export_succeeded(self.root, job, json_file):
+            return
+        
+        messagebox.showinfo(
+            "Changes Saved",
+            "Allocation has been successfully updated!\n\n"
+            f"Updated files:\n"
+            f"• {os.path.basename(json_file)}\n"
+            f"• {os.path.basename(job.filename)}"
+        )
+    
     def export_results(self):
         """Export results to PDF and Excel"""
         from ui.dialogs.export_dialog import ExportDialog
         dialog = ExportDialog(self.root, self.state)
         dialog.show()
+        if dialog.reloaded:
+            self.app.show_screen('results', edit_mode=self.edit_mode)
 
     def back_to_menu_with_password(self):
         """Go back to allocation menu with password protection"""
@@ -0,0 +1,217 @@
+"""
+Shift comparison screen: what changed between two shifts, and reassignment
+churn over a date range
+"""
+import os
+import tkinter as tk
+from datetime import datetime
+from tkinter import ttk, messagebox
+from ui.screens.base_screen import BaseScreen
+
+
+class ShiftDiffScreen(BaseScreen):
+    """Screen comparing two shifts or every consecutive shift in a range"""
+    
+    MODES = ("Two Shifts", "Date Range")
+    SHIFTS = ("Morning", "Evening")
+    
+    def show(self, **kwargs):
+        self.result = None  # ('diff', diff) or ('churn', churn), for CSV export
+        self.return_filepath = kwargs.get('filepath')
+        
+        title = self.create_title("🔀 Compare Shifts", 24)
+        title.pack(pady=20)
+        
+        # Filter bar
+        filter_frame = tk.Frame(self.main_frame, bg="#e8f4f8", relief=tk.RAISED, bd=2)
+        filter_frame.pack(fill=tk.X, padx=30, pady=10)
+        
+        def add_label(text):
+            tk.Label(filter_frame, text=text, font=("Arial", 11, "bold"), bg="#e8f4f8").pack(side=tk.LEFT, padx=(15, 5), pady=10)
+        
+        def add_shift_combo(values, default):
+            combo = ttk.Combobox(filter_frame, values=values, font=("Arial", 11), width=9, state="readonly")
+            combo.set(default)
+            combo.pack(side=tk.LEFT, padx=(5, 0), pady=10)
+            return combo
+        
+        self.mode_combo = ttk.Combobox(filter_frame, values=self.MODES, font=("Arial", 11), width=11, state="readonly")
+        self.mode_combo.set(kwargs.get('mode', self.MODES[0]))
+        self.mode_combo.pack(side=tk.LEFT, padx=(15, 0), pady=10)
+        self.mode_combo.bind("<<ComboboxSelected>>", lambda e: self.on_mode_changed())
+        
+        add_label("From:")
+        self.from_entry = tk.Entry(filter_frame, font=("Arial", 11), width=11)
+        self.from_entry.pack(side=tk.LEFT, pady=10)
+        self.from_shift = add_shift_combo(self.SHIFTS, kwargs.get('from_shift', "Morning"))
+        
+        add_label("To:")
+        self.to_entry = tk.Entry(filter_frame, font=("Arial", 11), width=11)
+        self.to_entry.pack(side=tk.LEFT, pady=10)
+        self.to_shift = add_shift_combo(self.SHIFTS, kwargs.get('to_shift', "Morning"))
+        
+        self.from_entry.insert(0, kwargs.get('from_date', ""))
+        self.to_entry.insert(0, kwargs.get('to_date', datetime.now().strftime("%Y-%m-%d")))
+        
+        compare_btn = tk.Button(
+            filter_frame,
+            text="Compare",
+            font=("Arial", 11, "bold"),
+            bg="#3498db",
+            fg="white",
+            command=self.run_compare,
+            cursor="hand2"
+        )
+        compare_btn.pack(side=tk.LEFT, padx=15, pady=10)
+        
+        self.summary_label = tk.Label(
+            filter_frame,
+            text="",
+            font=("Arial", 10),
+            bg="#e8f4f8",
+            fg="#2c3e50"
+        )
+        self.summary_label.pack(side=tk.RIGHT, padx=15, pady=10)
+        
+        # Bottom buttons
+        button_frame = tk.Frame(self.main_frame, bg="#f0f0f0")
+        button_frame.pack(side=tk.BOTTOM, pady=20, fill=tk.X, padx=20)
+        
+        back_btn = self.create_button(
+            button_frame,
+            "← Back",
+            self.go_back,
+            bg="#95a5a6"
+        )
+        back_btn.pack(side=tk.LEFT, padx=5)
+        
+        export_btn = self.create_button(
+            button_frame,
+            "📄 Export CSV",
+            self.export_csv,
+            bg="#16a085"
+        )
+        export_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Results: changes of a shift pair, or worker/task churn next to the list of pairs
+        content_frame = tk.Frame(self.main_frame, bg="#f0f0f0")
+        content_frame.pack(fill=tk.BOTH, expand=True, padx=30, pady=10)
+        
+        self.tree = self.create_table(content_frame, ('section', 'name', 'details'), ('Change', 'Name', 'Details'))
+        self.pairs_tree = self.create_table(
+            content_frame,
+            ('from', 'to', 'tasks_changed', 'reassigned', 'joined', 'left'),
+            ('From', 'To', 'Tasks Changed', 'Reassigned', 'Joined', 'Left')
+        )
+        
+        self.on_mode_changed()
+        if self.from_entry.get() and self.to_entry.get():
+            self.run_compare()
+    
+    def create_table(self, parent, columns, titles):
+        """Treeview with a scrollbar, packed to the left of its parent"""
+        frame = tk.Frame(parent, bg="#f0f0f0")
+        frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5)
+        
+        tree = ttk.Treeview(frame, columns=columns, show='headings')
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        for column, heading in zip(columns, titles):
+            tree.heading(column, text=heading)
+            tree.column(column, width=420 if column == 'details' else 120, anchor=tk.W)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        return tree
+    
+    def on_mode_changed(self):
+        """In range mode the From shift picks the shift type compared; the To shift is unused"""
+        is_range = self.mode_combo.get() == "Date Range"
+        self.from_shift['values'] = ("All Shifts",) + self.SHIFTS if is_range else self.SHIFTS
+        if not is_range and self.from_shift.get() not in self.SHIFTS:
+            self.from_shift.set(self.SHIFTS[0])
+        self.to_shift.config(state=tk.DISABLED if is_range else "readonly")
+        
+        if is_range:
+            self.pairs_tree.master.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5)
+        else:
+            self.pairs_tree.master.pack_forget()
+    
+    def run_compare(self):
+        """Diff the selected shifts (or range) and fill the tables"""
+        from shift_diff import compare_shifts, diff_rows, range_churn
+        
+        from_date = self.from_entry.get().strip()
+        to_date = self.to_entry.get().strip()
+        for value in (from_date, to_date):
+            try:
+                datetime.strptime(value, "%Y-%m-%d")
+            except ValueError:
+                messagebox.showwarning("Invalid Date", "Dates must be in YYYY-MM-DD format")
+                return
+        
+        self.tree.delete(*self.tree.get_children())
+        self.pairs_tree.delete(*self.pairs_tree.get_children())
+        
+        if self.mode_combo.get() == "Two Shifts":
+            try:
+                diff = compare_shifts(from_date, self.from_shift.get(), to_date, self.to_shift.get())
+            except FileNotFoundError as e:
+                messagebox.showinfo("No Allocation Found", str(e))
+                self.result = None
+                return
+            
+            for row in diff_rows(diff):
+                self.tree.insert('', tk.END, values=row)
+            self.result = ('diff', diff)
+            self.summary_label.config(
+                text=f"{len(diff['tasks_changed'])} tasks changed, {len(diff['reassigned'])} reassigned, "
+                     f"{diff['unchanged_tasks']} tasks unchanged"
+            )
+        else:
+            shift = self.from_shift.get()
+            churn = range_churn(from_date, to_date, None if shift == "All Shifts" else shift)
+            
+            for worker, count in churn['workers'].items():
+                self.tree.insert('', tk.END, values=("Worker reassignments", worker, count))
+            for task, count in churn['tasks'].items():
+                self.tree.insert('', tk.END, values=("Task worker changes", task, count))
+            for pair in churn['pairs']:
+                self.pairs_tree.insert('', tk.END, values=(
+                    pair['from'], pair['to'], pair['tasks_changed'], pair['reassigned'], pair['joined'], pair['left']
+                ))
+            self.result = ('churn', churn)
+            self.summary_label.config(
+                text=f"{len(churn['pairs'])} shift pairs, {sum(churn['workers'].values())} reassignments "
+                     f"in {churn['elapsed_ms']:.0f} ms"
+            )
+    
+    def export_csv(self):
+        """Write the shown comparison to exports/ as CSV"""
+        if self.result is None:
+            messagebox.showwarning("Nothing to Export", "Run a comparison first")
+            return
+        
+        from shift_diff import export_diff_csv, export_churn_csv
+        from traceability_report import get_exports_dir
+        
+        kind, result = self.result
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        name = "Shift_Diff" if kind == 'diff' else "Shift_Churn"
+        output_file = os.path.join(get_exports_dir(), f"{name}_{timestamp}.csv")
+        try:
+            if kind == 'diff':
+                export_diff_csv(result, output_file)
+            else:
+                export_churn_csv(result, output_file)
+        except Exception as e:
+            messagebox.showerror("Export Failed", f"Could not write the CSV:\n{e}")
+            return
+        
+        messagebox.showinfo("Export Successful", f"Comparison saved to:\n{output_file}")
+    
+    def go_back(self):
+        """Return to the shift this screen was opened from, or to date selection"""
+        if self.return_filepath:
+            self.app.show_screen('history_viewer', filepath=self.return_filepath)
+        else:
+            self.app.show_screen('date_shift')
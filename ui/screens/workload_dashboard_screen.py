@@ -0,0 +1,212 @@
+"""
+Workload dashboard screen backed by the statistics cube
+"""
+import tkinter as tk
+from tkinter import ttk, messagebox
+from datetime import datetime, timedelta
+from ui.screens.base_screen import BaseScreen
+
+
+class WorkloadDashboardScreen(BaseScreen):
+    """Screen showing per-worker, per-group and per-period workload totals"""
+    
+    PERIODS = {
+        "Last 4 Weeks": 28,
+        "Last 13 Weeks": 91,
+        "Last 52 Weeks": 364,
+        "All Time": None
+    }
+    
+    ALL_GROUPS = "All Process Groups"
+    
+    def show(self, **kwargs):
+        try:
+            from workload_stats import get_workload_cube
+            self.cube = get_workload_cube()
+        except ImportError:
+            messagebox.showerror(
+                "Dashboard Unavailable",
+                "The workload dashboard requires NumPy.\n\n"
+                "Install it with: pip install numpy"
+            )
+            self.app.show_screen('date_shift')
+            return
+        
+        title = self.create_title("📊 Workload Dashboard", 24)
+        title.pack(pady=20)
+        
+        # Filter bar
+        filter_frame = tk.Frame(self.main_frame, bg="#e8f4f8", relief=tk.RAISED, bd=2)
+        filter_frame.pack(fill=tk.X, padx=30, pady=10)
+        
+        tk.Label(
+            filter_frame,
+            text="Period:",
+            font=("Arial", 11, "bold"),
+            bg="#e8f4f8"
+        ).pack(side=tk.LEFT, padx=(15, 5), pady=10)
+        
+        self.period_combo = ttk.Combobox(
+            filter_frame,
+            values=list(self.PERIODS.keys()),
+            font=("Arial", 11),
+            width=15,
+            state="readonly"
+        )
+        self.period_combo.set("Last 13 Weeks")
+        self.period_combo.pack(side=tk.LEFT, padx=5, pady=10)
+        self.period_combo.bind("<<ComboboxSelected>>", lambda e: self.refresh())
+        
+        tk.Label(
+            filter_frame,
+            text="Process Group:",
+            font=("Arial", 11, "bold"),
+            bg="#e8f4f8"
+        ).pack(side=tk.LEFT, padx=(20, 5), pady=10)
+        
+        self.group_combo = ttk.Combobox(
+            filter_frame,
+            values=[self.ALL_GROUPS] + sorted(self.cube.groups),
+            font=("Arial", 11),
+            width=30,
+            state="readonly"
+        )
+        self.group_combo.set(self.ALL_GROUPS)
+        self.group_combo.pack(side=tk.LEFT, padx=5, pady=10)
+        self.group_combo.bind("<<ComboboxSelected>>", lambda e: self.refresh())
+        
+        self.summary_label = tk.Label(
+            filter_frame,
+            text="",
+            font=("Arial", 10),
+            bg="#e8f4f8",
+            fg="#2c3e50"
+        )
+        self.summary_label.pack(side=tk.RIGHT, padx=15, pady=10)
+        
+        # Bottom buttons
+        button_frame = tk.Frame(self.main_frame, bg="#f0f0f0")
+        button_frame.pack(side=tk.BOTTOM, pady=20, fill=tk.X, padx=20)
+        
+        back_btn = self.create_button(
+            button_frame,
+            "← Back",
+            lambda: self.app.show_screen('date_shift'),
+            bg="#95a5a6"
+        )
+        back_btn.pack(side=tk.LEFT, padx=5)
+        
+        # Content: top workers and group totals side by side, period chart below
+        content_frame = tk.Frame(self.main_frame, bg="#f0f0f0")
+        content_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        
+        self.top_tree = self.create_table(
+            content_frame, "Most Allocated Workers", ('worker', 'count'), ('Worker', 'Allocations')
+        )
+        self.group_tree = self.create_table(
+            content_frame, "Allocations per Process Group", ('group', 'count'), ('Process Group', 'Allocations')
+        )
+        
+        chart_label = tk.Label(
+            self.main_frame,
+            text="Allocations per Week",
+            font=("Arial", 14, "bold"),
+            bg="#f0f0f0",
+            fg="#2c3e50"
+        )
+        chart_label.pack(pady=(10, 0))
+        
+        self.chart = tk.Canvas(self.main_frame, bg="#ffffff", height=180, highlightthickness=0)
+        self.chart.pack(fill=tk.X, padx=30, pady=10)
+        self.chart.bind("<Configure>", lambda e: self.draw_chart())
+        
+        self.period_data = []
+        self.refresh()
+    
+    def create_table(self, parent, heading, columns, titles):
+        """Create a titled two-column table"""
+        frame = tk.Frame(parent, bg="#f0f0f0")
+        frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=10)
+        
+        tk.Label(
+            frame,
+            text=heading,
+            font=("Arial", 14, "bold"),
+            bg="#f0f0f0",
+            fg="#2c3e50"
+        ).pack(pady=5)
+        
+        tree = ttk.Treeview(frame, columns=columns, show='headings', height=12)
+        tree.heading(columns[0], text=titles[0])
+        tree.heading(columns[1], text=titles[1])
+        tree.column(columns[0], width=250, anchor='w')
+        tree.column(columns[1], width=100, anchor='center')
+        
+        vsb = ttk.Scrollbar(frame, orient=tk.VERTICAL, command=tree.yview)
+        tree.configure(yscrollcommand=vsb.set)
+        tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        vsb.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        return tree
+    
+    def get_filters(self):
+        """Get (group_name, start_date) from the filter bar"""
+        group_name = self.group_combo.get()
+        if group_name == self.ALL_GROUPS:
+            group_name = None
+        
+        days = self.PERIODS.get(self.period_combo.get())
+        start_date = None
+        if days is not None:
+            start_date = (datetime.now() - timedelta(days=days)).strftime("%Y-%m-%d")
+        
+        return group_name, start_date
+    
+    def refresh(self):
+        """Re-run the cube queries for the current filters"""
+        group_name, start_date = self.get_filters()
+        
+        self.top_tree.delete(*self.top_tree.get_children())
+        for worker, count in self.cube.top_workers(25, group_name, start_date):
+            self.top_tree.insert('', tk.END, values=(worker, count))
+        
+        self.group_tree.delete(*self.group_tree.get_children())
+        group_totals = self.cube.group_totals(start_date=start_date)
+        for group, count in sorted(group_totals.items(), key=lambda x: x[1], reverse=True):
+            self.group_tree.insert('', tk.END, values=(group, count))
+        
+        stats = self.cube.distribution(group_name, start_date)
+        self.summary_label.config(
+            text=f"Per worker: min {stats['min']} | median {stats['median']:.0f} | "
+                 f"mean {stats['mean']:.1f} | max {stats['max']}"
+        )
+        
+        self.period_data = self.cube.period_totals(group_name, start_date)
+        self.draw_chart()
+    
+    def draw_chart(self):
+        """Draw per-period totals as a simple bar chart"""
+        self.chart.delete("all")
+        if not self.period_data:
+            return
+        
+        width = self.chart.winfo_width()
+        height = self.chart.winfo_height()
+        if width <= 1:
+            return
+        
+        peak = max(count for _, count in self.period_data) or 1
+        bar_width = max((width - 20) / len(self.period_data), 1)
+        
+        for i, (bucket_start, count) in enumerate(self.period_data):
+            x0 = 10 + i * bar_width
+            bar_height = (height - 30) * count / peak
+            self.chart.create_rectangle(
+                x0, height - 20 - bar_height,
+                x0 + max(bar_width - 2, 1), height - 20,
+                fill="#3498db", outline=""
+            )
+        
+        self.chart.create_text(10, height - 8, text=self.period_data[0][0], anchor="w", font=("Arial", 8))
+        self.chart.create_text(width - 10, height - 8, text=self.period_data[-1][0], anchor="e", font=("Arial", 8))
+        self.chart.create_text(10, 8, text=f"Peak: {peak}", anchor="w", font=("Arial", 8))
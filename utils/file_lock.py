@@ -0,0 +1,419 @@
+"""
+Advisory file locks and optimistic version checks for the shared data folder
+
+Several stations run the app against one (network) folder. Every
+read-modify-write of a shared document takes the document's lock, checks
+that the version it started from is still the one on disk, and replaces the
+file atomically:
+    
+    with FileLock(path):
+        if file_stamp(path) != stamp_when_read:
+            raise StaleWriteError(path)
+        atomic_write(path, text)
+
+Readers never lock: writes go through a temporary file and os.replace, so a
+reader sees either the old or the new document, and locking only orders the
+writers.
+
+The lock is an OS advisory lock (fcntl on POSIX, msvcrt on Windows) on
+<path>.lock. Where the filesystem does not support those (some network
+shares) it falls back to a lock file created exclusively, <path>.lck,
+recording the host and pid of its owner. The owner refreshes the file's
+mtime while it holds the lock, and a lock file is broken once it has not been
+refreshed for STALE_LOCK_SECONDS (a crashed station), or at once if its owner
+is no longer running on this host.
+    
+    python utils/file_lock.py hammer --processes 8 --rounds 200
+"""
+import argparse
+import errno
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+# Seconds to wait for a lock before giving up
+LOCK_TIMEOUT = 10
+
+# A fallback lock file not refreshed for this long is left over from a crashed station
+STALE_LOCK_SECONDS = 60
+
+# Seconds between refreshes of the fallback lock files this process holds
+HEARTBEAT_SECONDS = 10
+
+POLL_INTERVAL = 0.02
+
+# Lock files whose filesystem rejected OS locks (use the fallback from then on)
+unsupported_paths = set()
+
+# Threads of one process are ordered locally as well (POSIX locks are per process)
+local_locks = {}
+local_locks_guard = threading.Lock()
+
+# Fallback lock files held by this process (kept fresh by the heartbeat thread)
+held_fallbacks = set()
+heartbeat_thread = None
+
+
+class LockTimeout(TimeoutError):
+    """Raised when a lock cannot be acquired within its timeout"""
+
+
+class StaleWriteError(Exception):
+    """
+    Raised when a document changed on disk since it was read (another station saved it)
+    
+    Attributes:
+        path: Document path
+        base: Version the write started from
+        current: Version now on disk
+    """
+    
+    def __init__(self, path, base=None, current=None, message=None):
+        super().__init__(message or f"{os.path.basename(path)} was changed by another station")
+        self.path = path
+        self.base = base
+        self.current = current
+
+
+def process_alive(pid):
+    """True if a process with this id is running on this host"""
+    if os.name == 'nt':
+        import ctypes
+        # PROCESS_QUERY_LIMITED_INFORMATION
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # running under another user
+    return True
+
+
+def heartbeat():
+    """Refresh the fallback lock files this process holds (runs on its own thread)"""
+    while True:
+        time.sleep(HEARTBEAT_SECONDS)
+        with local_locks_guard:
+            files = list(held_fallbacks)
+        for fallback_file in files:
+            try:
+                os.utime(fallback_file)
+            except OSError:
+                pass
+
+
+def hold_fallback(fallback_file):
+    """Keep a fallback lock file fresh until release_fallback"""
+    global heartbeat_thread
+    with local_locks_guard:
+        held_fallbacks.add(fallback_file)
+        if heartbeat_thread is None or not heartbeat_thread.is_alive():
+            heartbeat_thread = threading.Thread(target=heartbeat, name="file-lock-heartbeat", daemon=True)
+            heartbeat_thread.start()
+
+
+def release_fallback(fallback_file):
+    """Stop refreshing a fallback lock file"""
+    with local_locks_guard:
+        held_fallbacks.discard(fallback_file)
+
+
+def local_lock(lock_file):
+    """Process-wide lock for a lock file"""
+    key = os.path.normcase(os.path.abspath(lock_file))
+    with local_locks_guard:
+        lock = local_locks.get(key)
+        if lock is None:
+            lock = local_locks[key] = threading.Lock()
+        return lock
+
+
+class FileLock:
+    """Exclusive advisory lock on a document, shared by stations and threads"""
+    
+    def __init__(self, path, timeout=LOCK_TIMEOUT):
+        self.path = path
+        self.lock_file = path + ".lock"
+        self.fallback_file = path + ".lck"
+        self.timeout = timeout
+        self.handle = None  # open lock file holding the OS lock
+        self.owns_fallback = False
+        self.local = local_lock(self.lock_file)
+    
+    def acquire(self):
+        """Wait for the lock (raises LockTimeout)"""
+        deadline = time.monotonic() + self.timeout
+        if not self.local.acquire(timeout=self.timeout):
+            raise LockTimeout(f"Timed out waiting for {self.lock_file}")
+        
+        try:
+            while True:
+                if self.lock_file in unsupported_paths:
+                    if self.try_fallback():
+                        return self
+                elif self.try_os_lock():
+                    return self
+                
+                if time.monotonic() >= deadline:
+                    raise LockTimeout(f"Timed out waiting for {self.lock_file} (held by another station)")
+                time.sleep(POLL_INTERVAL)
+        except BaseException:
+            self.local.release()
+            raise
+    
+    def try_os_lock(self):
+        """Take the OS lock without blocking; False if another process holds it"""
+        handle = open(self.lock_file, 'a+b')
+        try:
+            if fcntl is not None:
+                fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            elif msvcrt is not None:
+                handle.seek(0)
+                msvcrt.locking(handle.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                raise OSError(errno.ENOSYS, "no OS file locking")
+        except OSError as e:
+            handle.close()
+            if e.errno in (errno.EAGAIN, errno.EACCES, errno.EWOULDBLOCK, errno.EDEADLK):
+                return False
+            # Locks not supported here: use lock files for this path from now on
+            print(f"File locks unsupported for {self.lock_file} ({e}); using lock files")
+            unsupported_paths.add(self.lock_file)
+            return False
+        
+        self.handle = handle
+        return True
+    
+    def try_fallback(self):
+        """Create the fallback lock file exclusively; False if another station holds it"""
+        try:
+            fd = os.open(self.fallback_file, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            owner = self.fallback_owner()
+            if owner is not None and self.is_stale(owner):
+                self.break_fallback(owner)
+            return False
+        
+        import socket
+        with os.fdopen(fd, 'w') as f:
+            f.write(json.dumps({'host': socket.gethostname(), 'pid': os.getpid(), 'time': time.time()}))
+        self.owns_fallback = True
+        hold_fallback(self.fallback_file)
+        return True
+    
+    def break_fallback(self, owner):
+        """
+        Remove a fallback lock file judged stale
+        
+        The file is first renamed to a name unique to this thread, so that of
+        several waiters breaking it only one gets it, and then checked to still
+        be the lock judged stale; a lock another waiter took in between is put back.
+        """
+        import socket
+        aside = f"{self.fallback_file}.{socket.gethostname()}.{os.getpid()}.{threading.get_ident()}.stale"
+        try:
+            os.rename(self.fallback_file, aside)
+        except OSError:
+            return  # broken by another waiter
+        
+        try:
+            if self.fallback_owner(aside) == owner:
+                print(f"Breaking stale lock {self.fallback_file}")
+            else:
+                try:
+                    os.link(aside, self.fallback_file)  # fails rather than replace a newer lock
+                except OSError:
+                    pass
+        finally:
+            try:
+                os.remove(aside)
+            except OSError:
+                pass
+    
+    def fallback_owner(self, path=None):
+        """
+        Owner record of the fallback lock file (or of path), with its mtime
+        
+        Returns:
+            Dictionary ({} while the owner is still writing it), or None if there is no file
+        """
+        path = path or self.fallback_file
+        try:
+            mtime = os.path.getmtime(path)
+            with open(path, 'r', encoding='utf-8') as f:
+                text = f.read()
+        except OSError:
+            return None
+        try:
+            owner = json.loads(text)
+        except ValueError:
+            owner = {}
+        owner['mtime'] = mtime
+        return owner
+    
+    def is_stale(self, owner):
+        """True if a fallback lock file was left by an owner that no longer holds it"""
+        import socket
+        if owner.get('host') == socket.gethostname() and owner.get('pid') and not process_alive(owner['pid']):
+            return True
+        # A live owner refreshes the file while it holds the lock
+        return time.time() - owner['mtime'] > STALE_LOCK_SECONDS
+    
+    def release(self):
+        """Release the lock"""
+        try:
+            if self.handle is not None:
+                if fcntl is not None:
+                    fcntl.flock(self.handle.fileno(), fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    self.handle.seek(0)
+                    msvcrt.locking(self.handle.fileno(), msvcrt.LK_UNLCK, 1)
+                self.handle.close()
+                self.handle = None
+            if self.owns_fallback:
+                self.owns_fallback = False
+                release_fallback(self.fallback_file)
+                os.remove(self.fallback_file)
+        finally:
+            self.local.release()
+    
+    def __enter__(self):
+        return self.acquire()
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+
+
+def file_stamp(path):
+    """Version of a file as [mtime_ns, size], or None if it does not exist"""
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def atomic_write(path, data):
+    """Replace a file with text or bytes through a temporary file unique to this process"""
+    import tempfile
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_file = tempfile.mkstemp(prefix=os.path.basename(path) + ".", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data.encode('utf-8') if isinstance(data, str) else data)
+        os.replace(temp_file, path)
+    except BaseException:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+
+
+def locked_write(path, data, check=None):
+    """
+    Replace a file under its lock
+    
+    Args:
+        check: Called as check(path) once the lock is held, before writing;
+            raises StaleWriteError if the write would overwrite a newer version
+    """
+    with FileLock(path):
+        if check is not None:
+            check(path)
+        atomic_write(path, data)
+
+
+# ---------------------------------------------------------------------- #
+# Stress test: many processes doing read-modify-write on one document
+# ---------------------------------------------------------------------- #
+
+def read_json(path):
+    """Parsed JSON document"""
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def hammer_worker(path, rounds, worker_id, fallback=False):
+    """Increment a shared JSON counter `rounds` times, retrying stale writes"""
+    if fallback:
+        unsupported_paths.add(path + ".lock")
+    
+    retries = 0
+    for _ in range(rounds):
+        while True:
+            # Lock-free read, optimistic write
+            data = read_json(path)
+            base = data['revision']
+            data['revision'] = base + 1
+            data['count'] += 1
+            data['by_worker'][str(worker_id)] = data['by_worker'].get(str(worker_id), 0) + 1
+            
+            def check(p):
+                current = read_json(p)['revision']
+                if current != base:
+                    raise StaleWriteError(p, base, current)
+            try:
+                locked_write(path, json.dumps(data), check)
+                break
+            except StaleWriteError:
+                retries += 1
+    return retries
+
+
+def hammer(processes=8, rounds=200, directory=None, fallback=False):
+    """
+    Run `processes` processes each incrementing one counter `rounds` times
+    
+    Returns:
+        (expected count, final count, stale writes retried, seconds)
+    """
+    import multiprocessing
+    import tempfile
+    directory = directory or tempfile.mkdtemp(prefix="file_lock_")
+    path = os.path.join(directory, "counter.json")
+    atomic_write(path, json.dumps({'revision': 0, 'count': 0, 'by_worker': {}}))
+    
+    started = time.perf_counter()
+    with multiprocessing.Pool(processes) as pool:
+        retries = pool.starmap(hammer_worker, [(path, rounds, i, fallback) for i in range(processes)])
+    elapsed = time.perf_counter() - started
+    
+    final = read_json(path)['count']
+    return processes * rounds, final, sum(retries), elapsed
+
+
+def main(argv=None):
+    """Command line: stress the locks with local processes"""
+    parser = argparse.ArgumentParser(description="File lock tools")
+    commands = parser.add_subparsers(dest='command', required=True)
+    stress = commands.add_parser('hammer', help="many processes updating one document")
+    stress.add_argument('--processes', type=int, default=8)
+    stress.add_argument('--rounds', type=int, default=200)
+    stress.add_argument('--dir', help="folder to run in (e.g. the shared network folder)")
+    stress.add_argument('--fallback', action='store_true', help="use lock files instead of OS locks")
+    args = parser.parse_args(argv)
+    
+    expected, final, retries, elapsed = hammer(args.processes, args.rounds, args.dir, args.fallback)
+    print(f"{expected} updates, counter at {final}, {retries} stale writes retried, {elapsed:.2f} s")
+    if final != expected:
+        print("LOST UPDATES")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
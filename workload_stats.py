@@ -0,0 +1,310 @@
+"""
+Workload statistics cube (worker x process group x time bucket)
+
+The cube is a NumPy array of allocation counts built once from the
+allocation history and kept current through history listeners, so
+dashboard queries are plain array reductions instead of date parsing.
+The listeners run on the persistence worker for merged history, so the
+cube is only read and changed under its lock.
+"""
+import threading
+from datetime import datetime, timedelta
+
+import numpy as np
+
+BUCKET_DAYS = {
+    'day': 1,
+    'week': 7
+}
+
+
+class WorkloadCube:
+    """Allocation counts indexed by worker, process group and time bucket"""
+    
+    def __init__(self, bucket='week', origin=None, dtype=np.uint16):
+        if bucket not in BUCKET_DAYS:
+            raise ValueError(f"Unknown bucket size: {bucket}")
+        
+        self.bucket = bucket
+        self.bucket_days = BUCKET_DAYS[bucket]
+        self.dtype = dtype
+        
+        # Set from the earliest history date on build unless given explicitly
+        self.origin = self._align(origin) if origin is not None else None
+        
+        self.workers = []
+        self.worker_index = {}
+        self.groups = []
+        self.group_index = {}
+        
+        self.counts = np.zeros((0, 0, 0), dtype=self.dtype)
+        self.num_buckets = 0
+        self.lock = threading.RLock()
+    
+    def _align(self, date):
+        """Align a date to the start of its bucket (weeks start on Monday)"""
+        date = datetime(date.year, date.month, date.day)
+        if self.bucket == 'week':
+            date -= timedelta(days=date.weekday())
+        return date
+    
+    def _bucket_for(self, date_str):
+        """Get bucket number for a YYYY-MM-DD date (negative if before origin)"""
+        date = datetime.strptime(date_str, "%Y-%m-%d")
+        return (date - self.origin).days // self.bucket_days
+    
+    def bucket_start(self, bucket):
+        """Get the first date (YYYY-MM-DD) covered by a bucket"""
+        return (self.origin + timedelta(days=bucket * self.bucket_days)).strftime("%Y-%m-%d")
+    
+    def _index(self, names, index, name):
+        """Get (or assign) the axis position for a name"""
+        position = index.get(name)
+        if position is None:
+            position = len(names)
+            names.append(name)
+            index[name] = position
+        return position
+    
+    def _ensure_shape(self, workers, groups, buckets):
+        """Grow the array so the given axis sizes fit (amortised doubling)"""
+        shape = self.counts.shape
+        if workers <= shape[0] and groups <= shape[1] and buckets <= shape[2]:
+            return
+        
+        new_shape = (
+            max(workers, shape[0] * 2 if workers > shape[0] else shape[0]),
+            max(groups, shape[1] * 2 if groups > shape[1] else shape[1]),
+            max(buckets, shape[2] * 2 if buckets > shape[2] else shape[2])
+        )
+        grown = np.zeros(new_shape, dtype=self.dtype)
+        grown[:shape[0], :shape[1], :shape[2]] = self.counts
+        self.counts = grown
+    
+    def _move_origin(self, bucket):
+        """Move the origin back so a negative bucket becomes bucket 0"""
+        shift = -bucket
+        self.origin -= timedelta(days=shift * self.bucket_days)
+        shape = self.counts.shape
+        moved = np.zeros((shape[0], shape[1], shape[2] + shift), dtype=self.dtype)
+        moved[:, :, shift:] = self.counts
+        self.counts = moved
+        self.num_buckets += shift
+    
+    def build(self, history):
+        """
+        Build the cube from an AllocationHistory in one pass
+        
+        Raw dates land in their own bucket. Rolled-up months only have month
+        resolution, so they are counted in the bucket holding the 1st.
+        """
+        with self.lock, history.lock:
+            return self._build(history)
+    
+    def _build(self, history):
+        """Build the cube (under both locks)"""
+        if self.origin is None:
+            earliest = self._earliest_date(history)
+            self.origin = self._align(earliest or datetime.now())
+        
+        worker_ids = []
+        group_ids = []
+        bucket_ids = []
+        bucket_cache = {}
+        
+        def collect(group_name, worker_name, date_str, count=1):
+            # The same few hundred dates repeat for every worker
+            bucket = bucket_cache.get(date_str)
+            if bucket is None:
+                try:
+                    bucket = self._bucket_for(date_str)
+                except ValueError:
+                    bucket = False
+                bucket_cache[date_str] = bucket
+            if bucket is False:
+                return
+            g = self._index(self.groups, self.group_index, group_name)
+            w = self._index(self.workers, self.worker_index, worker_name)
+            for _ in range(count):
+                worker_ids.append(w)
+                group_ids.append(g)
+                bucket_ids.append(bucket)
+        
+        for group_name, workers in history.monthly.items():
+            for worker_name, months in workers.items():
+                for month, count in months.items():
+                    collect(group_name, worker_name, f"{month}-01", count)
+        
+        for group_name, workers in history.history.items():
+            for worker_name, dates in workers.items():
+                for date_str in dates:
+                    collect(group_name, worker_name, date_str)
+        
+        # Dates before an explicit origin move it back
+        if bucket_ids and min(bucket_ids) < 0:
+            shift = min(bucket_ids)
+            self._move_origin(shift)
+            bucket_ids = [bucket - shift for bucket in bucket_ids]
+        
+        max_bucket = max(bucket_ids) + 1 if bucket_ids else 0
+        self.num_buckets = max(self.num_buckets, max_bucket)
+        self._ensure_shape(len(self.workers), len(self.groups), self.num_buckets)
+        
+        if bucket_ids:
+            np.add.at(
+                self.counts,
+                (np.array(worker_ids), np.array(group_ids), np.array(bucket_ids)),
+                1
+            )
+        return self
+    
+    def _earliest_date(self, history):
+        """Find the earliest date held in either history tier"""
+        candidates = []
+        for workers in history.monthly.values():
+            for months in workers.values():
+                candidates.extend(f"{month}-01" for month in months)
+        for workers in history.history.values():
+            for dates in workers.values():
+                candidates.extend(dates)
+        
+        for date_str in sorted(candidates):
+            try:
+                return datetime.strptime(date_str, "%Y-%m-%d")
+            except ValueError:
+                continue
+        return None
+    
+    def record(self, group_name, worker_name, date_str, count=1):
+        """
+        Add an allocation (used as an AllocationHistory listener)
+        
+        A date before the cube origin moves the origin back.
+        """
+        with self.lock:
+            if self.origin is None:
+                self.origin = self._align(datetime.strptime(date_str, "%Y-%m-%d"))
+            
+            bucket = self._bucket_for(date_str)
+            if bucket < 0:
+                self._move_origin(bucket)
+                bucket = 0
+            
+            g = self._index(self.groups, self.group_index, group_name)
+            w = self._index(self.workers, self.worker_index, worker_name)
+            self.num_buckets = max(self.num_buckets, bucket + 1)
+            self._ensure_shape(len(self.workers), len(self.groups), self.num_buckets)
+            self.counts[w, g, bucket] += count
+    
+    def record_month(self, group_name, worker_name, month, count):
+        """Add rolled-up allocations merged from another station (AllocationHistory month listener)"""
+        self.record(group_name, worker_name, f"{month}-01", count)
+    
+    def _view(self, group_name=None, start_date=None, end_date=None):
+        """
+        Get the populated part of the cube, optionally narrowed down (under self.lock)
+        
+        Returns:
+            Array of shape (workers, groups, buckets); the group axis has
+            length 1 when a group filter is applied.
+        """
+        view = self.counts[:len(self.workers), :len(self.groups), :self.num_buckets]
+        
+        first = 0 if start_date is None else max(self._bucket_for(start_date), 0)
+        last = self.num_buckets if end_date is None else self._bucket_for(end_date) + 1
+        view = view[:, :, first:max(last, first)]
+        
+        if group_name is not None:
+            g = self.group_index.get(group_name)
+            if g is None:
+                return view[:, :0, :]
+            view = view[:, g:g + 1, :]
+        
+        return view
+    
+    def worker_totals(self, group_name=None, start_date=None, end_date=None):
+        """Get total allocations per worker as {worker: count}"""
+        with self.lock:
+            totals = self._view(group_name, start_date, end_date).sum(axis=(1, 2), dtype=np.int64)
+            return {
+                self.workers[i]: int(totals[i])
+                for i in np.flatnonzero(totals)
+            }
+    
+    def group_totals(self, worker_name=None, start_date=None, end_date=None):
+        """Get total allocations per process group as {group: count}"""
+        with self.lock:
+            view = self._view(None, start_date, end_date)
+            if worker_name is not None:
+                w = self.worker_index.get(worker_name)
+                if w is None:
+                    return {}
+                view = view[w:w + 1]
+            
+            totals = view.sum(axis=(0, 2), dtype=np.int64)
+            return {
+                self.groups[i]: int(totals[i])
+                for i in np.flatnonzero(totals)
+            }
+    
+    def period_totals(self, group_name=None, start_date=None, end_date=None):
+        """Get total allocations per bucket as [(bucket_start_date, count), ...]"""
+        with self.lock:
+            first = 0 if start_date is None else max(self._bucket_for(start_date), 0)
+            totals = self._view(group_name, start_date, end_date).sum(axis=(0, 1), dtype=np.int64)
+            return [
+                (self.bucket_start(first + i), int(count))
+                for i, count in enumerate(totals)
+            ]
+    
+    def top_workers(self, n=10, group_name=None, start_date=None, end_date=None):
+        """Get the N most allocated workers as [(worker, count), ...]"""
+        with self.lock:
+            totals = self._view(group_name, start_date, end_date).sum(axis=(1, 2), dtype=np.int64)
+            n = min(n, len(totals))
+            if n == 0:
+                return []
+            
+            top = np.argpartition(-totals, n - 1)[:n]
+            top = top[np.argsort(-totals[top], kind='stable')]
+            return [(self.workers[i], int(totals[i])) for i in top if totals[i] > 0]
+    
+    def distribution(self, group_name=None, start_date=None, end_date=None):
+        """
+        Get the spread of per-worker totals
+        
+        Returns:
+            Dictionary with min/max/mean/median/std and a histogram as
+            {allocation count: number of workers}
+        """
+        with self.lock:
+            totals = self._view(group_name, start_date, end_date).sum(axis=(1, 2), dtype=np.int64)
+            if totals.size == 0:
+                return {'min': 0, 'max': 0, 'mean': 0.0, 'median': 0.0, 'std': 0.0, 'histogram': {}}
+            
+            values, frequency = np.unique(totals, return_counts=True)
+            return {
+                'min': int(totals.min()),
+                'max': int(totals.max()),
+                'mean': float(totals.mean()),
+                'median': float(np.median(totals)),
+                'std': float(totals.std()),
+                'histogram': {int(v): int(f) for v, f in zip(values, frequency)}
+            }
+
+
+_workload_cube = None
+
+
+def get_workload_cube():
+    """Get the shared cube, building it from allocation history on first use"""
+    global _workload_cube
+    
+    if _workload_cube is None:
+        from allocation_history import allocation_history
+        
+        _workload_cube = WorkloadCube().build(allocation_history)
+        allocation_history.add_listener(_workload_cube.record)
+        allocation_history.add_month_listener(_workload_cube.record_month)
+    
+    return _workload_cube